@@ -1,8 +1,22 @@
 import streamlit as st
+import io
+import uuid
 import pandas as pd
 from datetime import datetime
 from config import *
 from utils import *
+from cache import cached_predict_price
+from lookup_table import lookup_predict_price
+from comparables import find_comparables
+from history import get_history_store
+from charts import (attribution_figure, city_comparison_figure, prediction_gauge_figure, price_curve_figures,
+                    store_history_figure)
+from insights import get_insights
+from explain import explain_price
+import drift
+from drift import current_scores
+from startup import start_startup
+import metrics
 
 # Page configuration
 st.set_page_config(
@@ -12,6 +26,38 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+
+@st.cache_resource
+def start_app():
+    """Load and warm up the pipeline once per process, in the background"""
+    # The diagnostics panel shows the input drift of this process's predictions
+    drift.enable()
+    if METRICS_PATH:
+        metrics.start_file_exporter()
+    return start_startup(background=True)
+
+
+startup_report = start_app()
+
+
+def history_id():
+    """
+    Id of this browser's rows in the history store, kept in the page URL
+    (?history=...) so reloads, bookmarks and server restarts find them again
+    """
+    value = st.query_params.get("history", "")
+    try:
+        if uuid.UUID(hex=value).hex == value:
+            return value
+    except ValueError:
+        pass
+    value = st.session_state.setdefault('history_session_id', uuid.uuid4().hex)
+    st.query_params["history"] = value
+    return value
+
+
+session_id = history_id()
+
 # Custom CSS
 st.markdown("""
 <style>
@@ -35,6 +81,11 @@ st.markdown("""
         color: #2ca02c;
         text-align: center;
     }
+    .interval-display {
+        font-size: 1.1rem;
+        color: #555555;
+        text-align: center;
+    }
     .metric-card {
         background-color: #ffffff;
         padding: 1rem;
@@ -55,10 +106,6 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-# Initialize session state for history
-if 'prediction_history' not in st.session_state:
-    st.session_state.prediction_history = []
-
 # Header
 st.markdown(f'<div class="main-header"> Tunisian House Price Predictor</div>', unsafe_allow_html=True)
 st.markdown("### Predict real estate prices across Tunis, Ariana, Ben Arous, and La Manouba")
@@ -85,6 +132,8 @@ with st.sidebar:
         st.metric("Champion Model", model_info.get('champion_model_name', 'N/A'))
         st.metric("R² Score", f"{model_info.get('champion_r2', 0):.2%}")
         st.metric("Export Date", model_info.get('export_date', 'N/A')[:10])
+        if model_info.get('version'):
+            st.metric("Pipeline Version", model_info['version'])
 
     st.divider()
 
@@ -100,6 +149,46 @@ with st.sidebar:
     except:
         st.info("City statistics unavailable")
 
+    # Diagnostics (hidden: open the app with ?diagnostics=1)
+    if st.query_params.get("diagnostics") == "1":
+        st.divider()
+        st.subheader("🩺 Diagnostics")
+        instrumented = st.toggle("Record prediction metrics", value=metrics.enabled)
+        if instrumented != metrics.enabled:
+            metrics.enable() if instrumented else metrics.disable()
+
+        stage_rows, city_rows = metrics.registry.snapshot()
+        if stage_rows:
+            st.caption("Stage latency")
+            st.dataframe(pd.DataFrame(stage_rows).round(3), hide_index=True, use_container_width=True)
+            st.caption("Outcomes")
+            st.dataframe(pd.DataFrame(city_rows).round(3), hide_index=True, use_container_width=True)
+        else:
+            st.info("No predictions recorded yet")
+
+        col1, col2 = st.columns(2)
+        with col1:
+            st.download_button("Prometheus", metrics.render_prometheus(), file_name="house_price_metrics.prom",
+                               mime="text/plain")
+        with col2:
+            if st.button("Reset"):
+                metrics.registry.reset()
+                st.rerun()
+
+        # Input drift of the served predictions against the training listings (drift.py)
+        st.caption("Input drift")
+        drift_rows, drift_summary = current_scores()
+        if drift_rows:
+            st.dataframe(pd.DataFrame(drift_rows).round(3), hide_index=True, use_container_width=True)
+            for row in drift_rows:
+                if row['alert']:
+                    st.warning(f"{row['city'].title()}: inputs drifted from the training data (score {row['drift']:.2f})")
+        else:
+            st.info("No predictions monitored yet")
+        st.caption(f"{drift_summary['live_listings']} listings monitored, "
+                   f"{drift_summary['unknown_city_share']:.1%} from unknown cities, "
+                   f"{drift_summary['dropped']} dropped | reference: {drift_summary['reference']}")
+
 # Main content tabs
 tab1, tab2, tab3 = st.tabs([" Price Prediction", " Prediction History", " Market Insights"])
 
@@ -184,15 +273,12 @@ with tab1:
                 # Convert region back to lowercase for the model
                 region_lower = region.lower()
 
-                result = predict_price(city, size, room_count, bathroom_count, region_lower)
+                result = lookup_predict_price(city, size, room_count, bathroom_count, region_lower,
+                                              fallback=cached_predict_price)
 
-                # Store in history
+                # Store in this browser's history
                 result['timestamp'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                st.session_state.prediction_history.insert(0, result)
-
-                # Keep only recent predictions
-                if len(st.session_state.prediction_history) > MAX_HISTORY_SIZE:
-                    st.session_state.prediction_history = st.session_state.prediction_history[:MAX_HISTORY_SIZE]
+                get_history_store().add(result, session_id)
 
                 # Display result
                 st.success("✅ Prediction Complete!")
@@ -204,6 +290,12 @@ with tab1:
                     f'<div class="price-display">{format_currency(result["estimated_price_tnd"])}</div>',
                     unsafe_allow_html=True
                 )
+                if result.get('price_low_tnd') is not None:
+                    st.markdown(
+                        f'<div class="interval-display">{PREDICTION_INTERVAL_LEVEL:.0%} prediction interval: '
+                        f'{format_currency(result["price_low_tnd"])} – {format_currency(result["price_high_tnd"])}</div>',
+                        unsafe_allow_html=True
+                    )
 
                 st.markdown("---")
 
@@ -231,7 +323,8 @@ with tab1:
                     city_median_per_m2 = city_stats[city_stats['City'] == result['city']]['Median Price/m²'].values[0]
                     city_median_total = city_median_per_m2 * result['size']
 
-                    gauge_fig = create_prediction_gauge(result['estimated_price_tnd'], city_median_total)
+                    gauge_fig = prediction_gauge_figure(result['estimated_price_tnd'], city_median_total,
+                                                        result.get('price_low_tnd'), result.get('price_high_tnd'))
                     st.plotly_chart(gauge_fig, use_container_width=True)
 
                     # Comparison text
@@ -246,9 +339,44 @@ with tab1:
                     pass
 
                 # Region info
-                if result['original_region'] == 'autres villes':
+                if result['canonical_region'] == 'autres villes':
                     st.info(f"ℹ️ Region was automatically predicted as: **{result['imputed_region'].title()}**")
 
+                # Price explanation
+                try:
+                    explanation = explain_price(result)
+                    st.subheader("Why This Price?")
+                    st.plotly_chart(attribution_figure(explanation), use_container_width=True)
+                    caption = ("Effect of each input on the price compared with the model's average prediction; "
+                               "size-derived features (average room size, value tier) are shared between size, "
+                               "rooms and bathrooms.")
+                    if not explanation.complete:
+                        caption += (f" Approximate: the time budget allowed {explanation.background_rows} "
+                                    f"reference listings.")
+                    st.caption(caption)
+                except Exception as e:
+                    st.caption(f"Price explanation unavailable: {e}")
+
+                # Comparable listings
+                try:
+                    comparables = find_comparables(city, size, room_count, bathroom_count, result['imputed_region'])
+                    if comparables:
+                        st.subheader("Comparable Listings")
+                        comparables_df = pd.DataFrame(comparables)
+                        comparables_df['region'] = comparables_df['region'].str.title()
+                        st.dataframe(
+                            comparables_df.drop(columns='distance').rename(columns={
+                                'region': 'Region', 'size': 'Size (m²)', 'room_count': 'Rooms',
+                                'bathroom_count': 'Bathrooms', 'price_tnd': 'Price (TND)',
+                                'price_per_m2': 'Price/m² (TND)'}),
+                            hide_index=True,
+                            use_container_width=True
+                        )
+                        st.caption(f"The {len(comparables)} listings of the dataset closest in size, rooms and "
+                                   f"bathrooms, in {result['imputed_region'].title()} when it has enough listings")
+                except Exception as e:
+                    st.caption(f"Comparable listings unavailable: {e}")
+
             except Exception as e:
                 st.error(f"❌ Error making prediction: {str(e)}")
                 st.exception(e)
@@ -257,20 +385,20 @@ with tab1:
 with tab2:
     st.header("Prediction History")
 
-    if not st.session_state.prediction_history:
+    history_store = get_history_store()
+    overall = history_store.summary(session_id)
+
+    if not overall['count']:
         st.info("No predictions yet. Make your first prediction in the 'Price Prediction' tab!")
     else:
-        # Convert to DataFrame
-        history_df = pd.DataFrame(st.session_state.prediction_history)
-
         # Filters
         filter_col1, filter_col2, filter_col3 = st.columns(3)
 
         with filter_col1:
             city_filter = st.multiselect(
                 "Filter by City",
-                options=sorted(history_df['city'].unique()),
-                default=sorted(history_df['city'].unique())
+                options=CITIES,
+                default=CITIES
             )
 
         with filter_col2:
@@ -282,89 +410,113 @@ with tab2:
             )
 
         with filter_col3:
+            default_max_price = int(overall['max']) + 100000
             max_price = st.number_input(
                 "Max Price (TND)",
                 min_value=0,
-                value=int(history_df['estimated_price_tnd'].max()) + 100000,
+                value=default_max_price,
                 step=10000
             )
 
-        # Apply filters
-        filtered_df = history_df[
-            (history_df['city'].isin(city_filter)) &
-            (history_df['estimated_price_tnd'] >= min_price) &
-            (history_df['estimated_price_tnd'] <= max_price)
-            ]
+        # Filters are applied in SQL; untouched ones are dropped so the query can use the narrowest index
+        filters = {
+            'session_id': session_id,
+            'cities': None if set(city_filter) == set(CITIES) else sorted(city_filter),
+            'min_price': min_price or None,
+            'max_price': None if max_price >= default_max_price else max_price,
+        }
+        summary = history_store.summary(**filters)
 
         # Display statistics
         st.subheader("Summary Statistics")
         stat_col1, stat_col2, stat_col3, stat_col4 = st.columns(4)
 
         with stat_col1:
-            st.metric("Total Predictions", len(filtered_df))
-        with stat_col2:
-            st.metric("Avg Price", format_currency(filtered_df['estimated_price_tnd'].mean()))
-        with stat_col3:
-            st.metric("Min Price", format_currency(filtered_df['estimated_price_tnd'].min()))
-        with stat_col4:
-            st.metric("Max Price", format_currency(filtered_df['estimated_price_tnd'].max()))
-
-        st.divider()
-
-        # History chart
-        st.subheader("Visual History")
-        history_chart = create_history_chart(filtered_df)
-        if history_chart:
-            st.plotly_chart(history_chart, use_container_width=True)
+            st.metric("Total Predictions", f"{summary['count']:,}")
+        if summary['count']:
+            with stat_col2:
+                st.metric("Avg Price", format_currency(summary['mean']))
+            with stat_col3:
+                st.metric("Min Price", format_currency(summary['min']))
+            with stat_col4:
+                st.metric("Max Price", format_currency(summary['max']))
 
         st.divider()
 
-        # Data table
-        st.subheader("Detailed History")
-
-        # Format for display
-        display_df = filtered_df.copy()
-        display_df['estimated_price_tnd'] = display_df['estimated_price_tnd'].apply(lambda x: f"{x:,.2f} {CURRENCY}")
-        display_df['price_per_m2'] = display_df['price_per_m2'].apply(lambda x: f"{x:,.2f} {CURRENCY}")
-
-        # Rename columns
-        display_df = display_df.rename(columns={
-            'timestamp': 'Date/Time',
-            'city': 'City',
-            'size': 'Size (m²)',
-            'room_count': 'Rooms',
-            'bathroom_count': 'Bathrooms',
-            'imputed_region': 'Region',
-            'estimated_price_tnd': 'Predicted Price',
-            'price_per_m2': 'Price/m²'
-        })
-
-        # Select columns to display
-        columns_to_show = ['Date/Time', 'City', 'Region', 'Size (m²)', 'Rooms',
-                           'Bathrooms', 'Predicted Price', 'Price/m²']
-
-        st.dataframe(
-            display_df[columns_to_show],
-            hide_index=True,
-            use_container_width=True
-        )
+        if not summary['count']:
+            st.info("No predictions match these filters.")
+        else:
+            # History chart (binned by size × price above CHART_MAX_POINTS, cached until the history changes)
+            st.subheader("Visual History")
+            history_chart = store_history_figure(history_store, **filters)
+            if history_chart:
+                st.plotly_chart(history_chart, use_container_width=True)
+            if summary['count'] > CHART_MAX_POINTS:
+                st.caption("Large histories are shown as hexagonal bins: marker size grows with the number of "
+                           "predictions, hover for the count and averages")
+
+            st.divider()
+
+            # Data table, one page at a time
+            st.subheader("Detailed History")
+
+            n_pages = (summary['count'] - 1) // HISTORY_PAGE_SIZE + 1
+            page_number = st.number_input(f"Page (of {n_pages:,})", min_value=1, max_value=n_pages, value=1, step=1)
+            page_df = history_store.page(**filters, page=page_number - 1, page_size=HISTORY_PAGE_SIZE)
+
+            # Format for display
+            display_df = page_df.copy()
+            display_df['estimated_price_tnd'] = display_df['estimated_price_tnd'].apply(lambda x: f"{x:,.2f} {CURRENCY}")
+            display_df['price_per_m2'] = display_df['price_per_m2'].apply(lambda x: f"{x:,.2f} {CURRENCY}")
+
+            # Rename columns
+            display_df = display_df.rename(columns={
+                'timestamp': 'Date/Time',
+                'city': 'City',
+                'size': 'Size (m²)',
+                'room_count': 'Rooms',
+                'bathroom_count': 'Bathrooms',
+                'imputed_region': 'Region',
+                'estimated_price_tnd': 'Predicted Price',
+                'price_per_m2': 'Price/m²'
+            })
+
+            # Select columns to display
+            columns_to_show = ['Date/Time', 'City', 'Region', 'Size (m²)', 'Rooms',
+                               'Bathrooms', 'Predicted Price', 'Price/m²']
+
+            st.dataframe(
+                display_df[columns_to_show],
+                hide_index=True,
+                use_container_width=True
+            )
 
-        # Export options
+        # Export options (built only when requested, streamed from the store in chunks into memory)
         col_export1, col_export2 = st.columns([1, 4])
 
         with col_export1:
-            csv = filtered_df.to_csv(index=False)
-            st.download_button(
-                label="📥 Export to CSV",
-                data=csv,
-                file_name=f"house_predictions_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-                mime="text/csv",
-                use_container_width=True
-            )
+            export_format = st.radio("Export format", ["CSV", "Parquet"], horizontal=True)
+            if st.button("📦 Prepare Export", use_container_width=True):
+                extension = export_format.lower()
+                with st.spinner("Exporting predictions..."):
+                    buffer = io.BytesIO()
+                    history_store.export(buffer, extension, **filters)
+                st.session_state.history_export = (buffer.getvalue(), extension)
+
+            if 'history_export' in st.session_state:
+                export_data, extension = st.session_state.history_export
+                st.download_button(
+                    label=f"📥 Download {extension.upper()}",
+                    data=export_data,
+                    file_name=f"house_predictions_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{extension}",
+                    mime="text/csv" if extension == 'csv' else "application/octet-stream",
+                    use_container_width=True
+                )
 
         with col_export2:
             if st.button("🗑️ Clear All History", type="secondary", use_container_width=True):
-                st.session_state.prediction_history = []
+                history_store.clear(session_id)
+                st.session_state.pop('history_export', None)
                 st.rerun()
 
 # TAB 3: MARKET INSIGHTS
@@ -376,7 +528,7 @@ with tab3:
 
         # City comparison chart
         st.subheader("City Price Comparison")
-        city_chart = create_city_comparison_chart(city_stats)
+        city_chart = city_comparison_figure(city_stats)
         st.plotly_chart(city_chart, use_container_width=True)
 
         st.divider()
@@ -419,25 +571,77 @@ with tab3:
             - Mean: {lowest_city['Mean Price/m²']:,.2f} {CURRENCY}/m²
             """)
 
+        # Precomputed surfaces (one batch per pipeline, no model calls here)
+        market_insights = get_insights()
+        standard_size, standard_rooms, standard_baths = INSIGHTS_STANDARD_PROPERTY
+
         # Price range analysis
         st.divider()
         st.subheader("📏 Example Price Ranges")
 
-        st.markdown("**For a 100m² property with 3 rooms and 2 bathrooms:**")
+        st.markdown(f"**For a {standard_size}m² property with {standard_rooms} rooms and {standard_baths} bathrooms:**")
 
+        standard_prices = market_insights.standard_prices.set_index('city')
         example_cols = st.columns(len(CITIES))
         for idx, city in enumerate(CITIES):
             with example_cols[idx]:
-                try:
-                    example_result = predict_price(city, 100, 3, 2)
+                if city in standard_prices.index:
                     st.metric(
                         city,
-                        format_currency(example_result['estimated_price_tnd']),
-                        delta=f"{example_result['price_per_m2']:.0f} {CURRENCY}/m²"
+                        format_currency(standard_prices.loc[city, 'estimated_price_tnd']),
+                        delta=f"{standard_prices.loc[city, 'price_per_m2']:.0f} {CURRENCY}/m²"
                     )
-                except:
+                else:
                     st.metric(city, "N/A")
 
+        # Price curves
+        st.divider()
+        st.subheader("📈 Price Curves")
+
+        size_curve_chart, rooms_curve_chart = price_curve_figures(market_insights)
+        curve_col1, curve_col2 = st.columns(2)
+        with curve_col1:
+            st.plotly_chart(size_curve_chart, use_container_width=True)
+        with curve_col2:
+            st.plotly_chart(rooms_curve_chart, use_container_width=True)
+
+        # Region valuations
+        st.divider()
+        st.subheader("🗺️ Region Valuations")
+        st.markdown(f"**The same {standard_size}m² property with {standard_rooms} rooms and {standard_baths} "
+                    f"bathrooms in every region, most expensive first:**")
+
+        valuations_df = market_insights.region_valuations.rename(columns={
+            'rank': 'Rank',
+            'city': 'City',
+            'region': 'Region',
+            'estimated_price_tnd': f'Predicted Price ({CURRENCY})',
+            'price_per_m2': f'Price/m² ({CURRENCY})',
+            'vs_city_pct': 'vs City (%)'
+        })
+        map_col, table_col = st.columns([3, 2])
+        with table_col:
+            st.dataframe(
+                valuations_df[['Rank', 'City', 'Region', f'Predicted Price ({CURRENCY})', f'Price/m² ({CURRENCY})',
+                               'vs City (%)']],
+                hide_index=True,
+                use_container_width=True,
+                height=520
+            )
+        with map_col:
+            if market_insights.map_html:
+                if hasattr(st, 'iframe'):
+                    st.iframe(market_insights.map_html, height=520)
+                else:
+                    # Older Streamlit without st.iframe
+                    import streamlit.components.v1 as components
+
+                    components.html(market_insights.map_html, height=520)
+            else:
+                st.info("Install folium to see the region map.")
+        st.caption("'vs City' compares with the same property in the city with the region left to the model "
+                   "('Autres Villes'). Region positions are approximate neighbourhood centroids.")
+
     except Exception as e:
         st.error(f"Unable to load market insights: {str(e)}")
 
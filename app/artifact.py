@@ -0,0 +1,181 @@
+"""
+Memory-mapped pipeline artifact.
+
+`joblib.load` unpickles every array of house_pricing_pipeline.joblib into
+private memory, so each Streamlit or worker process on a host pays the load
+time and the RAM again. This module re-exports the pipeline uncompressed so
+that its numeric arrays (KNN fit data and search trees, SVR support vectors,
+KMeans centroids, linear coefficients, ...) can be loaded with
+mmap_mode='r': every process maps the same file pages read-only and the OS
+shares them instead of copying.
+
+Note that scikit-learn's Tree objects copy their node arrays into their own
+buffers when unpickled, so decision-tree nodes stay private per process.
+
+The export records the fingerprint of the artifact it was made from
+('source_fingerprint'). load_mmap_artifact compares it with the artifact on
+disk and exports again when they differ, so mmap mode never serves an older
+model than joblib mode, and the served fingerprint is the source artifact's in
+both modes.
+
+Usage:
+    python artifact.py --export            # PIPELINE_PATH -> PIPELINE_MMAP_PATH
+    python artifact.py --report -p 4       # cold start and memory, 4 concurrent processes per mode
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+import joblib
+
+from config import PIPELINE_PATH, PIPELINE_MMAP_PATH
+
+
+def export_mmap_artifact(source_path=PIPELINE_PATH, dest_path=PIPELINE_MMAP_PATH):
+    """
+    Re-export a pipeline artifact in a memory-mappable (uncompressed) layout.
+
+    Returns:
+    --------
+    str - Path of the exported artifact
+    """
+    from utils import file_fingerprint
+
+    fingerprint = file_fingerprint(source_path)
+    pipeline = joblib.load(source_path)
+    # The export remembers the artifact it was made from (see load_mmap_artifact)
+    pipeline['source_fingerprint'] = fingerprint
+    directory = os.path.dirname(dest_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    # Write to a temporary file first so readers never see a partial artifact
+    # (one per process: several processes may find the same export stale)
+    tmp_path = f"{dest_path}.{os.getpid()}.tmp"
+    joblib.dump(pipeline, tmp_path, compress=0)
+    os.replace(tmp_path, dest_path)
+    return dest_path
+
+
+def load_mmap_artifact(path=PIPELINE_MMAP_PATH, source_path=PIPELINE_PATH):
+    """
+    Load a pipeline exported by export_mmap_artifact with shared read-only arrays,
+    exporting it again first when it is missing or was made from another artifact.
+
+    Returns:
+    --------
+    (pipeline dict, fingerprint of source_path)
+
+    Raises:
+    -------
+    Exception - source_path changed again while it was being exported
+    """
+    from utils import file_fingerprint
+
+    fingerprint = file_fingerprint(source_path)
+    pipeline = joblib.load(path, mmap_mode='r') if os.path.exists(path) else None
+    if pipeline is None or pipeline.get('source_fingerprint') != fingerprint:
+        export_mmap_artifact(source_path, path)
+        pipeline = joblib.load(path, mmap_mode='r')
+        if pipeline.get('source_fingerprint') != fingerprint:
+            raise Exception(f"{source_path} changed while {path} was exported from it")
+    return pipeline, fingerprint
+
+
+def memory_usage():
+    """
+    Memory of the current process in MB.
+
+    rss is the resident set, private is anonymous memory only this process
+    uses, and pss charges shared pages proportionally to every process that
+    maps them (Linux only; other platforms report rss).
+    """
+    usage = {}
+    try:
+        with open('/proc/self/smaps_rollup') as f:
+            for line in f:
+                parts = line.split()
+                if parts[0] in ('Rss:', 'Pss:', 'Anonymous:'):
+                    usage[parts[0][:-1].lower()] = int(parts[1]) / 1024
+        return {'rss': usage['rss'], 'pss': usage['pss'], 'private': usage['anonymous']}
+    except (OSError, KeyError):
+        import resource
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        rss = rss / (1024 * 1024) if sys.platform == 'darwin' else rss / 1024
+        return {'rss': rss, 'pss': rss, 'private': rss}
+
+
+_CHILD = """
+import json, sys, time
+sys.path.insert(0, {app_dir!r})
+start = time.perf_counter()
+import joblib
+pipeline = joblib.load({path!r}, mmap_mode={mmap_mode!r})
+load_seconds = time.perf_counter() - start
+from artifact import memory_usage
+print('loaded', flush=True)
+sys.stdin.readline()
+print(json.dumps(dict(load_seconds=load_seconds, **memory_usage())), flush=True)
+"""
+
+
+def _measure(path, mmap_mode, processes):
+    """Load the artifact in `processes` concurrent interpreters and measure each once all are loaded"""
+    code = _CHILD.format(app_dir=os.path.dirname(os.path.abspath(__file__)), path=path, mmap_mode=mmap_mode)
+    children = [subprocess.Popen([sys.executable, '-c', code], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                 text=True) for _ in range(processes)]
+    try:
+        for child in children:
+            if child.stdout.readline().strip() != 'loaded':
+                raise Exception("Measurement process failed to load the pipeline")
+        # Every process now holds the pipeline, so shared pages are counted once across them
+        results = []
+        for child in children:
+            child.stdin.write('\n')
+            child.stdin.flush()
+            results.append(json.loads(child.stdout.readline()))
+    finally:
+        for child in children:
+            child.wait()
+
+    return {key: sum(result[key] for result in results) / len(results) for key in results[0]}
+
+
+def cold_start_report(processes=4, source_path=PIPELINE_PATH, mmap_path=PIPELINE_MMAP_PATH):
+    """
+    Compare plain joblib.load with the memory-mapped artifact.
+
+    Returns:
+    --------
+    dict mode -> average load seconds and rss/pss/private MB per process
+    """
+    # Measure an export of the current artifact
+    load_mmap_artifact(mmap_path, source_path)
+    return {
+        'joblib': _measure(source_path, None, processes),
+        'mmap': _measure(mmap_path, 'r', processes),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Memory-mapped pipeline artifact")
+    parser.add_argument('--export', action='store_true', help="Write PIPELINE_MMAP_PATH from PIPELINE_PATH")
+    parser.add_argument('--report', action='store_true', help="Compare cold start and memory per process")
+    parser.add_argument('-p', '--processes', type=int, default=4, help="Concurrent processes per mode")
+    args = parser.parse_args(argv)
+
+    if args.export or not args.report:
+        path = export_mmap_artifact()
+        print(f"Exported memory-mappable artifact to {path}")
+    if args.report:
+        report = cold_start_report(args.processes)
+        print(f"Per process, {args.processes} concurrent processes:")
+        print(f"{'mode':>8} | {'load (s)':>8} | {'RSS (MB)':>8} | {'PSS (MB)':>8} | {'private (MB)':>12}")
+        for mode, stats in report.items():
+            print(f"{mode:>8} | {stats['load_seconds']:8.3f} | {stats['rss']:8.1f} | "
+                  f"{stats['pss']:8.1f} | {stats['private']:12.1f}")
+
+
+if __name__ == "__main__":
+    main()
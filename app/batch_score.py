@@ -0,0 +1,237 @@
+"""
+House Price Prediction - Streaming Batch Scorer
+
+Scores arbitrarily large listing files with the same pipeline as the app
+(PIPELINE_PATH in config.py). The input is read in fixed-size chunks, chunks
+are scored in parallel by worker processes that each load the pipeline once,
+and results are streamed to CSV or Parquet as they complete, so memory stays
+bounded by (workers x chunk size) regardless of the input size.
+
+Each listing is screened before it reaches the model (cleaning.screen_listings):
+implausible or unsupported listings are rejected and left unscored, listings
+outside the training data are scored and flagged ('input_status' and
+'input_issues' columns), or left unscored too with --reject-flagged.
+
+Usage:
+    python batch_score.py ../data/raw/source_1/Property-Prices-in-Tunisia.csv predictions.parquet
+    python batch_score.py listings.csv predictions.csv --chunksize 20000 --workers 8
+    python batch_score.py listings.csv predictions.csv --comparables 5   # adds a JSON 'comparables' column
+    python batch_score.py listings.csv predictions.csv --reject-flagged  # only score in-distribution listings
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from cleaning import screen_listings
+from utils import load_pipeline, predict_prices
+
+INPUT_COLUMNS = ['city', 'region', 'size', 'room_count', 'bathroom_count']
+OUTPUT_COLUMNS = ['imputed_region', 'estimated_price_tnd', 'price_low_tnd', 'price_high_tnd', 'price_per_m2']
+SCREENING_COLUMNS = ['input_status', 'input_issues']
+
+
+def _init_worker():
+    """Load the pipeline once per worker process (without a drift monitor: the workers serve no /metrics)"""
+    import drift
+    drift.disable()
+    load_pipeline()
+
+
+def score_chunk(chunk, n_comparables=0, reject_flagged=False):
+    """
+    Score one chunk of listings.
+
+    Rejected rows (unsupported city, missing or implausible size, room count or
+    bathroom count; the raw sources use -1 for unknown values) are passed
+    through with empty prediction columns, and so are flagged rows with
+    reject_flagged.
+
+    Parameters:
+    -----------
+    chunk : pd.DataFrame - Listings with at least city, size, room_count, bathroom_count
+    n_comparables : int - When > 0, add a 'comparables' column: the nearest real listings as a JSON list
+    reject_flagged : bool - Also leave listings outside the training data unscored
+
+    Returns:
+    --------
+    pd.DataFrame - The input chunk with OUTPUT_COLUMNS (price_low_tnd / price_high_tnd: prediction
+    interval at PREDICTION_INTERVAL_LEVEL, empty without a conformal table) and SCREENING_COLUMNS appended
+    """
+    numeric = chunk[['size', 'room_count', 'bathroom_count']].apply(pd.to_numeric, errors='coerce')
+    screening = screen_listings(chunk, load_pipeline())
+    valid = screening['input_status'].isin(['ok'] if reject_flagged else ['ok', 'flagged'])
+
+    scored = chunk.copy()
+    scored['imputed_region'] = None
+    scored['estimated_price_tnd'] = np.nan
+    scored['price_low_tnd'] = np.nan
+    scored['price_high_tnd'] = np.nan
+    scored['price_per_m2'] = np.nan
+
+    if valid.any():
+        listings = numeric[valid].assign(city=chunk.loc[valid, 'city'])
+        if 'region' in chunk.columns:
+            listings['region'] = chunk.loc[valid, 'region']
+        results = predict_prices(listings)
+        scored.loc[valid, OUTPUT_COLUMNS] = results[OUTPUT_COLUMNS]
+    scored[SCREENING_COLUMNS] = screening
+
+    if n_comparables > 0:
+        from comparables import find_comparables
+
+        scored['comparables'] = None
+        if valid.any():
+            scored.loc[valid, 'comparables'] = [
+                json.dumps(find_comparables(city, size, room_count, bathroom_count, region, n_comparables))
+                for city, size, room_count, bathroom_count, region in zip(
+                    listings['city'], listings['size'], listings['room_count'], listings['bathroom_count'],
+                    scored.loc[valid, 'imputed_region'])
+            ]
+
+    return scored
+
+
+class _CsvSink:
+    def __init__(self, path):
+        self.path = path
+        self.header = True
+
+    def write(self, df):
+        df.to_csv(self.path, mode='w' if self.header else 'a', header=self.header, index=False)
+        self.header = False
+
+    def close(self):
+        pass
+
+
+class _ParquetSink:
+    def __init__(self, path):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise Exception("Parquet output requires pyarrow. Install it with: pip install pyarrow")
+        self.pa = pa
+        self.pq = pq
+        self.path = path
+        self.writer = None
+
+    def write(self, df):
+        # Pin types that can drift between chunks (all-null text, ints with/without NaN)
+        df = df.astype({column: 'string' for column in df.select_dtypes('object').columns})
+        df = df.astype({column: 'float64' for column in df.select_dtypes('integer').columns})
+        if self.writer is None:
+            table = self.pa.Table.from_pandas(df, preserve_index=False)
+            self.writer = self.pq.ParquetWriter(self.path, table.schema)
+        else:
+            table = self.pa.Table.from_pandas(df, schema=self.writer.schema, preserve_index=False)
+        self.writer.write_table(table)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+def _open_sink(path, output_format=None):
+    output_format = output_format or ('parquet' if path.endswith('.parquet') else 'csv')
+    if output_format == 'parquet':
+        return _ParquetSink(path)
+    return _CsvSink(path)
+
+
+def score_file(input_path, output_path, chunksize=10000, workers=None, output_format=None, n_comparables=0,
+               reject_flagged=False):
+    """
+    Stream a listing file through the pipeline and write the scored rows.
+
+    Parameters:
+    -----------
+    input_path : str - CSV file with city, size, room_count, bathroom_count and optionally region
+    output_path : str - Destination file (.csv or .parquet)
+    chunksize : int - Number of rows per chunk
+    workers : int - Number of worker processes (defaults to the CPU count)
+    output_format : str - 'csv' or 'parquet' (inferred from output_path if None)
+    n_comparables : int - Nearest real listings to attach to each row (0 = none)
+    reject_flagged : bool - Leave listings outside the training data unscored
+
+    Returns:
+    --------
+    dict with the number of rows read, scored, flagged and rejected, and elapsed seconds
+    """
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = workers * 2
+    # Keep text columns as strings so every chunk has the same schema
+    reader = pd.read_csv(input_path, chunksize=chunksize, dtype={'city': str, 'region': str})
+    sink = _open_sink(output_path, output_format)
+
+    rows_read = 0
+    rows_scored = 0
+    rows_flagged = 0
+    rows_rejected = 0
+    start = time.perf_counter()
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+            pending = deque()
+
+            def drain(limit):
+                nonlocal rows_scored, rows_flagged, rows_rejected
+                while len(pending) > limit:
+                    scored = pending.popleft().result()
+                    rows_scored += int(scored['estimated_price_tnd'].notna().sum())
+                    rows_flagged += int((scored['input_status'] == 'flagged').sum())
+                    rows_rejected += int((scored['input_status'] == 'rejected').sum())
+                    sink.write(scored)
+
+            for chunk in reader:
+                rows_read += len(chunk)
+                pending.append(executor.submit(score_chunk, chunk, n_comparables, reject_flagged))
+                # Bound memory: never hold more than max_in_flight chunks
+                drain(max_in_flight - 1)
+
+            drain(0)
+    finally:
+        sink.close()
+
+    return {
+        'rows_read': rows_read,
+        'rows_scored': rows_scored,
+        'rows_flagged': rows_flagged,
+        'rows_rejected': rows_rejected,
+        'seconds': time.perf_counter() - start,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score a listing file with the house pricing pipeline")
+    parser.add_argument('input', help="Input CSV file")
+    parser.add_argument('output', help="Output file (.csv or .parquet)")
+    parser.add_argument('--chunksize', type=int, default=10000, help="Rows per chunk (default: 10000)")
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument('--format', choices=['csv', 'parquet'], default=None,
+                        help="Output format (default: inferred from the output extension)")
+    parser.add_argument('--comparables', type=int, default=0, metavar='K',
+                        help="Add the K nearest real listings of each row as a JSON column")
+    parser.add_argument('--reject-flagged', action='store_true',
+                        help="Leave listings outside the training data unscored (default: score and flag them)")
+    args = parser.parse_args(argv)
+
+    summary = score_file(args.input, args.output, chunksize=args.chunksize, workers=args.workers,
+                         output_format=args.format, n_comparables=args.comparables,
+                         reject_flagged=args.reject_flagged)
+
+    rows_per_second = summary['rows_read'] / summary['seconds'] if summary['seconds'] > 0 else 0
+    print(f"Scored {summary['rows_scored']:,} of {summary['rows_read']:,} rows "
+          f"in {summary['seconds']:.2f}s ({rows_per_second:,.0f} rows/s) -> {args.output}; "
+          f"{summary['rows_flagged']:,} flagged, {summary['rows_rejected']:,} rejected", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
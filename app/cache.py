@@ -0,0 +1,238 @@
+"""
+Prediction cache for predict_price.
+
+Two tiers:
+  - a bounded in-memory tier (LRU or FIFO eviction)
+  - an optional SQLite tier on disk that survives restarts
+
+Entries are keyed on the normalized listing inputs plus the fingerprint of the
+loaded pipeline artifact, so a retrained pipeline never serves stale prices:
+when the fingerprint changes the memory tier is dropped and disk entries from
+older artifacts are purged.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import metrics
+from config import CACHE_MAX_ENTRIES, CACHE_POLICY, CACHE_DISK_PATH, CACHE_DISK_MAX_ENTRIES
+from utils import predict_price, get_active_pipeline, get_pipeline_fingerprint
+
+EVICTION_POLICIES = ('lru', 'fifo')
+
+
+def normalize_inputs(city, size, room_count, bathroom_count, region='autres villes'):
+    """Canonical cache key for a listing (case and numeric type insensitive)"""
+    return (
+        str(city).strip().lower(),
+        float(size),
+        float(room_count),
+        float(bathroom_count),
+        str(region or 'autres villes').strip().lower(),
+    )
+
+
+def _to_builtin(value):
+    """Convert numpy scalars so results can be stored as JSON"""
+    return value.item() if hasattr(value, 'item') else value
+
+
+class _DiskTier:
+    """SQLite-backed store, bounded by evicting the least recently used rows"""
+
+    def __init__(self, path, max_entries):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.max_entries = max_entries
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS predictions (
+                fingerprint TEXT NOT NULL,
+                key TEXT NOT NULL,
+                result TEXT NOT NULL,
+                accessed REAL NOT NULL,
+                PRIMARY KEY (fingerprint, key)
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_predictions_accessed ON predictions (accessed)")
+        self.conn.commit()
+
+    def get(self, fingerprint, key):
+        row = self.conn.execute(
+            "SELECT result FROM predictions WHERE fingerprint = ? AND key = ?", (fingerprint, key)
+        ).fetchone()
+        if row is None:
+            return None
+        self.conn.execute(
+            "UPDATE predictions SET accessed = ? WHERE fingerprint = ? AND key = ?", (time.time(), fingerprint, key)
+        )
+        self.conn.commit()
+        return json.loads(row[0])
+
+    def put(self, fingerprint, key, result):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO predictions (fingerprint, key, result, accessed) VALUES (?, ?, ?, ?)",
+            (fingerprint, key, json.dumps(result), time.time())
+        )
+        count = self.conn.execute("SELECT COUNT(*) FROM predictions").fetchone()[0]
+        evicted = max(0, count - self.max_entries)
+        if evicted:
+            self.conn.execute(
+                "DELETE FROM predictions WHERE rowid IN "
+                "(SELECT rowid FROM predictions ORDER BY accessed LIMIT ?)", (evicted,)
+            )
+        self.conn.commit()
+        return evicted
+
+    def purge_other_fingerprints(self, fingerprint):
+        self.conn.execute("DELETE FROM predictions WHERE fingerprint != ?", (fingerprint,))
+        self.conn.commit()
+
+    def clear(self):
+        self.conn.execute("DELETE FROM predictions")
+        self.conn.commit()
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM predictions").fetchone()[0]
+
+
+class PredictionCache:
+    """
+    Two-tier cache in front of predict_price.
+
+    Parameters:
+    -----------
+    max_entries : int - Maximum number of entries kept in memory
+    policy : str - Memory eviction policy, 'lru' or 'fifo'
+    disk_path : str - SQLite file for the persistent tier (None disables it)
+    disk_max_entries : int - Maximum number of entries kept on disk
+    """
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, policy=CACHE_POLICY,
+                 disk_path=CACHE_DISK_PATH, disk_max_entries=CACHE_DISK_MAX_ENTRIES):
+        if policy not in EVICTION_POLICIES:
+            raise ValueError(f"Unknown eviction policy '{policy}', expected one of {EVICTION_POLICIES}")
+        self.max_entries = max_entries
+        self.policy = policy
+        self.disk = _DiskTier(disk_path, disk_max_entries) if disk_path else None
+        self._memory = OrderedDict()
+        self._fingerprint = None
+        self._lock = threading.Lock()
+        self._counters = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'evictions': 0, 'invalidations': 0}
+
+    def _check_fingerprint(self, fingerprint):
+        # Caller holds the lock
+        if fingerprint != self._fingerprint:
+            if self._fingerprint is not None:
+                self._counters['invalidations'] += 1
+            self._memory.clear()
+            if self.disk is not None:
+                self.disk.purge_other_fingerprints(fingerprint)
+            self._fingerprint = fingerprint
+
+    def get(self, key, fingerprint=None):
+        """Cached result for a normalized key under `fingerprint` (defaults to the loaded pipeline's), or None"""
+        fingerprint = fingerprint or get_pipeline_fingerprint()
+        with self._lock:
+            self._check_fingerprint(fingerprint)
+
+            if key in self._memory:
+                if self.policy == 'lru':
+                    self._memory.move_to_end(key)
+                self._counters['memory_hits'] += 1
+                return dict(self._memory[key])
+
+            if self.disk is not None:
+                result = self.disk.get(fingerprint, json.dumps(key))
+                if result is not None:
+                    self._counters['disk_hits'] += 1
+                    self._store_in_memory(key, result)
+                    return dict(result)
+
+            self._counters['misses'] += 1
+            return None
+
+    def put(self, key, result, fingerprint=None):
+        """Store a predict_price result under a normalized key, for the pipeline of `fingerprint`"""
+        result = {name: _to_builtin(value) for name, value in result.items()}
+        fingerprint = fingerprint or get_pipeline_fingerprint()
+        with self._lock:
+            self._check_fingerprint(fingerprint)
+            self._store_in_memory(key, result)
+            if self.disk is not None:
+                self._counters['evictions'] += self.disk.put(fingerprint, json.dumps(key), result)
+
+    def _store_in_memory(self, key, result):
+        self._memory[key] = result
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self._counters['evictions'] += 1
+
+    def predict_price(self, city, size, room_count, bathroom_count, region='autres villes'):
+        """predict_price with caching (returns a fresh dict the caller may modify)"""
+        clock = metrics.stage_clock()
+        started = clock()
+        key = normalize_inputs(city, size, room_count, bathroom_count, region)
+        # One snapshot: a registry swap mid-call must not store the old model's price under the new fingerprint
+        active = get_active_pipeline()
+        result = self.get(key, active.fingerprint)
+        if result is None:
+            result = predict_price(city, size, room_count, bathroom_count, region, active=active)
+            self.put(key, result, active.fingerprint)
+            result = dict(result)
+        else:
+            # Hits never reach predict_price: record them and queue them for the input drift monitor here
+            from drift import observe
+            if metrics.enabled:
+                metrics.record_call('cache', key[0], clock() - started)
+            # Entries written before canonical_region existed held the canonical name in original_region
+            result.setdefault('canonical_region', result['original_region'])
+            # Keys ignore case and spacing: report the region as this caller typed it
+            result['original_region'] = region
+            observe(result)
+        return result
+
+    def clear(self):
+        """Drop every entry from both tiers"""
+        with self._lock:
+            self._memory.clear()
+            if self.disk is not None:
+                self.disk.clear()
+
+    def stats(self):
+        """Hit/miss counters and current sizes of both tiers"""
+        with self._lock:
+            stats = dict(self._counters)
+            stats['hits'] = stats['memory_hits'] + stats['disk_hits']
+            lookups = stats['hits'] + stats['misses']
+            stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+            stats['policy'] = self.policy
+            stats['memory_entries'] = len(self._memory)
+            stats['max_entries'] = self.max_entries
+            stats['disk_entries'] = len(self.disk) if self.disk is not None else None
+            stats['fingerprint'] = self._fingerprint
+            return stats
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_prediction_cache():
+    """Process-wide cache configured from config.py"""
+    global _default_cache
+    if _default_cache is None:
+        with _default_cache_lock:
+            if _default_cache is None:
+                _default_cache = PredictionCache()
+    return _default_cache
+
+
+def cached_predict_price(city, size, room_count, bathroom_count, region='autres villes'):
+    """Drop-in replacement for predict_price backed by the process-wide cache"""
+    return get_prediction_cache().predict_price(city, size, room_count, bathroom_count, region)
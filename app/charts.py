@@ -0,0 +1,356 @@
+"""
+Chart rendering for the app that stays responsive as the data grows.
+
+- Scatter plots switch from SVG to WebGL traces above CHART_WEBGL_THRESHOLD
+  points (create_history_chart).
+- Above CHART_MAX_POINTS the history is aggregated on the server into hexagonal
+  bins over size × predicted price, one trace per city, so the browser gets at
+  most a few thousand markers whatever the size of the history.
+- Figures are cached as Plotly JSON keyed on a fingerprint of the data they were
+  built from (a hash of a DataFrame, or the history store's version and
+  filters), so reruns with unchanged data skip building them.
+
+Usage:
+    python charts.py --benchmark        # payload size and render time at 1k, 100k and 1M points
+"""
+import argparse
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from config import (CHART_CACHE_MAX_ENTRIES, CHART_HEXBIN_GRIDSIZE, CHART_MAX_POINTS, CITIES, CURRENCY,
+                    INSIGHTS_STANDARD_PROPERTY)
+from utils import (create_attribution_chart, create_city_comparison_chart, create_history_chart,
+                   create_prediction_gauge, create_price_curve_chart)
+
+HISTORY_CHART_COLUMNS = ['city', 'size', 'room_count', 'estimated_price_tnd']
+
+
+def data_fingerprint(df):
+    """Content hash of a DataFrame (values, index and column names)"""
+    import pandas as pd
+
+    digest = hashlib.sha256(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    digest.update(repr(list(df.columns)).encode())
+    return digest.hexdigest()[:16]
+
+
+class FigureCache:
+    """
+    Bounded LRU cache of Plotly figure JSON.
+
+    Parameters:
+    -----------
+    max_entries : int - Figures kept (least recently used dropped first)
+    """
+
+    def __init__(self, max_entries=CHART_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_json(self, key, build):
+        """Cached JSON of the figure for key, calling build() to create it on a miss"""
+        with self._lock:
+            spec = self._entries.get(key)
+            if spec is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return spec
+            self.misses += 1
+
+        import plotly.io as pio
+
+        figure = build()
+        spec = pio.to_json(figure, validate=False) if figure is not None else ''
+        with self._lock:
+            self._entries[key] = spec
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return spec
+
+    def get(self, key, build):
+        """Figure for key (a fresh object per call, so callers may modify it), None if build() returned None"""
+        import plotly.graph_objects as go
+        import plotly.io as pio
+
+        spec = self.get_json(key, build)
+        if not spec:
+            return None
+        # The JSON came from a valid figure: skipping plotly's per-property validation
+        # makes rebuilding it several times cheaper than building the original
+        return go.Figure(pio.json.from_json_plotly(spec), _validate=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'bytes': sum(len(spec) for spec in self._entries.values()),
+                    'hits': self.hits, 'misses': self.misses}
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_figure_cache():
+    """Process-wide figure cache"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = FigureCache()
+    return _cache
+
+
+def hexbin(x, y, gridsize=CHART_HEXBIN_GRIDSIZE, extent=None):
+    """
+    Assign points to a hexagonal grid (same lattice as matplotlib's hexbin).
+
+    Parameters:
+    -----------
+    x, y : np.ndarray - Point coordinates
+    gridsize : int - Hexagons across the x axis
+    extent : tuple - (xmin, xmax, ymin, ymax), default the data range
+
+    Returns:
+    --------
+    (cell id per point, centre x per cell id, centre y per cell id); ids are dense
+    (0 to len(centre x) - 1), so per-cell aggregates are np.bincount calls
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    xmin, xmax, ymin, ymax = extent or (x.min(), x.max(), y.min(), y.max())
+    nx = gridsize
+    ny = max(int(nx / np.sqrt(3)), 1)
+    sx = (xmax - xmin) / nx or 1.0
+    sy = (ymax - ymin) / ny or 1.0
+
+    xs = np.clip((x - xmin) / sx, 0, nx)
+    ys = np.clip((y - ymin) / sy, 0, ny)
+    # Two interleaved rectangular lattices; each point goes to the nearer centre
+    ix1, iy1 = np.round(xs), np.round(ys)
+    ix2, iy2 = np.floor(xs), np.floor(ys)
+    d1 = (xs - ix1) ** 2 + 3.0 * (ys - iy1) ** 2
+    d2 = (xs - ix2 - 0.5) ** 2 + 3.0 * (ys - iy2 - 0.5) ** 2
+    on_first = d1 <= d2
+
+    # Centres on a half-step lattice: (column, row) = 2 * (x, y) in grid units
+    width, height = 2 * nx + 2, 2 * ny + 2
+    columns = (2 * np.where(on_first, ix1, ix2 + 0.5)).astype(np.int64)
+    rows = (2 * np.where(on_first, iy1, iy2 + 0.5)).astype(np.int64)
+    cell_ids = np.arange(width * height)
+    centre_x = (cell_ids % width) / 2 * sx + xmin
+    centre_y = (cell_ids // width) / 2 * sy + ymin
+    return rows * width + columns, centre_x, centre_y
+
+
+def create_history_density_chart(history_df, gridsize=CHART_HEXBIN_GRIDSIZE):
+    """
+    Hexagonal-bin density of predictions over size × predicted price, one trace per city.
+
+    Marker area grows with the number of predictions in the hexagon; hovering
+    shows the count and the mean size, rooms and price of the cell.
+    """
+    import pandas as pd
+    import plotly.express as px
+    import plotly.graph_objects as go
+
+    history_df = history_df.dropna(subset=['city', 'size', 'estimated_price_tnd'])
+    if history_df.empty:
+        return None
+
+    size = history_df['size'].to_numpy(dtype=float)
+    price = history_df['estimated_price_tnd'].to_numpy(dtype=float)
+    rooms = history_df['room_count'].fillna(0).to_numpy(dtype=float)
+    cells, centre_x, centre_y = hexbin(size, price, gridsize)
+
+    # One bincount per statistic over (city, cell) pairs
+    city_codes, city_names = pd.factorize(history_df['city'])
+    n_cells = len(centre_x)
+    pairs = city_codes * n_cells + cells
+    n_pairs = len(city_names) * n_cells
+    counts = np.bincount(pairs, minlength=n_pairs).reshape(len(city_names), n_cells)
+    sums = [np.bincount(pairs, weights=values, minlength=n_pairs).reshape(len(city_names), n_cells)
+            for values in (size, rooms, price)]
+
+    order = [c for c in CITIES if c in city_names] + sorted(set(city_names) - set(CITIES))
+    max_count = counts.max()
+    colors = px.colors.qualitative.Plotly
+    fig = go.Figure()
+    for i, city in enumerate(order):
+        code = city_names.get_loc(city)
+        occupied = np.flatnonzero(counts[code])
+        cell_counts = counts[code, occupied]
+        mean_size, mean_rooms, mean_price = (total[code, occupied] / cell_counts for total in sums)
+        fig.add_trace(go.Scattergl(
+            x=centre_x[occupied],
+            y=centre_y[occupied],
+            mode='markers',
+            name=city,
+            marker={'symbol': 'hexagon', 'size': 4 + 14 * np.sqrt(cell_counts / max_count),
+                    'color': colors[i % len(colors)], 'opacity': 0.7, 'line': {'width': 0}},
+            customdata=np.column_stack([cell_counts, mean_size, mean_rooms, mean_price]),
+            hovertemplate=(f"<b>{city}</b><br>%{{customdata[0]:,}} predictions<br>"
+                           "Mean size: %{customdata[1]:.0f} m²<br>Mean rooms: %{customdata[2]:.1f}<br>"
+                           f"Mean price: %{{customdata[3]:,.2f}} {CURRENCY}<extra></extra>"),
+        ))
+
+    fig.update_layout(
+        title=f'Prediction History ({len(history_df):,} predictions, binned)',
+        xaxis_title='Size (m²)',
+        yaxis_title=f'Predicted Price ({CURRENCY})',
+        legend_title='City',
+        height=500,
+    )
+    return fig
+
+
+def history_figure(history_df, key=None):
+    """
+    Cached figure of a prediction history: the scatter plot (WebGL above
+    CHART_WEBGL_THRESHOLD points) up to CHART_MAX_POINTS, the hexbin density above.
+
+    Parameters:
+    -----------
+    history_df : pd.DataFrame - Predictions (at least HISTORY_CHART_COLUMNS)
+    key : hashable - Fingerprint of the data, when the caller has a cheaper one than hashing history_df
+    """
+    key = ('history', key if key is not None else data_fingerprint(history_df))
+    if len(history_df) > CHART_MAX_POINTS:
+        return get_figure_cache().get(key, lambda: create_history_density_chart(history_df))
+    return get_figure_cache().get(key, lambda: create_history_chart(history_df))
+
+
+def store_history_figure(store, **filters):
+    """
+    history_figure of the predictions of a HistoryStore that match filters.
+
+    The number of matching rows comes from the store (its memoized summary), so
+    the WebGL and hexbin thresholds apply to the whole history, and the figure
+    is keyed on the store's version and the filters, so a hit reads nothing
+    else from the database. Small histories are charted with every column of
+    the rows (rich hover); large ones load only the columns the hexbin needs.
+    """
+    key = ('history', store.path, store.version(filters.get('session_id')),
+           tuple(sorted((name, repr(value)) for name, value in filters.items())))
+
+    def build():
+        if store.summary(**filters)['count'] > CHART_MAX_POINTS:
+            return create_history_density_chart(store.columns(HISTORY_CHART_COLUMNS, **filters))
+        return create_history_chart(store.page(**filters, page_size=CHART_MAX_POINTS))
+
+    return get_figure_cache().get(key, build)
+
+
+def city_comparison_figure(stats_df):
+    """Cached create_city_comparison_chart"""
+    return get_figure_cache().get(('city_comparison', data_fingerprint(stats_df)),
+                                  lambda: create_city_comparison_chart(stats_df))
+
+
+def prediction_gauge_figure(predicted_price, city_median, low=None, high=None):
+    """Cached create_prediction_gauge"""
+    key = ('gauge', float(predicted_price), float(city_median),
+           None if low is None else float(low), None if high is None else float(high))
+    return get_figure_cache().get(key, lambda: create_prediction_gauge(predicted_price, city_median, low, high))
+
+
+def attribution_figure(explanation):
+    """Cached create_attribution_chart of an explain.Explanation"""
+    key = ('attribution', float(explanation.base_price)) + tuple(explanation.contributions.items())
+    return get_figure_cache().get(key, lambda: create_attribution_chart(explanation.contributions,
+                                                                       explanation.base_price))
+
+
+def price_curve_figures(insights):
+    """Cached price-vs-size and price-vs-rooms charts of a MarketInsights (keyed on its pipeline fingerprint)"""
+    size, rooms, baths = INSIGHTS_STANDARD_PROPERTY
+    cache = get_figure_cache()
+    size_figure = cache.get(('size_curve', insights.fingerprint), lambda: create_price_curve_chart(
+        insights.size_curves, 'size', f'Price by Size ({rooms} rooms, {baths} bathrooms)', 'Size (m²)'))
+    rooms_figure = cache.get(('rooms_curve', insights.fingerprint), lambda: create_price_curve_chart(
+        insights.room_curves, 'room_count', f'Price by Rooms ({size} m², {baths} bathrooms)', 'Rooms'))
+    return size_figure, rooms_figure
+
+
+def synthetic_history(n_rows, seed=0):
+    """n_rows random predictions shaped like the history store's"""
+    import pandas as pd
+
+    rng = np.random.default_rng(seed)
+    size = rng.integers(30, 400, n_rows).astype(float)
+    price = np.round(size * rng.normal(2.4, 0.6, n_rows).clip(0.5), 2)
+    return pd.DataFrame({
+        'city': rng.choice(CITIES, n_rows),
+        'size': size,
+        'room_count': rng.integers(1, 7, n_rows).astype(float),
+        'bathroom_count': rng.integers(1, 4, n_rows).astype(float),
+        'imputed_region': 'autres villes',
+        'estimated_price_tnd': price,
+        'price_per_m2': np.round(price / size, 2),
+    })
+
+
+def benchmark(sizes=(1000, 100000, 1000000)):
+    """
+    Payload size and server-side render time (figure build + JSON serialization)
+    of the history chart at each size: the previous unconditional scatter plot
+    against the figure history_figure picks, cold and cached.
+
+    Returns:
+    --------
+    list of dicts
+    """
+    import plotly.express as px
+    import plotly.io as pio
+
+    def render(build):
+        start = time.perf_counter()
+        spec = pio.to_json(build(), validate=False)
+        return time.perf_counter() - start, len(spec)
+
+    # Keep plotly's imports and first-call setup out of the timings
+    render(lambda: create_history_chart(synthetic_history(100)))
+
+    rows = []
+    for n_rows in sizes:
+        df = synthetic_history(n_rows)
+        fingerprint = data_fingerprint(df)
+
+        def scatter():
+            # Before: SVG (or plotly.express's own WebGL switch), every point with its hover columns
+            return px.scatter(df, x='size', y='estimated_price_tnd', color='city', size='room_count',
+                              hover_data=['bathroom_count', 'price_per_m2', 'imputed_region'])
+
+        variants = [('scatter, every point', scatter)]
+        get_figure_cache().clear()
+        variants.append(('history_figure, cold', lambda: history_figure(df, key=fingerprint)))
+        variants.append(('history_figure, cached', lambda: history_figure(df, key=fingerprint)))
+        for label, build in variants:
+            seconds, payload = render(build)
+            rows.append({'points': n_rows, 'chart': label, 'render_ms': seconds * 1000, 'payload_kb': payload / 1024})
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Chart rendering layer")
+    parser.add_argument('--benchmark', action='store_true', help="Payload size and render time at 1k, 100k, 1M points")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 100000, 1000000])
+    args = parser.parse_args(argv)
+
+    if args.benchmark:
+        print(f"{'points':>10} {'chart':<24} {'render (ms)':>12} {'payload (KB)':>13}")
+        for row in benchmark(args.sizes):
+            print(f"{row['points']:>10,} {row['chart']:<24} {row['render_ms']:>12.1f} {row['payload_kb']:>13,.1f}")
+
+
+if __name__ == "__main__":
+    main()
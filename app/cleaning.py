@@ -0,0 +1,360 @@
+"""
+Listing cleaning shared by training and serving.
+
+The cleaning of docs/source_1, docs/aggregation/AGGREGATION.md and
+docs/model/MODEL.md as importable, vectorized functions (row masks and
+groupby transforms instead of notebook cells):
+
+    1. Source 1 (notebooks/source_1): apartments for sale in Grand Tunis,
+       prices in K TND, the notebook's rules on implausible price/size
+       combinations, exact duplicates and price_per_m2 above 6000 TND removed
+    2. Merge (notebooks/merge): Source 1 prices x SOURCE_1_PRICE_ADJUSTMENT
+       (2020 to 2024 prices), Source 1 rows that repeat a Source 2 listing on
+       every column but region dropped, then Source 2 appended. Source 2 has
+       no raw file in the repository: its cleaned CSV is the input.
+    3. Structural cleaning (prepare_listings): lowercase city/region, -1 as
+       missing, supported cities only, price_per_m2, merged region names.
+       'Autres villes', the sources' marker for an unknown region, is kept as a
+       region and left to the KNN region imputers.
+    4. Per-city IQR filter on price_per_m2 (iqr_bounds / apply_bounds)
+
+Steps 1-2 stream their input in CLEANING_CHUNK_ROWS chunks: every rule is a
+row mask except duplicate removal, which remembers a 64-bit hash of each kept
+row. Memory therefore grows with the cleaned output, not the raw file. Numeric
+columns are read as float64 and chunks are written in input order, so
+regenerating the processed CSVs reproduces them byte for byte (--verify).
+
+Serving side, input_profile() records the per-city range of size, rooms and
+bathrooms the model was trained on (stored at export), and screen_listings()
+rejects or flags inputs outside it before they reach the champion model
+(batch_score.py).
+
+Usage:
+    python cleaning.py --regenerate --verify     # rebuild the processed CSVs in a temp dir and compare
+    python cleaning.py --regenerate --output ../data/processed
+"""
+import argparse
+import filecmp
+import os
+import shutil
+import tempfile
+import threading
+
+import numpy as np
+import pandas as pd
+
+from config import (CLEANING_CHUNK_ROWS, IQR_MULTIPLIER, RAW_DATA_PATH, SOURCE_1_PRICE_ADJUSTMENT,
+                    TRAINING_DATA_PATH)
+
+SUPPORTED_CITIES = ['tunis', 'ariana', 'ben arous', 'la manouba']
+PROCESSED_DIR = os.path.dirname(TRAINING_DATA_PATH)
+SOURCE_2_CLEANED_PATH = os.path.join(PROCESSED_DIR, "source_2", "processed_apartment_data.csv")
+
+# Source 1 notebook rules (prices in K TND, sizes in m²)
+SOURCE_1_CITIES = ['Tunis', 'Ariana', 'Ben arous', 'La manouba']
+SOURCE_1_MAX_PRICE = 3000
+SOURCE_1_MAX_PRICE_PER_M2 = 6000  # TND
+LISTING_DTYPES = {'room_count': 'float64', 'bathroom_count': 'float64', 'size': 'float64', 'price': 'float64',
+                  'city': str, 'region': str}
+PROFILE_COLUMNS = ['size', 'room_count', 'bathroom_count']
+
+# Region variants merged by the notebook (first name of each group is canonical)
+GROUPED_REGIONS = [
+    ["Ariana Ville"], ["Jardins D'el Menzah", "Jardins El Menzah"], ["Ennasr"], ["Autres villes"],
+    ["Borj Louzir"], ["La Soukra"], ["Ghazela"], ["Ariana"], ["Chotrana"], ["Raoued"], ["Mnihla"],
+    ["Ettadhamen"], ["Sidi Thabet"], ["Fouchana"], ["Mornag"], ["Medina Jedida"], ["El Mourouj"],
+    ["Hammam Chott"], ["Ezzahra"], ["Boumhel"], ["Hammam Lif"], ["Radès", "Rads"], ["Mégrine", "Mgrine"],
+    ["Ben arous", "Ben Arous"], ["Manouba Ville"], ["Oued Ellil"], ["Denden"], ["La manouba", "La Manouba"],
+    ["Douar Hicher"], ["Le Bardo"], ["L'aouina", "L Aouina"], ["La Marsa"], ["La Goulette"], ["Carthage"],
+    ["Agba"], ["Ettahrir"], ["Menzah"], ["Tunis"], ["Sidi Daoud"], ["Le Kram"], ["El Kabaria"],
+    ["El Ouardia"], ["Manar"], ["Ezzouhour"], ["Centre Urbain Nord"], ["Médina"],
+    ["Centre Ville - Lafayette", "Centre Ville Lafayette"], ["Sidi Bou Said"], ["Hraïria", "Hraria"],
+    ["Sidi Hassine"], ["Mutuelleville"], ["Ain Zaghouan Nord"], ["Chotrana 1"], ["Cit Ennasr 2"],
+    ["Bab Souika"], ["Borj Cedria"], ["El Mourouj 5"], ["El Menzah 7"], ["Jardins De Carthage"],
+    ["El Omrane Suprieur"], ["Ain Zaghouen", "Ain Zaghouan"], ["El Mourouj 6"], ["El Mourouj 1"],
+    ["El Manar 1"], ["Riadh Andalous"], ["El Menzah 9"], ["Ariana Essoughra"], ["Cit Olympique"],
+    ["El Menzah 4"], ["Les Jardins El_Menzah_2"], ["Montplaisir"], ["Dar Fadhal"], ["El Menzah 5"],
+    ["Mohamedia"], ["El Manar 2"], ["Cit El Khadra"], ["Cite Ennkhilet"], ["Ain Zaghouan Sud"],
+    ["Tunis Belvedere"], ["Gammarth"], ["Lac 2"], ["Ksar Said"], ["Cit Hedi Nouira"], ["El Menzah 6"],
+    ["Les Jardins El_Menzah_1"], ["Lac 1"], ["El Mourouj 4"],
+]
+
+
+# 1. Source 1
+
+def clean_source_1(chunk):
+    """
+    Row rules of the Source 1 notebook on a chunk of the raw scrape (duplicates
+    are removed across chunks by drop_repeated_rows).
+
+    Returns:
+    --------
+    pd.DataFrame - room_count, bathroom_count, size, price (K TND), city, region
+    """
+    price = chunk['price'] / 1000
+    size = chunk['size']
+    keep = (chunk['category'].eq('Appartements') & chunk['type'].eq('À Vendre')
+            & chunk['city'].isin(SOURCE_1_CITIES) & (price <= SOURCE_1_MAX_PRICE)
+            & ~((price <= 70) & (size >= 70))
+            & ~((price >= 1000) & (size <= 90))
+            & ~((chunk['room_count'] >= 2) & (size <= 25))
+            & (price * 1000 / size <= SOURCE_1_MAX_PRICE_PER_M2))
+    return chunk[keep].assign(price=price[keep]).drop(columns=['category', 'type', 'log_price'])
+
+
+def drop_repeated_rows(chunk, seen, columns=None):
+    """
+    Drop rows equal to an earlier row of the chunk or of previous chunks.
+
+    Parameters:
+    -----------
+    chunk : pd.DataFrame - Rows in input order
+    seen : set - 64-bit hashes of the rows kept so far (updated in place)
+    columns : list - Columns that define a duplicate (default: all)
+    """
+    hashes = pd.util.hash_pandas_object(chunk if columns is None else chunk[columns], index=False)
+    first = ~hashes.duplicated().to_numpy()
+    first &= np.fromiter((value not in seen for value in hashes.tolist()), dtype=bool, count=len(hashes))
+    seen.update(hashes[first].tolist())
+    return chunk[first]
+
+
+def iter_source_1(raw_path=RAW_DATA_PATH, chunksize=CLEANING_CHUNK_ROWS):
+    """Cleaned Source 1 rows, one chunk of the raw scrape at a time"""
+    seen = set()
+    dtypes = dict(LISTING_DTYPES, log_price='float64', category=str, type=str)
+    for chunk in pd.read_csv(raw_path, chunksize=chunksize, dtype=dtypes):
+        # Exact duplicates among the rows the rules keep (the notebook drops them before its
+        # price_per_m2 rule, which keeps or drops equal rows together)
+        yield drop_repeated_rows(clean_source_1(chunk), seen)
+
+
+# 2. Merge
+
+def adjust_source_1_prices(chunk, factor=SOURCE_1_PRICE_ADJUSTMENT):
+    """Source 1 prices (2020) in 2024 TND"""
+    return chunk.assign(price=chunk['price'] * factor)
+
+
+def iter_merged(source_1_chunks, source_2_path=SOURCE_2_CLEANED_PATH, chunksize=CLEANING_CHUNK_ROWS):
+    """
+    merged.csv rows: adjusted Source 1 rows not repeated in Source 2, then Source 2.
+
+    Parameters:
+    -----------
+    source_1_chunks : iterable - Cleaned Source 1 chunks (iter_source_1 or a read of its CSV)
+    source_2_path : str - Cleaned Source 2 CSV
+    """
+    source_2 = pd.read_csv(source_2_path, dtype=LISTING_DTYPES)
+    key_columns = [column for column in source_2.columns if column != 'region']
+    source_2_keys = pd.MultiIndex.from_frame(source_2[key_columns])
+    for chunk in source_1_chunks:
+        chunk = adjust_source_1_prices(chunk)
+        yield chunk[~pd.MultiIndex.from_frame(chunk[key_columns]).isin(source_2_keys)]
+    for start in range(0, len(source_2), chunksize):
+        yield source_2.iloc[start:start + chunksize]
+
+
+def write_chunks(chunks, path):
+    """Write chunks to one CSV (through a temporary file); returns the number of rows"""
+    rows = 0
+    with open(path + '.tmp', 'w', encoding='utf-8', newline='') as f:
+        for position, chunk in enumerate(chunks):
+            chunk.to_csv(f, header=position == 0, index=False)
+            rows += len(chunk)
+    os.replace(path + '.tmp', path)
+    return rows
+
+
+def regenerate(output_dir=PROCESSED_DIR, raw_path=RAW_DATA_PATH, source_2_path=SOURCE_2_CLEANED_PATH,
+               chunksize=CLEANING_CHUNK_ROWS):
+    """
+    Rebuild source_1/apartments_cleaned.csv and merged.csv from the raw Source 1
+    scrape and the cleaned Source 2 file.
+
+    Returns:
+    --------
+    dict - Output path -> rows written
+    """
+    source_1_path = os.path.join(output_dir, "source_1", "apartments_cleaned.csv")
+    merged_path = os.path.join(output_dir, "merged.csv")
+    os.makedirs(os.path.dirname(source_1_path), exist_ok=True)
+    counts = {source_1_path: write_chunks(iter_source_1(raw_path, chunksize), source_1_path)}
+    # The merge notebook reads the cleaned Source 1 CSV back, so its prices went through the file
+    source_1_chunks = pd.read_csv(source_1_path, chunksize=chunksize, dtype=LISTING_DTYPES)
+    counts[merged_path] = write_chunks(iter_merged(source_1_chunks, source_2_path, chunksize), merged_path)
+    return counts
+
+
+# 3. Structural cleaning
+
+def clean_region_names(df, region_column='region'):
+    """
+    Merge duplicate region names using GROUPED_REGIONS.
+
+    The notebook applies this mapping after lowercasing the column, so only
+    names that still match exactly are changed; it is kept that way so a
+    retrained pipeline has the same region classes as the exported one.
+    """
+    region_mapping = {variant: group[0] for group in GROUPED_REGIONS for variant in group}
+    df = df.copy()
+    df[region_column] = df[region_column].replace(region_mapping)
+    return df
+
+
+def prepare_listings(df):
+    """
+    Structural cleaning of rows in the merged.csv schema: lowercase city/region,
+    -1 as missing, supported cities only, price_per_m2 and merged region names.
+    """
+    df = df.copy()
+    for col in ['city', 'region']:
+        df[col] = df[col].astype(str).str.strip().str.lower()
+    num_cols = ['room_count', 'bathroom_count', 'size']
+    df[num_cols] = df[num_cols].replace(-1, np.nan)
+    df = df[df['city'].isin(SUPPORTED_CITIES)].copy()
+    df['price_per_m2'] = df['price'] / df['size']
+    return clean_region_names(df)
+
+
+# 4. Per-city IQR filter
+
+def iqr_bounds(df, column='price_per_m2', by='city', k=IQR_MULTIPLIER):
+    """
+    Tukey fences of a column per group: quartiles -/+ k x IQR.
+
+    Returns:
+    --------
+    pd.DataFrame indexed by group with columns lower, upper
+    """
+    quartiles = df.groupby(by)[column].quantile([0.25, 0.75]).unstack()
+    iqr = quartiles[0.75] - quartiles[0.25]
+    return pd.DataFrame({'lower': quartiles[0.25] - k * iqr, 'upper': quartiles[0.75] + k * iqr})
+
+
+def apply_bounds(df, bounds, column='price_per_m2', by='city'):
+    """Rows whose value lies inside the fences of their group (rows of groups without fences are dropped)"""
+    groups = df[by]
+    keep = df[column].between(groups.map(bounds['lower']), groups.map(bounds['upper']))
+    return df[keep.fillna(False).astype(bool)]
+
+
+# Serving: out-of-distribution screening
+
+def input_profile(listings):
+    """
+    Per-city range of the request features in the training listings.
+
+    Returns:
+    --------
+    dict - city -> {column: (min, max)} for PROFILE_COLUMNS
+    """
+    ranges = listings.groupby('city')[PROFILE_COLUMNS].agg(['min', 'max'])
+    return {city: {column: (float(row[(column, 'min')]), float(row[(column, 'max')])) for column in PROFILE_COLUMNS}
+            for city, row in ranges.iterrows()}
+
+
+_profile = None
+_profile_lock = threading.Lock()
+
+
+def get_input_profile(pipeline):
+    """
+    input_profile of a pipeline artifact. Notebook exports have none: it is
+    built once from TRAINING_DATA_PATH.
+    """
+    global _profile
+    if pipeline.get('input_profile') is not None:
+        return pipeline['input_profile']
+    with _profile_lock:
+        if _profile is None:
+            from train import load_training_data
+            _profile = input_profile(load_training_data(TRAINING_DATA_PATH))
+        return _profile
+
+
+def screen_listings(listings, pipeline):
+    """
+    Reject or flag listings the model was not trained for.
+
+    Rejected (never scored): missing city or city without region models,
+    missing or non-positive size or rooms, missing or negative bathrooms (the
+    raw sources use -1 for unknown), or at least 2 rooms in 25 m² or less (a
+    Source 1 cleaning rule). Flagged (scored, but outside the training data):
+    size, rooms or bathrooms outside the city's training range, or a region
+    that does not resolve to a trained region of the city (regions.py).
+
+    Parameters:
+    -----------
+    listings : pd.DataFrame - city, size, room_count, bathroom_count and optionally region
+    pipeline : dict - Pipeline artifact
+
+    Returns:
+    --------
+    pd.DataFrame indexed like listings: input_status ('ok', 'flagged' or
+    'rejected') and input_issues (reasons separated by '; ')
+    """
+    from regions import get_region_canonicalizer
+
+    numeric = listings[PROFILE_COLUMNS].apply(pd.to_numeric, errors='coerce')
+    cities = listings['city'].astype(str).str.strip().str.lower().where(listings['city'].notna())
+    profile = get_input_profile(pipeline)
+
+    rejections = {
+        'unsupported city': ~cities.isin(list(pipeline['knn_region_models'])),
+        'missing or non-positive size': ~(numeric['size'] > 0),
+        'missing or non-positive room count': ~(numeric['room_count'] > 0),
+        'missing or negative bathroom count': ~(numeric['bathroom_count'] >= 0),
+        'too many rooms for the size': (numeric['room_count'] >= 2) & (numeric['size'] <= 25),
+    }
+    flags = {}
+    for column in PROFILE_COLUMNS:
+        lower = cities.map({city: ranges[column][0] for city, ranges in profile.items()})
+        upper = cities.map({city: ranges[column][1] for city, ranges in profile.items()})
+        flags[f"{column} outside the training range"] = (numeric[column] < lower) | (numeric[column] > upper)
+    if 'region' in listings.columns:
+        regions = listings['region'].fillna('autres villes').astype(str)
+        known = pd.Series(get_region_canonicalizer(pipeline).known(cities.fillna('').to_numpy(), regions.to_numpy()),
+                          index=listings.index)
+        flags['unknown region'] = ~known
+
+    reasons = list(rejections) + list(flags)
+    masks = np.column_stack([mask.to_numpy(dtype=bool) for mask in [*rejections.values(), *flags.values()]])
+    rejected = masks[:, :len(rejections)].any(axis=1)
+    masks[:, len(rejections):] &= ~rejected[:, None]  # A rejected listing only lists why it was rejected
+    flagged = masks[:, len(rejections):].any(axis=1)
+    # One text per distinct combination of reasons
+    codes, combinations = pd.factorize(masks @ (1 << np.arange(len(reasons))))
+    texts = np.array(['; '.join(reason for bit, reason in enumerate(reasons) if combination >> bit & 1) or None
+                      for combination in combinations], dtype=object)
+    return pd.DataFrame({'input_status': np.select([rejected, flagged], ['rejected', 'flagged'], 'ok'),
+                         'input_issues': texts[codes]}, index=listings.index)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Listing cleaning (Source 1, merge)")
+    parser.add_argument('--regenerate', action='store_true', help="Rebuild the processed CSVs from the raw file")
+    parser.add_argument('--output', default=None, help="Output directory (default: a temporary directory)")
+    parser.add_argument('--verify', action='store_true', help="Compare the regenerated files with data/processed")
+    parser.add_argument('--raw', default=RAW_DATA_PATH)
+    parser.add_argument('--chunksize', type=int, default=CLEANING_CHUNK_ROWS)
+    args = parser.parse_args(argv)
+
+    if not args.regenerate:
+        parser.error("nothing to do (use --regenerate)")
+    output_dir = args.output or tempfile.mkdtemp(prefix='cleaning-')
+    try:
+        counts = regenerate(output_dir, args.raw, chunksize=args.chunksize)
+        for path, rows in counts.items():
+            line = f"{rows:>6} rows -> {path}"
+            if args.verify:
+                reference = os.path.join(PROCESSED_DIR, os.path.relpath(path, output_dir))
+                line += "  (identical)" if filecmp.cmp(path, reference, shallow=False) else "  (DIFFERS)"
+            print(line)
+    finally:
+        if args.output is None:
+            shutil.rmtree(output_dir)
+
+
+if __name__ == "__main__":
+    main()
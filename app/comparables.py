@@ -0,0 +1,212 @@
+"""
+Comparable listings: the real listings of data/processed/merged.csv closest to
+a property.
+
+Listings are indexed per city in a KD-tree over (size, room_count,
+bathroom_count), standardized with the mean/scale the pipeline's KNN region
+imputer uses for those columns (knn_region_models[city]['scaler']), or with
+the city's own statistics when the city has no imputer. Each region with at
+least one listing gets its own tree, so a region filter is a tree lookup too.
+
+The index is saved next to the pipeline (COMPARABLES_INDEX_PATH) together with
+the fingerprints of the pipeline artifact and of merged.csv, and rebuilt when
+either changes. Queries take tens of microseconds.
+
+Usage:
+    python comparables.py --build
+    python comparables.py --query tunis 120 3 2 --region "la marsa" -k 5
+"""
+import argparse
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from config import COMPARABLES_INDEX_PATH, COMPARABLES_K, TRAINING_DATA_PATH
+from utils import file_fingerprint, get_active_pipeline
+
+FEATURES = ['size', 'room_count', 'bathroom_count']
+LISTING_COLUMNS = ['region', 'size', 'room_count', 'bathroom_count', 'price', 'price_per_m2']
+
+
+class ComparablesIndex:
+    """
+    Per-city (and per-region) KD-trees over the scaled listing features.
+
+    Attributes:
+    -----------
+    cities : dict - city -> {'mean', 'scale', 'tree', 'listings' (list of dicts), 'regions' {region: (tree, rows)}}
+    fingerprint : str - Pipeline artifact the scaling was taken from
+    data_fingerprint : str - merged.csv the listings were read from
+    """
+
+    def __init__(self, cities, fingerprint, data_fingerprint):
+        self.cities = cities
+        self.fingerprint = fingerprint
+        self.data_fingerprint = data_fingerprint
+
+    def save(self, path=COMPARABLES_INDEX_PATH):
+        import joblib
+
+        # Plain state, so the file does not depend on the module being importable as 'comparables'
+        joblib.dump({'cities': self.cities, 'fingerprint': self.fingerprint,
+                     'data_fingerprint': self.data_fingerprint}, path + '.tmp')
+        os.replace(path + '.tmp', path)
+
+    @staticmethod
+    def load(path=COMPARABLES_INDEX_PATH):
+        import joblib
+
+        return ComparablesIndex(**joblib.load(path))
+
+    def query(self, city, size, room_count, bathroom_count, region=None, k=COMPARABLES_K):
+        """
+        The k listings nearest to a property, closest first.
+
+        Parameters:
+        -----------
+        city : str - City name (case-insensitive)
+        size, room_count, bathroom_count : float - Property features
+        region : str - Restrict to this region when it has at least k listings
+                 (None or 'autres villes' searches the whole city)
+        k : int - Number of listings
+
+        Returns:
+        --------
+        list of dicts with region, size, room_count, bathroom_count, price_tnd,
+        price_per_m2 and distance (in scaled units); empty for an unknown city
+        """
+        entry = self.cities.get(city.lower())
+        if entry is None:
+            return []
+        point = (np.array([size, room_count, bathroom_count], dtype=float) - entry['mean']) / entry['scale']
+
+        tree, rows = entry['tree'], None
+        if region is not None and region.lower() != 'autres villes':
+            region_entry = entry['regions'].get(region.lower())
+            if region_entry is not None and len(region_entry[1]) >= k:
+                tree, rows = region_entry
+        distances, positions = tree.query(point, k=[i + 1 for i in range(min(k, tree.n))])
+        if rows is not None:
+            positions = rows[positions]
+
+        listings = entry['listings']
+        return [dict(listings[position], distance=round(float(distance), 4))
+                for position, distance in zip(positions.tolist(), distances)]
+
+
+def load_listings(data_path=TRAINING_DATA_PATH):
+    """Listings of merged.csv with complete, positive features, cleaned like the training data"""
+    from cleaning import prepare_listings
+
+    df = prepare_listings(pd.read_csv(data_path))
+    df = df[(df[FEATURES] > 0).all(axis=1) & (df['price'] > 0)]
+    return df.reset_index(drop=True)
+
+
+def build_comparables_index(active=None, data_path=TRAINING_DATA_PATH):
+    """Build the index from merged.csv, scaled like the KNN imputers of an ActivePipeline (default: the served one)"""
+    from scipy.spatial import cKDTree
+
+    active = active or get_active_pipeline()
+    pipeline = active.pipeline
+    df = load_listings(data_path)
+    cities = {}
+    for city, city_df in df.groupby('city'):
+        X = city_df[FEATURES].to_numpy(dtype=float)
+        models = pipeline['knn_region_models'].get(city)
+        if models is not None:
+            # Same standardization as the imputer (its first three columns are FEATURES)
+            mean, scale = models['scaler'].mean_[:3], models['scaler'].scale_[:3]
+        else:
+            mean, scale = X.mean(axis=0), X.std(axis=0)
+            scale[scale == 0] = 1.0
+        X_scaled = (X - mean) / scale
+
+        region_codes = city_df['region'].to_numpy()
+        regions = {}
+        for region in np.unique(region_codes):
+            rows = np.flatnonzero(region_codes == region)
+            regions[region] = (cKDTree(X_scaled[rows]), rows)
+
+        cities[city] = {
+            'mean': mean,
+            'scale': scale,
+            'tree': cKDTree(X_scaled),
+            'listings': [{
+                'region': region,
+                'size': float(size),
+                'room_count': int(room_count),
+                'bathroom_count': int(bathroom_count),
+                'price_tnd': round(float(price), 2),
+                'price_per_m2': round(float(price_per_m2), 2),
+            } for region, size, room_count, bathroom_count, price, price_per_m2
+                in city_df[LISTING_COLUMNS].itertuples(index=False)],
+            'regions': regions,
+        }
+    return ComparablesIndex(cities, active.fingerprint, file_fingerprint(data_path))
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_comparables_index(path=COMPARABLES_INDEX_PATH, data_path=TRAINING_DATA_PATH):
+    """The saved index when it matches the loaded pipeline and merged.csv, else a freshly built (and saved) one"""
+    global _index
+    # One snapshot: the index is built from and keyed on the same artifact during a hot swap
+    active = get_active_pipeline()
+    fingerprint = active.fingerprint
+    index = _index
+    if index is not None and index.fingerprint == fingerprint:
+        return index
+    with _index_lock:
+        if _index is None or _index.fingerprint != fingerprint:
+            index = None
+            if os.path.exists(path):
+                index = ComparablesIndex.load(path)
+                if index.fingerprint != fingerprint or index.data_fingerprint != file_fingerprint(data_path):
+                    index = None
+            if index is None:
+                index = build_comparables_index(active, data_path)
+                try:
+                    index.save(path)
+                except OSError:
+                    pass  # Read-only deployment: keep the in-memory index
+            _index = index
+    return _index
+
+
+def find_comparables(city, size, room_count, bathroom_count, region=None, k=COMPARABLES_K):
+    """ComparablesIndex.query on the index of the loaded pipeline"""
+    return get_comparables_index().query(city, size, room_count, bathroom_count, region, k)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Comparable listings index")
+    parser.add_argument('--build', action='store_true', help="Build and save the index")
+    parser.add_argument('--query', nargs=4, metavar=('CITY', 'SIZE', 'ROOMS', 'BATHS'))
+    parser.add_argument('--region', default=None)
+    parser.add_argument('-k', type=int, default=COMPARABLES_K)
+    args = parser.parse_args(argv)
+
+    if args.build:
+        start = time.perf_counter()
+        index = build_comparables_index()
+        index.save()
+        print(f"Built index of {sum(len(entry['listings']) for entry in index.cities.values())} listings "
+              f"in {(time.perf_counter() - start) * 1000:.0f} ms -> {COMPARABLES_INDEX_PATH}")
+    if args.query:
+        city, size, rooms, baths = args.query
+        index = get_comparables_index()
+        start = time.perf_counter()
+        results = index.query(city, float(size), float(rooms), float(baths), args.region, args.k)
+        elapsed = time.perf_counter() - start
+        print(pd.DataFrame(results).to_string(index=False))
+        print(f"Query: {elapsed * 1e6:.0f} µs")
+
+
+if __name__ == "__main__":
+    main()
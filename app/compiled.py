@@ -0,0 +1,427 @@
+"""
+Compiled (pandas-free) single-row inference.
+
+At load time every fitted component predict_price touches is flattened into
+plain NumPy arrays: the region-imputation and clustering scalers, the KNN
+training matrix and labels, the KMeans centroids, the tier table and the
+champion model's column preprocessing. A request then fills a preallocated
+feature row and calls the final estimator once, skipping the DataFrame
+construction and repeated sklearn input validation of the standard path.
+
+The features produced are bit-for-bit those of the standard path
+(see verify_compiled), and `python compiled.py --benchmark` compares the
+per-call latency of both implementations.
+
+Select it for the whole app with INFERENCE_MODE = "compiled" in config.py.
+"""
+import argparse
+import threading
+import time
+
+import numpy as np
+from sklearn.compose import ColumnTransformer
+from sklearn.preprocessing import OneHotEncoder, RobustScaler, StandardScaler
+
+from config import CITIES
+from conformal import interval
+from regions import get_region_canonicalizer
+from utils import load_pipeline, get_active_pipeline, predict_price
+
+REGION_FEATURES = ['size', 'room_count', 'bathroom_count', 'price_per_m2']
+
+
+def _scaler_arrays(scaler):
+    """(offset, scale) such that transform(x) == (x - offset) / scale"""
+    n_features = scaler.n_features_in_
+    if isinstance(scaler, StandardScaler):
+        offset = scaler.mean_ if scaler.with_mean else np.zeros(n_features)
+        scale = scaler.scale_ if scaler.with_std else np.ones(n_features)
+    elif isinstance(scaler, RobustScaler):
+        offset = scaler.center_ if scaler.with_centering else np.zeros(n_features)
+        scale = scaler.scale_ if scaler.with_scaling else np.ones(n_features)
+    else:
+        raise TypeError(f"Cannot compile scaler of type {type(scaler).__name__}")
+    return np.array(offset, dtype=np.float64), np.array(scale, dtype=np.float64)
+
+
+class _CityArrays:
+    """Region imputation, clustering and tier tables of one city as arrays"""
+
+    def __init__(self, city, pipeline):
+        self.median_ppm2 = pipeline['city_price_stats']['median'].get(city, 3000)
+
+        self.has_knn = city in pipeline['knn_region_models']
+        if self.has_knn:
+            models = pipeline['knn_region_models'][city]
+            knn = models['knn']
+            if knn.effective_metric_ != 'euclidean':
+                raise TypeError(f"Cannot compile KNN with metric '{knn.effective_metric_}'")
+            self.knn_offset, self.knn_scale = _scaler_arrays(models['scaler'])
+            self.knn_X = np.ascontiguousarray(knn._fit_X, dtype=np.float64)
+            self.knn_y = np.asarray(knn._y)
+            self.knn_k = knn.n_neighbors
+            self.knn_distance_weights = knn.weights == 'distance'
+            self.knn_n_classes = len(knn.classes_)
+            # knn.classes_ holds label-encoder codes, map straight to region names
+            self.knn_region_names = models['label_encoder'].classes_[knn.classes_]
+
+        self.has_clusters = city in pipeline['clustering_models']
+        if self.has_clusters:
+            models = pipeline['clustering_models'][city]
+            self.cluster_offset, self.cluster_scale = _scaler_arrays(models['scaler'])
+            self.centroids = np.ascontiguousarray(models['kmeans'].cluster_centers_, dtype=np.float64)
+            self.virtual_regions = [f"{city}_Cluster_{cluster_id}" for cluster_id in range(len(self.centroids))]
+            self.tiers = np.array([pipeline['tier_lookup'].get(name, 1) for name in self.virtual_regions])
+
+    def impute_region(self, query):
+        scaled = (query - self.knn_offset) / self.knn_scale
+        distances = np.sqrt(((self.knn_X - scaled) ** 2).sum(axis=1))
+        k = min(self.knn_k, len(distances))
+        nearest = np.argpartition(distances, k - 1)[:k]
+        nearest = nearest[np.argsort(distances[nearest], kind='stable')]
+        nearest_distances = distances[nearest]
+
+        if not self.knn_distance_weights:
+            weights = np.ones(k)
+        elif (nearest_distances == 0).any():
+            # Same convention as sklearn: exact matches take all the weight
+            weights = (nearest_distances == 0).astype(np.float64)
+        else:
+            weights = 1.0 / nearest_distances
+
+        votes = np.bincount(self.knn_y[nearest], weights=weights, minlength=self.knn_n_classes)
+        return self.knn_region_names[np.argmax(votes)]
+
+    def assign_cluster(self, query):
+        scaled = (query - self.cluster_offset) / self.cluster_scale
+        return int(np.argmin(((self.centroids - scaled) ** 2).sum(axis=1)))
+
+
+class _CompiledPreprocessor:
+    """The champion model's ColumnTransformer as index/offset/scale arrays"""
+
+    def __init__(self, column_transformer, features):
+        if not isinstance(column_transformer, ColumnTransformer):
+            raise TypeError("Champion preprocessing step is not a ColumnTransformer")
+
+        self.numeric = []      # (output slice, input feature names, offset, scale)
+        self.categorical = []  # (input feature name, {category: output index})
+        position = 0
+
+        for name, transformer, columns in column_transformer.transformers_:
+            if transformer == 'drop' or len(columns) == 0:
+                continue
+            columns = [features[c] if isinstance(c, (int, np.integer)) else c for c in columns]
+
+            if transformer == 'passthrough':
+                width = len(columns)
+                self.numeric.append((slice(position, position + width), columns,
+                                     np.zeros(width), np.ones(width)))
+            elif isinstance(transformer, (StandardScaler, RobustScaler)):
+                width = len(columns)
+                offset, scale = _scaler_arrays(transformer)
+                self.numeric.append((slice(position, position + width), columns, offset, scale))
+            elif isinstance(transformer, OneHotEncoder):
+                if transformer._infrequent_enabled:
+                    raise TypeError("Cannot compile OneHotEncoder with infrequent categories")
+                width = 0
+                drop_idx = transformer.drop_idx_
+                for i, (column, categories) in enumerate(zip(columns, transformer.categories_)):
+                    dropped = drop_idx[i] if drop_idx is not None else None
+                    lookup = {}
+                    for j, category in enumerate(categories):
+                        if dropped is not None and j == dropped:
+                            continue
+                        lookup[category] = position + width
+                        width += 1
+                    self.categorical.append((column, lookup))
+            else:
+                raise TypeError(f"Cannot compile transformer of type {type(transformer).__name__}")
+            position += width
+
+        self.n_outputs = position
+
+    def transform_into(self, row, values):
+        """Write the transformed features of one listing into `row` (1D)"""
+        row.fill(0.0)
+        for output, columns, offset, scale in self.numeric:
+            row[output] = (np.array([values[column] for column in columns], dtype=np.float64) - offset) / scale
+        for column, lookup in self.categorical:
+            index = lookup.get(values[column])
+            if index is not None:
+                row[index] = 1.0
+
+
+class CompiledPipeline:
+    """
+    Array-only version of the loaded pipeline.
+
+    Parameters:
+    -----------
+    pipeline : dict - The loaded pipeline artifact (see utils.load_pipeline)
+    """
+
+    def __init__(self, pipeline):
+        champion_model = pipeline['champion_model']
+        self.features = list(pipeline['features'])
+        self.cities = {}
+        for city in set(pipeline['knn_region_models']) | set(pipeline['clustering_models']):
+            self.cities[city] = _CityArrays(city, pipeline)
+        self._default_median = 3000
+        self.conformal_intervals = pipeline.get('conformal_intervals')
+        self.region_canonicalizer = get_region_canonicalizer(pipeline)
+
+        steps = getattr(champion_model, 'steps', None)
+        if steps is None or len(steps) != 2:
+            raise TypeError("Champion model must be a two-step (preprocessor, estimator) Pipeline")
+        self.preprocessor = _CompiledPreprocessor(steps[0][1], self.features)
+        self.estimator = steps[1][1]
+        self._buffers = threading.local()
+
+    def _row_buffer(self):
+        # One preallocated (1, n_features) row per thread
+        row = getattr(self._buffers, 'row', None)
+        if row is None:
+            row = self._buffers.row = np.zeros((1, self.preprocessor.n_outputs), dtype=np.float64)
+            self._buffers.query = np.zeros(len(REGION_FEATURES), dtype=np.float64)
+        return row
+
+    def engineer_features(self, city, size, room_count, bathroom_count, region='autres villes'):
+        """
+        Stages 1-4 of predict_price (imputation, clustering, tier, features).
+
+        Returns:
+        --------
+        (values dict keyed like the standard input_data, imputed_region, transformed feature row)
+        """
+        city = city.lower()
+        return self._engineer(city, size, room_count, bathroom_count, self.region_canonicalizer.canonical(city, region))
+
+    def _engineer(self, city, size, room_count, bathroom_count, region):
+        # engineer_features for a lowercase city and a canonical region
+        row = self._row_buffer()
+        query = self._buffers.query
+
+        arrays = self.cities.get(city)
+        query[0] = size
+        query[1] = room_count
+        query[2] = bathroom_count
+        query[3] = arrays.median_ppm2 if arrays is not None else self._default_median
+
+        # 1. Region Imputation (KNN)
+        if region == 'autres villes' and arrays is not None and arrays.has_knn:
+            imputed_region = arrays.impute_region(query)
+        else:
+            imputed_region = region
+
+        # 2. Virtual Region (Cluster assignment) + 3. Tier lookup
+        if arrays is not None and arrays.has_clusters:
+            cluster_id = arrays.assign_cluster(query)
+            virtual_region = arrays.virtual_regions[cluster_id]
+            tier = arrays.tiers[cluster_id]
+        else:
+            virtual_region = None
+            tier = 1
+
+        # 4. Feature Engineering
+        avg_room_size = size / room_count if room_count > 0 else 0
+        values = {
+            'city': city,
+            'region': imputed_region,
+            'virtual_region': virtual_region,
+            'tier': tier,
+            'size': size,
+            'room_count': room_count,
+            'bathroom_count': bathroom_count,
+            'avg_room_size': avg_room_size,
+            'log_size': np.log1p(size),
+            'bathroom_ratio': bathroom_count / (room_count + 1),
+            'size_per_bathroom': size / (bathroom_count + 1),
+            'room_density': room_count / (size / 100) if size > 0 else 0,
+            'size_squared': size ** 2,
+        }
+        # Features the model does not know are filled with 0 like the reindex in predict_price
+        for feature in self.features:
+            values.setdefault(feature, 0)
+
+        self.preprocessor.transform_into(row[0], values)
+        return values, imputed_region, row
+
+    def predict_price(self, city, size, room_count, bathroom_count, region='autres villes'):
+        """Same contract as utils.predict_price"""
+        original_region = region
+        city = city.lower()
+        region = self.region_canonicalizer.canonical(city, region)
+        values, imputed_region, row = self._engineer(city, size, room_count, bathroom_count, region)
+
+        # 5. Predict
+        log_price = self.estimator.predict(row)[0]
+        estimated_price = np.expm1(log_price)
+        price_per_m2 = estimated_price / size if size > 0 else 0
+        avg_room_size = values['avg_room_size']
+
+        # 6. Prediction interval
+        price_low, price_high = interval(self.conformal_intervals, estimated_price, values['city'], values['tier'],
+                                         imputed=region == 'autres villes')
+
+        return {
+            'city': values['city'].title(),
+            'size': size,
+            'room_count': room_count,
+            'bathroom_count': bathroom_count,
+            'original_region': original_region,
+            'canonical_region': region,
+            'imputed_region': imputed_region,
+            'estimated_price_tnd': round(estimated_price, 2),
+            'price_low_tnd': price_low,
+            'price_high_tnd': price_high,
+            'price_per_m2': round(price_per_m2, 2),
+            'avg_room_size': round(avg_room_size, 2)
+        }
+
+
+_compiled = None  # (fingerprint, CompiledPipeline)
+_compiled_lock = threading.Lock()
+
+
+def get_compiled_pipeline(active=None):
+    """Compiled view of `active` (a utils.ActivePipeline, defaults to the loaded pipeline), rebuilt if it changes"""
+    global _compiled
+    active = active or get_active_pipeline()
+    cached = _compiled
+    if cached is not None and cached[0] == active.fingerprint:
+        return cached[1]
+    with _compiled_lock:
+        if _compiled is None or _compiled[0] != active.fingerprint:
+            _compiled = (active.fingerprint, CompiledPipeline(active.pipeline))
+        return _compiled[1]
+
+
+def compiled_predict_price(city, size, room_count, bathroom_count, region='autres villes', active=None):
+    """predict_price on the compiled pipeline (of `active`, defaults to the loaded pipeline)"""
+    return get_compiled_pipeline(active).predict_price(city, size, room_count, bathroom_count, region)
+
+
+def _random_listings(n, seed=42):
+    pipeline = load_pipeline()
+    rng = np.random.default_rng(seed)
+    listings = []
+    for _ in range(n):
+        city = str(rng.choice(CITIES)).lower()
+        regions = ['autres villes']
+        if city in pipeline['knn_region_models']:
+            regions += list(pipeline['knn_region_models'][city]['label_encoder'].classes_)
+        listings.append((city, int(rng.integers(10, 1001)), int(rng.integers(1, 21)),
+                         int(rng.integers(1, 11)), str(rng.choice(regions))))
+    return listings
+
+
+class _RecordingModel:
+    """Champion stand-in that keeps the feature frame the standard path passes to predict"""
+
+    def __init__(self, model):
+        self.model = model
+        self.frame = None
+
+    def predict(self, X):
+        self.frame = X
+        return self.model.predict(X)
+
+
+def verify_compiled(n=1000, seed=42):
+    """
+    Compare compiled and standard paths on random listings.
+
+    The standard path runs with a recording champion, so the compiled values
+    and feature row are checked against the input frame predict_price actually
+    builds and its transform by the champion's preprocessor.
+
+    Returns:
+    --------
+    dict with the number of listings whose engineered inputs (model features
+    and virtual_region), transformed features, imputed region or rounded price
+    differ, and the largest log-price difference
+    """
+    from utils import request_virtual_regions
+
+    active = get_active_pipeline()
+    pipeline = active.pipeline
+    compiled = get_compiled_pipeline(active)
+    preprocessor = pipeline['champion_model'][:-1]
+    recorder = _RecordingModel(pipeline['champion_model'])
+    recording = active._replace(pipeline=dict(pipeline, champion_model=recorder))
+    report = {'listings': n, 'input_mismatches': 0, 'feature_mismatches': 0, 'region_mismatches': 0,
+              'price_mismatches': 0, 'max_log_price_diff': 0.0}
+
+    for city, size, room_count, bathroom_count, region in _random_listings(n, seed):
+        standard = predict_price(city, size, room_count, bathroom_count, region, mode='standard', monitor=False,
+                                 active=recording)
+        input_df = recorder.frame
+        values, imputed_region, row = compiled.engineer_features(city, size, room_count, bathroom_count, region)
+
+        virtual_region = request_virtual_regions(pipeline, [city], [size], [room_count], [bathroom_count])[0]
+        if values['virtual_region'] != virtual_region or \
+                any(values[feature] != input_df[feature].iloc[0] for feature in pipeline['features']):
+            report['input_mismatches'] += 1
+        expected = preprocessor.transform(input_df)
+        expected = expected.toarray() if hasattr(expected, 'toarray') else np.asarray(expected)
+        if not np.array_equal(expected, row):
+            report['feature_mismatches'] += 1
+        if imputed_region != standard['imputed_region']:
+            report['region_mismatches'] += 1
+
+        result = compiled.predict_price(city, size, room_count, bathroom_count, region)
+        if result['estimated_price_tnd'] != standard['estimated_price_tnd']:
+            report['price_mismatches'] += 1
+        diff = abs(np.log1p(result['estimated_price_tnd']) - np.log1p(standard['estimated_price_tnd']))
+        report['max_log_price_diff'] = max(report['max_log_price_diff'], float(diff))
+
+    return report
+
+
+def benchmark(n=500, seed=42):
+    """Median and p99 per-call latency (ms) of the standard and compiled paths"""
+    listings = _random_listings(n, seed)
+    compiled = get_compiled_pipeline()
+    # Warm both paths so first-call costs are not counted
+    predict_price(*listings[0], mode='standard')
+    compiled.predict_price(*listings[0])
+
+    report = {}
+    for name, fn in [('standard', lambda *args: predict_price(*args, mode='standard')),
+                     ('compiled', compiled.predict_price)]:
+        latencies = []
+        for listing in listings:
+            start = time.perf_counter()
+            fn(*listing)
+            latencies.append((time.perf_counter() - start) * 1000)
+        report[name] = {'p50_ms': float(np.percentile(latencies, 50)),
+                        'p99_ms': float(np.percentile(latencies, 99))}
+    report['speedup'] = report['standard']['p50_ms'] / report['compiled']['p50_ms']
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compiled inference: verification and latency benchmark")
+    parser.add_argument('--verify', action='store_true', help="Compare compiled features with the standard path")
+    parser.add_argument('--benchmark', action='store_true', help="Compare per-call latency")
+    parser.add_argument('-n', type=int, default=500, help="Number of random listings")
+    args = parser.parse_args(argv)
+
+    if args.verify or not args.benchmark:
+        report = verify_compiled(args.n)
+        print(f"Verified {report['listings']} listings: "
+              f"{report['input_mismatches']} input mismatches, "
+              f"{report['feature_mismatches']} feature mismatches, "
+              f"{report['region_mismatches']} region mismatches, "
+              f"{report['price_mismatches']} price mismatches "
+              f"(max log-price diff {report['max_log_price_diff']:.2e})")
+    if args.benchmark:
+        report = benchmark(args.n)
+        for name in ['standard', 'compiled']:
+            print(f"{name:>9}: p50 {report[name]['p50_ms']:.3f} ms | p99 {report[name]['p99_ms']:.3f} ms")
+        print(f"  speedup: {report['speedup']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
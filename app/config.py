@@ -5,6 +5,80 @@ import os
 # Use relative path that works both locally and on Streamlit Cloud
 PIPELINE_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "notebooks", "model", "v2", "model_export", "house_pricing_pipeline.joblib")
 
+# "joblib" unpickles PIPELINE_PATH into each process, "mmap" maps the arrays of
+# PIPELINE_MMAP_PATH (written by `python artifact.py --export`) so processes share them
+PIPELINE_LOAD_MODE = "joblib"
+PIPELINE_MMAP_PATH = os.path.join(os.path.dirname(PIPELINE_PATH), "house_pricing_pipeline.mmap.joblib")
+
+# Versioned artifact registry (registry.py): serve the newest (or pinned) version
+# under MODEL_REGISTRY_DIR/v<N>/model_export instead of PIPELINE_PATH, and hot-swap
+# new versions without a restart
+USE_MODEL_REGISTRY = False
+MODEL_REGISTRY_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "notebooks", "model")
+REGISTRY_POLL_SECONDS = 30  # How often the watcher looks for a new or pinned version
+
+# Datasets (datasets.py converts the CSVs under DATA_DIR to Parquet in PARQUET_CACHE_DIR)
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data")
+PARQUET_CACHE_DIR = os.path.join(DATA_DIR, ".cache", "parquet")
+
+# Listing cleaning (cleaning.py): Source 1 cleaning, merge, per-city IQR filter
+RAW_DATA_PATH = os.path.join(DATA_DIR, "raw", "source_1", "Property-Prices-in-Tunisia.csv")  # Source 1 scrape
+SOURCE_1_PRICE_ADJUSTMENT = 1.25  # Source 1 prices are 2020 prices: +25% to 2024 (INS apartment price index)
+IQR_MULTIPLIER = 1.5  # Per-city fences on price_per_m2: quartiles -/+ this x IQR
+CLEANING_CHUNK_ROWS = 100000  # Raw rows read at a time
+
+# Headless retraining (train.py)
+TRAINING_DATA_PATH = os.path.join(DATA_DIR, "processed", "merged.csv")
+TRAINING_CACHE_DIR = os.path.join(os.path.dirname(__file__), ".cache", "training")  # Fitted stages reused across runs
+INCREMENTAL_KNN_MAX_REFERENCE = 5000  # KNN imputer reference rows kept per city by incremental.py
+
+# "standard" runs predict_price through pandas/sklearn, "compiled" uses the
+# preextracted NumPy arrays of compiled.py (same features, lower latency)
+INFERENCE_MODE = "standard"
+
+# Precomputed lookup table (lookup_table.py): prices over the form's input
+# domain, used instead of the model when built from the loaded pipeline
+# Opt-in: every process answering from the table holds it in memory. With LOOKUP_SIZE_STEP = 1 that
+# is about 75 MB of arrays (95 MB peak while the .npz decompresses) and 49 MB on disk; a step of 10
+# needs about a tenth of that but interpolates sizes between grid points (see lookup_table.py)
+LOOKUP_TABLE_ENABLED = False  # Answer the app's predictions from LOOKUP_TABLE_PATH (build it first with --build)
+LOOKUP_TABLE_PATH = os.path.join(os.path.dirname(PIPELINE_PATH), "house_pricing_lookup.npz")
+LOOKUP_SIZE_STEP = 1  # m² between grid points on the size axis (>1 interpolates linearly: smaller, less exact)
+LOOKUP_SIZE_RANGE = (10, 1000)
+LOOKUP_ROOMS_RANGE = (1, 20)
+LOOKUP_BATHROOMS_RANGE = (1, 10)
+
+# Comparable listings (comparables.py): nearest real listings of merged.csv
+COMPARABLES_INDEX_PATH = os.path.join(os.path.dirname(PIPELINE_PATH), "house_pricing_comparables.joblib")
+COMPARABLES_K = 5  # Listings shown after a prediction
+
+# Market insights (insights.py): curves and region valuations precomputed per pipeline
+INSIGHTS_STANDARD_PROPERTY = (100, 3, 2)  # Size (m²), rooms and bathrooms valued in every region
+INSIGHTS_SIZE_RANGE = (40, 300, 10)  # Sizes (first, last, step) of the price-vs-size curves
+INSIGHTS_ROOMS_RANGE = (1, 8)  # Room counts of the price-vs-rooms curves
+INSIGHTS_MAP_TILES = "OpenStreetMap"  # folium tile provider of the region map (CartoDB tiles now need an API key)
+
+# Prediction intervals (conformal.py): residual quantiles of the held-out listings, stored at export
+PREDICTION_INTERVAL_LEVEL = 0.9  # Coverage of the range shown with each prediction (one of CONFORMAL_LEVELS)
+CONFORMAL_LEVELS = (0.8, 0.9, 0.95)  # Levels tabulated in the artifact
+CONFORMAL_MIN_STRATUM = 30  # Held-out residuals a city x tier stratum needs (else the city's, then all cities')
+
+# Prediction explanations (explain.py): per-input attribution of the champion model
+EXPLAIN_BUDGET_MS = 250  # Time budget of one explanation (background-sampled members stop early)
+EXPLAIN_BACKGROUND_SIZE = 64  # Reference listings of the background sample (stored at export)
+EXPLAIN_CACHE_MAX_ENTRIES = 256  # Explanations kept in memory
+
+# Distilled student model (distill.py): one compact model trained on the champion's predictions
+CHAMPION_MODEL = "ensemble"  # "ensemble" (the exported champion) or "student" (its distilled student, when exported)
+DISTILL_SYNTHETIC_SIZE = 20000  # Synthetic listings added to the real training listings
+DISTILL_STUDENT_PARAMS = {'n_estimators': 300, 'max_depth': None, 'max_leaf_nodes': 64, 'learning_rate': 0.1,
+                          'subsample': 0.8, 'random_state': 42}
+DISTILL_MAX_R2_DROP = 0.01  # Export fails if the student's held-out R² is lower than the champion's by more
+DISTILL_MAX_MAE_INCREASE = 0.05  # ... or its held-out MAE higher by more than this fraction
+
+# Region names of requests are mapped onto the trained regions of their city (regions.py)
+REGION_MATCH_MIN_SIMILARITY = 0.7  # Trigram similarity (0-1) a misspelled region needs to be corrected
+
 
 # Supported Cities
 CITIES = ["Tunis", "Ariana", "Ben Arous", "La Manouba"]
@@ -12,7 +86,16 @@ CITIES = ["Tunis", "Ariana", "Ben Arous", "La Manouba"]
 # App Configuration
 APP_TITLE = " Tunisia House Price Predictor"
 APP_ICON = ""
-MAX_HISTORY_SIZE = 100  # Maximum number of predictions to keep in history
+MAX_HISTORY_SIZE = None  # Predictions kept per browser in the history store (None = unlimited)
+HISTORY_MAX_ROWS = 1000000  # Predictions kept in the history store across sessions (oldest deleted beyond it)
+HISTORY_DB_PATH = os.path.join(os.path.dirname(__file__), ".cache", "history.sqlite")  # Persistent prediction history
+HISTORY_PAGE_SIZE = 50  # Rows per page in the History tab
+
+# Charts (charts.py)
+CHART_WEBGL_THRESHOLD = 1000  # Scatter plots use WebGL instead of SVG above this many points
+CHART_MAX_POINTS = 20000  # Larger histories are drawn as hexagonal bins of size × price per city
+CHART_HEXBIN_GRIDSIZE = 40  # Hexagons across the size axis
+CHART_CACHE_MAX_ENTRIES = 32  # Figures kept as JSON, keyed on a fingerprint of their data
 
 # Visualization Colors
 CHART_COLORS = {
@@ -27,6 +110,31 @@ CHART_COLORS = {
 CURRENCY = "K TND"
 CURRENCY_SYMBOL = "د.ت"
 
+# Prediction Cache (cache.py)
+CACHE_MAX_ENTRIES = 1024  # In-memory entries
+CACHE_POLICY = "lru"  # In-memory eviction policy: "lru" or "fifo"
+CACHE_DISK_PATH = None  # SQLite file for the persistent tier, e.g. os.path.join(os.path.dirname(__file__), ".cache", "predictions.sqlite")
+CACHE_DISK_MAX_ENTRIES = 100000
+
+# Inference Service (server.py)
+SERVER_HOST = "0.0.0.0"
+SERVER_PORT = 8080
+BATCH_WINDOW_MS = 5  # How long concurrent requests are collected into one batch
+MAX_BATCH_SIZE = 256  # A batch is scored early once this many listings are waiting
+
+# Prediction Metrics (metrics.py)
+METRICS_ENABLED = False  # Per-stage timings and outcome counters for predict_price / predict_prices
+METRICS_PATH = None  # Prometheus text file rewritten periodically, e.g. "/var/lib/node_exporter/house_price.prom"
+METRICS_FILE_INTERVAL = 15  # Seconds between rewrites of METRICS_PATH
+
+# Input Drift Monitor (drift.py)
+DRIFT_MONITOR_ENABLED = True  # Drift monitor thread in the app and server.py (batch workers and CLIs never run one)
+DRIFT_QUEUE_SIZE = 10000  # Queued predictions (single or batch) before new ones are dropped, never waited for
+DRIFT_WINDOW_SIZE = 5000  # Live listings per city per window; scores cover the last one to two windows
+DRIFT_DIGEST_COMPRESSION = 100  # Centroids per quantile digest (memory vs accuracy)
+DRIFT_MIN_SAMPLES = 200  # Live listings a city needs before it can alert
+DRIFT_ALERT_THRESHOLD = 0.2  # Score (KS distance, share difference, total variation) that raises an alert
+
 # Default Values
 DEFAULT_CITY = "Tunis"
 DEFAULT_REGION = "Autres Villes"  # Capitalized for display
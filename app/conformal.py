@@ -0,0 +1,282 @@
+"""
+Prediction intervals from precomputed conformal residual tables.
+
+Split conformal calibration, done once when a pipeline is exported: the
+held-out listings of merged.csv (the 20% test split of train.py / the v2
+notebook) are priced through the request path and the quantiles of their
+log-price residuals are stored in the artifact under 'conformal_intervals'.
+Each listing is priced as listed ('given' region, or imputed when it is
+'autres villes') and, when its region is known, again with the region left to
+the KNN imputer ('imputed'), since imputation adds its own error.
+
+Residuals are stratified by region source x city x tier (the tier the request
+path assigns). A stratum with too few residuals for a level falls back to the
+city, then to every city. At request time an interval is a dict lookup and
+two multiplications, price x exp(lower offset) and price x exp(upper offset),
+in predict_price, predict_prices, the compiled path and the lookup table.
+
+Usage:
+    python conformal.py --calibrate     # add the table to the pipeline at PIPELINE_PATH (notebook exports)
+    python conformal.py --report        # coverage per city on the held-out listings, in-sample and cross-fitted
+"""
+import argparse
+import math
+import os
+
+import numpy as np
+import pandas as pd
+
+from config import CONFORMAL_LEVELS, CONFORMAL_MIN_STRATUM, PREDICTION_INTERVAL_LEVEL, TRAINING_DATA_PATH
+
+LISTING_COLUMNS = ['city', 'region', 'size', 'room_count', 'bathroom_count']
+
+
+def conformal_offsets(residuals, level):
+    """
+    Lower and upper offsets covering `level` of future residuals (each tail
+    gets half the miss rate, with the finite-sample correction of split
+    conformal prediction).
+
+    Returns:
+    --------
+    (lower, upper), or None when there are too few residuals for this level
+    """
+    residuals = np.sort(np.asarray(residuals, dtype=float))
+    n = len(residuals)
+    tail = (1 - level) / 2
+    low_rank = math.floor((n + 1) * tail)
+    high_rank = math.ceil((n + 1) * (1 - tail))
+    if low_rank < 1 or high_rank > n:
+        return None
+    return float(residuals[low_rank - 1]), float(residuals[high_rank - 1])
+
+
+def request_features(pipeline, listings):
+    """
+    Model feature rows the request path builds for listings (imputed regions,
+    request-time tiers), as the champion model receives them.
+
+    Parameters:
+    -----------
+    listings : pd.DataFrame - LISTING_COLUMNS (lowercase city/region)
+    """
+    from utils import predict_prices, request_tiers
+
+    predictions = predict_prices(listings[LISTING_COLUMNS], pipeline=pipeline)
+    size = listings['size'].to_numpy(dtype=float)
+    room_count = listings['room_count'].to_numpy(dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        avg_room_size = np.where(room_count > 0, size / room_count, 0)
+    return pd.DataFrame({
+        'city': listings['city'].to_numpy(),
+        'region': predictions['imputed_region'].to_numpy(),
+        'tier': request_tiers(pipeline, listings['city'], size, room_count, listings['bathroom_count']),
+        'size': size,
+        'room_count': room_count,
+        'bathroom_count': listings['bathroom_count'].to_numpy(dtype=float),
+        'avg_room_size': avg_room_size,
+    })
+
+
+def calibrate(pipeline, listings, levels=CONFORMAL_LEVELS, min_stratum=CONFORMAL_MIN_STRATUM):
+    """
+    Residual table of a pipeline from held-out listings.
+
+    Parameters:
+    -----------
+    pipeline : dict - Pipeline artifact (need not be the loaded one)
+    listings : pd.DataFrame - Held-out rows with LISTING_COLUMNS and price (lowercase city/region)
+    levels : tuple - Coverage levels to tabulate
+    min_stratum : int - Residuals a city x tier stratum needs before it is stored
+
+    Returns:
+    --------
+    dict - 'conformal_intervals' entry of the artifact
+    """
+    from utils import predict_prices, request_tiers
+
+    listings = listings.dropna(subset=LISTING_COLUMNS + ['price']).reset_index(drop=True)
+    known = listings[listings['region'] != 'autres villes']
+    variants = [listings, known.assign(region='autres villes')]
+    sources = [np.where(listings['region'] == 'autres villes', 'imputed', 'given'), np.full(len(known), 'imputed')]
+
+    frames = []
+    for variant, source in zip(variants, sources):
+        predictions = predict_prices(variant[LISTING_COLUMNS], pipeline=pipeline)
+        frames.append(pd.DataFrame({
+            'source': source,
+            'city': variant['city'].to_numpy(),
+            'tier': request_tiers(pipeline, variant['city'], variant['size'], variant['room_count'],
+                                  variant['bathroom_count']),
+            'residual': np.log1p(variant['price'].to_numpy()) - np.log1p(predictions['estimated_price_tnd'].to_numpy()),
+        }))
+    scores = pd.concat(frames, ignore_index=True)
+
+    strata = {}
+    groupings = [['source', 'city', 'tier'], ['source', 'city'], ['source']]
+    for columns in groupings:
+        for key, group in scores.groupby(columns):
+            key = tuple(key) + (None,) * (3 - len(columns))
+            key = (key[0], key[1], None if key[2] is None else int(key[2]))
+            if len(group) < min_stratum and len(columns) > 1:
+                continue
+            strata[key] = {
+                'n': len(group),
+                'offsets': {level: conformal_offsets(group['residual'], level) for level in levels},
+            }
+    return {'levels': list(levels), 'min_stratum': min_stratum, 'n_listings': len(listings), 'strata': strata}
+
+
+def holdout_rows(df):
+    """
+    Rows of the 20% test split of train.py (the v2 notebook's split) as listed.
+
+    Stages 2-3 of train.py keep the rows of load_training_data and their order,
+    so splitting the positions of its frame selects the same listings.
+    """
+    from sklearn.model_selection import train_test_split
+
+    _, test_positions = train_test_split(np.arange(len(df)), test_size=0.2, random_state=42)
+    return df.iloc[np.sort(test_positions)][LISTING_COLUMNS + ['price']]
+
+
+def holdout_listings(data_path=TRAINING_DATA_PATH):
+    """Held-out listings of merged.csv (see holdout_rows)"""
+    from train import load_training_data
+
+    return holdout_rows(load_training_data(data_path))
+
+
+def _offsets(table, source, city, tier, level):
+    """Offsets of the most specific stratum that has them for level"""
+    strata = table['strata']
+    for key in ((source, city, tier), (source, city, None), (source, None, None)):
+        stratum = strata.get(key)
+        if stratum is not None and stratum['offsets'].get(level) is not None:
+            return stratum['offsets'][level]
+    return None
+
+
+def interval(table, estimated_price, city, tier, imputed, level=PREDICTION_INTERVAL_LEVEL):
+    """
+    (low, high) price interval of one prediction, or (None, None) without a table.
+
+    Parameters:
+    -----------
+    table : dict - 'conformal_intervals' of the artifact (None when it has none)
+    estimated_price : float - Model estimate (K TND)
+    city : str - Lowercase city
+    tier : int - Tier the request path assigned
+    imputed : bool - The region was imputed ('autres villes')
+    """
+    if table is None:
+        return None, None
+    offsets = _offsets(table, 'imputed' if imputed else 'given', city, int(tier), level)
+    if offsets is None:
+        return None, None
+    return round(estimated_price * math.exp(offsets[0]), 2), round(estimated_price * math.exp(offsets[1]), 2)
+
+
+def intervals(table, estimated_price, cities, tiers, imputed, level=PREDICTION_INTERVAL_LEVEL):
+    """
+    Vectorized interval: one lookup per distinct (region source, city, tier).
+
+    Returns:
+    --------
+    (low, high) float arrays (NaN without a table or offsets)
+    """
+    estimated_price = np.asarray(estimated_price, dtype=float)
+    low = np.full(len(estimated_price), np.nan)
+    high = np.full(len(estimated_price), np.nan)
+    if table is None or not len(estimated_price):
+        return low, high
+
+    keys = pd.DataFrame({'imputed': np.asarray(imputed, dtype=bool), 'city': np.asarray(cities, dtype=object),
+                         'tier': np.asarray(tiers, dtype=np.int64)})
+    for (is_imputed, city, tier), positions in keys.groupby(['imputed', 'city', 'tier']).indices.items():
+        offsets = _offsets(table, 'imputed' if is_imputed else 'given', city, int(tier), level)
+        if offsets is not None:
+            low[positions] = estimated_price[positions] * math.exp(offsets[0])
+            high[positions] = estimated_price[positions] * math.exp(offsets[1])
+    return np.round(low, 2), np.round(high, 2)
+
+
+def _coverage(pipeline, listings):
+    """Per-listing frame: city, whether the price is inside its interval and the relative interval width"""
+    from utils import predict_prices
+
+    predictions = predict_prices(listings[LISTING_COLUMNS], pipeline=pipeline)
+    if predictions['price_low_tnd'].isna().all():
+        raise ValueError("The pipeline has no conformal_intervals table (run --calibrate first)")
+    inside = (listings['price'] >= predictions['price_low_tnd']) & (listings['price'] <= predictions['price_high_tnd'])
+    width = (predictions['price_high_tnd'] - predictions['price_low_tnd']) / predictions['estimated_price_tnd']
+    return pd.DataFrame({'city': listings['city'], 'inside': inside, 'relative_width': width})
+
+
+def _by_city(report):
+    by_city = report.groupby('city').agg(listings=('inside', 'size'), coverage=('inside', 'mean'),
+                                         median_relative_width=('relative_width', 'median'))
+    by_city.loc['all'] = [len(report), report['inside'].mean(), report['relative_width'].median()]
+    return by_city
+
+
+def coverage_report(pipeline, listings):
+    """
+    Share of listings whose price falls inside their interval, per city and overall.
+
+    On the calibration listings themselves this is an in-sample check of the
+    table (close to PREDICTION_INTERVAL_LEVEL by construction), not an independent
+    estimate: see cross_fitted_coverage.
+    """
+    listings = listings.dropna(subset=LISTING_COLUMNS + ['price']).reset_index(drop=True)
+    return _by_city(_coverage(pipeline, listings))
+
+
+def cross_fitted_coverage(pipeline, listings, folds=5, seed=42):
+    """
+    Out-of-sample coverage_report: the listings are split into `folds` folds and
+    each fold is scored with a table calibrated on the other folds only.
+    """
+    from sklearn.model_selection import KFold
+
+    listings = listings.dropna(subset=LISTING_COLUMNS + ['price']).reset_index(drop=True)
+    reports = []
+    for calibration, evaluation in KFold(folds, shuffle=True, random_state=seed).split(listings):
+        table = calibrate(pipeline, listings.iloc[calibration])
+        reports.append(_coverage(dict(pipeline, conformal_intervals=table),
+                                 listings.iloc[evaluation].reset_index(drop=True)))
+    return _by_city(pd.concat(reports, ignore_index=True))
+
+
+def main(argv=None):
+    import joblib
+
+    from config import PIPELINE_PATH
+
+    parser = argparse.ArgumentParser(description="Conformal prediction intervals")
+    parser.add_argument('--calibrate', action='store_true', help="Add the residual table to the pipeline artifact")
+    parser.add_argument('--report', action='store_true', help="Coverage per city on the held-out listings")
+    parser.add_argument('--folds', type=int, default=5, help="Folds of the cross-fitted coverage in --report")
+    parser.add_argument('--pipeline', default=PIPELINE_PATH)
+    parser.add_argument('--data', default=TRAINING_DATA_PATH)
+    args = parser.parse_args(argv)
+
+    pipeline = joblib.load(args.pipeline)
+    listings = holdout_listings(args.data)
+    if args.calibrate:
+        pipeline['conformal_intervals'] = calibrate(pipeline, listings)
+        if 'stale_tables' in pipeline:
+            pipeline['stale_tables'] = [name for name in pipeline['stale_tables'] if name != 'conformal_intervals']
+        joblib.dump(pipeline, args.pipeline + '.tmp')
+        os.replace(args.pipeline + '.tmp', args.pipeline)
+        strata = pipeline['conformal_intervals']['strata']
+        print(f"Calibrated on {len(listings)} held-out listings: {len(strata)} strata -> {args.pipeline}")
+    if args.report:
+        print(f"Coverage of the {PREDICTION_INTERVAL_LEVEL:.0%} intervals (in-sample for the calibration listings):")
+        print(coverage_report(pipeline, listings).to_string(float_format=lambda value: f"{value:.3f}"))
+        print(f"\nCross-fitted ({args.folds} folds, each scored with a table calibrated on the others):")
+        print(cross_fitted_coverage(pipeline, listings, args.folds).to_string(float_format=lambda value: f"{value:.3f}"))
+
+
+if __name__ == "__main__":
+    main()
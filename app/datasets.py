@@ -0,0 +1,185 @@
+"""
+Columnar access to the project's CSV datasets.
+
+Each dataset is converted once to Parquet with an explicit schema (city,
+region, category and type as categoricals, numeric columns as float32) under
+PARQUET_CACHE_DIR. The Parquet file records the fingerprint of the CSV it was
+converted from and of the schema, so it is rebuilt only when either changes
+(the CSV is hashed once per process, then again only if its mtime or size changes).
+Loads read only the requested columns and push filters down to the Parquet
+reader:
+
+    from datasets import load_dataset
+    df = load_dataset('merged', columns=['size', 'price'], filters=[('city', '=', 'Tunis')])
+
+Values are the CSV's as written (e.g. 'Tunis', not 'tunis'). float32 keeps about
+7 significant digits, enough for prices in thousands of TND and sizes in m²;
+train.py keeps reading merged.csv with pandas so retraining stays bit-exact.
+
+Usage:
+    python datasets.py --convert          # convert (or refresh) every dataset
+    python datasets.py --report           # load time and memory vs pd.read_csv
+"""
+import argparse
+import hashlib
+import os
+import time
+
+from config import DATA_DIR, PARQUET_CACHE_DIR
+from utils import file_fingerprint
+
+# name -> CSV path relative to DATA_DIR
+DATASETS = {
+    'properties_raw': os.path.join("raw", "source_1", "Property-Prices-in-Tunisia.csv"),
+    'apartments_source_1': os.path.join("processed", "source_1", "apartments_cleaned.csv"),
+    'apartments_source_2': os.path.join("processed", "source_2", "processed_apartment_data.csv"),
+    'merged': os.path.join("processed", "merged.csv"),
+}
+CATEGORICAL_COLUMNS = ['category', 'type', 'city', 'region']
+NUMERIC_COLUMNS = ['room_count', 'bathroom_count', 'size', 'price', 'log_price']
+ROW_GROUP_SIZE = 64 * 1024
+
+# name -> (CSV mtime, size) already checked against its Parquet file in this process
+_verified = {}
+
+
+def dataset_path(name):
+    if name not in DATASETS:
+        raise ValueError(f"Unknown dataset: {name} (expected one of {', '.join(DATASETS)})")
+    return os.path.join(DATA_DIR, DATASETS[name])
+
+
+def parquet_path(name):
+    return os.path.join(PARQUET_CACHE_DIR, f"{name}.parquet")
+
+
+def dataset_schema(csv_path):
+    """Arrow schema for a CSV: its header columns with categorical strings and float32 numerics"""
+    import pyarrow as pa
+
+    with open(csv_path, encoding='utf-8') as f:
+        header = f.readline().strip().split(',')
+    fields = []
+    for column in header:
+        if column in CATEGORICAL_COLUMNS:
+            fields.append(pa.field(column, pa.dictionary(pa.int32(), pa.string())))
+        elif column in NUMERIC_COLUMNS:
+            fields.append(pa.field(column, pa.float32()))
+        else:
+            raise ValueError(f"{csv_path}: no schema for column '{column}'")
+    return pa.schema(fields)
+
+
+def _source_key(csv_path, schema):
+    """Fingerprint of the CSV contents and of the target schema"""
+    return f"{file_fingerprint(csv_path)}-{hashlib.sha256(str(schema).encode()).hexdigest()[:8]}"
+
+
+def convert_dataset(name, force=False):
+    """
+    Convert a dataset to Parquet unless an up-to-date conversion exists.
+
+    Returns:
+    --------
+    (parquet path, True if it was (re)converted)
+    """
+    import pyarrow.csv as pv
+    import pyarrow.parquet as pq
+
+    csv_path, output_path = dataset_path(name), parquet_path(name)
+    stat = os.stat(csv_path)
+    if not force and _verified.get(name) == (stat.st_mtime_ns, stat.st_size) and os.path.exists(output_path):
+        return output_path, False
+
+    schema = dataset_schema(csv_path)
+    key = _source_key(csv_path, schema)
+    if not force and os.path.exists(output_path):
+        metadata = pq.read_schema(output_path).metadata or {}
+        if metadata.get(b'source_key') == key.encode():
+            _verified[name] = (stat.st_mtime_ns, stat.st_size)
+            return output_path, False
+
+    table = pv.read_csv(csv_path, convert_options=pv.ConvertOptions(column_types=schema))
+    table = table.replace_schema_metadata({'source_key': key, 'source_csv': DATASETS[name]})
+    os.makedirs(PARQUET_CACHE_DIR, exist_ok=True)
+    pq.write_table(table, output_path + '.tmp', row_group_size=ROW_GROUP_SIZE)
+    os.replace(output_path + '.tmp', output_path)
+    _verified[name] = (stat.st_mtime_ns, stat.st_size)
+    return output_path, True
+
+
+def load_table(name, columns=None, filters=None):
+    """
+    Read a dataset as an Arrow table.
+
+    Parameters:
+    -----------
+    name : str - Key of DATASETS
+    columns : list - Columns to read (default: all)
+    filters : list or pyarrow.compute.Expression - Row predicate pushed down to the reader,
+              e.g. [('city', '=', 'Tunis'), ('size', '>', 50)]
+    """
+    import pyarrow.parquet as pq
+
+    path, _ = convert_dataset(name)
+    return pq.read_table(path, columns=columns, filters=filters)
+
+
+def load_dataset(name, columns=None, filters=None):
+    """load_table as a pandas DataFrame (categorical columns become pandas categoricals)"""
+    return load_table(name, columns, filters).to_pandas()
+
+
+def report(repeat=5):
+    """
+    Load time and memory of pd.read_csv against the Parquet loader for every dataset.
+
+    Returns:
+    --------
+    list of dicts
+    """
+    import pandas as pd
+
+    def best_time(load):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            df = load()
+            timings.append(time.perf_counter() - start)
+        return min(timings) * 1000, df.memory_usage(deep=True).sum() / 1024 ** 2
+
+    rows = []
+    for name in DATASETS:
+        convert_dataset(name)
+        csv_path = dataset_path(name)
+        variants = [
+            ('pd.read_csv', lambda: pd.read_csv(csv_path)),
+            ('parquet', lambda: load_dataset(name)),
+            ("parquet, city == 'Tunis', 3 columns",
+             lambda: load_dataset(name, columns=['size', 'room_count', 'price'], filters=[('city', '=', 'Tunis')])),
+        ]
+        for variant, load in variants:
+            load_ms, memory_mb = best_time(load)
+            rows.append({'dataset': name, 'loader': variant, 'load_ms': load_ms, 'memory_mb': memory_mb})
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Parquet conversion of the project datasets")
+    parser.add_argument('--convert', action='store_true', help="Convert every dataset (skips up-to-date ones)")
+    parser.add_argument('--force', action='store_true', help="Reconvert even when up to date")
+    parser.add_argument('--report', action='store_true', help="Compare load time and memory with pd.read_csv")
+    args = parser.parse_args(argv)
+
+    if args.convert or args.force:
+        for name in DATASETS:
+            path, converted = convert_dataset(name, force=args.force)
+            print(f"{name:<20} {'converted' if converted else 'up to date':<11} {path}")
+    if args.report:
+        print(f"{'dataset':<20} {'loader':<38} {'load (ms)':>10} {'memory (MB)':>12}")
+        for row in report():
+            print(f"{row['dataset']:<20} {row['loader']:<38} {row['load_ms']:>10.2f} {row['memory_mb']:>12.3f}")
+
+
+if __name__ == "__main__":
+    main()
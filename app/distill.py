@@ -0,0 +1,255 @@
+"""
+Distilled student model: a compact alternate champion.
+
+The exported champion is an ensemble (Stacking_Ensemble evaluates Ridge,
+RandomForest and GradientBoosting plus a Ridge meta-learner on every prediction). distill() trains one
+GradientBoostingRegressor, in the same (preprocessor, model) Pipeline as the
+base models, on the champion's own predictions over:
+
+- the training listings of merged.csv (the 80% split), and
+- DISTILL_SYNTHETIC_SIZE synthetic listings drawn around them (sizes, rooms and
+  bathrooms jittered, half of them with the region left to the KNN imputer),
+  so the student also matches the champion between the real listings.
+
+Features are built through the request path (imputed regions, request-time
+tiers), as the app feeds them. Both models are then scored on the held-out 20%
+split against the real prices; the export fails if the student's R² drops by
+more than DISTILL_MAX_R2_DROP or its MAE grows by more than
+DISTILL_MAX_MAE_INCREASE.
+
+The student is stored next to the champion ('student_model', with its own
+conformal table) and served instead of it with CHAMPION_MODEL = "student" in
+config.py.
+
+Usage:
+    python distill.py                   # add a student to the pipeline at PIPELINE_PATH
+    python distill.py --benchmark       # latency and memory of the champion vs the stored student
+"""
+import argparse
+import json
+import os
+import pickle
+import time
+
+import numpy as np
+import pandas as pd
+
+from config import (DISTILL_MAX_MAE_INCREASE, DISTILL_MAX_R2_DROP, DISTILL_STUDENT_PARAMS, DISTILL_SYNTHETIC_SIZE,
+                    LOOKUP_BATHROOMS_RANGE, LOOKUP_ROOMS_RANGE, LOOKUP_SIZE_RANGE, TRAINING_DATA_PATH)
+from conformal import LISTING_COLUMNS, calibrate, request_features
+
+STUDENT_NAME = 'Distilled_GradientBoosting'
+
+
+def synthetic_listings(listings, n, seed=42):
+    """
+    Listings drawn around real ones: size scaled by a log-normal factor (about ±25%),
+    rooms and bathrooms moved by up to one, and every other region left to the imputer.
+    """
+    from utils import get_available_regions
+
+    rng = np.random.default_rng(seed)
+    base = listings.iloc[rng.integers(len(listings), size=n)].reset_index(drop=True)
+    synthetic = pd.DataFrame({
+        'city': base['city'],
+        'size': np.clip(np.round(base['size'] * np.exp(rng.normal(0, 0.25, n))), *LOOKUP_SIZE_RANGE),
+        'room_count': np.clip(base['room_count'] + rng.integers(-1, 2, n), *LOOKUP_ROOMS_RANGE),
+        'bathroom_count': np.clip(base['bathroom_count'] + rng.integers(-1, 2, n), *LOOKUP_BATHROOMS_RANGE),
+    })
+    regions = {city: [region.lower() for region in get_available_regions(city)] for city in synthetic['city'].unique()}
+    synthetic['region'] = [regions[city][rng.integers(len(regions[city]))] if rng.random() < 0.5 else 'autres villes'
+                           for city in synthetic['city']]
+    return synthetic[LISTING_COLUMNS]
+
+
+def distill(pipeline, data_path=TRAINING_DATA_PATH, n_synthetic=DISTILL_SYNTHETIC_SIZE,
+            max_r2_drop=DISTILL_MAX_R2_DROP, max_mae_increase=DISTILL_MAX_MAE_INCREASE, verbose=True):
+    """
+    Train the student of a pipeline's champion and check it on the held-out listings.
+
+    Parameters:
+    -----------
+    pipeline : dict - Pipeline artifact (its champion_model is the teacher)
+    data_path : str - merged.csv
+    n_synthetic : int - Synthetic listings added to the real training listings
+    max_r2_drop : float - Largest accepted drop of held-out R² (log prices)
+    max_mae_increase : float - Largest accepted relative increase of held-out MAE (prices)
+
+    Returns:
+    --------
+    (student Pipeline, report dict with the held-out scores of both models)
+
+    Raises:
+    -------
+    ValueError - The student degrades held-out R² or MAE beyond the tolerances
+    """
+    from sklearn.ensemble import GradientBoostingRegressor
+    from sklearn.model_selection import train_test_split
+    from sklearn.pipeline import Pipeline
+
+    from train import evaluate, load_training_data, make_preprocessor
+
+    def log(message):
+        if verbose:
+            print(f"[{time.strftime('%H:%M:%S')}] {message}")
+
+    start = time.perf_counter()
+    listings = load_training_data(data_path).dropna(subset=LISTING_COLUMNS + ['price']).reset_index(drop=True)
+    # Same split as train.py and conformal.holdout_rows
+    train_positions, test_positions = train_test_split(np.arange(len(listings)), test_size=0.2, random_state=42)
+    train_listings = listings.iloc[np.sort(train_positions)].reset_index(drop=True)
+    test_listings = listings.iloc[np.sort(test_positions)].reset_index(drop=True)
+
+    # 1. Teacher labels on real and synthetic inputs
+    teacher = pipeline['champion_model']
+    frames = [request_features(pipeline, train_listings[LISTING_COLUMNS])]
+    if n_synthetic > 0:
+        frames.append(request_features(pipeline, synthetic_listings(train_listings, n_synthetic)))
+    X_distill = pd.concat(frames, ignore_index=True)
+    y_distill = teacher.predict(X_distill)
+    log(f"Teacher labels: {len(train_listings)} real + {n_synthetic} synthetic listings")
+
+    # 2. Student
+    student = Pipeline([('prep', make_preprocessor()),
+                        ('model', GradientBoostingRegressor(**DISTILL_STUDENT_PARAMS))]).fit(X_distill, y_distill)
+    log(f"Student fitted in {time.perf_counter() - start:.0f}s")
+
+    # 3. Accuracy guard on the held-out listings (real prices)
+    X_test = request_features(pipeline, test_listings[LISTING_COLUMNS])
+    y_test = np.log1p(test_listings['price'].to_numpy())
+    teacher_results = evaluate(teacher, X_test, y_test)
+    student_results = evaluate(student, X_test, y_test)
+    teacher_log_prices = teacher.predict(X_test)
+    fidelity = 1 - (np.sum((student.predict(X_test) - teacher_log_prices) ** 2)
+                    / np.sum((teacher_log_prices - teacher_log_prices.mean()) ** 2))
+    report = {
+        'teacher_name': pipeline['champion_name'],
+        'student_name': STUDENT_NAME,
+        'holdout_listings': len(test_listings),
+        'distill_listings': len(X_distill),
+        'teacher_r2': float(teacher_results['R2_Test']),
+        'student_r2': float(student_results['R2_Test']),
+        'teacher_mae': float(teacher_results['MAE']),
+        'student_mae': float(student_results['MAE']),
+        'fidelity_r2': float(fidelity),
+        'max_r2_drop': max_r2_drop,
+        'max_mae_increase': max_mae_increase,
+        'fit_seconds': time.perf_counter() - start,
+    }
+    log(f"Held-out R² {report['teacher_r2']:.4f} -> {report['student_r2']:.4f}, "
+        f"MAE {report['teacher_mae']:.2f} -> {report['student_mae']:.2f} (fidelity R² {fidelity:.4f})")
+
+    if report['teacher_r2'] - report['student_r2'] > max_r2_drop:
+        raise ValueError(f"Student R² {report['student_r2']:.4f} is more than {max_r2_drop} below the "
+                         f"champion's {report['teacher_r2']:.4f}")
+    if report['student_mae'] > report['teacher_mae'] * (1 + max_mae_increase):
+        raise ValueError(f"Student MAE {report['student_mae']:.2f} is more than {max_mae_increase:.0%} above the "
+                         f"champion's {report['teacher_mae']:.2f}")
+    return student, report
+
+
+def add_student(pipeline, data_path=TRAINING_DATA_PATH, max_r2_drop=DISTILL_MAX_R2_DROP,
+                max_mae_increase=DISTILL_MAX_MAE_INCREASE, verbose=True):
+    """
+    Distill the champion of `pipeline` and store the student in it (in place).
+
+    Returns:
+    --------
+    dict - The distillation report (also stored as pipeline['student_results'])
+    """
+    from conformal import holdout_listings
+
+    student, report = distill(pipeline, data_path, max_r2_drop=max_r2_drop, max_mae_increase=max_mae_increase,
+                              verbose=verbose)
+    pipeline['student_model'] = student
+    pipeline['student_name'] = STUDENT_NAME
+    pipeline['student_results'] = report
+    # Prediction intervals of the student's own residuals
+    pipeline['student_conformal_intervals'] = calibrate(dict(pipeline, champion_model=student),
+                                                        holdout_listings(data_path))
+    return report
+
+
+def add_student_metadata(metadata, report):
+    """pipeline_metadata.json fields of the student (held-out scores through the request path)"""
+    return dict(metadata, student_model_name=report['student_name'], student_r2=report['student_r2'],
+                student_mae=report['student_mae'], student_teacher_r2=report['teacher_r2'],
+                student_teacher_mae=report['teacher_mae'])
+
+
+def benchmark(pipeline, n_single=300, n_batch=10000, seed=42):
+    """
+    Latency and size of the champion and its student.
+
+    Single: one predict_price-shaped call (1-row frame) of the model, median over
+    n_single listings. Batch: predict_prices over n_batch listings.
+
+    Returns:
+    --------
+    pd.DataFrame indexed by model
+    """
+    from compiled import _random_listings
+    from utils import predict_prices
+
+    listings = pd.DataFrame(_random_listings(n_batch, seed), columns=['city', 'size', 'room_count',
+                                                                       'bathroom_count', 'region'])
+    features = request_features(pipeline, listings)
+    rows = []
+    for name, model in [(pipeline['champion_name'], pipeline['champion_model']),
+                        (pipeline['student_name'], pipeline['student_model'])]:
+        served = dict(pipeline, champion_model=model)
+        model.predict(features.iloc[:1])
+        single = []
+        for i in range(n_single):
+            row = features.iloc[i:i + 1]
+            start = time.perf_counter()
+            model.predict(row)
+            single.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        predict_prices(listings, pipeline=served)
+        batch_seconds = time.perf_counter() - start
+        rows.append({'model': name, 'single_ms': 1000 * float(np.median(single)),
+                     'batch_rows_per_s': n_batch / batch_seconds, 'size_mb': len(pickle.dumps(model)) / 1024 ** 2})
+    report = pd.DataFrame(rows).set_index('model')
+    report.loc['speedup / reduction'] = [report['single_ms'].iloc[0] / report['single_ms'].iloc[1],
+                                         report['batch_rows_per_s'].iloc[1] / report['batch_rows_per_s'].iloc[0],
+                                         report['size_mb'].iloc[0] / report['size_mb'].iloc[1]]
+    return report
+
+
+def main(argv=None):
+    import joblib
+
+    from config import PIPELINE_PATH
+
+    parser = argparse.ArgumentParser(description="Distill the champion into a compact student model")
+    parser.add_argument('--pipeline', default=PIPELINE_PATH)
+    parser.add_argument('--data', default=TRAINING_DATA_PATH)
+    parser.add_argument('--max-r2-drop', type=float, default=DISTILL_MAX_R2_DROP)
+    parser.add_argument('--max-mae-increase', type=float, default=DISTILL_MAX_MAE_INCREASE)
+    parser.add_argument('--benchmark', action='store_true', help="Only compare the champion and the stored student")
+    args = parser.parse_args(argv)
+
+    pipeline = joblib.load(args.pipeline)
+    if not args.benchmark:
+        try:
+            report = add_student(pipeline, args.data, args.max_r2_drop, args.max_mae_increase)
+        except ValueError as e:
+            raise SystemExit(f"Distillation rejected, {args.pipeline} unchanged: {e}")
+        joblib.dump(pipeline, args.pipeline + '.tmp')
+        os.replace(args.pipeline + '.tmp', args.pipeline)
+        metadata_path = os.path.join(os.path.dirname(args.pipeline), 'pipeline_metadata.json')
+        if os.path.exists(metadata_path):
+            with open(metadata_path, encoding='utf-8') as f:
+                metadata = add_student_metadata(json.load(f), report)
+            with open(metadata_path, 'w', encoding='utf-8') as f:
+                json.dump(metadata, f, indent=2)
+        print(f"Stored {STUDENT_NAME} in {args.pipeline}")
+
+    if 'student_model' not in pipeline:
+        raise SystemExit(f"{args.pipeline} has no student model (run python distill.py first)")
+    print(benchmark(pipeline).to_string(float_format=lambda value: f"{value:,.2f}"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,466 @@
+"""
+Input drift monitor on the prediction stream.
+
+Every prediction served (predict_price in both modes, predict_prices on the
+active pipeline, prediction cache and lookup table hits) queues its city,
+size, rooms, bathrooms, whether the region had to be imputed and the
+estimated price. The hot path only appends to a bounded queue: when it is full
+the prediction is dropped from the monitor (and counted), never delayed.
+
+A background thread drains the queue in batches, assigns the virtual_region
+the request path used (utils.request_virtual_regions) and folds the rows
+into fixed-size sketches per city:
+
+- a QuantileDigest of size, room_count, bathroom_count and estimated_price_tnd
+- counts of imputed regions and of virtual_region values (bounded by the
+  clusters of the city; cities without region models share one 'other' sketch)
+
+Each city keeps two tumbling windows of DRIFT_WINDOW_SIZE listings, so memory
+is constant and the scores follow the last one to two windows of traffic.
+They are compared with the same sketches of the training listings, priced
+through the request path at export ('drift_reference' in the artifact, built
+from TRAINING_DATA_PATH for notebook exports):
+
+- size, rooms, bathrooms, price: Kolmogorov-Smirnov distance of the digests
+- imputed_share: difference of the share of imputed regions
+- virtual_region: total variation distance of the cluster shares
+
+A city alerts when its largest score reaches DRIFT_ALERT_THRESHOLD with at
+least DRIFT_MIN_SAMPLES live listings; the share of listings from cities the
+model was not trained on is reported separately. Scores are exposed in the
+metrics output (metrics.render_prometheus, /metrics) and the app's
+diagnostics panel.
+
+Only the processes that show the scores run a monitor: the app and the JSON
+service call enable() at startup when DRIFT_MONITOR_ENABLED is set. Batch
+workers, training and the other command-line tools leave it off, so they
+neither start the thread nor build a reference for notebook exports.
+
+Usage:
+    python drift.py                        # replay the held-out listings through predict_prices
+    python drift.py --replay listings.csv  # replay a CSV (city, size, room_count, bathroom_count, region)
+"""
+import argparse
+import logging
+import queue
+import threading
+
+import numpy as np
+import pandas as pd
+
+from config import (DRIFT_ALERT_THRESHOLD, DRIFT_DIGEST_COMPRESSION, DRIFT_MIN_SAMPLES, DRIFT_MONITOR_ENABLED,
+                    DRIFT_QUEUE_SIZE, DRIFT_WINDOW_SIZE, TRAINING_DATA_PATH)
+
+NUMERIC_SIGNALS = ('size', 'room_count', 'bathroom_count', 'estimated_price_tnd')
+SIGNALS = NUMERIC_SIGNALS + ('imputed_share', 'virtual_region')
+OTHER_CITY = 'other'  # Sketch shared by the cities the model has no region models for
+
+enabled = False  # Turned on by the serving processes (enable)
+logger = logging.getLogger(__name__)
+
+
+def enable():
+    """Queue served predictions for the monitor (when DRIFT_MONITOR_ENABLED)"""
+    global enabled
+    enabled = DRIFT_MONITOR_ENABLED
+
+
+def disable():
+    global enabled
+    enabled = False
+
+
+class CitySketch:
+    """Fixed-size summary of the listings of one city"""
+
+    def __init__(self, compression=DRIFT_DIGEST_COMPRESSION):
+        from sketches import QuantileDigest
+
+        self.digests = {signal: QuantileDigest(compression) for signal in NUMERIC_SIGNALS}
+        self.rows = 0
+        self.imputed = 0
+        self.virtual_regions = {}  # virtual_region (None when clustering fell back) -> listings
+
+    def update(self, columns, imputed, virtual_regions):
+        """
+        Parameters:
+        -----------
+        columns : dict - NUMERIC_SIGNALS -> values of the listings
+        imputed : np.ndarray (bool) - The region was left to the imputer
+        virtual_regions : np.ndarray (object) - virtual_region of each listing
+        """
+        for signal, digest in self.digests.items():
+            digest.update(columns[signal])
+        self.rows += len(imputed)
+        self.imputed += int(np.count_nonzero(imputed))
+        names, counts = np.unique(virtual_regions.astype(str), return_counts=True)
+        for name, count in zip(names, counts):
+            key = None if name == 'None' else name
+            self.virtual_regions[key] = self.virtual_regions.get(key, 0) + int(count)
+        return self
+
+    def merge(self, other):
+        for signal, digest in self.digests.items():
+            digest.merge(other.digests[signal])
+        self.rows += other.rows
+        self.imputed += other.imputed
+        for key, count in other.virtual_regions.items():
+            self.virtual_regions[key] = self.virtual_regions.get(key, 0) + count
+        return self
+
+
+def sketch_listings(pipeline, cities, columns, imputed, compression=DRIFT_DIGEST_COMPRESSION):
+    """
+    Sketches of a batch of priced listings, per city.
+
+    Parameters:
+    -----------
+    pipeline : dict - Pipeline artifact (clustering models for the virtual regions)
+    cities : np.ndarray - Lowercase city of each listing
+    columns : dict - NUMERIC_SIGNALS -> float arrays
+    imputed : np.ndarray (bool) - The region was left to the imputer
+
+    Returns:
+    --------
+    dict - city (OTHER_CITY for the cities without region models) -> CitySketch
+    """
+    from utils import request_virtual_regions
+
+    virtual_regions = request_virtual_regions(pipeline, cities, columns['size'], columns['room_count'],
+                                              columns['bathroom_count'])
+    known = set(pipeline['knn_region_models'])
+    keys = np.array([city if city in known else OTHER_CITY for city in cities], dtype=object)
+    sketches = {}
+    for key in pd.unique(keys):
+        mask = keys == key
+        sketches[key] = CitySketch(compression).update({signal: values[mask] for signal, values in columns.items()},
+                                                       imputed[mask], virtual_regions[mask])
+    return sketches
+
+
+def build_reference(pipeline, listings):
+    """
+    Reference sketches: training listings as listed, priced through the request path.
+
+    Parameters:
+    -----------
+    pipeline : dict - Pipeline artifact (need not be the loaded one)
+    listings : pd.DataFrame - city, region, size, room_count, bathroom_count (lowercase city/region)
+
+    Returns:
+    --------
+    dict - 'drift_reference' entry of the artifact
+    """
+    from conformal import LISTING_COLUMNS
+    from utils import predict_prices
+
+    listings = listings.dropna(subset=LISTING_COLUMNS).reset_index(drop=True)
+    predictions = predict_prices(listings[LISTING_COLUMNS], pipeline=pipeline)
+    columns = {signal: predictions[signal].to_numpy(dtype=float) for signal in NUMERIC_SIGNALS}
+    return sketch_listings(pipeline, listings['city'].to_numpy(dtype=object), columns,
+                           predictions['canonical_region'].to_numpy() == 'autres villes')
+
+
+_reference = None
+_reference_lock = threading.Lock()
+
+
+def get_drift_reference(pipeline):
+    """
+    drift_reference of a pipeline artifact. Notebook exports have none: it is
+    built once from TRAINING_DATA_PATH.
+    """
+    global _reference
+    if pipeline.get('drift_reference') is not None:
+        return pipeline['drift_reference']
+    with _reference_lock:
+        # Rebuilt for another champion: the reference prices are its own
+        if _reference is None or _reference[0] is not pipeline['champion_model']:
+            from train import load_training_data
+            _reference = (pipeline['champion_model'],
+                          build_reference(pipeline, load_training_data(TRAINING_DATA_PATH)))
+        return _reference[1]
+
+
+def ks_distance(reference, live):
+    """Largest gap between the CDFs of two digests, between consecutive centroids (NaN if one is empty)"""
+    if not len(reference.means) or not len(live.means):
+        return float('nan')
+    points = np.unique(np.r_[reference.means, live.means, reference.min, reference.max, live.min, live.max])
+    if len(points) == 1:
+        return 0.0
+    # Between centroids, so a value repeated in many centroids (rooms, bathrooms) counts once on both sides
+    midpoints = (points[1:] + points[:-1]) / 2
+    return float(np.max(np.abs(reference.cdf(midpoints) - live.cdf(midpoints))))
+
+
+def drift_scores(reference, live):
+    """
+    Scores of a city's live sketch against its reference sketch.
+
+    Returns:
+    --------
+    dict - SIGNALS -> score in [0, 1] (0: same distribution)
+    """
+    scores = {signal: ks_distance(reference.digests[signal], live.digests[signal]) for signal in NUMERIC_SIGNALS}
+    scores['imputed_share'] = abs(live.imputed / live.rows - reference.imputed / reference.rows)
+    keys = set(reference.virtual_regions) | set(live.virtual_regions)
+    scores['virtual_region'] = 0.5 * sum(abs(live.virtual_regions.get(key, 0) / live.rows
+                                             - reference.virtual_regions.get(key, 0) / reference.rows)
+                                         for key in keys)
+    return scores
+
+
+class DriftMonitor:
+    """
+    Live sketches of one pipeline's prediction stream, fed through a bounded
+    queue by a daemon thread. Predictions the thread fails to sketch are
+    logged and counted as dropped; the thread keeps running.
+
+    Parameters:
+    -----------
+    pipeline : dict - The served pipeline artifact
+    fingerprint : str - Its fingerprint (the monitor is replaced when it changes)
+    window : int - Live listings per city per window
+    queue_size : int - Queued predictions (single or batch) before new ones are dropped
+    """
+
+    def __init__(self, pipeline, fingerprint=None, window=DRIFT_WINDOW_SIZE, queue_size=DRIFT_QUEUE_SIZE,
+                 compression=DRIFT_DIGEST_COMPRESSION):
+        self.pipeline = pipeline
+        self.fingerprint = fingerprint
+        self.window = window
+        self.compression = compression
+        self.reference = None  # Loaded (or built) by the monitor's thread
+        self.reference_source = None
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        # city -> [previous window, current window]
+        self._windows = {}
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="drift-monitor", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+
+    def observe(self, city, size, room_count, bathroom_count, imputed, estimated_price):
+        """Queue one prediction (never blocks)"""
+        try:
+            self._queue.put_nowait((city, size, room_count, bathroom_count, imputed, estimated_price))
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+
+    def observe_batch(self, cities, size, room_count, bathroom_count, imputed, estimated_price):
+        """Queue a batch of predictions as one item (arrays, never blocks)"""
+        try:
+            self._queue.put_nowait((cities, size, room_count, bathroom_count, imputed, estimated_price))
+        except queue.Full:
+            with self._lock:
+                self.dropped += len(cities)
+
+    def flush(self):
+        """Wait until every queued prediction is in the sketches"""
+        self._queue.join()
+
+    def _run(self):
+        try:
+            self.reference = get_drift_reference(self.pipeline)
+            self.reference_source = 'artifact' if self.pipeline.get('drift_reference') is not None else 'training data'
+        except Exception as e:
+            self.reference_source = f"unavailable ({e})"
+        while not self._stopped.is_set():
+            try:
+                items = [self._queue.get(timeout=1.0)]
+            except queue.Empty:
+                continue
+            # Everything already waiting is sketched together
+            while True:
+                try:
+                    items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self.update(items)
+            except Exception:
+                # A batch the sketches cannot take (e.g. a NaN size) is dropped, the thread keeps running
+                logger.exception("Drift monitor could not process %d queued predictions", len(items))
+                with self._lock:
+                    self.dropped += sum(len(np.atleast_1d(item[0])) for item in items)
+            finally:
+                for _ in items:
+                    self._queue.task_done()
+
+    def update(self, items):
+        """Fold queued predictions (single tuples and batch arrays) into the live windows"""
+        fields = [[np.atleast_1d(item[position]) for item in items] for position in range(6)]
+        cities, size, room_count, bathroom_count, imputed, estimated_price = [np.concatenate(field)
+                                                                              for field in fields]
+        cities = np.array([str(city).lower() for city in cities], dtype=object)
+        columns = {'size': size.astype(float), 'room_count': room_count.astype(float),
+                   'bathroom_count': bathroom_count.astype(float), 'estimated_price_tnd': estimated_price.astype(float)}
+        batch = sketch_listings(self.pipeline, cities, columns, imputed.astype(bool), self.compression)
+        with self._lock:
+            for city, sketch in batch.items():
+                windows = self._windows.get(city)
+                if windows is None:
+                    windows = self._windows[city] = [None, CitySketch(self.compression)]
+                windows[1].merge(sketch)
+                if windows[1].rows >= self.window:
+                    windows[0], windows[1] = windows[1], CitySketch(self.compression)
+
+    def live(self):
+        """city -> live CitySketch (the previous window merged with the current one)"""
+        with self._lock:
+            sketches = {}
+            for city, (previous, current) in self._windows.items():
+                sketch = CitySketch(self.compression)
+                if previous is not None:
+                    sketch.merge(previous)
+                sketches[city] = sketch.merge(current)
+        return sketches
+
+    def scores(self):
+        """
+        Drift scores per city, for display.
+
+        Returns:
+        --------
+        (rows, summary) - one dict per city with a reference (samples, SIGNALS, drift, alert),
+        and a dict with the live listings, the share from cities without region models, the
+        dropped predictions and where the reference came from
+        """
+        live = self.live()
+        with self._lock:
+            dropped = self.dropped
+        reference = self.reference or {}
+        rows = []
+        for city in sorted(live):
+            if city not in reference or not live[city].rows:
+                continue
+            scores = drift_scores(reference[city], live[city])
+            drift = np.nanmax(list(scores.values()))
+            rows.append(dict(city=city, samples=live[city].rows, **scores, drift=float(drift),
+                             alert=bool(live[city].rows >= DRIFT_MIN_SAMPLES and drift >= DRIFT_ALERT_THRESHOLD)))
+        total = sum(sketch.rows for sketch in live.values())
+        other = live[OTHER_CITY].rows if OTHER_CITY in live else 0
+        summary = {
+            'live_listings': total,
+            'unknown_city_share': other / total if total else 0.0,
+            'dropped': dropped,
+            'queued': self._queue.qsize(),
+            'reference': self.reference_source,
+        }
+        return rows, summary
+
+    def render_prometheus(self):
+        """Drift scores in the Prometheus text exposition format"""
+        rows, summary = self.scores()
+        lines = ['# HELP house_price_input_drift Distance between live and training inputs (KS, share difference, '
+                 'total variation)',
+                 '# TYPE house_price_input_drift gauge']
+        for row in rows:
+            for signal in SIGNALS:
+                lines.append(f'house_price_input_drift{{city="{row["city"]}",signal="{signal}"}} {row[signal]:.6f}')
+        lines.append('# HELP house_price_input_drift_alert 1 when a city drifts beyond DRIFT_ALERT_THRESHOLD')
+        lines.append('# TYPE house_price_input_drift_alert gauge')
+        for row in rows:
+            lines.append(f'house_price_input_drift_alert{{city="{row["city"]}"}} {int(row["alert"])}')
+        lines.append('# HELP house_price_input_drift_samples Live listings in the drift windows')
+        lines.append('# TYPE house_price_input_drift_samples gauge')
+        for row in rows:
+            lines.append(f'house_price_input_drift_samples{{city="{row["city"]}"}} {row["samples"]}')
+        lines.append('# HELP house_price_input_unknown_city_share Live listings from cities without region models')
+        lines.append('# TYPE house_price_input_unknown_city_share gauge')
+        lines.append(f'house_price_input_unknown_city_share {summary["unknown_city_share"]:.6f}')
+        lines.append('# HELP house_price_drift_dropped_total Predictions dropped because the drift queue was full')
+        lines.append('# TYPE house_price_drift_dropped_total counter')
+        lines.append(f'house_price_drift_dropped_total {summary["dropped"]}')
+        return '\n'.join(lines) + '\n'
+
+
+_monitor = None
+_monitor_lock = threading.Lock()
+
+
+def get_drift_monitor():
+    """Monitor of the active pipeline (a fresh one, with empty windows, when the pipeline changes)"""
+    global _monitor
+    from utils import get_active_pipeline
+
+    active = get_active_pipeline()
+    monitor = _monitor
+    if monitor is not None and monitor.fingerprint == active.fingerprint:
+        return monitor
+    with _monitor_lock:
+        if _monitor is None or _monitor.fingerprint != active.fingerprint:
+            if _monitor is not None:
+                _monitor.stop()
+            _monitor = DriftMonitor(active.pipeline, active.fingerprint).start()
+        return _monitor
+
+
+def observe(result):
+    """Queue a predict_price result (same contract in every mode) for the monitor"""
+    if enabled:
+        get_drift_monitor().observe(result['city'], result['size'], result['room_count'], result['bathroom_count'],
+                                    result['canonical_region'] == 'autres villes', result['estimated_price_tnd'])
+
+
+def observe_batch(results):
+    """Queue a predict_prices result frame for the monitor"""
+    if enabled and len(results):
+        get_drift_monitor().observe_batch(results['city'].to_numpy(), results['size'].to_numpy(),
+                                          results['room_count'].to_numpy(), results['bathroom_count'].to_numpy(),
+                                          results['canonical_region'].to_numpy() == 'autres villes',
+                                          results['estimated_price_tnd'].to_numpy())
+
+
+def current_scores():
+    """scores() of the running monitor (no rows before the first prediction, without loading the pipeline)"""
+    if _monitor is None:
+        return [], {'live_listings': 0, 'unknown_city_share': 0.0, 'dropped': 0, 'queued': 0, 'reference': None}
+    return _monitor.scores()
+
+
+def render_prometheus():
+    """Drift metrics of the running monitor ('' before the first prediction)"""
+    return _monitor.render_prometheus() if _monitor is not None else ''
+
+
+def main(argv=None):
+    from conformal import LISTING_COLUMNS, holdout_listings
+    from utils import predict_prices
+
+    parser = argparse.ArgumentParser(description="Input drift monitor")
+    parser.add_argument('--replay', help="CSV of listings to stream through predict_prices "
+                                         "(default: the held-out listings of the training data)")
+    parser.add_argument('--batch-size', type=int, default=100)
+    args = parser.parse_args(argv)
+
+    # The monitor predict_prices feeds lives in the imported module, not in __main__
+    import drift as monitored
+    monitored.enabled = True
+
+    listings = pd.read_csv(args.replay) if args.replay else holdout_listings()
+    listings = listings.assign(city=listings['city'].astype(str).str.strip().str.lower())
+    columns = [column for column in LISTING_COLUMNS if column in listings.columns]
+    for offset in range(0, len(listings), args.batch_size):
+        predict_prices(listings.iloc[offset:offset + args.batch_size][columns])
+    monitor = monitored.get_drift_monitor()
+    monitor.flush()
+
+    rows, summary = monitor.scores()
+    print(f"{summary['live_listings']} listings replayed ({summary['unknown_city_share']:.1%} from unknown cities, "
+          f"{summary['dropped']} dropped), reference: {summary['reference']}")
+    print(pd.DataFrame(rows).set_index('city').to_string(float_format=lambda value: f"{value:.3f}"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,401 @@
+"""
+Per-input explanations of champion model predictions.
+
+An explanation splits the predicted log-price into a base value (the model's
+average prediction) plus one additive contribution per model feature, then
+groups those back onto the raw inputs of the form: city, region, size, rooms
+and bathrooms. Derived features are shared equally between their sources
+(avg_room_size: size and rooms; tier: size, rooms and bathrooms, from which the
+city's KMeans assigns it).
+
+The champion's members are explained separately, each with the fastest exact
+method it allows, and combined with the ensemble's weights (VotingRegressor)
+or the final linear model's coefficients (StackingRegressor):
+
+- RandomForest / GradientBoosting / decision trees: tree-path (Saabas)
+  attribution, following each tree's decision path once.
+- Linear models (Ridge, ElasticNet, ...): closed form, coef x (x - background mean).
+- Any other member (SVR, AdaBoost, a non-linear stacker, ...): exact Shapley
+  values over the model features against a background sample of listings,
+  evaluated a few background rows at a time until EXPLAIN_BUDGET_MS runs out.
+
+Within its method every member is additive: base + sum of contributions is its
+prediction. Explanations are cached per pipeline fingerprint and listing.
+
+Usage:
+    python explain.py tunis 120 3 2 --region "la marsa"   # explain one listing
+    python explain.py --verify -n 200                     # check additivity on random listings
+"""
+import argparse
+import math
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+import pandas as pd
+
+from config import EXPLAIN_BACKGROUND_SIZE, EXPLAIN_BUDGET_MS, EXPLAIN_CACHE_MAX_ENTRIES, TRAINING_DATA_PATH
+from utils import get_active_pipeline, predict_price, request_tiers
+
+RAW_INPUTS = ['city', 'region', 'size', 'room_count', 'bathroom_count']
+
+# Model feature -> raw inputs it is computed from (contributions are split equally)
+FEATURE_SOURCES = {
+    'city': ('city',),
+    'region': ('region',),
+    'size': ('size',),
+    'room_count': ('room_count',),
+    'bathroom_count': ('bathroom_count',),
+    'avg_room_size': ('size', 'room_count'),
+    'tier': ('size', 'room_count', 'bathroom_count'),
+}
+
+# Background rows evaluated per step of the sampled (Shapley) members
+BACKGROUND_CHUNK = 4
+
+Explanation = namedtuple('Explanation', [
+    'base_price',             # K TND: price of the model's average prediction (expm1 of the base log-price)
+    'estimated_price',        # K TND: expm1(base + every contribution), the model's prediction
+    'contributions',          # raw input -> log-price contribution
+    'feature_contributions',  # model feature -> log-price contribution
+    'methods',                # member -> 'tree_path', 'linear' or 'background'
+    'background_rows',        # background listings the sampled members used (None without such members)
+    'complete',               # False when the time budget cut the background sample short
+    'seconds',
+])
+
+
+def _dense(matrix):
+    return np.asarray(matrix.toarray() if hasattr(matrix, 'toarray') else matrix, dtype=np.float64)
+
+
+def _column_features(preprocessor, features):
+    """Model feature of each output column of the fitted ColumnTransformer"""
+    names = preprocessor.get_feature_names_out()
+    owners = []
+    for name in names:
+        output = name.split('__', 1)[-1]
+        # One-hot columns are named '<feature>_<category>': keep the longest matching feature
+        matches = [feature for feature in features if output == feature or output.startswith(feature + '_')]
+        if not matches:
+            raise ValueError(f"Cannot map preprocessed column '{name}' to a model feature")
+        owners.append(max(matches, key=len))
+    return owners
+
+
+def _ensemble_terms(estimator):
+    """
+    Decompose the final step of the champion into intercept + sum(weight x member).
+
+    Returns:
+    --------
+    (intercept, [(name, weight, fitted member), ...])
+    """
+    from sklearn.ensemble import StackingRegressor, VotingRegressor
+
+    if isinstance(estimator, VotingRegressor):
+        names = [name for name, member in estimator.estimators if member != 'drop']
+        weights = np.ones(len(names)) if estimator.weights is None else np.asarray(
+            [weight for (_, member), weight in zip(estimator.estimators, estimator.weights) if member != 'drop'],
+            dtype=float)
+        weights = weights / weights.sum()
+        return 0.0, list(zip(names, weights, estimator.estimators_))
+    if (isinstance(estimator, StackingRegressor) and not estimator.passthrough
+            and getattr(estimator.final_estimator_, 'coef_', None) is not None):
+        names = [name for name, member in estimator.estimators if member != 'drop']
+        final = estimator.final_estimator_
+        return float(final.intercept_), list(zip(names, np.ravel(final.coef_), estimator.estimators_))
+    return 0.0, [(type(estimator).__name__, 1.0, estimator)]
+
+
+class _TreePath:
+    """Saabas attribution of a RandomForest / GradientBoosting / single tree"""
+
+    def __init__(self, member):
+        from sklearn.ensemble import GradientBoostingRegressor
+
+        if isinstance(member, GradientBoostingRegressor):
+            trees = member.estimators_[:, 0]
+            self.scale = member.learning_rate
+            self.offset = 0.0 if member.init_ == 'zero' else None
+            self.init = member.init_
+        else:
+            trees = getattr(member, 'estimators_', [member])
+            self.scale = 1.0 / len(trees)
+            self.offset = 0.0
+            self.init = None
+        # Flat arrays of each tree, read once instead of through tree_ on every request
+        self.trees = [(tree.tree_.children_left, tree.tree_.children_right, tree.tree_.feature,
+                       tree.tree_.threshold, tree.tree_.value[:, 0, 0]) for tree in trees]
+
+    def explain(self, x):
+        """(base, contribution per column) of one preprocessed row"""
+        # Trees compare float32 inputs, as in sklearn's predict
+        x32 = x.astype(np.float32)
+        contributions = np.zeros(len(x))
+        base = 0.0
+        for left, right, feature, threshold, value in self.trees:
+            node = 0
+            base += value[0]
+            while left[node] != -1:
+                child = left[node] if x32[feature[node]] <= threshold[node] else right[node]
+                contributions[feature[node]] += value[child] - value[node]
+                node = child
+        offset = self.offset if self.offset is not None else float(self.init.predict(x[None, :])[0])
+        return offset + self.scale * base, self.scale * contributions
+
+
+class Explainer:
+    """
+    Attribution engine of one pipeline.
+
+    Parameters:
+    -----------
+    pipeline : dict - Pipeline artifact
+    background : pd.DataFrame - Model feature rows (pipeline['features']) of reference listings
+    """
+
+    def __init__(self, pipeline, background):
+        champion = pipeline['champion_model']
+        self.features = list(pipeline['features'])
+        self.preprocessor = champion[:-1]
+        self.background = _dense(self.preprocessor.transform(background[self.features]))
+        self.background_mean = self.background.mean(axis=0)
+
+        owners = _column_features(self.preprocessor[-1], self.features)
+        self.players = list(dict.fromkeys(owners))
+        self.column_player = np.array([self.players.index(owner) for owner in owners])
+
+        self.intercept, members = _ensemble_terms(champion[-1])
+        self.members = []
+        for name, weight, member in members:
+            if self._is_tree_model(member):
+                self.members.append((name, weight, 'tree_path', _TreePath(member)))
+            elif getattr(member, 'coef_', None) is not None and np.ndim(member.coef_) == 1:
+                self.members.append((name, weight, 'linear', member))
+            else:
+                self.members.append((name, weight, 'background', member))
+
+        # Shapley weights over the players: phi = shapley_matrix @ v(coalitions)
+        n_players = len(self.players)
+        self.coalitions = ((np.arange(2 ** n_players)[:, None] >> np.arange(n_players)) & 1).astype(bool)
+        self.shapley_matrix = np.zeros((n_players, 2 ** n_players))
+        for mask, members_in in enumerate(self.coalitions):
+            size = int(members_in.sum())
+            for player in np.flatnonzero(~members_in):
+                weight = math.factorial(size) * math.factorial(n_players - size - 1) / math.factorial(n_players)
+                self.shapley_matrix[player, mask | (1 << player)] += weight
+                self.shapley_matrix[player, mask] -= weight
+        self.coalition_columns = self.coalitions[:, self.column_player]
+
+    @staticmethod
+    def _is_tree_model(member):
+        from sklearn.ensemble import GradientBoostingRegressor, RandomForestRegressor, ExtraTreesRegressor
+        from sklearn.tree import DecisionTreeRegressor
+
+        return isinstance(member, (GradientBoostingRegressor, RandomForestRegressor, ExtraTreesRegressor,
+                                   DecisionTreeRegressor))
+
+    def _player_sums(self, column_values):
+        return np.bincount(self.column_player, weights=column_values, minlength=len(self.players))
+
+    def explain(self, feature_row, budget_seconds=EXPLAIN_BUDGET_MS / 1000):
+        """
+        Attribution of one model feature row.
+
+        Returns:
+        --------
+        (base log-price, contribution per player, background rows used or None, complete)
+        """
+        deadline = time.perf_counter() + budget_seconds
+        x = _dense(self.preprocessor.transform(feature_row[self.features]))[0]
+        base = self.intercept
+        contributions = np.zeros(len(self.players))
+
+        # 1. Exact members
+        sampled = []
+        for name, weight, method, member in self.members:
+            if method == 'tree_path':
+                member_base, column_values = member.explain(x)
+            elif method == 'linear':
+                member_base = float(member.intercept_ + member.coef_ @ self.background_mean)
+                column_values = member.coef_ * (x - self.background_mean)
+            else:
+                sampled.append((weight, member))
+                continue
+            base += weight * member_base
+            contributions += weight * self._player_sums(column_values)
+        if not sampled:
+            return base, contributions, None, True
+
+        # 2. Shapley values of the other members against the background, a chunk of rows at a time
+        totals = [np.zeros(len(self.coalitions)) for _ in sampled]
+        used = 0
+        while used < len(self.background) and (used == 0 or time.perf_counter() < deadline):
+            chunk = self.background[used:used + BACKGROUND_CHUNK]
+            rows = np.where(self.coalition_columns[:, None, :], x, chunk[None, :, :]).reshape(-1, len(x))
+            for total, (_, member) in zip(totals, sampled):
+                total += member.predict(rows).reshape(len(self.coalitions), len(chunk)).sum(axis=1)
+            used += len(chunk)
+        for total, (weight, _) in zip(totals, sampled):
+            values = total / used
+            base += weight * values[0]
+            contributions += weight * (self.shapley_matrix @ values)
+        return base, contributions, used, used == len(self.background)
+
+
+def build_background(pipeline, data_path=TRAINING_DATA_PATH, size=EXPLAIN_BACKGROUND_SIZE, seed=42):
+    """
+    Model feature rows of `size` listings of merged.csv, through the request path
+    (imputed regions, request-time tiers), for pipelines exported without a background.
+    """
+    from conformal import request_features
+    from train import load_training_data
+
+    listings = load_training_data(data_path)
+    listings = listings.sample(min(size, len(listings)), random_state=seed).reset_index(drop=True)
+    return request_features(pipeline, listings)
+
+
+def group_contributions(feature_contributions):
+    """Model feature contributions summed onto RAW_INPUTS (derived features split equally)"""
+    grouped = dict.fromkeys(RAW_INPUTS, 0.0)
+    for feature, value in feature_contributions.items():
+        sources = FEATURE_SOURCES.get(feature, (feature,))
+        for source in sources:
+            grouped[source] = grouped.get(source, 0.0) + value / len(sources)
+    return grouped
+
+
+_explainer = None  # (fingerprint, Explainer)
+_explainer_lock = threading.Lock()
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def get_explainer(active=None):
+    """Explainer of `active` (a utils.ActivePipeline, defaults to the loaded pipeline), rebuilt if it changes"""
+    global _explainer
+    active = active or get_active_pipeline()
+    cached = _explainer
+    if cached is not None and cached[0] == active.fingerprint:
+        return cached[1]
+    with _explainer_lock:
+        if _explainer is None or _explainer[0] != active.fingerprint:
+            background = active.pipeline.get('explain_background')
+            if background is None:
+                background = build_background(active.pipeline)
+            _explainer = (active.fingerprint, Explainer(active.pipeline, background))
+            with _cache_lock:
+                _cache.clear()
+        return _explainer[1]
+
+
+def explain_price(result, budget_ms=EXPLAIN_BUDGET_MS):
+    """
+    Explain a predict_price result.
+
+    Parameters:
+    -----------
+    result : dict - predict_price output (any path: standard, compiled, cached or lookup table)
+    budget_ms : float - Time budget; members explained against the background stop early when it runs out
+
+    Returns:
+    --------
+    Explanation
+    """
+    start = time.perf_counter()
+    # One snapshot per call: the explainer and the tier come from the same pipeline version
+    active = get_active_pipeline()
+    explainer = get_explainer(active)
+    city = result['city'].lower()
+    tier = int(request_tiers(active.pipeline, [city], [result['size']], [result['room_count']],
+                             [result['bathroom_count']])[0])
+    row = {
+        'city': city,
+        'region': result['imputed_region'],
+        'tier': tier,
+        'size': float(result['size']),
+        'room_count': float(result['room_count']),
+        'bathroom_count': float(result['bathroom_count']),
+    }
+    row['avg_room_size'] = row['size'] / row['room_count'] if row['room_count'] > 0 else 0
+    key = (active.fingerprint,) + tuple(row.values())
+
+    with _cache_lock:
+        explanation = _cache.get(key)
+        if explanation is not None:
+            _cache.move_to_end(key)
+            return explanation
+
+    base, contributions, background_rows, complete = explainer.explain(pd.DataFrame([row]), budget_ms / 1000)
+    feature_contributions = dict(zip(explainer.players, contributions.tolist()))
+    explanation = Explanation(
+        base_price=float(np.expm1(base)),
+        estimated_price=float(np.expm1(base + contributions.sum())),
+        contributions=group_contributions(feature_contributions),
+        feature_contributions=feature_contributions,
+        methods={name: method for name, _, method, _ in explainer.members},
+        background_rows=background_rows,
+        complete=complete,
+        seconds=time.perf_counter() - start,
+    )
+    with _cache_lock:
+        _cache[key] = explanation
+        while len(_cache) > EXPLAIN_CACHE_MAX_ENTRIES:
+            _cache.popitem(last=False)
+    return explanation
+
+
+def verify_additivity(n=200, seed=42):
+    """
+    Explain random listings without a time budget and compare base + contributions with the model.
+
+    Returns:
+    --------
+    dict with the largest log-price gap and the mean explanation time
+    """
+    from compiled import _random_listings
+
+    largest_gap, seconds = 0.0, []
+    for city, size, room_count, bathroom_count, region in _random_listings(n, seed):
+        result = predict_price(city, size, room_count, bathroom_count, region, mode='standard')
+        explanation = explain_price(result, budget_ms=float('inf'))
+        seconds.append(explanation.seconds)
+        log_price = np.log1p(explanation.base_price) + sum(explanation.contributions.values())
+        largest_gap = max(largest_gap, abs(log_price - np.log1p(result['estimated_price_tnd'])))
+    return {'listings': n, 'max_log_price_gap': float(largest_gap), 'mean_ms': 1000 * float(np.mean(seconds)),
+            'methods': explanation.methods}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Explain champion model predictions")
+    parser.add_argument('listing', nargs='*', help="city size room_count bathroom_count")
+    parser.add_argument('--region', default='autres villes')
+    parser.add_argument('--budget-ms', type=float, default=EXPLAIN_BUDGET_MS)
+    parser.add_argument('--verify', action='store_true', help="Check additivity on random listings")
+    parser.add_argument('-n', type=int, default=200, help="Verification listings")
+    args = parser.parse_args(argv)
+
+    if args.verify:
+        report = verify_additivity(args.n)
+        print(f"{report['listings']} listings: max |base + contributions - prediction| = "
+              f"{report['max_log_price_gap']:.2e} (log-price), {report['mean_ms']:.1f} ms per explanation")
+        print(f"Methods: {report['methods']}")
+    if args.listing:
+        city, size, room_count, bathroom_count = args.listing
+        result = predict_price(city, float(size), int(room_count), int(bathroom_count), args.region)
+        explanation = explain_price(result, args.budget_ms)
+        print(f"{result['city']}, {size} m², {room_count} rooms, {bathroom_count} bathrooms, "
+              f"region {result['imputed_region']}: {explanation.estimated_price:,.2f} K TND "
+              f"(average listing {explanation.base_price:,.2f} K TND)")
+        for name, value in sorted(explanation.contributions.items(), key=lambda item: -abs(item[1])):
+            print(f"  {name:<16} {np.expm1(value):+8.1%}")
+        print(f"Methods: {explanation.methods} | {explanation.seconds * 1000:.1f} ms"
+              + ("" if explanation.complete else f" (budget reached after {explanation.background_rows} "
+                                                  f"background listings)"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+Offline coordinates of the cities and regions the pipeline knows.
+
+Approximate centroids (WGS84 latitude, longitude) of each neighbourhood,
+precise to a few hundred metres: enough to place regions on a city-scale map
+without a geocoding service or shapefiles. Region keys are normalized with
+normalize_region_name, so spelling variants of the listings ('Mégrine' /
+'Mgrine', "L'Aouina" / 'L Aouina') share one entry.
+"""
+import re
+import unicodedata
+
+CITY_CENTROIDS = {
+    'tunis': (36.8065, 10.1815),
+    'ariana': (36.8625, 10.1956),
+    'ben arous': (36.7531, 10.2189),
+    'la manouba': (36.8080, 10.0970),
+}
+
+# Normalized region name -> (latitude, longitude)
+REGION_CENTROIDS = {
+    # Tunis
+    'agba': (36.7990, 10.0700),
+    'ain zaghouan': (36.8620, 10.2630),
+    'ain zaghouan nord': (36.8680, 10.2620),
+    'ain zaghouan sud': (36.8550, 10.2640),
+    'ain zaghouen': (36.8620, 10.2630),
+    'bab souika': (36.8050, 10.1680),
+    'carthage': (36.8528, 10.3233),
+    'centre urbain nord': (36.8440, 10.1960),
+    'centre ville lafayette': (36.8160, 10.1850),
+    'cit el khadra': (36.8320, 10.1900),
+    'cite el khadra': (36.8320, 10.1900),
+    'cit olympique': (36.8330, 10.1780),
+    'cite olympique': (36.8330, 10.1780),
+    'el kabaria': (36.7650, 10.1800),
+    'el manar 1': (36.8370, 10.1550),
+    'el manar 2': (36.8420, 10.1620),
+    'manar': (36.8400, 10.1600),
+    'el menzah 4': (36.8450, 10.1800),
+    'el menzah 9': (36.8440, 10.1550),
+    'menzah': (36.8450, 10.1750),
+    'el omrane suprieur': (36.8230, 10.1520),
+    'el omrane superieur': (36.8230, 10.1520),
+    'el ouardia': (36.7780, 10.1810),
+    'ettahrir': (36.8180, 10.1330),
+    'ezzouhour': (36.7960, 10.1230),
+    'gammarth': (36.9180, 10.2870),
+    'hraria': (36.7840, 10.1090),
+    'hrairia': (36.7840, 10.1090),
+    'jardins de carthage': (36.8480, 10.2920),
+    'ksar said': (36.8230, 10.1160),
+    'l aouina': (36.8560, 10.2450),
+    'la goulette': (36.8180, 10.3050),
+    'la marsa': (36.8782, 10.3247),
+    'lac 1': (36.8330, 10.2330),
+    'lac 2': (36.8450, 10.2700),
+    'le bardo': (36.8090, 10.1400),
+    'le kram': (36.8330, 10.3150),
+    'montplaisir': (36.8160, 10.1950),
+    'mutuelleville': (36.8250, 10.1720),
+    'medina': (36.7990, 10.1700),
+    'sidi bou said': (36.8700, 10.3410),
+    'sidi daoud': (36.8650, 10.2960),
+    'sidi hassine': (36.7700, 10.1000),
+    'tunis': (36.8065, 10.1815),
+    'tunis belvedere': (36.8230, 10.1780),
+    # Ariana
+    'ariana': (36.8625, 10.1956),
+    'ariana ville': (36.8625, 10.1956),
+    'ariana essoughra': (36.8720, 10.1700),
+    'borj louzir': (36.8670, 10.2060),
+    'chotrana': (36.8850, 10.2100),
+    'chotrana 1': (36.8830, 10.2050),
+    'cit ennasr 2': (36.8590, 10.1580),
+    'cite ennasr 2': (36.8590, 10.1580),
+    'ennasr': (36.8570, 10.1620),
+    'cit hedi nouira': (36.8700, 10.1800),
+    'cite hedi nouira': (36.8700, 10.1800),
+    'cite ennkhilet': (36.8780, 10.1900),
+    'dar fadhal': (36.8800, 10.2250),
+    'el menzah 5': (36.8480, 10.1800),
+    'el menzah 6': (36.8510, 10.1820),
+    'el menzah 7': (36.8500, 10.1640),
+    'ettadhamen': (36.8400, 10.1000),
+    'ghazela': (36.8950, 10.1900),
+    'jardins d el menzah': (36.8560, 10.1450),
+    'jardins el menzah': (36.8560, 10.1450),
+    'les jardins el menzah 1': (36.8540, 10.1480),
+    'les jardins el menzah 2': (36.8580, 10.1420),
+    'la soukra': (36.8750, 10.2200),
+    'mnihla': (36.8500, 10.1200),
+    'raoued': (36.9400, 10.1800),
+    'riadh andalous': (36.8770, 10.1750),
+    'sidi thabet': (36.9100, 10.0400),
+    # Ben Arous
+    'ben arous': (36.7531, 10.2189),
+    'borj cedria': (36.7050, 10.4000),
+    'boumhel': (36.7260, 10.3040),
+    'el mourouj': (36.7300, 10.2100),
+    'el mourouj 1': (36.7400, 10.2050),
+    'el mourouj 4': (36.7250, 10.2150),
+    'el mourouj 5': (36.7180, 10.2220),
+    'el mourouj 6': (36.7100, 10.2050),
+    'ezzahra': (36.7440, 10.3080),
+    'fouchana': (36.7000, 10.1700),
+    'hammam chott': (36.7120, 10.3750),
+    'hammam lif': (36.7290, 10.3410),
+    'medina jedida': (36.7170, 10.1960),
+    'mgrine': (36.7700, 10.2340),
+    'megrine': (36.7700, 10.2340),
+    'mohamedia': (36.6770, 10.1560),
+    'mornag': (36.6800, 10.2900),
+    'rads': (36.7680, 10.2750),
+    'rades': (36.7680, 10.2750),
+    # La Manouba
+    'denden': (36.8050, 10.1100),
+    'douar hicher': (36.8270, 10.0800),
+    'la manouba': (36.8080, 10.0970),
+    'manouba ville': (36.8080, 10.0970),
+    'oued ellil': (36.8340, 10.0420),
+}
+
+
+def normalize_region_name(name):
+    """Lowercase, accents removed, punctuation and underscores as single spaces"""
+    name = unicodedata.normalize('NFKD', str(name)).encode('ascii', 'ignore').decode('ascii')
+    return re.sub(r'[^a-z0-9]+', ' ', name.lower()).strip()
+
+
+def region_centroid(city, region):
+    """
+    Coordinates of a region of a city.
+
+    Returns:
+    --------
+    ((latitude, longitude), True) when the region is in REGION_CENTROIDS, else
+    (the city centroid, False); (None, False) for an unknown city
+    """
+    coordinates = REGION_CENTROIDS.get(normalize_region_name(region))
+    if coordinates is not None:
+        return coordinates, True
+    return CITY_CENTROIDS.get(str(city).lower()), False
@@ -0,0 +1,360 @@
+"""
+Persistent prediction history.
+
+Predictions are appended to a local SQLite database (HISTORY_DB_PATH) with
+indexes on session and timestamp, city and price, so the History tab filters,
+summarizes and paginates in SQL instead of loading every prediction into a
+DataFrame on each rerun. Every row carries the history id of the browser that
+made it (kept in the app's URL, so it outlives page reloads and server
+restarts), and the app only reads, exports and clears the rows of its own id.
+Exports are generated only when requested and streamed in chunks, so their
+memory use does not grow with the history.
+
+Usage:
+    python history.py --stats
+    python history.py --export history.parquet --city Tunis --min-price 200
+    python history.py --generate 1000000 --session ID  # synthetic rows for the browser whose URL has ?history=ID
+"""
+import argparse
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+from config import HISTORY_DB_PATH, HISTORY_MAX_ROWS, MAX_HISTORY_SIZE
+
+COLUMNS = ['timestamp', 'city', 'original_region', 'imputed_region', 'size', 'room_count', 'bathroom_count',
+           'estimated_price_tnd', 'price_per_m2', 'avg_room_size']
+EXPORT_CHUNK_SIZE = 50000
+
+
+def _to_builtin(value):
+    return value.item() if hasattr(value, 'item') else value
+
+
+class HistoryStore:
+    """
+    SQLite-backed prediction history of every session of the app.
+
+    Every method takes a `session_id`: the rows of that session only (None =
+    every session, for the command line).
+
+    Parameters:
+    -----------
+    path : str - Database file (created if missing)
+    max_rows : int - Oldest predictions of a session are deleted beyond this many (None = unlimited)
+    max_total_rows : int - Oldest predictions of any session are deleted beyond this many (None = unlimited)
+
+    The app's script threads share one connection: statements and the summary
+    memo are serialized by a lock.
+    """
+
+    def __init__(self, path=HISTORY_DB_PATH, max_rows=MAX_HISTORY_SIZE, max_total_rows=HISTORY_MAX_ROWS):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.max_rows = max_rows
+        self.max_total_rows = max_total_rows
+        self._lock = threading.Lock()
+        self._summaries = {}
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        # AUTOINCREMENT: ids are never reused, so (MIN(id), MAX(id)) identifies the store's contents
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS predictions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                session_id TEXT,
+                timestamp TEXT NOT NULL,
+                city TEXT NOT NULL,
+                original_region TEXT,
+                imputed_region TEXT,
+                size REAL,
+                room_count REAL,
+                bathroom_count REAL,
+                estimated_price_tnd REAL NOT NULL,
+                price_per_m2 REAL,
+                avg_room_size REAL
+            )
+        """)
+        # Databases created before sessions were recorded
+        if 'session_id' not in {row[1] for row in self.conn.execute("PRAGMA table_info(predictions)")}:
+            self.conn.execute("ALTER TABLE predictions ADD COLUMN session_id TEXT")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_history_session ON predictions (session_id, timestamp)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_history_timestamp ON predictions (timestamp)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_history_city ON predictions (city, timestamp)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_history_price ON predictions (estimated_price_tnd)")
+        self.conn.commit()
+
+    def add(self, result, session_id=None):
+        """Append one predict_price result (its 'timestamp' defaults to now)"""
+        row = dict(result)
+        row.setdefault('timestamp', datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+        self.add_many([row], session_id)
+
+    def add_many(self, rows, session_id=None):
+        values = [(session_id,) + tuple(_to_builtin(row.get(column)) for column in COLUMNS) for row in rows]
+        with self._lock:
+            self.conn.executemany(
+                f"INSERT INTO predictions (session_id, {', '.join(COLUMNS)}) "
+                f"VALUES ({', '.join('?' * (len(COLUMNS) + 1))})", values)
+            if self.max_rows is not None and session_id is not None:
+                self.conn.execute(
+                    "DELETE FROM predictions WHERE session_id = ? AND id <= "
+                    "(SELECT id FROM predictions WHERE session_id = ? ORDER BY id DESC LIMIT 1 OFFSET ?)",
+                    (session_id, session_id, self.max_rows))
+            if self.max_total_rows is not None:
+                self.conn.execute(
+                    "DELETE FROM predictions WHERE id <= "
+                    "(SELECT id FROM predictions ORDER BY id DESC LIMIT 1 OFFSET ?)", (self.max_total_rows,))
+            self.conn.commit()
+
+    def clear(self, session_id=None):
+        """Delete the predictions of a session (of every session when None)"""
+        where, params = self._where(session_id)
+        with self._lock:
+            self.conn.execute(f"DELETE FROM predictions{where}", params)
+            self.conn.commit()
+
+    def version(self, session_id=None):
+        """(oldest id, newest id): ids only grow, so a clear or prune changes the first and an add the second"""
+        with self._lock:
+            return self._version(session_id)
+
+    def _version(self, session_id=None):
+        if session_id is not None:
+            return self.conn.execute("SELECT MIN(id), MAX(id) FROM predictions WHERE session_id = ?",
+                                     (session_id,)).fetchone()
+        # Two subqueries: SQLite answers a lone MIN or MAX from the primary key, not both in one SELECT
+        return self.conn.execute(
+            "SELECT (SELECT MIN(id) FROM predictions), (SELECT MAX(id) FROM predictions)").fetchone()
+
+    @staticmethod
+    def _where(session_id=None, cities=None, min_price=None, max_price=None, after_id=None):
+        clauses, params = [], []
+        if session_id is not None:
+            clauses.append("session_id = ?")
+            params.append(session_id)
+        if cities is not None:
+            clauses.append(f"city IN ({', '.join('?' * len(cities))})")
+            params.extend(cities)
+        if min_price is not None:
+            clauses.append("estimated_price_tnd >= ?")
+            params.append(min_price)
+        if max_price is not None:
+            clauses.append("estimated_price_tnd <= ?")
+            params.append(max_price)
+        if after_id is not None:
+            clauses.append("id > ?")
+            params.append(after_id)
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def summary(self, session_id=None, cities=None, min_price=None, max_price=None):
+        """
+        Count, mean, min and max predicted price of the matching predictions.
+
+        Memoized per filter: while only new predictions were added, the memo is
+        brought up to date from the rows after the last id it covered (a primary
+        key range), so reruns of the History tab do not rescan the table.
+
+        Returns:
+        --------
+        dict with count, mean, min and max (None when nothing matches)
+        """
+        key = (session_id, tuple(cities) if cities is not None else None, min_price, max_price)
+        with self._lock:
+            first_id, last_id = self._version(session_id)
+            memo = self._summaries.get(key)
+            if memo is not None and memo['first_id'] == first_id and memo['last_id'] == last_id:
+                return memo['summary']
+
+            incremental = memo is not None and memo['first_id'] == first_id and memo['last_id'] is not None
+            where, params = self._where(session_id, cities, min_price, max_price,
+                                        memo['last_id'] if incremental else None)
+            count, total, low, high = self.conn.execute(
+                "SELECT COUNT(*), SUM(estimated_price_tnd), MIN(estimated_price_tnd), MAX(estimated_price_tnd) "
+                # NOT INDEXED: the new rows are a primary-key range, which the planner would skip for the city index
+                f"FROM predictions{' NOT INDEXED' if incremental else ''}{where}", params).fetchone()
+            if incremental and memo['count']:
+                count += memo['count']
+                total = memo['total'] + (total or 0.0)
+                low = min(value for value in (low, memo['summary']['min']) if value is not None)
+                high = max(value for value in (high, memo['summary']['max']) if value is not None)
+
+            summary = {'count': count, 'mean': total / count if count else None, 'min': low, 'max': high}
+            if len(self._summaries) > 64:
+                self._summaries.clear()
+            self._summaries[key] = {'first_id': first_id, 'last_id': last_id, 'count': count,
+                                    'total': total or 0.0, 'summary': summary}
+            return summary
+
+    def page(self, session_id=None, cities=None, min_price=None, max_price=None, page=0, page_size=50):
+        """Matching predictions, newest first, as a DataFrame of at most page_size rows"""
+        import pandas as pd
+
+        where, params = self._where(session_id, cities, min_price, max_price)
+        with self._lock:
+            rows = self.conn.execute(
+                f"SELECT {', '.join(COLUMNS)} FROM predictions{where} "
+                "ORDER BY timestamp DESC, id DESC LIMIT ? OFFSET ?", params + [page_size, page * page_size]).fetchall()
+        return pd.DataFrame(rows, columns=COLUMNS)
+
+    def columns(self, columns, session_id=None, cities=None, min_price=None, max_price=None):
+        """Some columns of every matching prediction, as a DataFrame (for charts over the whole history)"""
+        import pandas as pd
+
+        unknown = set(columns) - set(COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown history columns: {', '.join(sorted(unknown))}")
+        where, params = self._where(session_id, cities, min_price, max_price)
+        with self._lock:
+            rows = self.conn.execute(f"SELECT {', '.join(columns)} FROM predictions{where}", params).fetchall()
+        return pd.DataFrame(rows, columns=columns)
+
+    def iter_chunks(self, session_id=None, cities=None, min_price=None, max_price=None,
+                    chunk_size=EXPORT_CHUNK_SIZE):
+        """Matching predictions, newest first, as DataFrames of at most chunk_size rows"""
+        import pandas as pd
+
+        where, params = self._where(session_id, cities, min_price, max_price)
+        # Separate connection: a long export must not hold the app's connection
+        conn = sqlite3.connect(self.path)
+        try:
+            cursor = conn.execute(
+                f"SELECT {', '.join(COLUMNS)} FROM predictions{where} ORDER BY timestamp DESC, id DESC", params)
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield pd.DataFrame(rows, columns=COLUMNS)
+        finally:
+            conn.close()
+
+    def export(self, output, output_format='csv', session_id=None, cities=None, min_price=None, max_price=None,
+               chunk_size=EXPORT_CHUNK_SIZE):
+        """
+        Stream the matching predictions to a file.
+
+        Parameters:
+        -----------
+        output : str or binary file object - Destination
+        output_format : str - 'csv' or 'parquet'
+
+        Returns:
+        --------
+        int - Number of rows written
+        """
+        rows = 0
+        if output_format == 'parquet':
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            writer = None
+            try:
+                for chunk in self.iter_chunks(session_id, cities, min_price, max_price, chunk_size):
+                    table = pa.Table.from_pandas(chunk, preserve_index=False)
+                    if writer is None:
+                        writer = pq.ParquetWriter(output, table.schema)
+                    writer.write_table(table.cast(writer.schema))
+                    rows += len(chunk)
+            finally:
+                if writer is not None:
+                    writer.close()
+            return rows
+
+        header = True
+        handle = open(output, 'wb') if isinstance(output, str) else output
+        try:
+            for chunk in self.iter_chunks(session_id, cities, min_price, max_price, chunk_size):
+                handle.write(chunk.to_csv(index=False, header=header).encode('utf-8'))
+                header = False
+                rows += len(chunk)
+            if header:
+                handle.write((','.join(COLUMNS) + '\n').encode('utf-8'))
+        finally:
+            if isinstance(output, str):
+                handle.close()
+        return rows
+
+    def __len__(self):
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM predictions").fetchone()[0]
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_history_store():
+    """Process-wide history store"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = HistoryStore()
+    return _store
+
+
+def generate_history(store, n_rows, session_id=None, seed=0, batch_size=100000):
+    """Insert n_rows synthetic predictions (random listings priced at the city medians) for a history id"""
+    import numpy as np
+    from config import CITIES
+
+    rng = np.random.default_rng(seed)
+    start = time.time() - n_rows
+    for offset in range(0, n_rows, batch_size):
+        n = min(batch_size, n_rows - offset)
+        sizes = rng.integers(30, 400, n).astype(float)
+        rooms = rng.integers(1, 7, n).astype(float)
+        prices = sizes * rng.normal(2.4, 0.6, n).clip(0.5)
+        cities = rng.choice(CITIES, n)
+        timestamps = [datetime.fromtimestamp(start + offset + i).strftime("%Y-%m-%d %H:%M:%S") for i in range(n)]
+        store.add_many([{
+            'timestamp': timestamps[i], 'city': cities[i], 'original_region': 'autres villes',
+            'imputed_region': 'autres villes', 'size': sizes[i], 'room_count': rooms[i],
+            'bathroom_count': 1.0, 'estimated_price_tnd': round(prices[i], 2),
+            'price_per_m2': round(prices[i] / sizes[i], 2), 'avg_room_size': round(sizes[i] / rooms[i], 2),
+        } for i in range(n)], session_id)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Prediction history store")
+    parser.add_argument('--db', default=HISTORY_DB_PATH)
+    parser.add_argument('--stats', action='store_true', help="Row count and query timings")
+    parser.add_argument('--export', metavar='PATH', help="Stream matching predictions to .csv or .parquet")
+    parser.add_argument('--session', help="History id of a browser (the app URL's ?history=), to filter or generate")
+    parser.add_argument('--city', action='append', help="Filter on a city (repeatable)")
+    parser.add_argument('--min-price', type=float)
+    parser.add_argument('--max-price', type=float)
+    parser.add_argument('--generate', type=int, metavar='N', help="Insert N synthetic predictions")
+    args = parser.parse_args(argv)
+
+    store = HistoryStore(args.db, max_rows=None, max_total_rows=None)
+    filters = {'session_id': args.session, 'cities': args.city, 'min_price': args.min_price,
+               'max_price': args.max_price}
+    if args.generate:
+        start = time.perf_counter()
+        generate_history(store, args.generate, args.session)
+        print(f"Inserted {args.generate:,} rows in {time.perf_counter() - start:.1f}s")
+    if args.export:
+        start = time.perf_counter()
+        rows = store.export(args.export, 'parquet' if args.export.endswith('.parquet') else 'csv', **filters)
+        print(f"Exported {rows:,} rows to {args.export} in {time.perf_counter() - start:.1f}s")
+    if args.stats:
+        import pandas  # noqa: F401 (imported by page(), keep it out of the timings)
+
+        print(f"{len(store):,} predictions in {args.db}")
+        for label, call in [
+            ('summary', lambda: store.summary(**filters)),
+            ('summary (memoized)', lambda: store.summary(**filters)),
+            ('first page', lambda: store.page(**filters)),
+            ('page 1000', lambda: store.page(**filters, page=1000)),
+        ]:
+            start = time.perf_counter()
+            call()
+            print(f"  {label:<20} {(time.perf_counter() - start) * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,296 @@
+"""
+Incremental update of the pipeline's data-dependent state from new listings.
+
+Takes rows appended in the merged.csv schema and, without retraining the
+champion model:
+
+    1. Filters them with each city's current IQR fences on price_per_m2
+    2. Updates city_price_stats from streaming summaries (running mean/std and
+       a quantile digest for the median) kept in the artifact's stream_state
+    3. Moves the virtual-region centroids with a mini-batch KMeans step
+    4. Recomputes the tiers from the per-virtual-region price digests, starting
+       KMeans from the current tier centers
+    5. Appends the listings with a known region to the KNN imputers' reference
+       set (capped at INCREMENTAL_KNN_MAX_REFERENCE rows per city, oldest dropped)
+    6. Widens the per-city input ranges that screen batch inputs, and merges
+       sketches of the new rows, priced through the request path, into the
+       drift reference
+
+and publishes the result as a new artifact version. Every step only touches
+the new rows and fixed-size summaries, so its cost grows with the new rows,
+not the history. Earlier listings keep the virtual region they were
+summarized under when the centroids move; retrain with train.py to reassign
+them.
+
+The conformal residual tables and the explanation background hold per-listing
+results computed with the previous tiers and centroids, which cannot be
+updated from summaries. They are kept as they are and listed in the
+artifact's 'stale_tables' (and its metadata) until the next train.py run
+rebuilds them; `conformal.py --calibrate` refreshes the residual table alone.
+
+Artifacts exported by the notebook have no stream_state: the first update
+rebuilds it once from TRAINING_DATA_PATH.
+
+Usage:
+    python incremental.py new_listings.csv                  # publishes the next registry version
+    python incremental.py new_listings.csv --output DIR     # or any directory
+    python incremental.py new_listings.csv --base v3        # start from v3 instead of the served version
+"""
+import argparse
+import copy
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from config import INCREMENTAL_KNN_MAX_REFERENCE, IQR_MULTIPLIER, TRAINING_DATA_PATH
+from cleaning import apply_bounds, get_input_profile, input_profile, prepare_listings
+from train import KNN_FEATURES, assign_tiers, build_stream_state, export_pipeline, load_training_data
+
+
+def assign_virtual_regions(clustering_models, df):
+    """virtual_region of each row from the pipeline's per-city scaler + KMeans (None when not clustered)"""
+    virtual_regions = pd.Series(None, index=df.index, dtype=object)
+    for city, models in clustering_models.items():
+        mask = (df['city'] == city) & df[KNN_FEATURES].notna().all(axis=1)
+        if mask.any():
+            clusters = models['kmeans'].predict(models['scaler'].transform(df.loc[mask, KNN_FEATURES]))
+            virtual_regions[mask] = [f"{city}_Cluster_{cluster}" for cluster in clusters]
+    return virtual_regions
+
+
+def bootstrap_stream_state(pipeline, data_path=TRAINING_DATA_PATH):
+    """Streaming summaries for an artifact exported without them (one pass over the training data)"""
+    df = load_training_data(data_path)
+    df['virtual_region'] = assign_virtual_regions(pipeline['clustering_models'], df)
+    return build_stream_state(df)
+
+
+def filter_outliers(state, rows):
+    """Keep rows of summarized cities whose price_per_m2 is inside the city's current IQR fences"""
+    quartiles = pd.DataFrame({city: summary['digest'].quantile(np.array([0.25, 0.75]))
+                              for city, summary in state['city_price_per_m2'].items()}, index=['q1', 'q3']).T
+    iqr = quartiles['q3'] - quartiles['q1']
+    bounds = pd.DataFrame({'lower': quartiles['q1'] - IQR_MULTIPLIER * iqr,
+                           'upper': quartiles['q3'] + IQR_MULTIPLIER * iqr})
+    return apply_bounds(rows, bounds)
+
+
+def update_price_stats(state, rows):
+    """Feed new price_per_m2 values to the city summaries; returns the refreshed city_price_stats"""
+    from sketches import QuantileDigest, RunningMoments
+
+    for city, values in rows.groupby('city')['price_per_m2']:
+        summary = state['city_price_per_m2'].setdefault(
+            city, {'moments': RunningMoments(), 'digest': QuantileDigest()})
+        summary['moments'].update(values)
+        summary['digest'].update(values)
+
+    stats = {'median': {}, 'mean': {}, 'std': {}}
+    for city, summary in sorted(state['city_price_per_m2'].items()):
+        stats['median'][city] = summary['digest'].quantile(0.5)
+        stats['mean'][city] = summary['moments'].mean
+        stats['std'][city] = summary['moments'].std
+    return stats
+
+
+def update_centroids(clustering_models, rows):
+    """
+    Mini-batch KMeans step: each centroid moves to the running mean of every
+    listing assigned to it (old count + new rows). Counts start from the fit's
+    labels_ and are kept in clustering_models[city]['counts'].
+
+    A city's entry is replaced by an updated copy: the KMeans objects of the
+    base artifact are never modified.
+    """
+    for city, models in list(clustering_models.items()):
+        city_rows = rows[(rows['city'] == city) & rows[KNN_FEATURES].notna().all(axis=1)]
+        if city_rows.empty:
+            continue
+        kmeans = copy.deepcopy(models['kmeans'])
+        centers = kmeans.cluster_centers_
+        counts = models.get('counts')
+        if counts is None:
+            counts = np.bincount(kmeans.labels_, minlength=len(centers)).astype(float)
+
+        X = models['scaler'].transform(city_rows[KNN_FEATURES])
+        labels = kmeans.predict(X)
+        batch_counts = np.bincount(labels, minlength=len(centers))
+        batch_sums = np.zeros_like(centers)
+        np.add.at(batch_sums, labels, X)
+        updated = batch_counts > 0
+        new_counts = counts + batch_counts
+        centers[updated] += (batch_sums[updated] - batch_counts[updated, None] * centers[updated]) \
+            / new_counts[updated, None]
+        kmeans.cluster_centers_ = centers
+        clustering_models[city] = dict(models, kmeans=kmeans, counts=new_counts)
+
+
+def update_tiers(state, rows, tier_lookup):
+    """Feed new rows to the virtual-region digests and recompute tier_lookup from their medians"""
+    from sketches import QuantileDigest
+
+    digests = state['virtual_region_price_per_m2']
+    for virtual_region, values in rows.dropna(subset=['virtual_region']).groupby('virtual_region')['price_per_m2']:
+        digests.setdefault(virtual_region, QuantileDigest()).update(values)
+    medians = pd.Series({virtual_region: digest.quantile(0.5) for virtual_region, digest in digests.items()})
+    return assign_tiers(medians, tier_lookup)
+
+
+def update_knn_references(knn_region_models, rows, max_reference=INCREMENTAL_KNN_MAX_REFERENCE):
+    """
+    Append listings with a known region to each city's KNN reference set and
+    refit the classifier (same k). Regions the label encoder has never seen are
+    skipped: the champion's one-hot encoder does not know them either.
+
+    Returns:
+    --------
+    int - Number of rows added
+    """
+    from sklearn.neighbors import KNeighborsClassifier
+
+    added = 0
+    for city, models in list(knn_region_models.items()):
+        known = rows[(rows['city'] == city) & (rows['region'] != 'autres villes')
+                     & rows['region'].isin(models['label_encoder'].classes_)
+                     & rows[KNN_FEATURES].notna().all(axis=1)]
+        if known.empty:
+            continue
+        knn = models['knn']
+        X = np.vstack([knn._fit_X, models['scaler'].transform(known[KNN_FEATURES])])[-max_reference:]
+        # knn._y indexes knn.classes_, which holds label-encoder codes
+        y = np.concatenate([knn.classes_[knn._y], models['label_encoder'].transform(known['region'])])[-max_reference:]
+        knn_region_models[city] = dict(models, knn=KNeighborsClassifier(n_neighbors=knn.n_neighbors,
+                                                                         weights=knn.weights).fit(X, y))
+        added += len(known)
+    return added
+
+
+def update_input_profile(profile, rows):
+    """input_profile ranges widened to cover the new rows"""
+    profile = {city: dict(ranges) for city, ranges in profile.items()}
+    for city, ranges in input_profile(rows).items():
+        current = profile.setdefault(city, ranges)
+        for column, (low, high) in ranges.items():
+            current[column] = (min(current[column][0], low), max(current[column][1], high))
+    return profile
+
+
+def update_drift_reference(reference, pipeline, rows):
+    """
+    Merge sketches of the new rows, priced through the request path with the
+    updated pipeline, into a copy of the drift reference.
+    """
+    from conformal import LISTING_COLUMNS
+    from drift import build_reference
+
+    reference = copy.deepcopy(reference)
+    for city, sketch in build_reference(pipeline, rows[LISTING_COLUMNS]).items():
+        if city in reference:
+            reference[city].merge(sketch)
+        else:
+            reference[city] = sketch
+    return reference
+
+
+def update_pipeline(pipeline, new_rows, data_path=TRAINING_DATA_PATH, max_reference=INCREMENTAL_KNN_MAX_REFERENCE):
+    """
+    Apply new listings to a loaded pipeline dict in place.
+
+    The models and summaries it updates are copied first, so objects the dict
+    shares with another artifact (such as the one being served) are unchanged.
+
+    Parameters:
+    -----------
+    pipeline : dict - Pipeline artifact (modified in place)
+    new_rows : pd.DataFrame - Rows in the merged.csv schema
+    data_path : str - Training data, read once to bootstrap a missing stream_state
+
+    Returns:
+    --------
+    dict - Row counts and tier changes of the update
+    """
+    if 'stream_state' not in pipeline:
+        pipeline['stream_state'] = bootstrap_stream_state(pipeline, data_path)
+    state = pipeline['stream_state'] = copy.deepcopy(pipeline['stream_state'])
+    pipeline['clustering_models'] = dict(pipeline['clustering_models'])
+    pipeline['knn_region_models'] = dict(pipeline['knn_region_models'])
+
+    # 1. Cleaning
+    rows = filter_outliers(state, prepare_listings(new_rows))
+
+    # 2. City price statistics
+    pipeline['city_price_stats'] = update_price_stats(state, rows)
+
+    # 3. Virtual-region centroids, then the new rows' virtual regions
+    update_centroids(pipeline['clustering_models'], rows)
+    rows = rows.assign(virtual_region=assign_virtual_regions(pipeline['clustering_models'], rows))
+
+    # 4. Tiers
+    previous_tiers = pipeline['tier_lookup']
+    pipeline['tier_lookup'] = update_tiers(state, rows, previous_tiers)
+
+    # 5. KNN reference sets
+    knn_rows = update_knn_references(pipeline['knn_region_models'], rows, max_reference)
+
+    # 6. Input ranges and drift reference; the per-listing tables wait for train.py
+    pipeline['input_profile'] = update_input_profile(get_input_profile(pipeline), rows)
+    if pipeline.get('drift_reference') is not None and len(rows):
+        pipeline['drift_reference'] = update_drift_reference(pipeline['drift_reference'], pipeline, rows)
+    stale = {'conformal_intervals', 'student_conformal_intervals', 'explain_background'}.intersection(pipeline)
+    pipeline['stale_tables'] = sorted(stale.union(pipeline.get('stale_tables', ())))
+
+    state['rows'] += len(rows)
+    return {
+        'received': len(new_rows),
+        'accepted': len(rows),
+        'knn_reference_rows': knn_rows,
+        'tier_changes': {virtual_region: (previous_tiers.get(virtual_region), tier)
+                         for virtual_region, tier in pipeline['tier_lookup'].items()
+                         if previous_tiers.get(virtual_region) != tier},
+    }
+
+
+def main(argv=None):
+    from registry import get_registry, load_version
+
+    parser = argparse.ArgumentParser(description="Update the pipeline state from new listings")
+    parser.add_argument('rows', nargs='+', help="CSV files of new listings (merged.csv schema)")
+    parser.add_argument('--base', help="Version to update (default: the version being served)")
+    parser.add_argument('--output', help="Export directory (default: next version in the model registry)")
+    parser.add_argument('--data', default=TRAINING_DATA_PATH, help="Training data, to bootstrap stream_state")
+    parser.add_argument('--max-reference', type=int, default=INCREMENTAL_KNN_MAX_REFERENCE,
+                        help="KNN reference rows kept per city")
+    args = parser.parse_args(argv)
+
+    registry = get_registry()
+    base = registry.get(args.base) if args.base else registry.resolve()
+    if base is None:
+        raise Exception("No pipeline version to update")
+    pipeline, _ = load_version(base, load_mode='joblib')
+    new_rows = pd.concat([pd.read_csv(path) for path in args.rows], ignore_index=True)
+
+    start = time.perf_counter()
+    summary = update_pipeline(pipeline, new_rows, args.data, args.max_reference)
+    elapsed = time.perf_counter() - start
+
+    metadata = dict(base.metadata,
+                    export_date=datetime.now().isoformat(),
+                    base_version=base.name,
+                    incremental_rows=base.metadata.get('incremental_rows', 0) + summary['accepted'],
+                    stale_tables=pipeline['stale_tables'],
+                    cities_supported=list(pipeline['knn_region_models'].keys()))
+    path = export_pipeline(pipeline, args.output or registry.next_version_dir(), metadata)
+
+    print(f"{summary['accepted']}/{summary['received']} rows applied to {base.name} in {elapsed * 1000:.0f} ms "
+          f"({summary['knn_reference_rows']} added to KNN reference sets)")
+    for virtual_region, (old, new) in sorted(summary['tier_changes'].items()):
+        print(f"  {virtual_region}: tier {old} -> {new}")
+    if pipeline['stale_tables']:
+        print(f"Kept until the next train.py run: {', '.join(pipeline['stale_tables'])}")
+    print(f"Exported to {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""
+Market insights precomputed from the loaded pipeline.
+
+One predict_prices call values every point the Market Insights tab shows:
+
+- price-vs-size and price-vs-rooms curves per city (region imputed as for
+  'Autres Villes', bathrooms and the other feature of the standard property fixed)
+- the standard property (INSIGHTS_STANDARD_PROPERTY) in every region of every
+  city, ranked, and placed on a folium map with the offline centroids of geo.py
+
+The result is cached per pipeline fingerprint and computed during app startup,
+so rendering the tab makes no model calls; a new pipeline (retraining or a
+registry hot swap) is picked up on the next get_insights call.
+
+Usage:
+    python insights.py    # compute and print the region ranking
+"""
+import threading
+import time
+from collections import namedtuple
+
+import numpy as np
+
+from config import (CITIES, CURRENCY, INSIGHTS_MAP_TILES, INSIGHTS_ROOMS_RANGE, INSIGHTS_SIZE_RANGE,
+                    INSIGHTS_STANDARD_PROPERTY)
+from utils import get_active_pipeline, predict_prices
+
+MarketInsights = namedtuple('MarketInsights', [
+    'fingerprint',         # pipeline artifact the surfaces were computed from
+    'size_curves',         # DataFrame: city, size, estimated_price_tnd, price_per_m2
+    'room_curves',         # DataFrame: city, room_count, estimated_price_tnd, price_per_m2
+    'standard_prices',     # DataFrame: city, estimated_price_tnd, price_per_m2 ('Autres Villes', standard property)
+    'region_valuations',   # DataFrame ranked by price: rank, city, region, estimated_price_tnd, price_per_m2,
+                           # vs_city_pct, latitude, longitude, located
+    'map_html',            # folium heatmap of region_valuations as HTML (None without folium)
+    'compute_seconds',
+])
+
+
+def _insight_rows(index):
+    """Every listing the insights need (regions from a PipelineIndex), tagged with the surface it belongs to"""
+    import pandas as pd
+
+    size, rooms, baths = INSIGHTS_STANDARD_PROPERTY
+    start, stop, step = INSIGHTS_SIZE_RANGE
+    sizes = np.arange(start, stop + step, step, dtype=float)
+    room_counts = np.arange(INSIGHTS_ROOMS_RANGE[0], INSIGHTS_ROOMS_RANGE[1] + 1, dtype=float)
+
+    frames = []
+    for city in CITIES:
+        frames.append(pd.DataFrame({'surface': 'size', 'city': city, 'size': sizes, 'room_count': rooms,
+                                    'bathroom_count': baths, 'region': 'autres villes'}))
+        frames.append(pd.DataFrame({'surface': 'rooms', 'city': city, 'size': size, 'room_count': room_counts,
+                                    'bathroom_count': baths, 'region': 'autres villes'}))
+        frames.append(pd.DataFrame({'surface': 'standard', 'city': [city], 'size': size, 'room_count': rooms,
+                                    'bathroom_count': baths, 'region': 'autres villes'}))
+        regions = [region for region in index.regions_by_city.get(city.lower(), index.all_regions)
+                   if region.lower() != 'autres villes']
+        frames.append(pd.DataFrame({'surface': 'region', 'city': city, 'size': size, 'room_count': rooms,
+                                    'bathroom_count': baths, 'region': regions, 'display_region': regions}))
+    return pd.concat(frames, ignore_index=True)
+
+
+def compute_insights(active=None):
+    """
+    Value every insight listing in one batch.
+
+    Parameters:
+    -----------
+    active : ActivePipeline - Snapshot to value with (default: the served pipeline); its
+             fingerprint keys the result, so a hot swap cannot mix two artifacts
+
+    Returns:
+    --------
+    MarketInsights
+    """
+    from geo import region_centroid
+
+    active = active or get_active_pipeline()
+    start = time.perf_counter()
+    rows = _insight_rows(active.index)
+    # Passed explicitly: the insight grid is not user traffic for the drift monitor
+    predictions = predict_prices(rows[['city', 'size', 'room_count', 'bathroom_count', 'region']].assign(
+        region=rows['region'].str.lower()), pipeline=active.pipeline)
+    rows['estimated_price_tnd'] = predictions['estimated_price_tnd'].to_numpy()
+    rows['price_per_m2'] = predictions['price_per_m2'].to_numpy()
+    price_columns = ['estimated_price_tnd', 'price_per_m2']
+
+    size_curves = rows.loc[rows['surface'] == 'size', ['city', 'size'] + price_columns].reset_index(drop=True)
+    room_curves = rows.loc[rows['surface'] == 'rooms', ['city', 'room_count'] + price_columns].reset_index(drop=True)
+    standard_prices = rows.loc[rows['surface'] == 'standard', ['city'] + price_columns].reset_index(drop=True)
+
+    regions = rows.loc[rows['surface'] == 'region', ['city', 'display_region'] + price_columns]
+    regions = regions.rename(columns={'display_region': 'region'})
+    city_price = standard_prices.set_index('city')['estimated_price_tnd']
+    regions['vs_city_pct'] = ((regions['estimated_price_tnd'] / regions['city'].map(city_price) - 1) * 100).round(1)
+    located = [region_centroid(city, region) for city, region in zip(regions['city'], regions['region'])]
+    regions['latitude'] = [coordinates[0] if coordinates else np.nan for coordinates, _ in located]
+    regions['longitude'] = [coordinates[1] if coordinates else np.nan for coordinates, _ in located]
+    regions['located'] = [found for _, found in located]
+    regions = regions.sort_values('estimated_price_tnd', ascending=False, kind='stable').reset_index(drop=True)
+    regions.insert(0, 'rank', np.arange(1, len(regions) + 1))
+
+    return MarketInsights(active.fingerprint, size_curves, room_curves, standard_prices, regions,
+                          build_region_map(regions), time.perf_counter() - start)
+
+
+def build_region_map(region_valuations):
+    """
+    Folium map of the region valuations: a heat layer weighted by price per m²
+    and one marker per region (colored on the same scale, valuation in the tooltip).
+
+    Returns:
+    --------
+    str - Standalone HTML, or None when folium is not installed
+    """
+    try:
+        import folium
+        from branca.colormap import LinearColormap
+        from folium.plugins import HeatMap
+    except ImportError:
+        return None
+
+    located = region_valuations.dropna(subset=['latitude', 'longitude'])
+    if located.empty:
+        return None
+    low, high = located['price_per_m2'].min(), located['price_per_m2'].max()
+    colormap = LinearColormap(['#2c7bb6', '#ffffbf', '#d7191c'], vmin=low, vmax=high,
+                              caption=f"Price per m² ({CURRENCY}/m²), standard property")
+
+    region_map = folium.Map(location=[located['latitude'].mean(), located['longitude'].mean()], zoom_start=11,
+                            tiles=INSIGHTS_MAP_TILES)
+    weights = (located['price_per_m2'] - low) / ((high - low) or 1.0)
+    HeatMap(np.column_stack([located['latitude'], located['longitude'], 0.2 + 0.8 * weights]).tolist(),
+            radius=25, blur=20, min_opacity=0.3).add_to(region_map)
+    for row in located.itertuples(index=False):
+        folium.CircleMarker(
+            location=[row.latitude, row.longitude],
+            radius=6,
+            color=colormap(row.price_per_m2),
+            fill=True,
+            fill_opacity=0.9,
+            tooltip=(f"<b>{row.region}</b> ({row.city})<br>#{row.rank}: {row.estimated_price_tnd:,.2f} {CURRENCY}"
+                     f"<br>{row.price_per_m2:,.2f} {CURRENCY}/m² ({row.vs_city_pct:+.1f}% vs city)"),
+        ).add_to(region_map)
+    colormap.add_to(region_map)
+    return region_map.get_root().render()
+
+
+_insights = None
+_insights_lock = threading.Lock()
+
+
+def get_insights():
+    """Insights of the loaded pipeline, computed once per pipeline fingerprint"""
+    global _insights
+    active = get_active_pipeline()
+    insights = _insights
+    if insights is not None and insights.fingerprint == active.fingerprint:
+        return insights
+    with _insights_lock:
+        if _insights is None or _insights.fingerprint != active.fingerprint:
+            _insights = compute_insights(active)
+    return _insights
+
+
+def main():
+    insights = get_insights()
+    size, rooms, baths = INSIGHTS_STANDARD_PROPERTY
+    print(f"Computed in {insights.compute_seconds * 1000:.0f} ms "
+          f"({len(insights.size_curves) + len(insights.room_curves) + len(insights.standard_prices)} curve points, "
+          f"{len(insights.region_valuations)} regions)")
+    print(f"\nStandard property ({size} m², {rooms} rooms, {baths} bathrooms) by region:")
+    print(insights.region_valuations.drop(columns=['latitude', 'longitude']).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,393 @@
+"""
+Precomputed prediction lookup table for the app's bounded input domain.
+
+The prediction form only accepts integer sizes of 10-1000 m², 1-20 rooms,
+1-10 bathrooms, the four CITIES and their trained regions. This module
+evaluates the pipeline over that domain once, offline, and stores the prices
+as a float32 tensor indexed by (city, region) slot x size x rooms x baths.
+An interactive prediction then becomes an array lookup. The table is opt-in
+(LOOKUP_TABLE_ENABLED): it costs its full size in memory in every process that
+serves from it.
+
+The size axis can be sampled on a coarser grid (LOOKUP_SIZE_STEP) with
+linear interpolation in between; a step of 1 stores the full domain exactly.
+For 'autres villes' the KNN-imputed region is stored too (taken from the
+nearest size on the grid), and so is the tier of every grid point, which
+selects the conformal offsets of the prediction interval (see conformal.py).
+
+Usage:
+    python lookup_table.py --build                 # build LOOKUP_TABLE_PATH
+    python lookup_table.py --build --size-step 1   # exhaustive domain, no interpolation
+    python lookup_table.py --validate -n 2000      # max deviation from predict_price and footprint
+"""
+import argparse
+import json
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+import metrics
+from config import (CITIES, LOOKUP_TABLE_ENABLED, LOOKUP_TABLE_PATH, LOOKUP_SIZE_STEP, LOOKUP_SIZE_RANGE,
+                    LOOKUP_ROOMS_RANGE, LOOKUP_BATHROOMS_RANGE)
+from conformal import interval
+from drift import observe
+from utils import (get_active_pipeline, get_pipeline_fingerprint, load_pipeline, predict_price, predict_prices,
+                   request_tiers)
+
+BUILD_BATCH_SIZE = 50000
+
+
+class PriceLookupTable:
+    """
+    Prices of every (city, region, size, rooms, baths) combination on the grid.
+
+    Attributes:
+    -----------
+    prices : np.ndarray float32 - (n_slots, n_sizes, n_rooms, n_baths)
+    imputed : np.ndarray int16 - (n_cities, n_sizes, n_rooms, n_baths) codes of the
+              region imputed for 'autres villes' (into regions_by_city[city])
+    tiers : np.ndarray int8 - (n_cities, n_sizes, n_rooms, n_baths) tier of each grid
+            point (None for tables built before prediction intervals)
+    """
+
+    def __init__(self, prices, imputed, sizes, rooms, baths, cities, regions_by_city, fingerprint, tiers=None):
+        self.prices = prices
+        self.imputed = imputed
+        self.tiers = tiers
+        self.sizes = sizes
+        self.rooms = rooms
+        self.baths = baths
+        self.cities = list(cities)
+        self.regions_by_city = {city: list(regions) for city, regions in regions_by_city.items()}
+        self.fingerprint = fingerprint
+
+        self._city_index = {city: i for i, city in enumerate(self.cities)}
+        self._slots = {}
+        for city in self.cities:
+            for region in self.regions_by_city[city]:
+                self._slots[(city, region)] = len(self._slots)
+
+    @property
+    def nbytes(self):
+        return self.prices.nbytes + self.imputed.nbytes + (self.tiers.nbytes if self.tiers is not None else 0)
+
+    def save(self, path=LOOKUP_TABLE_PATH):
+        metadata = {
+            'cities': self.cities,
+            'regions_by_city': self.regions_by_city,
+            'fingerprint': self.fingerprint,
+        }
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        arrays = {'prices': self.prices, 'imputed': self.imputed, 'sizes': self.sizes, 'rooms': self.rooms,
+                  'baths': self.baths, 'metadata': np.array(json.dumps(metadata))}
+        if self.tiers is not None:
+            arrays['tiers'] = self.tiers
+        # Written under a temporary name so a running app never loads a partial table
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.savez_compressed(f, **arrays)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path=LOOKUP_TABLE_PATH):
+        with np.load(path) as data:
+            metadata = json.loads(str(data['metadata']))
+            return cls(data['prices'], data['imputed'], data['sizes'], data['rooms'], data['baths'],
+                       metadata['cities'], metadata['regions_by_city'], metadata['fingerprint'],
+                       data['tiers'] if 'tiers' in data else None)
+
+    def _size_position(self, size):
+        """(lower index, upper index, upper weight) of size on the grid, or None outside it"""
+        if size < self.sizes[0] or size > self.sizes[-1]:
+            return None
+        upper = int(np.searchsorted(self.sizes, size))
+        if self.sizes[upper] == size:
+            return upper, upper, 0.0
+        lower = upper - 1
+        weight = (size - self.sizes[lower]) / (self.sizes[upper] - self.sizes[lower])
+        return lower, upper, float(weight)
+
+    def lookup(self, city, size, room_count, bathroom_count, region='autres villes', active=None):
+        """
+        Same contract as utils.predict_price, or None when the listing is
+        outside the tabulated domain (the caller should fall back to the model).
+        `active` is the utils.ActivePipeline snapshot whose region index and
+        conformal table are used (defaults to the active one).
+        """
+        active = active or get_active_pipeline()
+        city = city.lower()
+        original_region = region
+        region = active.index.region_canonicalizer.canonical(city, region)
+        slot = self._slots.get((city, region))
+        position = self._size_position(size)
+        room_index = int(room_count) - int(self.rooms[0])
+        bath_index = int(bathroom_count) - int(self.baths[0])
+        if (slot is None or position is None or room_count != int(room_count)
+                or bathroom_count != int(bathroom_count)
+                or not 0 <= room_index < len(self.rooms) or not 0 <= bath_index < len(self.baths)):
+            return None
+
+        lower, upper, weight = position
+        prices = self.prices[slot, :, room_index, bath_index]
+        estimated_price = float(prices[lower]) * (1 - weight) + float(prices[upper]) * weight
+
+        nearest = upper if weight >= 0.5 else lower
+        if region == 'autres villes':
+            code = self.imputed[self._city_index[city], nearest, room_index, bath_index]
+            imputed_region = self.regions_by_city[city][code]
+        else:
+            imputed_region = region
+
+        if self.tiers is not None:
+            tier = self.tiers[self._city_index[city], nearest, room_index, bath_index]
+            price_low, price_high = interval(active.pipeline.get('conformal_intervals'), estimated_price, city, tier,
+                                             imputed=region == 'autres villes')
+        else:
+            price_low, price_high = None, None
+
+        avg_room_size = size / room_count if room_count > 0 else 0
+        price_per_m2 = estimated_price / size if size > 0 else 0
+        return {
+            'city': city.title(),
+            'size': size,
+            'room_count': room_count,
+            'bathroom_count': bathroom_count,
+            'original_region': original_region,
+            'canonical_region': region,
+            'imputed_region': imputed_region,
+            'estimated_price_tnd': round(estimated_price, 2),
+            'price_low_tnd': price_low,
+            'price_high_tnd': price_high,
+            'price_per_m2': round(price_per_m2, 2),
+            'avg_room_size': round(avg_room_size, 2)
+        }
+
+
+def build_lookup_table(size_step=LOOKUP_SIZE_STEP, size_range=LOOKUP_SIZE_RANGE,
+                       rooms_range=LOOKUP_ROOMS_RANGE, bathrooms_range=LOOKUP_BATHROOMS_RANGE,
+                       cities=CITIES, verbose=False):
+    """
+    Evaluate the pipeline over the whole grid with predict_prices.
+
+    Returns:
+    --------
+    PriceLookupTable
+    """
+    pipeline = load_pipeline()
+    sizes = np.arange(size_range[0], size_range[1] + 1, size_step, dtype=np.float64)
+    if sizes[-1] != size_range[1]:
+        sizes = np.append(sizes, float(size_range[1]))
+    rooms = np.arange(rooms_range[0], rooms_range[1] + 1)
+    baths = np.arange(bathrooms_range[0], bathrooms_range[1] + 1)
+
+    cities = [city.lower() for city in cities]
+    regions_by_city = {}
+    for city in cities:
+        regions = ['autres villes']
+        if city in pipeline['knn_region_models']:
+            regions += [r for r in pipeline['knn_region_models'][city]['label_encoder'].classes_.tolist()
+                        if r != 'autres villes']
+        regions_by_city[city] = regions
+
+    n_slots = sum(len(regions) for regions in regions_by_city.values())
+    grid_shape = (len(sizes), len(rooms), len(baths))
+    prices = np.empty((n_slots,) + grid_shape, dtype=np.float32)
+    imputed = np.zeros((len(cities),) + grid_shape, dtype=np.int16)
+    tiers = np.ones((len(cities),) + grid_shape, dtype=np.int8)
+
+    size_grid, rooms_grid, baths_grid = [axis.ravel() for axis in np.meshgrid(sizes, rooms, baths, indexing='ij')]
+    grid_size = size_grid.size
+    slot = 0
+    start = time.perf_counter()
+
+    for city_index, city in enumerate(cities):
+        region_codes = {region: code for code, region in enumerate(regions_by_city[city])}
+        tiers[city_index] = request_tiers(pipeline, np.full(grid_size, city, dtype=object), size_grid, rooms_grid,
+                                          baths_grid).reshape(grid_shape)
+        for region in regions_by_city[city]:
+            slot_prices = np.empty(grid_size, dtype=np.float32)
+            slot_imputed = np.empty(grid_size, dtype=np.int16) if region == 'autres villes' else None
+            for offset in range(0, grid_size, BUILD_BATCH_SIZE):
+                chunk = slice(offset, offset + BUILD_BATCH_SIZE)
+                results = predict_prices(pd.DataFrame({
+                    'city': city,
+                    'size': size_grid[chunk],
+                    'room_count': rooms_grid[chunk],
+                    'bathroom_count': baths_grid[chunk],
+                    'region': region,
+                }), pipeline=pipeline)
+                slot_prices[chunk] = results['estimated_price_tnd'].to_numpy()
+                if slot_imputed is not None:
+                    codes = results['imputed_region'].map(region_codes)
+                    if codes.isna().any():
+                        missing = sorted(results.loc[codes.isna(), 'imputed_region'].astype(str).unique())
+                        raise ValueError(f"{city}: imputed regions outside the table's regions: {missing}")
+                    slot_imputed[chunk] = codes.to_numpy()
+
+            prices[slot] = slot_prices.reshape(grid_shape)
+            if slot_imputed is not None:
+                imputed[city_index] = slot_imputed.reshape(grid_shape)
+            slot += 1
+            if verbose:
+                print(f"  [{slot}/{n_slots}] {city} / {region} ({time.perf_counter() - start:.0f}s)")
+
+    return PriceLookupTable(prices, imputed, sizes, rooms, baths, cities, regions_by_city,
+                            get_pipeline_fingerprint(), tiers)
+
+
+def validate_lookup_table(table, n=2000, seed=42, path=LOOKUP_TABLE_PATH):
+    """
+    Compare table lookups with live predict_price on random in-domain listings
+    (sizes are drawn off the grid so interpolation is exercised).
+
+    Returns:
+    --------
+    dict with max/mean absolute and relative price deviation, imputed-region
+    mismatch rate, listings the table did not answer (skipped) and memory/disk footprint
+
+    Raises:
+    -------
+    ValueError - The table was built from another pipeline artifact than the loaded one
+    """
+    fingerprint = get_pipeline_fingerprint()
+    if table.fingerprint != fingerprint:
+        raise ValueError(f"The table was built from pipeline {table.fingerprint}, the loaded pipeline is "
+                         f"{fingerprint}: rebuild it with --build")
+
+    rng = np.random.default_rng(seed)
+    abs_errors = []
+    rel_errors = []
+    region_mismatches = 0
+    imputed_lookups = 0
+    misses = []
+    size_low, size_high = int(table.sizes[0]), int(table.sizes[-1])
+
+    for _ in range(n):
+        city = table.cities[rng.integers(len(table.cities))]
+        regions = table.regions_by_city[city]
+        region = regions[rng.integers(len(regions))] if rng.random() < 0.5 else 'autres villes'
+        listing = (city, int(rng.integers(size_low, size_high + 1)),
+                   int(rng.integers(table.rooms[0], table.rooms[-1] + 1)),
+                   int(rng.integers(table.baths[0], table.baths[-1] + 1)), region)
+
+        actual = table.lookup(*listing)
+        if actual is None:
+            # Not on the grid (e.g. a region the table has no slot for): the app falls back to the model
+            misses.append(listing)
+            continue
+        expected = predict_price(*listing)
+        error = abs(actual['estimated_price_tnd'] - expected['estimated_price_tnd'])
+        abs_errors.append(error)
+        rel_errors.append(error / expected['estimated_price_tnd'])
+        if region == 'autres villes':
+            imputed_lookups += 1
+            region_mismatches += actual['imputed_region'] != expected['imputed_region']
+
+    return {
+        'listings': n,
+        'misses': len(misses),
+        'missed_listings': misses[:10],
+        'max_abs_deviation': float(np.max(abs_errors)) if abs_errors else float('nan'),
+        'mean_abs_deviation': float(np.mean(abs_errors)) if abs_errors else float('nan'),
+        'max_rel_deviation': float(np.max(rel_errors)) if rel_errors else float('nan'),
+        'mean_rel_deviation': float(np.mean(rel_errors)) if rel_errors else float('nan'),
+        'region_mismatch_rate': region_mismatches / imputed_lookups if imputed_lookups else 0.0,
+        'memory_mb': table.nbytes / 1024 ** 2,
+        'disk_mb': os.path.getsize(path) / 1024 ** 2 if os.path.exists(path) else None,
+    }
+
+
+# ((pipeline fingerprint, table file version), table or None)
+_table = None
+_table_lock = threading.Lock()
+
+
+def _file_version(path):
+    """(mtime, size) of a file, None when it does not exist"""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def get_lookup_table(path=LOOKUP_TABLE_PATH, fingerprint=None):
+    """
+    The saved lookup table if it exists and matches the pipeline `fingerprint`
+    (defaults to the loaded pipeline's), else None.
+
+    Cached per pipeline fingerprint and table file version, so a table built or a
+    pipeline swapped in while the process runs is picked up by the next call.
+    """
+    global _table
+    key = (fingerprint or get_pipeline_fingerprint(), _file_version(path))
+    cached = _table
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    with _table_lock:
+        if _table is None or _table[0] != key:
+            table = PriceLookupTable.load(path) if key[1] is not None else None
+            if table is not None and table.fingerprint != key[0]:
+                # Built from a different pipeline artifact: never serve its prices
+                table = None
+            _table = (key, table)
+        return _table[1]
+
+
+def lookup_predict_price(city, size, room_count, bathroom_count, region='autres villes', fallback=predict_price):
+    """Table lookup when enabled (LOOKUP_TABLE_ENABLED), available and in domain, otherwise `fallback` (the live model)"""
+    if not LOOKUP_TABLE_ENABLED:
+        return fallback(city, size, room_count, bathroom_count, region)
+    clock = metrics.stage_clock()
+    started = clock()
+    active = get_active_pipeline()
+    table = get_lookup_table(LOOKUP_TABLE_PATH, active.fingerprint)
+    result = table.lookup(city, size, room_count, bathroom_count, region, active) if table is not None else None
+    if result is None:
+        result = fallback(city, size, room_count, bathroom_count, region)
+    else:
+        # Table hits never reach predict_price: record them and queue them for the input drift monitor here
+        if metrics.enabled:
+            metrics.record_call('lookup', city.lower(), clock() - started)
+        observe(result)
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Precomputed prediction lookup table")
+    parser.add_argument('--build', action='store_true', help="Evaluate the pipeline over the grid and save it")
+    parser.add_argument('--validate', action='store_true', help="Report deviation from live predictions")
+    parser.add_argument('--size-step', type=int, default=LOOKUP_SIZE_STEP, help="Grid step on the size axis (m²)")
+    parser.add_argument('--output', default=LOOKUP_TABLE_PATH)
+    parser.add_argument('-n', type=int, default=2000, help="Validation listings")
+    args = parser.parse_args(argv)
+
+    if args.build:
+        start = time.perf_counter()
+        table = build_lookup_table(size_step=args.size_step, verbose=True)
+        table.save(args.output)
+        print(f"Built {table.prices.size:,} prices in {time.perf_counter() - start:.1f}s -> {args.output}")
+    if args.validate:
+        table = PriceLookupTable.load(args.output)
+        try:
+            report = validate_lookup_table(table, args.n, path=args.output)
+        except ValueError as e:
+            raise SystemExit(f"Cannot validate {args.output}: {e}")
+        print(f"Validated {report['listings'] - report['misses']} listings against predict_price "
+              f"({report['misses']} not answered by the table, served by the model):")
+        for listing in report['missed_listings']:
+            print(f"  not in the table: {listing}")
+        print(f"  max deviation:   {report['max_abs_deviation']:.4f} (abs) | "
+              f"{report['max_rel_deviation']:.4%} (rel)")
+        print(f"  mean deviation:  {report['mean_abs_deviation']:.4f} (abs) | {report['mean_rel_deviation']:.4%} (rel)")
+        print(f"  region mismatch: {report['region_mismatch_rate']:.2%} of 'autres villes' lookups")
+        print(f"  footprint:       {report['memory_mb']:.1f} MB in memory | {report['disk_mb']:.1f} MB on disk")
+
+
+if __name__ == "__main__":
+    main()
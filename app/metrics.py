@@ -0,0 +1,265 @@
+"""
+Per-stage latency and outcome metrics for predict_price / predict_prices.
+
+When enabled, every prediction records the time spent in each of the five
+stages (KNN region imputation, cluster assignment, tier lookup, feature
+engineering, champion predict) together with how often the region had to be
+imputed, how often virtual_region fell back to None and how often the tier
+lookup missed. Predictions that never run the stages (compiled mode, lookup
+table and prediction cache hits) record their call latency and listing count
+under their own path. When disabled (the default), the instrumented functions
+only call a no-op clock, so the hot path is unchanged.
+
+Metrics are exposed in the Prometheus text format: by render_prometheus()
+(served at /metrics by server.py), by a file rewritten periodically for the
+node_exporter textfile collector (METRICS_PATH), and in the app's hidden
+diagnostics panel (open the app with ?diagnostics=1). The Prometheus output
+also carries the input drift scores of drift.py.
+"""
+import logging
+import os
+import threading
+import time
+
+from config import METRICS_ENABLED, METRICS_PATH, METRICS_FILE_INTERVAL
+
+STAGES = ('imputation', 'clustering', 'tier_lookup', 'features', 'predict')
+# Histogram upper bounds in seconds (+Inf is implicit)
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+enabled = METRICS_ENABLED
+logger = logging.getLogger(__name__)
+
+
+def _no_clock():
+    return 0.0
+
+
+def stage_clock():
+    """time.perf_counter when metrics are enabled, else a no-op returning 0.0"""
+    return time.perf_counter if enabled else _no_clock
+
+
+def enable():
+    global enabled
+    enabled = True
+
+
+def disable():
+    global enabled
+    enabled = False
+
+
+class _Histogram:
+    __slots__ = ('buckets', 'count', 'total', 'max')
+
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        index = 0
+        while index < len(BUCKETS) and seconds > BUCKETS[index]:
+            index += 1
+        self.buckets[index] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-quantile (the max for the +Inf bucket)"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if seen >= rank:
+                return BUCKETS[index] if index < len(BUCKETS) else self.max
+        return self.max
+
+
+class PredictionMetrics:
+    """Thread-safe registry of stage histograms and per-city outcome counters"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            # (path, stage) -> _Histogram, path is 'single' or 'batch'
+            self.stages = {}
+            # path -> _Histogram of whole-call latency, path is 'single', 'batch', 'compiled', 'lookup' or 'cache'
+            self.calls = {}
+            # (path, city) -> [predictions, imputations, virtual_region fallbacks, tier lookup misses]
+            self.counters = {}
+
+    def record(self, path, city, durations, rows=1, imputed=0, fallbacks=0, tier_misses=0):
+        """
+        Record one prediction call.
+
+        Parameters:
+        -----------
+        path : str - 'single' (predict_price) or 'batch' (predict_prices)
+        city : str - City of the rows, or 'all' for a mixed batch
+        durations : tuple - Seconds spent in each of the five STAGES
+        rows : int - Number of listings predicted
+        imputed, fallbacks, tier_misses : int - Outcome counts over those rows
+        """
+        with self._lock:
+            for stage, seconds in zip(STAGES, durations):
+                histogram = self.stages.get((path, stage))
+                if histogram is None:
+                    histogram = self.stages[(path, stage)] = _Histogram()
+                histogram.observe(seconds)
+            self._count(path, city, sum(durations), rows, imputed, fallbacks, tier_misses)
+
+    def record_call(self, path, city, seconds, rows=1):
+        """
+        Record a prediction served without running the stages.
+
+        Parameters:
+        -----------
+        path : str - 'compiled' (compiled mode), 'lookup' (lookup table hit) or 'cache' (prediction cache hit)
+        city : str - City of the listing
+        seconds : float - Latency of the call
+        rows : int - Number of listings predicted
+        """
+        with self._lock:
+            self._count(path, city, seconds, rows)
+
+    def _count(self, path, city, seconds, rows, imputed=0, fallbacks=0, tier_misses=0):
+        # Caller holds the lock
+        histogram = self.calls.get(path)
+        if histogram is None:
+            histogram = self.calls[path] = _Histogram()
+        histogram.observe(seconds)
+        counts = self.counters.get((path, city))
+        if counts is None:
+            counts = self.counters[(path, city)] = [0, 0, 0, 0]
+        counts[0] += rows
+        counts[1] += imputed
+        counts[2] += fallbacks
+        counts[3] += tier_misses
+
+    def snapshot(self):
+        """
+        Plain-data view for display.
+
+        Returns:
+        --------
+        (stage rows, city rows) - lists of dicts; the whole-call latency of each path is the stage 'total'
+        """
+        with self._lock:
+            histograms = list(self.stages.items()) + [((path, 'total'), h) for path, h in self.calls.items()]
+            stage_rows = [{
+                'path': path,
+                'stage': stage,
+                'calls': h.count,
+                'mean_ms': h.total / h.count * 1000 if h.count else 0.0,
+                'p50_ms': h.quantile(0.5) * 1000,
+                'p99_ms': h.quantile(0.99) * 1000,
+                'max_ms': h.max * 1000,
+            } for (path, stage), h in sorted(histograms, key=lambda item: (
+                item[0][0], STAGES.index(item[0][1]) if item[0][1] in STAGES else len(STAGES)))]
+            city_rows = [{
+                'path': path,
+                'city': city,
+                'predictions': counts[0],
+                'imputation_rate': counts[1] / counts[0] if counts[0] else 0.0,
+                'virtual_region_fallbacks': counts[2],
+                'tier_lookup_misses': counts[3],
+            } for (path, city), counts in sorted(self.counters.items())]
+        return stage_rows, city_rows
+
+    def render_prometheus(self):
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            lines.append('# HELP house_price_stage_seconds Time spent in each prediction stage')
+            lines.append('# TYPE house_price_stage_seconds histogram')
+            for (path, stage), h in sorted(self.stages.items()):
+                labels = f'path="{path}",stage="{stage}"'
+                cumulative = 0
+                for bound, count in zip(BUCKETS + ('+Inf',), h.buckets):
+                    cumulative += count
+                    lines.append(f'house_price_stage_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f'house_price_stage_seconds_sum{{{labels}}} {h.total:.9f}')
+                lines.append(f'house_price_stage_seconds_count{{{labels}}} {h.count}')
+
+            lines.append('# HELP house_price_prediction_seconds Latency of each prediction call, by serving path')
+            lines.append('# TYPE house_price_prediction_seconds histogram')
+            for path, h in sorted(self.calls.items()):
+                labels = f'path="{path}"'
+                cumulative = 0
+                for bound, count in zip(BUCKETS + ('+Inf',), h.buckets):
+                    cumulative += count
+                    lines.append(f'house_price_prediction_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f'house_price_prediction_seconds_sum{{{labels}}} {h.total:.9f}')
+                lines.append(f'house_price_prediction_seconds_count{{{labels}}} {h.count}')
+
+            for position, (name, help_text) in enumerate([
+                ('house_price_predictions_total', 'Listings predicted'),
+                ('house_price_region_imputations_total', "Listings whose region was imputed by KNN"),
+                ('house_price_virtual_region_fallbacks_total', 'Listings whose virtual_region fell back to None'),
+                ('house_price_tier_lookup_misses_total', 'Listings whose virtual_region is not in tier_lookup'),
+            ]):
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} counter')
+                for (path, city), counts in sorted(self.counters.items()):
+                    lines.append(f'{name}{{path="{path}",city="{city}"}} {counts[position]}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = PredictionMetrics()
+
+
+def record_prediction(path, city, durations, rows=1, imputed=0, fallbacks=0, tier_misses=0):
+    """Record a prediction in the global registry (callers check `enabled` first)"""
+    registry.record(path, city, durations, rows, imputed, fallbacks, tier_misses)
+
+
+def record_call(path, city, seconds, rows=1):
+    """Record a prediction served without the stages in the global registry (callers check `enabled` first)"""
+    registry.record_call(path, city, seconds, rows)
+
+
+def render_prometheus():
+    """Prediction metrics followed by the input drift scores (drift.py)"""
+    import drift
+    return registry.render_prometheus() + drift.render_prometheus()
+
+
+def write_metrics_file(path=METRICS_PATH):
+    """Write the metrics atomically so a scraper never reads a partial file"""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        f.write(render_prometheus())
+    os.replace(tmp_path, path)
+
+
+_exporter = None
+_exporter_lock = threading.Lock()
+
+
+def start_file_exporter(path=METRICS_PATH, interval=METRICS_FILE_INTERVAL):
+    """Rewrite `path` every `interval` seconds in a daemon thread (once per process)"""
+    global _exporter
+    with _exporter_lock:
+        if _exporter is None:
+            def export():
+                while True:
+                    try:
+                        write_metrics_file(path)
+                    except OSError:
+                        # Full disk, missing directory...: retried on the next interval
+                        logger.exception("Could not write the metrics file %s", path)
+                    time.sleep(interval)
+
+            _exporter = threading.Thread(target=export, name="metrics-exporter", daemon=True)
+            _exporter.start()
+    return _exporter
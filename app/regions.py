@@ -0,0 +1,293 @@
+"""
+Canonical region names for free-text inputs.
+
+The model only knows the region names of its training data: each city's
+label_encoder.classes_, lowercase and with the notebook's duplicate spellings
+('mégrine' / 'mgrine'). Scraped or typed names often miss them by an accent, an
+apostrophe, an article or a typo ("Jardins D'el Menzah", "El Menzah",
+"Megrin"), and the one-hot encoder then ignores the region altogether.
+
+RegionCanonicalizer is built once per pipeline, with its metadata index, and
+resolves a name among the classes of its city, in order:
+
+1. exact: a trained class is kept as is, so the model's own spellings never change
+2. normalized: the geo.normalize_region_name key (accents, case, punctuation)
+   of a class or of a cleaning.GROUPED_REGIONS variant; variants map to the first
+   name of their group
+3. skeleton: the normalized key without articles ('el', "l'", 'la', 'cité'...)
+   and spaces, or only without spaces, when it belongs to a single class
+4. typo: trigram Dice similarity against a precomputed inverted index of the
+   skeletons, when the best class reaches REGION_MATCH_MIN_SIMILARITY, beats
+   every other class by MIN_MARGIN and has the same numbers ('el menzah 7'
+   never becomes 'el menzah 9')
+
+Names that resolve to nothing are returned lowercased, as before, and blank
+names become 'autres villes'. A column is resolved once per distinct
+(city, name) pair and resolutions are memoized, so normalizing a whole
+dataset costs a factorization plus dict lookups.
+
+Usage:
+    python regions.py "jardins el menzah" --city ariana   # resolve one name
+    python regions.py --report                             # resolve the regions of the raw scraped dataset
+"""
+import argparse
+import re
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from config import REGION_MATCH_MIN_SIMILARITY
+from geo import normalize_region_name
+
+UNKNOWN_REGION = 'autres villes'
+ARTICLES = frozenset(['el', 'l', 'la', 'le', 'les', 'd', 'de', 'du', 'des', 'cite', 'cit'])
+MIN_MARGIN = 0.1  # Similarity by which a typo correction must beat the next closest region
+MAX_RESOLVED = 65536  # Memoized (city, name) resolutions before the memo is reset
+
+
+def skeleton(key):
+    """Normalized key without articles and spaces ('jardins d el menzah' -> 'jardinsmenzah')"""
+    tokens = [token for token in key.split() if token not in ARTICLES]
+    return ''.join(tokens or key.split())
+
+
+def trigrams(text):
+    """Distinct character trigrams of text padded with boundary marks"""
+    padded = f"#{text}#"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class _CityRegions:
+    """Lookup keys and trigram index of the trained regions of one city"""
+
+    def __init__(self, classes, grouped_regions):
+        classes = [str(region) for region in classes]
+        known = set(classes)
+
+        # 2. Normalized keys: alias groups first, so duplicate spellings resolve to the group's first name
+        self.normalized = {}
+        for group in grouped_regions:
+            present = [name.lower() for name in group if name.lower() in known]
+            if not present:
+                continue
+            canonical = group[0].lower() if group[0].lower() in known else present[0]
+            for name in group:
+                self.normalized.setdefault(normalize_region_name(name), canonical)
+        for region in classes:
+            self.normalized.setdefault(normalize_region_name(region), region)
+        self.normalized[UNKNOWN_REGION] = UNKNOWN_REGION
+        self.classes = known | {UNKNOWN_REGION}
+
+        # 3. Skeleton keys (and keys without spaces, 'lamarsa'): dropped when they belong to different classes
+        skeletons = {}
+        for key, region in self.normalized.items():
+            skeletons.setdefault(skeleton(key), set()).add(region)
+            skeletons.setdefault(key.replace(' ', ''), set()).add(region)
+        self.skeletons = {key: regions.pop() for key, regions in skeletons.items() if len(regions) == 1}
+
+        # 4. Inverted trigram index over the unambiguous skeletons
+        self.targets = np.array(list(self.skeletons.values()), dtype=object)
+        keys = list(self.skeletons)
+        self.numbers = [re.findall(r'\d+', key) for key in keys]
+        grams = [trigrams(key) for key in keys]
+        self.gram_counts = np.array([len(key_grams) for key_grams in grams])
+        postings = {}
+        for position, key_grams in enumerate(grams):
+            for gram in key_grams:
+                postings.setdefault(gram, []).append(position)
+        self.postings = {gram: np.array(positions) for gram, positions in postings.items()}
+
+    def closest(self, key, min_similarity):
+        """Class of the most similar skeleton, or None when none is close enough or another class is as close"""
+        query_grams = [gram for gram in trigrams(key) if gram in self.postings]
+        if not query_grams:
+            return None
+        shared = np.bincount(np.concatenate([self.postings[gram] for gram in query_grams]),
+                             minlength=len(self.targets))
+        similarity = 2 * shared / (len(trigrams(key)) + self.gram_counts)
+        numbers = re.findall(r'\d+', key)
+        similarity[[position for position, key_numbers in enumerate(self.numbers) if key_numbers != numbers]] = 0
+        best = int(np.argmax(similarity))
+        if similarity[best] < min_similarity:
+            return None
+        others = similarity[self.targets != self.targets[best]]
+        if len(others) and others.max() > similarity[best] - MIN_MARGIN:
+            return None
+        return self.targets[best]
+
+
+class RegionCanonicalizer:
+    """
+    Maps free-text region names onto the trained region classes of each city.
+
+    Parameters:
+    -----------
+    classes_by_city : dict - city (lowercase) -> region classes of its label encoder
+    grouped_regions : list - Alias groups, first name canonical (cleaning.GROUPED_REGIONS)
+    min_similarity : float - Trigram Dice similarity a misspelled name needs to be corrected
+    """
+
+    def __init__(self, classes_by_city, grouped_regions=(), min_similarity=REGION_MATCH_MIN_SIMILARITY):
+        self.min_similarity = min_similarity
+        self._cities = {city: _CityRegions(classes, grouped_regions) for city, classes in classes_by_city.items()}
+        self._resolved = {}
+
+    @classmethod
+    def from_pipeline(cls, pipeline):
+        """Index of a pipeline artifact's label-encoder classes and the notebook's region groups"""
+        from cleaning import GROUPED_REGIONS
+
+        return cls({city: models['label_encoder'].classes_.tolist()
+                    for city, models in pipeline['knn_region_models'].items()}, GROUPED_REGIONS)
+
+    def resolve(self, city, region):
+        """
+        Canonical name of one region and how it was found.
+
+        Returns:
+        --------
+        (region, method) with method 'exact', 'normalized', 'skeleton', 'typo',
+        'unresolved' or 'other_city' (the last two with region lowercased and stripped)
+        """
+        region = str(region).strip().lower()
+        index = self._cities.get(str(city).strip().lower())
+        if index is None:
+            return region, 'other_city'
+        if region in index.classes:
+            return region, 'exact'
+        key = normalize_region_name(region)
+        if not key:
+            return UNKNOWN_REGION, 'normalized'
+        if key in index.normalized:
+            return index.normalized[key], 'normalized'
+        compact = skeleton(key)
+        if compact in index.skeletons:
+            return index.skeletons[compact], 'skeleton'
+        closest = index.closest(compact, self.min_similarity)
+        if closest is not None:
+            return closest, 'typo'
+        return region, 'unresolved'
+
+    def known(self, cities, regions):
+        """
+        Vectorized: whether each region resolves to a trained region of its city
+        (or is 'autres villes'), i.e. whether the model's region encoder knows it.
+        """
+        canonical = self.canonicalize(cities, regions)
+        classes = {city: index.classes for city, index in self._cities.items()}
+        return np.array([region in classes.get(city, ()) for city, region in zip(cities, canonical)], dtype=bool)
+
+    def canonical(self, city, region):
+        """Canonical name of one region (memoized)"""
+        key = (city, region)
+        resolved = self._resolved.get(key)
+        if resolved is None:
+            if len(self._resolved) >= MAX_RESOLVED:
+                self._resolved = {}
+            resolved = self._resolved[key] = self.resolve(city, region)[0]
+        return resolved
+
+    def canonicalize(self, cities, regions):
+        """
+        Vectorized canonical: each distinct (city, region) pair is resolved once.
+
+        Parameters:
+        -----------
+        cities : array-like - Lowercase city of each row
+        regions : array-like - Region name of each row (no missing values)
+
+        Returns:
+        --------
+        np.ndarray (object) of canonical region names
+        """
+        cities = np.asarray(cities, dtype=object)
+        regions = np.asarray(regions, dtype=object)
+        if not len(regions):
+            return regions.copy()
+        city_codes, city_names = pd.factorize(cities)
+        region_codes, region_names = pd.factorize(regions)
+        codes, pairs = pd.factorize(city_codes * len(region_names) + region_codes)
+        resolved = np.array([self.canonical(city_names[pair // len(region_names)],
+                                            region_names[pair % len(region_names)]) for pair in pairs], dtype=object)
+        return resolved[codes]
+
+
+_canonicalizer = None
+_canonicalizer_lock = threading.Lock()
+
+
+def get_region_canonicalizer(pipeline):
+    """
+    Canonicalizer of a pipeline artifact, rebuilt only when its region models change
+    (copies of an artifact with another champion, as in calibration and distillation, share it).
+    """
+    global _canonicalizer
+    knn_models = pipeline['knn_region_models']
+    cached = _canonicalizer
+    if cached is not None and cached[0] is knn_models:
+        return cached[1]
+    with _canonicalizer_lock:
+        if _canonicalizer is None or _canonicalizer[0] is not knn_models:
+            _canonicalizer = (knn_models, RegionCanonicalizer.from_pipeline(pipeline))
+        return _canonicalizer[1]
+
+
+def resolution_report(canonicalizer, listings):
+    """
+    How the regions of a dataset resolve.
+
+    Parameters:
+    -----------
+    listings : pd.DataFrame - Rows with city and region (any case)
+
+    Returns:
+    --------
+    (per-method counts of rows and distinct names, the distinct names that changed)
+    """
+    pairs = listings[['city', 'region']].fillna(UNKNOWN_REGION).astype(str)
+    pairs = pairs.assign(city=pairs['city'].str.strip().str.lower())
+    counts = pairs.value_counts().rename('rows').reset_index()
+    resolved = [canonicalizer.resolve(city, region) for city, region in zip(counts['city'], counts['region'])]
+    counts['canonical'] = [region for region, _ in resolved]
+    counts['method'] = [method for _, method in resolved]
+    summary = counts.groupby('method').agg(rows=('rows', 'sum'), names=('region', 'size'))
+    changed = counts[counts['region'].str.strip().str.lower() != counts['canonical']]
+    return summary, changed[['city', 'region', 'canonical', 'method', 'rows']]
+
+
+def main(argv=None):
+    from config import RAW_DATA_PATH
+    from utils import get_pipeline_index
+
+    parser = argparse.ArgumentParser(description="Canonical region names")
+    parser.add_argument('region', nargs='?', help="Region name to resolve")
+    parser.add_argument('--city', default='tunis')
+    parser.add_argument('--report', action='store_true', help="Resolve the regions of a raw dataset")
+    parser.add_argument('--data', default=RAW_DATA_PATH)
+    args = parser.parse_args(argv)
+
+    canonicalizer = get_pipeline_index().region_canonicalizer
+    if args.region is not None:
+        region, method = canonicalizer.resolve(args.city, args.region)
+        print(f"{args.region!r} ({args.city}) -> {region!r} [{method}]")
+    if args.report:
+        raw = pd.read_csv(args.data)
+        cities = raw['city'].astype(str).str.strip().str.lower()
+        regions = raw['region'].fillna(UNKNOWN_REGION)
+        start = time.perf_counter()
+        canonicalizer.canonicalize(cities, regions)
+        first_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        canonicalizer.canonicalize(cities, regions)
+        seconds = time.perf_counter() - start
+        summary, changed = resolution_report(canonicalizer, raw)
+        print(f"{len(raw)} rows canonicalized in {1000 * first_seconds:.1f} ms, "
+              f"{1000 * seconds:.1f} ms with the resolutions memoized")
+        print(summary.to_string())
+        print(changed.to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,274 @@
+"""
+Versioned pipeline artifact registry with hot reload.
+
+Versions follow the notebook layout under MODEL_REGISTRY_DIR:
+
+    notebooks/model/
+    ├── v2/model_export/
+    │   ├── house_pricing_pipeline.joblib
+    │   └── pipeline_metadata.json
+    ├── v3/model_export/...
+    └── active_version.json        # written by activate/rollback, optional
+
+A version is published once its house_pricing_pipeline.joblib exists (write
+it to a temporary name and rename it into place). Without a pointer file the
+highest version is served; activate/rollback pin a version in the pointer
+file, which every process watching the registry follows.
+
+With USE_MODEL_REGISTRY enabled the app and the inference service start a
+RegistryWatcher: it loads new versions in a background thread and swaps them
+in with utils.activate_pipeline, so predictions never wait on a reload.
+
+Usage:
+    python registry.py --list
+    python registry.py --activate v2
+    python registry.py --rollback
+"""
+import argparse
+import json
+import os
+import re
+import threading
+from collections import namedtuple
+
+from config import MODEL_REGISTRY_DIR, PIPELINE_LOAD_MODE, REGISTRY_POLL_SECONDS
+from utils import activate_pipeline, file_fingerprint, get_active_pipeline, select_champion, warm_up_pipeline
+
+ARTIFACT_NAME = "house_pricing_pipeline.joblib"
+MMAP_ARTIFACT_NAME = "house_pricing_pipeline.mmap.joblib"
+METADATA_NAME = "pipeline_metadata.json"
+POINTER_NAME = "active_version.json"
+VERSION_PATTERN = re.compile(r'^v(\d+)$')
+
+ArtifactVersion = namedtuple('ArtifactVersion', ['name', 'number', 'export_dir', 'metadata'])
+
+
+def artifact_path(version):
+    """Artifact file of a version (its memory-mappable export is derived from it and checked against it)"""
+    return os.path.join(version.export_dir, ARTIFACT_NAME)
+
+
+def load_version(version, load_mode=PIPELINE_LOAD_MODE):
+    """
+    Load a version's artifact (through its memory-mappable export in mmap mode,
+    re-exported when missing or stale).
+
+    Returns:
+    --------
+    (pipeline dict, artifact fingerprint)
+    """
+    import joblib
+
+    path = artifact_path(version)
+    if load_mode == 'mmap':
+        from artifact import load_mmap_artifact
+        return load_mmap_artifact(os.path.join(version.export_dir, MMAP_ARTIFACT_NAME), path)
+    return joblib.load(path), file_fingerprint(path)
+
+
+class ArtifactRegistry:
+    """
+    Published versions under `root` and the pointer selecting the active one.
+
+    Parameters:
+    -----------
+    root : str - Directory holding the v<N>/model_export folders
+    """
+
+    def __init__(self, root=MODEL_REGISTRY_DIR):
+        self.root = root
+        self.pointer_path = os.path.join(root, POINTER_NAME)
+
+    def versions(self):
+        """Published versions, oldest first"""
+        versions = []
+        for name in os.listdir(self.root) if os.path.isdir(self.root) else []:
+            match = VERSION_PATTERN.match(name)
+            export_dir = os.path.join(self.root, name, "model_export")
+            if not match or not os.path.exists(os.path.join(export_dir, ARTIFACT_NAME)):
+                continue
+            metadata = {}
+            try:
+                with open(os.path.join(export_dir, METADATA_NAME)) as f:
+                    metadata = json.load(f)
+            except (OSError, ValueError):
+                pass
+            versions.append(ArtifactVersion(name, int(match.group(1)), export_dir, metadata))
+        return sorted(versions, key=lambda version: version.number)
+
+    def get(self, name):
+        for version in self.versions():
+            if version.name == name:
+                return version
+        raise ValueError(f"Unknown pipeline version: {name}")
+
+    def next_version_dir(self):
+        """model_export directory for a new version, numbered after the highest existing one"""
+        numbers = [int(m.group(1)) for m in map(VERSION_PATTERN.match, os.listdir(self.root)) if m] \
+            if os.path.isdir(self.root) else []
+        return os.path.join(self.root, f"v{max(numbers, default=0) + 1}", "model_export")
+
+    def _read_pointer(self):
+        try:
+            with open(self.pointer_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {'active': None, 'history': []}
+
+    def _write_pointer(self, pointer):
+        # Readers in other processes must never see a partial pointer
+        tmp_path = self.pointer_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(pointer, f, indent=2)
+        os.replace(tmp_path, self.pointer_path)
+
+    def resolve(self):
+        """The version to serve: the pinned one if it is still published, else the newest (None if empty)"""
+        versions = self.versions()
+        pinned = self._read_pointer().get('active')
+        for version in versions:
+            if version.name == pinned:
+                return version
+        return versions[-1] if versions else None
+
+    def activate(self, name):
+        """Pin version `name`; the previously served version is remembered for rollback"""
+        version = self.get(name)
+        current = self.resolve()
+        pointer = self._read_pointer()
+        history = pointer.get('history', [])
+        if current is not None and current.name != name:
+            history = history + [current.name]
+        self._write_pointer({'active': name, 'history': history})
+        return version
+
+    def rollback(self):
+        """Pin the version served before the current one (or the next older version)"""
+        current = self.resolve()
+        if current is None:
+            raise ValueError("No pipeline version to roll back from")
+        pointer = self._read_pointer()
+        history = pointer.get('history', [])
+        published = {version.name for version in self.versions()}
+        while history:
+            previous = history.pop()
+            if previous in published and previous != current.name:
+                self._write_pointer({'active': previous, 'history': history})
+                return self.get(previous)
+
+        older = [version for version in self.versions() if version.number < current.number]
+        if not older:
+            raise ValueError(f"No version older than {current.name} to roll back to")
+        self._write_pointer({'active': older[-1].name, 'history': []})
+        return older[-1]
+
+
+class RegistryWatcher:
+    """
+    Polls the registry and hot-swaps the active pipeline when the version to
+    serve changes (new version published, activate/rollback, or its artifact
+    file replaced). Loading happens in the watcher thread; a failed load is
+    kept in last_error and the current pipeline stays active.
+    """
+
+    def __init__(self, registry=None, interval=REGISTRY_POLL_SECONDS, warm_up=True):
+        self.registry = registry or ArtifactRegistry()
+        self.interval = interval
+        self.warm_up = warm_up
+        self.last_error = None
+        self.swaps = 0
+        self._loaded = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _target(self):
+        version = self.registry.resolve()
+        if version is None:
+            return None, None
+        path = artifact_path(version)
+        stat = os.stat(path)
+        return version, (version.name, path, stat.st_mtime_ns, stat.st_size)
+
+    def check(self):
+        """Swap in the version to serve if it changed since the last check; returns True on a swap"""
+        try:
+            version, key = self._target()
+            if version is None or key == self._loaded:
+                return False
+            pipeline, fingerprint = load_version(version)
+            active = get_active_pipeline()
+            self._loaded = key
+            if active.fingerprint == select_champion(pipeline, fingerprint)[1] and active.version is not None \
+                    and active.version.name == version.name:
+                return False
+            activate_pipeline(pipeline, fingerprint, version)
+            self.swaps += 1
+            self.last_error = None
+            if self.warm_up:
+                warm_up_pipeline()
+            return True
+        except Exception as e:
+            self.last_error = str(e)
+            return False
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.check()
+
+    def start(self):
+        if self._thread is None:
+            # The first load is done by utils.load_pipeline; remember what it served
+            self._loaded = self._target()[1]
+            self._thread = threading.Thread(target=self._run, name="registry-watcher", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+
+_registry = None
+_watcher = None
+_watcher_lock = threading.Lock()
+
+
+def get_registry():
+    global _registry
+    if _registry is None:
+        _registry = ArtifactRegistry()
+    return _registry
+
+
+def start_watcher():
+    """Start the process-wide registry watcher (once per process)"""
+    global _watcher
+    with _watcher_lock:
+        if _watcher is None:
+            _watcher = RegistryWatcher(get_registry()).start()
+    return _watcher
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Versioned pipeline artifact registry")
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument('--list', action='store_true', help="List published versions")
+    group.add_argument('--activate', metavar='VERSION', help="Serve VERSION in every watching process")
+    group.add_argument('--rollback', action='store_true', help="Serve the previously active version")
+    args = parser.parse_args(argv)
+
+    registry = get_registry()
+    if args.activate:
+        print(f"Activated {registry.activate(args.activate).name}")
+    elif args.rollback:
+        print(f"Rolled back to {registry.rollback().name}")
+
+    active = registry.resolve()
+    for version in registry.versions():
+        marker = '*' if active is not None and version.name == active.name else ' '
+        print(f" {marker} {version.name:<6} {version.metadata.get('export_date', 'unknown')[:19]:<20} "
+              f"{version.metadata.get('champion_model_name', '')} "
+              f"R²={version.metadata.get('champion_r2', float('nan')):.4f}")
+
+
+if __name__ == "__main__":
+    main()
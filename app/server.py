@@ -0,0 +1,305 @@
+"""
+House Price Prediction - JSON Inference Service
+
+asyncio (aiohttp) server wrapping the pipeline loaded by utils.load_pipeline.
+Concurrent requests are collected over a short window and scored together
+with predict_prices, then each caller gets its own result back.
+
+Endpoints:
+    POST /predict  - one listing object, or a list of listing objects
+                     (?comparables=K adds the K nearest real listings to each result)
+    GET  /health   - liveness probe
+    GET  /ready    - readiness probe (200 once the pipeline is loaded)
+    GET  /metrics  - per-stage prediction metrics (METRICS_ENABLED) and input drift scores, Prometheus text format
+
+Usage:
+    python server.py                        # serve on SERVER_HOST:SERVER_PORT
+    python server.py --benchmark            # in-process p50/p99 latency report
+"""
+import argparse
+import asyncio
+import time
+
+import numpy as np
+import pandas as pd
+from aiohttp import web
+
+from config import SERVER_HOST, SERVER_PORT, BATCH_WINDOW_MS, MAX_BATCH_SIZE, CITIES, USE_MODEL_REGISTRY
+from cleaning import screen_listings
+from utils import load_pipeline, predict_prices
+from comparables import find_comparables
+import drift
+import metrics
+
+REQUIRED_FIELDS = ['city', 'size', 'room_count', 'bathroom_count']
+
+
+class MicroBatcher:
+    """
+    Collects individual listings for up to `window_ms` milliseconds (or until
+    `max_batch_size` listings are waiting) and scores them as one batch.
+    """
+
+    def __init__(self, window_ms=BATCH_WINDOW_MS, max_batch_size=MAX_BATCH_SIZE, score_batch=predict_prices):
+        self.window = window_ms / 1000
+        self.max_batch_size = max_batch_size
+        self.score_batch = score_batch
+        self._pending = []
+        self._timer = None
+        # Scoring tasks in flight (the event loop only keeps weak references to tasks)
+        self._tasks = set()
+        self.batches_scored = 0
+
+    async def submit(self, listing):
+        """Queue one listing and wait for its prediction"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((listing, future))
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._score(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    def _score_rows(self, listings):
+        """Score listings one by one: a record, or the exception of a listing that cannot be scored"""
+        outcomes = []
+        for position in range(len(listings)):
+            try:
+                outcomes.append(_records(self.score_batch(listings.iloc[[position]]))[0])
+            except Exception as e:
+                outcomes.append(e)
+        return outcomes
+
+    async def _score(self, batch):
+        listings = pd.DataFrame([listing for listing, _ in batch])
+        loop = asyncio.get_running_loop()
+        try:
+            # The model call is CPU-bound, keep it off the event loop
+            outcomes = _records(await loop.run_in_executor(None, self.score_batch, listings))
+        except Exception:
+            # One listing the model rejects must not fail the other callers of the batch
+            outcomes = await loop.run_in_executor(None, self._score_rows, listings)
+
+        self.batches_scored += 1
+        for (_, future), outcome in zip(batch, outcomes):
+            if future.done():
+                continue
+            if isinstance(outcome, Exception):
+                future.set_exception(outcome)
+            else:
+                future.set_result(outcome)
+
+
+def _records(results):
+    """Result rows as JSON-ready dicts: missing intervals (no conformal table) are NaN in the frame, null in the JSON"""
+    return results.astype(object).where(results.notna(), None).to_dict('records')
+
+
+def parse_listing(payload):
+    """Validate one request object and return the listing passed to the model"""
+    if not isinstance(payload, dict):
+        raise ValueError("Each listing must be a JSON object")
+
+    missing = [field for field in REQUIRED_FIELDS if field not in payload]
+    if missing:
+        raise ValueError(f"Missing fields: {', '.join(missing)}")
+
+    listing = {'city': str(payload['city'])}
+    for field in ['size', 'room_count', 'bathroom_count']:
+        try:
+            value = float(payload[field])
+        except (TypeError, ValueError):
+            raise ValueError(f"'{field}' must be a number")
+        if not np.isfinite(value):
+            raise ValueError(f"'{field}' must be a finite number")
+        listing[field] = value
+    listing['region'] = str(payload.get('region') or 'autres villes')
+
+    return listing
+
+
+def reject_unscorable(listings):
+    """Raise ValueError for the first listing cleaning.screen_listings rejects (flagged listings are scored)"""
+    screening = screen_listings(pd.DataFrame(listings), load_pipeline())
+    rejected = np.flatnonzero(screening['input_status'].to_numpy() == 'rejected')
+    if len(rejected):
+        issues = screening['input_issues'].iloc[rejected[0]]
+        raise ValueError(f"Listing {rejected[0]}: {issues}" if len(listings) > 1 else issues.capitalize())
+
+
+async def handle_predict(request):
+    if not request.app['state']['ready']:
+        return web.json_response({'error': 'Pipeline is still loading'}, status=503)
+
+    try:
+        payload = await request.json()
+    except ValueError:
+        return web.json_response({'error': 'Request body must be valid JSON'}, status=400)
+
+    try:
+        if isinstance(payload, list):
+            listings = [parse_listing(item) for item in payload]
+        else:
+            listings = [parse_listing(payload)]
+        reject_unscorable(listings)
+        if not request.query.get('comparables', '0').isdigit():
+            raise ValueError("'comparables' must be a non-negative integer")
+        n_comparables = int(request.query.get('comparables', '0'))
+    except ValueError as e:
+        return web.json_response({'error': str(e)}, status=400)
+
+    batcher = request.app['batcher']
+    try:
+        results = await asyncio.gather(*[batcher.submit(listing) for listing in listings])
+    except Exception as e:
+        return web.json_response({'error': f"Error making prediction: {str(e)}"}, status=500)
+
+    if n_comparables > 0:
+        # The first search may load or build the comparables index: keep it off the event loop
+        loop = asyncio.get_running_loop()
+        for listing, result in zip(listings, results):
+            result['comparables'] = await loop.run_in_executor(
+                None, find_comparables, listing['city'], listing['size'], listing['room_count'],
+                listing['bathroom_count'], result['imputed_region'], n_comparables)
+
+    return web.json_response(results if isinstance(payload, list) else results[0])
+
+
+async def handle_health(request):
+    return web.json_response({'status': 'ok'})
+
+
+async def handle_ready(request):
+    state = request.app['state']
+    if state['ready']:
+        return web.json_response({'status': 'ready'})
+    return web.json_response({'status': 'loading', 'error': state['load_error']}, status=503)
+
+
+async def handle_metrics(request):
+    return web.Response(text=metrics.render_prometheus(), content_type='text/plain', charset='utf-8',
+                        headers={'X-Metrics-Enabled': str(metrics.enabled).lower()})
+
+
+async def _load_pipeline_in_background(app):
+    loop = asyncio.get_running_loop()
+    try:
+        await loop.run_in_executor(None, load_pipeline)
+        if USE_MODEL_REGISTRY:
+            from registry import start_watcher
+            start_watcher()
+        app['state']['ready'] = True
+    except Exception as e:
+        app['state']['load_error'] = str(e)
+
+
+async def _start_loading(app):
+    app['state']['loader'] = asyncio.ensure_future(_load_pipeline_in_background(app))
+
+
+def create_app(window_ms=BATCH_WINDOW_MS, max_batch_size=MAX_BATCH_SIZE):
+    """Build the aiohttp application (the pipeline loads in the background on startup)"""
+    app = web.Application()
+    app['batcher'] = MicroBatcher(window_ms, max_batch_size)
+    # Mutable holder: the application's own mapping is frozen once it has started
+    app['state'] = {'ready': False, 'load_error': None, 'loader': None}
+    app.on_startup.append(_start_loading)
+
+    app.router.add_post('/predict', handle_predict)
+    app.router.add_get('/health', handle_health)
+    app.router.add_get('/ready', handle_ready)
+    app.router.add_get('/metrics', handle_metrics)
+    return app
+
+
+async def run_benchmark(n_requests=2000, concurrency=64, window_ms=BATCH_WINDOW_MS, max_batch_size=MAX_BATCH_SIZE):
+    """
+    Fire concurrent single-listing requests at an in-process server.
+
+    Returns:
+    --------
+    dict with p50/p99 latency (ms), throughput and the average batch size
+    """
+    from aiohttp.test_utils import TestServer, TestClient
+
+    app = create_app(window_ms, max_batch_size)
+    rng = np.random.default_rng(42)
+
+    async with TestClient(TestServer(app)) as client:
+        await app['state']['loader']
+        if not app['state']['ready']:
+            raise Exception(f"Error loading pipeline: {app['state']['load_error']}")
+
+        latencies = []
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def one_request():
+            listing = {
+                'city': str(rng.choice(CITIES)),
+                'size': int(rng.integers(30, 300)),
+                'room_count': int(rng.integers(1, 6)),
+                'bathroom_count': int(rng.integers(1, 3)),
+            }
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.post('/predict', json=listing)
+                await response.json()
+                latencies.append((time.perf_counter() - start) * 1000)
+
+        start = time.perf_counter()
+        await asyncio.gather(*[one_request() for _ in range(n_requests)])
+        elapsed = time.perf_counter() - start
+
+    batches = app['batcher'].batches_scored
+    return {
+        'requests': n_requests,
+        'concurrency': concurrency,
+        'window_ms': window_ms,
+        'p50_ms': float(np.percentile(latencies, 50)),
+        'p99_ms': float(np.percentile(latencies, 99)),
+        'requests_per_second': n_requests / elapsed,
+        'avg_batch_size': n_requests / batches if batches else 0,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="House price JSON inference service")
+    parser.add_argument('--host', default=SERVER_HOST)
+    parser.add_argument('--port', type=int, default=SERVER_PORT)
+    parser.add_argument('--window-ms', type=float, default=BATCH_WINDOW_MS,
+                        help="How long to collect requests before scoring a batch")
+    parser.add_argument('--max-batch-size', type=int, default=MAX_BATCH_SIZE)
+    parser.add_argument('--benchmark', action='store_true', help="Run an in-process latency benchmark and exit")
+    parser.add_argument('--requests', type=int, default=2000, help="Benchmark: number of requests")
+    parser.add_argument('--concurrency', type=int, default=64, help="Benchmark: concurrent clients")
+    args = parser.parse_args(argv)
+
+    if args.benchmark:
+        report = asyncio.run(run_benchmark(args.requests, args.concurrency, args.window_ms, args.max_batch_size))
+        print(f"{report['requests']} requests, concurrency {report['concurrency']}, window {report['window_ms']} ms")
+        print(f"  p50 latency:   {report['p50_ms']:.1f} ms")
+        print(f"  p99 latency:   {report['p99_ms']:.1f} ms")
+        print(f"  throughput:    {report['requests_per_second']:,.0f} req/s")
+        print(f"  avg batch:     {report['avg_batch_size']:.1f} listings")
+        return
+
+    # This process serves /metrics: monitor the input drift of its predictions
+    drift.enable()
+    web.run_app(create_app(args.window_ms, args.max_batch_size), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Bounded-memory summaries of a stream of values.
+
+RunningMoments keeps count/mean/variance exactly (Chan et al. parallel update),
+QuantileDigest approximates quantiles with at most ~compression centroids
+(a merging t-digest: centroids are kept small in the tails and larger around
+the median). Both accept batches, merge with each other and pickle with the
+pipeline artifact.
+"""
+import numpy as np
+
+
+class RunningMoments:
+    """Count, mean and sample standard deviation of a stream"""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0  # Sum of squared deviations from the mean
+
+    def update(self, values):
+        values = np.asarray(values, dtype=float)
+        values = values[~np.isnan(values)]
+        if len(values):
+            self._combine(len(values), values.mean(), ((values - values.mean()) ** 2).sum())
+        return self
+
+    def merge(self, other):
+        if other.count:
+            self._combine(other.count, other.mean, other.m2)
+        return self
+
+    def _combine(self, count, mean, m2):
+        total = self.count + count
+        delta = mean - self.mean
+        self.m2 += m2 + delta ** 2 * self.count * count / total
+        self.mean += delta * count / total
+        self.count = total
+
+    @property
+    def std(self):
+        """Sample standard deviation (ddof=1, as pandas)"""
+        return float(np.sqrt(self.m2 / (self.count - 1))) if self.count > 1 else float('nan')
+
+
+class QuantileDigest:
+    """
+    Approximate quantiles of a stream.
+
+    Parameters:
+    -----------
+    compression : int - Upper bound on the number of centroids kept (accuracy vs memory)
+    """
+
+    def __init__(self, compression=100):
+        self.compression = compression
+        self.means = np.empty(0)
+        self.weights = np.empty(0)
+        self.min = float('inf')
+        self.max = float('-inf')
+
+    @property
+    def count(self):
+        return float(self.weights.sum())
+
+    def update(self, values):
+        values = np.asarray(values, dtype=float)
+        values = values[~np.isnan(values)]
+        if len(values):
+            self.min = min(self.min, float(values.min()))
+            self.max = max(self.max, float(values.max()))
+            self._compress(np.concatenate([self.means, values]),
+                           np.concatenate([self.weights, np.ones(len(values))]))
+        return self
+
+    def merge(self, other):
+        if len(other.means):
+            self.min = min(self.min, other.min)
+            self.max = max(self.max, other.max)
+            self._compress(np.concatenate([self.means, other.means]),
+                           np.concatenate([self.weights, other.weights]))
+        return self
+
+    def _compress(self, means, weights):
+        order = np.argsort(means, kind='stable')
+        means, weights = means[order], weights[order]
+        cumulative = np.cumsum(weights)
+        # k1 scale function: equal steps of k hold few points near q=0 and q=1
+        q = (cumulative - weights / 2) / cumulative[-1]
+        k = np.floor(self.compression * (np.arcsin(2 * q - 1) / np.pi + 0.5))
+        starts = np.flatnonzero(np.r_[True, k[1:] != k[:-1]])
+        self.weights = np.add.reduceat(weights, starts)
+        self.means = np.add.reduceat(means * weights, starts) / self.weights
+
+    def quantile(self, q):
+        """Estimated q-quantile (q may be an array); NaN when empty"""
+        if not len(self.means):
+            return np.full(np.shape(q), np.nan) if np.ndim(q) else float('nan')
+        cumulative = np.cumsum(self.weights)
+        centers = cumulative - self.weights / 2
+        estimate = np.interp(np.asarray(q) * cumulative[-1],
+                             np.r_[0.0, centers, cumulative[-1]],
+                             np.r_[self.min, self.means, self.max])
+        return estimate if np.ndim(q) else float(estimate)
+
+    def cdf(self, values):
+        """Estimated fraction of the stream at or below each value"""
+        if not len(self.means):
+            return np.full(np.shape(values), np.nan)
+        cumulative = np.cumsum(self.weights)
+        centers = cumulative - self.weights / 2
+        return np.interp(values, np.r_[self.min, self.means, self.max],
+                         np.r_[0.0, centers, cumulative[-1]]) / cumulative[-1]
@@ -0,0 +1,498 @@
+"""
+Headless retraining of the house pricing pipeline.
+
+Reproduces notebooks/model/v2/house-pricing-v2.ipynb from
+data/processed/merged.csv without the notebook:
+
+    1. Structural cleaning and per-city IQR filtering on price_per_m2 (cleaning.py)
+    2. Per-city KNN region imputers, k chosen by cross-validation (2-5)
+    3. KMeans virtual regions per city and the value tier table
+    4. Model search: Ridge, ElasticNet, RandomForest, GradientBoosting, AdaBoost,
+       SVR and XGBoost (when installed), then the Voting, Stacking, Weighted, Ultimate and Elite ensembles
+    5. Export of the artifact dict and pipeline_metadata.json read by the app,
+       with the conformal residual table of the held-out listings (conformal.py),
+       a background sample of training listings for explanations (explain.py)
+       the per-city feature ranges that screen batch inputs (cleaning.py)
+       and the reference sketches of the input drift monitor (drift.py);
+       with --distill, a distilled student of the champion (distill.py)
+
+Differences from the notebook run:
+- Hyperparameters are searched with successive halving (HalvingGridSearchCV)
+  over the notebook's grids, using every core (n_jobs=-1).
+- Fitted stages (KNN imputers, clusters, each model search, each ensemble) are
+  cached on disk with joblib.Memory, keyed on their inputs: after changing one
+  grid, only that search and the ensembles built on it are refitted.
+- Enhanced_GB is not trained: it uses a different feature set than `features`,
+  so the app could not serve it as champion.
+
+Usage:
+    python train.py                          # publish the next registry version (notebooks/model/v<N>)
+    python train.py --output ./model_export  # write to a directory
+    python train.py --quick                  # reduced grids, for a smoke run
+    python train.py --distill                # also export a distilled student model (distill.py)
+"""
+import argparse
+import json
+import os
+import time
+from datetime import datetime
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.base import clone
+from sklearn.cluster import KMeans
+from sklearn.compose import ColumnTransformer
+from sklearn.ensemble import (AdaBoostRegressor, GradientBoostingRegressor, RandomForestRegressor,
+                              StackingRegressor, VotingRegressor)
+from sklearn.experimental import enable_halving_search_cv  # noqa: F401 (enables HalvingGridSearchCV)
+from sklearn.linear_model import ElasticNet, Ridge
+from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+from sklearn.model_selection import HalvingGridSearchCV, cross_val_score, train_test_split
+from sklearn.neighbors import KNeighborsClassifier
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import LabelEncoder, OneHotEncoder, RobustScaler, StandardScaler
+from sklearn.svm import SVR
+
+from cleaning import apply_bounds, input_profile, iqr_bounds, prepare_listings
+from config import EXPLAIN_BACKGROUND_SIZE, TRAINING_DATA_PATH, TRAINING_CACHE_DIR
+from conformal import LISTING_COLUMNS, calibrate, holdout_rows
+from drift import build_reference
+
+KNN_FEATURES = ['size', 'room_count', 'bathroom_count', 'price_per_m2']
+K_RANGE = (2, 5)
+K_MAP = {'ariana': 3, 'ben arous': 4, 'la manouba': 4, 'tunis': 3}  # Virtual regions per city
+N_TIERS = 4
+
+FEATURES = ['city', 'region', 'tier', 'size', 'room_count', 'bathroom_count', 'avg_room_size']
+CATEGORICAL_COLS = ['city', 'region']
+NUMERIC_COLS = ['size', 'tier', 'room_count', 'bathroom_count', 'avg_room_size']
+
+# Base models and their parameter grids (notebook section 3.1)
+BASE_MODELS = {
+    'Ridge': (Ridge(), {'model__alpha': [0.1, 1.0, 10.0, 100.0]}),
+    'ElasticNet': (ElasticNet(max_iter=5000), {'model__alpha': [0.1, 0.5, 1.0], 'model__l1_ratio': [0.2, 0.5, 0.8]}),
+    'RandomForest': (RandomForestRegressor(random_state=42),
+                     {'model__n_estimators': [100, 200], 'model__max_depth': [10, 20, None],
+                      'model__min_samples_split': [2, 5]}),
+    'GradientBoosting': (GradientBoostingRegressor(random_state=42),
+                         {'model__n_estimators': [100, 200], 'model__learning_rate': [0.05, 0.1],
+                          'model__max_depth': [3, 5, 7]}),
+    'AdaBoost': (AdaBoostRegressor(random_state=42),
+                 {'model__n_estimators': [50, 100, 150], 'model__learning_rate': [0.05, 0.1, 0.5]}),
+    'SVR': (SVR(), {'model__C': [0.1, 1, 10], 'model__kernel': ['rbf', 'linear'], 'model__epsilon': [0.1, 0.2]}),
+}
+
+# Smoke-run grids: one or two candidates per model
+QUICK_GRIDS = {
+    'Ridge': {'model__alpha': [1.0, 10.0]},
+    'ElasticNet': {'model__alpha': [0.1], 'model__l1_ratio': [0.5]},
+    'RandomForest': {'model__n_estimators': [50], 'model__max_depth': [10, None]},
+    'GradientBoosting': {'model__n_estimators': [50], 'model__max_depth': [3, 5]},
+    'AdaBoost': {'model__n_estimators': [50]},
+    'SVR': {'model__C': [1, 10], 'model__kernel': ['rbf']},
+}
+
+# XGBoost (notebook section 6.2), trained when xgboost is installed; not an ensemble member
+XGBOOST_PARAMS = {'n_estimators': 200, 'learning_rate': 0.05, 'max_depth': 4, 'min_child_weight': 3, 'subsample': 0.8,
+                  'colsample_bytree': 0.8, 'reg_alpha': 0.1, 'reg_lambda': 1.0, 'random_state': 42}
+XGBOOST_GRID = {'model__max_depth': [3, 4, 5], 'model__learning_rate': [0.03, 0.05, 0.1],
+                'model__n_estimators': [150, 200, 300], 'model__reg_alpha': [0, 0.1, 0.5],
+                'model__reg_lambda': [0.5, 1.0, 2.0]}
+XGBOOST_QUICK_GRID = {'model__max_depth': [4]}
+
+# Ensembles (notebook sections 4 and 6): name -> (kind, member models, weights)
+ENSEMBLES = {
+    'Voting_Ensemble': ('voting', None, None),  # Top 3 base models by test R²
+    'Stacking_Ensemble': ('stacking', ['Ridge', 'RandomForest', 'GradientBoosting'], None),
+    'Weighted_Voting': ('voting', ['SVR', 'GradientBoosting', 'RandomForest'], [0.4, 0.4, 0.2]),
+    'Ultimate_Ensemble': ('voting', ['SVR', 'GradientBoosting', 'AdaBoost', 'Ridge'], [0.35, 0.30, 0.20, 0.15]),
+    'Elite_Ensemble': ('voting', ['SVR', 'GradientBoosting'], [0.5, 0.5]),
+}
+
+
+def load_training_data(data_path=TRAINING_DATA_PATH):
+    """
+    Read merged.csv and apply the notebook's structural cleaning and per-city
+    IQR filtering on price_per_m2.
+
+    Returns:
+    --------
+    pd.DataFrame ordered like the notebook's (city-sorted) frame, so the
+    train/test split is the same
+    """
+    df = prepare_listings(pd.read_csv(data_path))
+    df = apply_bounds(df, iqr_bounds(df))
+    # groupby().apply() in the notebook concatenates the cities in sorted order
+    return df.sort_values('city', kind='stable').reset_index(drop=True)
+
+
+def build_stream_state(df):
+    """
+    Streaming summaries of the training frame used by incremental.py: per-city
+    moments and quantile digest of price_per_m2, and a price_per_m2 digest per
+    virtual region (for re-deriving tiers).
+    """
+    from sketches import QuantileDigest, RunningMoments
+
+    return {
+        'city_price_per_m2': {
+            city: {'moments': RunningMoments().update(values), 'digest': QuantileDigest().update(values)}
+            for city, values in df.groupby('city')['price_per_m2']
+        },
+        'virtual_region_price_per_m2': {
+            virtual_region: QuantileDigest().update(values)
+            for virtual_region, values in df.groupby('virtual_region')['price_per_m2']
+        },
+        'rows': len(df),
+    }
+
+
+def _find_best_k(X_scaled, y_encoded, k_range=K_RANGE):
+    best_k, best_score, scores = k_range[0], -1, {}
+    for k in range(k_range[0], k_range[1] + 1):
+        if k > len(X_scaled):
+            continue
+        knn = KNeighborsClassifier(n_neighbors=k, weights='distance')
+        score = cross_val_score(knn, X_scaled, y_encoded, cv=min(5, len(X_scaled)), scoring='accuracy').mean()
+        scores[k] = score
+        if score > best_score:
+            best_k, best_score = k, score
+    return best_k, best_score, scores
+
+
+def fit_region_imputers(df, n_jobs=-1):
+    """
+    Stage 2: per-city KNN classifiers predicting the region of 'autres villes' listings.
+
+    Returns:
+    --------
+    (df with imputed regions, knn_region_models, best_k_per_city)
+    """
+    df = df.copy()
+
+    def fit_city(city):
+        city_data = df[df['city'] == city]
+        known = city_data[city_data['region'] != 'autres villes']
+        unknown = city_data[city_data['region'] == 'autres villes']
+        if len(known) <= 10 or len(unknown) == 0:
+            return city, None, None
+        X_train = known[KNN_FEATURES].fillna(known[KNN_FEATURES].median())
+        label_encoder = LabelEncoder()
+        y_encoded = label_encoder.fit_transform(known['region'])
+        scaler = StandardScaler()
+        X_scaled = scaler.fit_transform(X_train)
+        best_k, _, _ = _find_best_k(X_scaled, y_encoded)
+        knn = KNeighborsClassifier(n_neighbors=best_k, weights='distance').fit(X_scaled, y_encoded)
+
+        X_unknown = unknown[KNN_FEATURES].fillna(city_data[KNN_FEATURES].median())
+        predicted = label_encoder.inverse_transform(knn.predict(scaler.transform(X_unknown)))
+        models = {'scaler': scaler, 'knn': knn, 'label_encoder': label_encoder, 'best_k': best_k}
+        return city, models, pd.Series(predicted, index=unknown.index)
+
+    knn_region_models, best_k_per_city = {}, {}
+    for city, models, imputed in joblib.Parallel(n_jobs=n_jobs, prefer='threads')(
+            joblib.delayed(fit_city)(city) for city in df['city'].unique()):
+        if models is not None:
+            knn_region_models[city] = models
+            best_k_per_city[city] = models['best_k']
+            df.loc[imputed.index, 'region'] = imputed
+    return df, knn_region_models, best_k_per_city
+
+
+def fit_virtual_regions(df):
+    """
+    Stage 3: KMeans virtual regions per city and the value tier of each.
+
+    Returns:
+    --------
+    (df with virtual_region and tier, clustering_models, tier_lookup)
+    """
+    df = df.copy()
+    df['virtual_region'] = None
+    clustering_models = {}
+    for city in df['city'].unique():
+        mask = df['city'] == city
+        if mask.sum() <= 10:
+            continue
+        scaler = StandardScaler()
+        kmeans = KMeans(n_clusters=K_MAP.get(city, 3), random_state=42, n_init=10)
+        clusters = kmeans.fit_predict(scaler.fit_transform(df.loc[mask, KNN_FEATURES]))
+        clustering_models[city] = {'scaler': scaler, 'kmeans': kmeans}
+        df.loc[mask, 'virtual_region'] = city + "_Cluster_" + pd.Series(clusters, index=df.index[mask]).astype(str)
+
+    tier_lookup = assign_tiers(df.groupby('virtual_region')['price_per_m2'].median())
+    df['tier'] = df['virtual_region'].map(tier_lookup)
+    return df, clustering_models, tier_lookup
+
+
+def assign_tiers(median_price_m2, previous_lookup=None):
+    """
+    Cluster the virtual regions on their median price/m² into N_TIERS ordered
+    tiers (0 = cheapest).
+
+    Parameters:
+    -----------
+    median_price_m2 : pd.Series - Median price_per_m2 indexed by virtual_region
+    previous_lookup : dict - Current tier_lookup; when given, KMeans starts from its
+                      tier centers so small median changes do not reshuffle the tiers
+
+    Returns:
+    --------
+    dict - {virtual_region: tier}
+    """
+    region_stats = median_price_m2.sort_index().rename('median_price_m2').reset_index()
+    if previous_lookup:
+        previous_tiers = region_stats.iloc[:, 0].map(previous_lookup)
+        centers = region_stats.groupby(previous_tiers)['median_price_m2'].mean().sort_values()
+        kmeans_tiers = KMeans(n_clusters=len(centers), init=centers.to_numpy().reshape(-1, 1), n_init=1)
+    else:
+        kmeans_tiers = KMeans(n_clusters=N_TIERS, random_state=42, n_init=10)
+    region_stats['tier'] = kmeans_tiers.fit_predict(region_stats[['median_price_m2']])
+    tier_ordering = region_stats.groupby('tier')['median_price_m2'].mean().sort_values().index
+    region_stats['tier'] = region_stats['tier'].map({old: new for new, old in enumerate(tier_ordering)})
+    return region_stats.set_index(region_stats.columns[0])['tier'].to_dict()
+
+
+def make_preprocessor():
+    return ColumnTransformer(transformers=[
+        ('num', RobustScaler(), NUMERIC_COLS),
+        ('cat', OneHotEncoder(drop='first', handle_unknown='ignore'), CATEGORICAL_COLS),
+    ])
+
+
+def evaluate(model, X_test, y_test):
+    """Test R² on log prices, MAE and RMSE in price units (as in the notebook)"""
+    y_pred = model.predict(X_test)
+    y_pred_real, y_test_real = np.expm1(y_pred), np.expm1(y_test)
+    return {
+        'R2_Test': r2_score(y_test, y_pred),
+        'MAE': mean_absolute_error(y_test_real, y_pred_real),
+        'RMSE': np.sqrt(mean_squared_error(y_test_real, y_pred_real)),
+    }
+
+
+def search_model(estimator, param_grid, X_train, y_train, X_test, y_test, n_jobs=-1):
+    """
+    Successive-halving search of one base model over its grid.
+
+    Returns:
+    --------
+    (best fitted Pipeline, model_results entry)
+    """
+    search = HalvingGridSearchCV(
+        Pipeline([('prep', make_preprocessor()), ('model', estimator)]),
+        param_grid, cv=5, scoring='r2', factor=3, n_jobs=n_jobs, random_state=42, return_train_score=True)
+    search.fit(X_train, y_train)
+
+    cv_train = search.cv_results_['mean_train_score'][search.best_index_]
+    cv_test = search.cv_results_['mean_test_score'][search.best_index_]
+    results = evaluate(search.best_estimator_, X_test, y_test)
+    results.update({
+        'CV_Train_R2': cv_train,
+        'CV_Test_R2': cv_test,
+        'CV_Std': search.cv_results_['std_test_score'][search.best_index_],
+        'Bias_Indicator': 1 - cv_train,
+        'Variance_Indicator': cv_train - cv_test,
+        'Best_Params': search.best_params_,
+    })
+    return search.best_estimator_, results
+
+
+def _member(name, best_params):
+    """Fresh base model with its searched parameters and random_state=42"""
+    model = clone(BASE_MODELS[name][0]).set_params(
+        **{key.replace('model__', ''): value for key, value in best_params.items()})
+    if 'random_state' in model.get_params():
+        model.set_params(random_state=42)
+    return model
+
+
+def fit_ensemble(kind, members, weights, X_train, y_train, X_test, y_test, n_jobs=-1):
+    """
+    Fit a voting or stacking ensemble of (name, model) members.
+
+    Returns:
+    --------
+    (fitted Pipeline, model_results entry)
+    """
+    if kind == 'stacking':
+        step = ('stacking', StackingRegressor(estimators=members, final_estimator=Ridge(alpha=1.0), cv=5,
+                                              n_jobs=n_jobs))
+    else:
+        step = ('voting', VotingRegressor(estimators=members, weights=weights, n_jobs=n_jobs))
+    pipeline = Pipeline([('prep', make_preprocessor()), step]).fit(X_train, y_train)
+
+    results = evaluate(pipeline, X_test, y_test)
+    results.update({key: np.nan for key in ['CV_Train_R2', 'CV_Test_R2', 'CV_Std', 'Bias_Indicator',
+                                            'Variance_Indicator']})
+    results['Best_Params'] = {'estimators': [name for name, _ in members], 'weights': weights}
+    return pipeline, results
+
+
+def train_pipeline(data_path=TRAINING_DATA_PATH, cache_dir=TRAINING_CACHE_DIR, n_jobs=-1, quick=False, verbose=True):
+    """
+    Run every stage and assemble the artifact dict.
+
+    Parameters:
+    -----------
+    data_path : str - merged.csv
+    cache_dir : str - joblib.Memory location for fitted stages (None disables caching)
+    n_jobs : int - Parallel workers for the searches and ensembles (-1 = all cores)
+    quick : bool - Use QUICK_GRIDS instead of the notebook grids
+
+    Returns:
+    --------
+    dict - Same keys as the notebook export
+    """
+    memory = joblib.Memory(cache_dir, verbose=0)
+
+    def log(message):
+        if verbose:
+            print(f"[{time.strftime('%H:%M:%S')}] {message}")
+
+    df = load_training_data(data_path)
+    log(f"{len(df)} listings after cleaning")
+    # Per-city feature ranges, for screening batch inputs (cleaning.screen_listings)
+    profile = input_profile(df)
+    # As listed (before region imputation), for the conformal calibration and the drift reference at export
+    holdout = holdout_rows(df)
+    listed = df[LISTING_COLUMNS]
+
+    df, knn_region_models, best_k_per_city = memory.cache(fit_region_imputers, ignore=['n_jobs'])(df, n_jobs)
+    log(f"Region imputers: best k {best_k_per_city}")
+    df, clustering_models, tier_lookup = memory.cache(fit_virtual_regions)(df)
+    log(f"Virtual regions: {len(tier_lookup)} in {N_TIERS} tiers")
+
+    df['avg_room_size'] = df['size'] / df['room_count']
+    df['log_price'] = np.log1p(df['price'])
+    X_train, X_test, y_train, y_test = train_test_split(df[FEATURES], df['log_price'], test_size=0.2,
+                                                        random_state=42)
+
+    model_results, best_estimators = {}, {}
+    cached_search = memory.cache(search_model, ignore=['n_jobs'])
+    for name, (estimator, grid) in BASE_MODELS.items():
+        grid = QUICK_GRIDS[name] if quick else grid
+        best_estimators[name], model_results[name] = cached_search(estimator, grid, X_train, y_train,
+                                                                   X_test, y_test, n_jobs)
+        log(f"{name}: R² {model_results[name]['R2_Test']:.4f} {model_results[name]['Best_Params']}")
+
+    try:
+        from xgboost import XGBRegressor
+        best_estimators['XGBoost'], model_results['XGBoost'] = cached_search(
+            XGBRegressor(**XGBOOST_PARAMS, n_jobs=n_jobs), XGBOOST_QUICK_GRID if quick else XGBOOST_GRID,
+            X_train, y_train, X_test, y_test, n_jobs)
+        log(f"XGBoost: R² {model_results['XGBoost']['R2_Test']:.4f} {model_results['XGBoost']['Best_Params']}")
+    except ImportError:
+        log("XGBoost: skipped (xgboost not installed)")
+
+    cached_ensemble = memory.cache(fit_ensemble, ignore=['n_jobs'])
+    base_ranking = sorted(BASE_MODELS, key=lambda name: model_results[name]['R2_Test'], reverse=True)
+    for name, (kind, member_names, weights) in ENSEMBLES.items():
+        member_names = member_names or base_ranking[:3]
+        members = [(member, _member(member, model_results[member]['Best_Params'])) for member in member_names]
+        best_estimators[name], model_results[name] = cached_ensemble(kind, members, weights, X_train, y_train,
+                                                                     X_test, y_test, n_jobs)
+        log(f"{name}: R² {model_results[name]['R2_Test']:.4f} ({', '.join(member_names)})")
+
+    champion_name = max(model_results, key=lambda name: model_results[name]['R2_Test'])
+    log(f"Champion: {champion_name} (R² {model_results[champion_name]['R2_Test']:.4f})")
+
+    exports = {
+        'champion_model': best_estimators[champion_name],
+        'champion_name': champion_name,
+        'all_trained_models': best_estimators,
+        'knn_region_models': knn_region_models,
+        'best_k_per_city': best_k_per_city,
+        'clustering_models': clustering_models,
+        'tier_lookup': tier_lookup,
+        'model_results': model_results,
+        'features': FEATURES,
+        'city_price_stats': df.groupby('city')['price_per_m2'].agg(['median', 'mean', 'std']).to_dict(),
+        'stream_state': build_stream_state(df),
+        'input_profile': profile,
+        # Reference listings of the prediction explanations (explain.py)
+        'explain_background': X_train.sample(min(EXPLAIN_BACKGROUND_SIZE, len(X_train)),
+                                             random_state=42).reset_index(drop=True),
+    }
+
+    # Prediction intervals: residual table of the held-out listings, priced through the request path
+    exports['conformal_intervals'] = calibrate(exports, holdout)
+    log(f"Prediction intervals: {len(exports['conformal_intervals']['strata'])} strata "
+        f"from {exports['conformal_intervals']['n_listings']} held-out listings")
+    # Input drift monitor: sketches of the training listings, priced through the request path
+    exports['drift_reference'] = build_reference(exports, listed)
+    log(f"Drift reference: {sum(sketch.rows for sketch in exports['drift_reference'].values())} listings")
+    return exports
+
+
+def build_metadata(exports):
+    """pipeline_metadata.json content (same fields as the notebook export)"""
+    performances = {name: float(results['R2_Test']) for name, results in exports['model_results'].items()}
+    return {
+        'export_date': datetime.now().isoformat(),
+        'champion_model_name': exports['champion_name'],
+        'champion_r2': performances[exports['champion_name']],
+        'all_model_performances': performances,
+        'cities_supported': list(exports['knn_region_models'].keys()),
+        'best_k_per_city': {city: int(k) for city, k in exports['best_k_per_city'].items()},
+        'features_required': exports['features'],
+    }
+
+
+def export_pipeline(exports, export_dir, metadata=None):
+    """
+    Write pipeline_metadata.json, then house_pricing_pipeline.joblib through a
+    temporary file, so a registry watcher only sees a complete version.
+
+    Parameters:
+    -----------
+    exports : dict - Pipeline artifact
+    export_dir : str - model_export directory to create
+    metadata : dict - pipeline_metadata.json content (default: build_metadata(exports))
+
+    Returns:
+    --------
+    str - Path of the pipeline artifact
+    """
+    os.makedirs(export_dir, exist_ok=True)
+    with open(os.path.join(export_dir, 'pipeline_metadata.json'), 'w', encoding='utf-8') as f:
+        json.dump(metadata or build_metadata(exports), f, indent=2)
+    pipeline_path = os.path.join(export_dir, 'house_pricing_pipeline.joblib')
+    joblib.dump(exports, pipeline_path + '.tmp')
+    os.replace(pipeline_path + '.tmp', pipeline_path)
+    return pipeline_path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Retrain the house pricing pipeline")
+    parser.add_argument('--data', default=TRAINING_DATA_PATH, help="merged.csv to train on")
+    parser.add_argument('--output', help="Export directory (default: next version in the model registry)")
+    parser.add_argument('--cache-dir', default=TRAINING_CACHE_DIR, help="Cache of fitted stages")
+    parser.add_argument('--no-cache', action='store_true', help="Refit every stage")
+    parser.add_argument('-j', '--n-jobs', type=int, default=-1, help="Parallel workers (-1 = all cores)")
+    parser.add_argument('--quick', action='store_true', help="Reduced grids, for a smoke run")
+    parser.add_argument('--distill', action='store_true',
+                        help="Also export a distilled student of the champion (fails if it is not accurate enough)")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    exports = train_pipeline(args.data, None if args.no_cache else args.cache_dir, args.n_jobs, args.quick)
+    metadata = build_metadata(exports)
+    if args.distill:
+        from distill import add_student, add_student_metadata
+        try:
+            metadata = add_student_metadata(metadata, add_student(exports, args.data))
+        except ValueError as e:
+            raise SystemExit(f"Distillation rejected, nothing exported: {e}")
+    if args.output:
+        export_dir = args.output
+    else:
+        from registry import get_registry
+        export_dir = get_registry().next_version_dir()
+    path = export_pipeline(exports, export_dir, metadata)
+    print(f"Exported {exports['champion_name']} pipeline to {path} in {time.perf_counter() - start:.0f}s")
+
+
+if __name__ == "__main__":
+    main()
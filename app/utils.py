@@ -1,27 +1,240 @@
-import joblib
-import pandas as pd
-import numpy as np
-import plotly.express as px
-import plotly.graph_objects as go
+import hashlib
+import logging
+import threading
+from collections import namedtuple
+from types import MappingProxyType
 from config import *
+import metrics
 
-# Global variable to store loaded pipeline
-_pipeline = None
+logger = logging.getLogger(__name__)
+
+# Heavy libraries (joblib/scikit-learn, pandas, numpy, plotly) are imported inside
+# the functions that use them, so importing this module costs nothing before
+# the first page renders.
+
+# The active pipeline, the fingerprint of its artifact, the metadata index built
+# from it and its registry version, swapped as one object so readers always
+# see a consistent set (see activate_pipeline)
+ActivePipeline = namedtuple('ActivePipeline', ['pipeline', 'fingerprint', 'index', 'version'])
+_active = None
+# Concurrent sessions arriving together must not each unpickle the pipeline
+_pipeline_lock = threading.Lock()
+
+
+def file_fingerprint(path, chunk_size=1024 * 1024):
+    """Content hash of a file, used to tell pipeline artifacts apart"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(chunk_size), b''):
+            digest.update(block)
+    return digest.hexdigest()[:16]
 
 
 def load_pipeline():
-    """Load the ML pipeline from disk (cached)"""
-    global _pipeline
-    if _pipeline is None:
-        try:
-            _pipeline = joblib.load(PIPELINE_PATH)
-        except Exception as e:
-            raise Exception(
-                f"Error loading pipeline: {str(e)}. This might be a scikit-learn version mismatch. Try: pip install scikit-learn==1.3.0 or retrain your model with the current environment.")
-    return _pipeline
+    """Load the ML pipeline from disk (cached, loaded once per process)"""
+    if _active is None:
+        with _pipeline_lock:
+            if _active is None:
+                import joblib
+                version = None
+                try:
+                    if USE_MODEL_REGISTRY:
+                        # Newest published version, or the one pinned by activate/rollback
+                        from registry import get_registry, load_version
+                        version = get_registry().resolve()
+                        if version is None:
+                            raise Exception(f"no pipeline version found in {MODEL_REGISTRY_DIR}")
+                        pipeline, fingerprint = load_version(version)
+                    elif PIPELINE_LOAD_MODE == 'mmap':
+                        # Arrays stay in the shared page cache instead of private memory; the
+                        # export is checked against PIPELINE_PATH and refreshed when stale
+                        from artifact import load_mmap_artifact
+                        pipeline, fingerprint = load_mmap_artifact(PIPELINE_MMAP_PATH, PIPELINE_PATH)
+                    else:
+                        fingerprint = file_fingerprint(PIPELINE_PATH)
+                        pipeline = joblib.load(PIPELINE_PATH)
+                except Exception as e:
+                    raise Exception(
+                        f"Error loading pipeline: {str(e)}. This might be a scikit-learn version mismatch. Try: pip install scikit-learn==1.3.0 or retrain your model with the current environment.")
+                activate_pipeline(pipeline, fingerprint, version)
+    return _active.pipeline
+
+
+def select_champion(pipeline, fingerprint):
+    """
+    The pipeline and fingerprint served under CHAMPION_MODEL.
+
+    With "student", an artifact holding a distilled student (distill.py) serves
+    it as champion_model, with its own conformal table; the fingerprint gets a
+    suffix so caches keyed on it never mix the two models' prices. An artifact
+    without a student keeps its ensemble, with a warning.
+    """
+    if CHAMPION_MODEL == 'student' and 'student_model' not in pipeline:
+        logger.warning("CHAMPION_MODEL is 'student' but the pipeline artifact has no student_model "
+                       "(run distill.py): serving %s", pipeline.get('champion_name', 'the exported champion'))
+    elif CHAMPION_MODEL == 'student':
+        pipeline = dict(pipeline, champion_model=pipeline['student_model'], champion_name=pipeline['student_name'],
+                        conformal_intervals=pipeline.get('student_conformal_intervals'))
+        fingerprint = f"{fingerprint}-student"
+    return pipeline, fingerprint
+
+
+def activate_pipeline(pipeline, fingerprint, version=None):
+    """
+    Make `pipeline` the active pipeline (its champion chosen by select_champion).
+
+    The swap is a single reference assignment: predictions already running
+    finish on the pipeline they started with, later calls get the new one.
+    """
+    global _active
+    pipeline, fingerprint = select_champion(pipeline, fingerprint)
+    _active = ActivePipeline(pipeline, fingerprint, build_pipeline_index(pipeline), version)
+
+
+def get_active_pipeline():
+    """The active ActivePipeline (pipeline, fingerprint, index, version), loading it if needed"""
+    load_pipeline()
+    return _active
+
+
+# Read-only lookup tables derived from the pipeline once, when it loads
+PipelineIndex = namedtuple('PipelineIndex', [
+    'cities',                   # tuple of city names (lowercase) with region models
+    'regions_by_city',          # city -> tuple of display region names, 'Autres Villes' first
+    'all_regions',              # tuple of display region names across all cities
+    'region_display_names',     # region (lowercase) -> display name
+    'region_to_cities',         # region (lowercase) -> tuple of cities it belongs to
+    'virtual_regions_by_city',  # city -> tuple of valid virtual_region names
+    'tier_lookup',              # virtual_region -> tier
+    'region_canonicalizer',     # regions.RegionCanonicalizer mapping free-text names onto the trained regions
+    'city_stats',               # DataFrame of price statistics by city (shared, do not modify)
+])
+
+
+def _display_regions(regions):
+    """Sorted display names with 'Autres Villes' at the top"""
+    regions_list = sorted([r for r in regions if r.lower() != 'autres villes'])
+    return tuple(['Autres Villes'] + [r.title() for r in regions_list])
+
 
+def build_pipeline_index(pipeline):
+    """Build the immutable metadata index of a loaded pipeline"""
+    import pandas as pd
 
-def predict_price(city, size, room_count, bathroom_count, region='autres villes'):
+    from regions import get_region_canonicalizer
+
+    # Regions come from the KNN label encoders (the CLEANED regions the model was trained on)
+    regions_by_city = {}
+    region_to_cities = {}
+    for city, models in pipeline['knn_region_models'].items():
+        regions = models['label_encoder'].classes_.tolist()
+        regions_by_city[city] = _display_regions(regions)
+        for region in regions:
+            region_to_cities.setdefault(region.lower(), []).append(city)
+
+    all_regions = _display_regions(set(region_to_cities))
+    region_display_names = {region: ('Autres Villes' if region == 'autres villes' else region.title())
+                            for region in region_to_cities}
+
+    virtual_regions_by_city = {}
+    for city, models in pipeline['clustering_models'].items():
+        n_clusters = len(models['kmeans'].cluster_centers_)
+        virtual_regions_by_city[city] = tuple(f"{city}_Cluster_{cluster_id}" for cluster_id in range(n_clusters))
+
+    city_stats = pipeline['city_price_stats']
+    stats_df = pd.DataFrame({
+        'City': [city.title() for city in city_stats['median'].keys()],
+        'Median Price/m²': [round(price, 2) for price in city_stats['median'].values()],
+        'Mean Price/m²': [round(price, 2) for price in city_stats['mean'].values()],
+        'Std Dev': [round(std, 2) for std in city_stats['std'].values()]
+    })
+
+    return PipelineIndex(
+        cities=tuple(pipeline['knn_region_models']),
+        regions_by_city=MappingProxyType(regions_by_city),
+        all_regions=all_regions,
+        region_display_names=MappingProxyType(region_display_names),
+        region_to_cities=MappingProxyType({region: tuple(cities) for region, cities in region_to_cities.items()}),
+        virtual_regions_by_city=MappingProxyType(virtual_regions_by_city),
+        tier_lookup=MappingProxyType(dict(pipeline['tier_lookup'])),
+        region_canonicalizer=get_region_canonicalizer(pipeline),
+        city_stats=stats_df,
+    )
+
+
+def get_pipeline_index():
+    """Metadata index of the loaded pipeline"""
+    return get_active_pipeline().index
+
+
+def canonical_region(city, region):
+    """Trained region name of a free-text region of a city (see regions.py), lowercase"""
+    return get_pipeline_index().region_canonicalizer.canonical(city.lower(), region)
+
+
+def preload_pipeline(background=False, warm_up=True):
+    """
+    Load the pipeline (and optionally warm it up) ahead of the first request.
+
+    Parameters:
+    -----------
+    background : bool - Run in a daemon thread and return immediately
+    warm_up : bool - Also run warm_up_pipeline once the pipeline is loaded
+
+    Returns:
+    --------
+    threading.Thread if background, else None
+    """
+    def _preload():
+        load_pipeline()
+        if warm_up:
+            warm_up_pipeline()
+
+    if background:
+        thread = threading.Thread(target=_preload, name="pipeline-preload", daemon=True)
+        thread.start()
+        return thread
+    _preload()
+    return None
+
+
+def warm_up_pipeline(cities=CITIES):
+    """
+    Run one prediction per city (with and without region imputation) and a
+    small batch, so the first real user does not pay first-call costs
+    (lazy imports, sklearn dispatch, compiled-mode tables).
+    """
+    import pandas as pd
+
+    import drift
+
+    pipeline = load_pipeline()
+    # Warm-up listings are not traffic: they stay out of the input drift monitor
+    for city in cities:
+        predict_price(city, DEFAULT_SIZE, DEFAULT_ROOMS, DEFAULT_BATHROOMS, monitor=False)
+        regions = pipeline['knn_region_models'].get(city.lower(), {}).get('label_encoder')
+        if regions is not None and len(regions.classes_):
+            predict_price(city, DEFAULT_SIZE, DEFAULT_ROOMS, DEFAULT_BATHROOMS, regions.classes_[0], monitor=False)
+
+    # An explicit pipeline is scored without feeding the monitor (see predict_prices)
+    predict_prices(pd.DataFrame({
+        'city': list(cities),
+        'size': DEFAULT_SIZE,
+        'room_count': DEFAULT_ROOMS,
+        'bathroom_count': DEFAULT_BATHROOMS,
+    }), pipeline=pipeline)
+    if drift.enabled:
+        # The monitor's thread starts now and loads its reference sketches in the background
+        drift.get_drift_monitor()
+
+
+def get_pipeline_fingerprint():
+    """Fingerprint of the artifact the loaded pipeline came from"""
+    return get_active_pipeline().fingerprint
+
+
+def predict_price(city, size, room_count, bathroom_count, region='autres villes', mode=None, monitor=True,
+                  active=None):
     """
     Predict house price for a new property.
 
@@ -32,12 +245,35 @@ def predict_price(city, size, room_count, bathroom_count, region='autres villes'
     room_count : int - Number of rooms
     bathroom_count : int - Number of bathrooms
     region : str - Region name (use 'autres villes' if unknown)
+    mode : str - 'standard' or 'compiled' (defaults to INFERENCE_MODE)
+    monitor : bool - Queue the prediction for the input drift monitor (False for synthetic listings)
+    active : ActivePipeline - Snapshot to predict with (defaults to the active pipeline)
 
     Returns:
     --------
-    dict with prediction details
+    dict with prediction details; original_region is the region as given and
+    canonical_region the trained region it resolved to (see regions.py)
     """
-    pipeline = load_pipeline()
+    from drift import observe
+
+    if (mode or INFERENCE_MODE) == 'compiled':
+        from compiled import compiled_predict_price
+        clock = metrics.stage_clock()
+        started = clock()
+        result = compiled_predict_price(city, size, room_count, bathroom_count, region, active)
+        if metrics.enabled:
+            metrics.record_call('compiled', city.lower(), clock() - started)
+        if monitor:
+            observe(result)
+        return result
+
+    import numpy as np
+    import pandas as pd
+
+    # One snapshot per call: a registry swap mid-call must not mix the region
+    # index of one version with the models of another
+    active = active or get_active_pipeline()
+    pipeline = active.pipeline
 
     # Extract components
     champion_model = pipeline['champion_model']
@@ -48,7 +284,11 @@ def predict_price(city, size, room_count, bathroom_count, region='autres villes'
     features = pipeline['features']
 
     city = city.lower()
-    region = region.lower()
+    original_region = region
+    region = active.index.region_canonicalizer.canonical(city, region)
+    # No-op unless metrics are enabled (see metrics.py)
+    clock = metrics.stage_clock()
+    started = clock()
 
     # 1. Region Imputation (KNN)
     city_median_ppm2 = city_stats['median'].get(city, 3000)
@@ -66,6 +306,7 @@ def predict_price(city, size, room_count, bathroom_count, region='autres villes'
         imputed_region = label_encoder.inverse_transform([predicted_encoded])[0]
     else:
         imputed_region = region
+    imputed_at = clock()
 
     # 2. Virtual Region (Cluster assignment)
     if city in clustering_models:
@@ -80,9 +321,11 @@ def predict_price(city, size, room_count, bathroom_count, region='autres villes'
         virtual_region = f"{city}_Cluster_{cluster_id}"
     else:
         virtual_region = None
+    clustered_at = clock()
 
     # 3. Tier lookup
     tier = tier_lookup.get(virtual_region, 1)
+    tiered_at = clock()
 
     # 4. Feature Engineering
     avg_room_size = size / room_count if room_count > 0 else 0
@@ -105,40 +348,260 @@ def predict_price(city, size, room_count, bathroom_count, region='autres villes'
 
     input_df = pd.DataFrame([input_data])
     input_df = input_df.reindex(columns=features, fill_value=0)
+    featured_at = clock()
 
     # 5. Predict
     log_price = champion_model.predict(input_df)[0]
     estimated_price = np.expm1(log_price)
     price_per_m2 = estimated_price / size if size > 0 else 0
 
-    return {
+    # 6. Prediction interval (residual table of the held-out listings, see conformal.py)
+    from conformal import interval
+    price_low, price_high = interval(pipeline.get('conformal_intervals'), estimated_price, city, tier,
+                                     imputed=region == 'autres villes')
+
+    if metrics.enabled:
+        metrics.record_prediction(
+            'single', city, (imputed_at - started, clustered_at - imputed_at, tiered_at - clustered_at,
+                             featured_at - tiered_at, clock() - featured_at),
+            imputed=int(region == 'autres villes' and city in knn_models),
+            fallbacks=int(virtual_region is None),
+            tier_misses=int(virtual_region not in tier_lookup))
+
+    result = {
         'city': city.title(),
         'size': size,
         'room_count': room_count,
         'bathroom_count': bathroom_count,
-        'original_region': region,
+        'original_region': original_region,
+        'canonical_region': region,
         'imputed_region': imputed_region,
         'estimated_price_tnd': round(estimated_price, 2),
+        'price_low_tnd': price_low,
+        'price_high_tnd': price_high,
         'price_per_m2': round(price_per_m2, 2),
         'avg_room_size': round(avg_room_size, 2)
     }
+    # Queued for the input drift monitor's thread (see drift.py)
+    if monitor:
+        observe(result)
+    return result
 
 
-def get_city_statistics():
-    """Get price statistics by city from the pipeline"""
-    try:
-        pipeline = load_pipeline()
-        city_stats = pipeline['city_price_stats']
-
-        stats_df = pd.DataFrame({
-            'City': [city.title() for city in city_stats['median'].keys()],
-            'Median Price/m²': [round(price, 2) for price in city_stats['median'].values()],
-            'Mean Price/m²': [round(price, 2) for price in city_stats['mean'].values()],
-            'Std Dev': [round(std, 2) for std in city_stats['std'].values()]
+def predict_prices(df, pipeline=None):
+    """
+    Predict house prices for a batch of properties.
+
+    Vectorized counterpart of predict_price: rows are grouped by city so the
+    region imputation and cluster assignment run once per city, and the
+    champion model scores the whole batch in a single call.
+
+    Parameters:
+    -----------
+    df : pd.DataFrame - Columns city, size, room_count, bathroom_count and
+         optionally region (missing regions are treated as 'autres villes')
+    pipeline : dict - Pipeline artifact to score with (defaults to the loaded one, whose
+               predictions feed the input drift monitor)
+
+    Returns:
+    --------
+    pd.DataFrame with the same fields as predict_price, indexed like df
+    """
+    import numpy as np
+    import pandas as pd
+
+    from drift import observe_batch
+    from regions import get_region_canonicalizer
+
+    served = pipeline is None
+    if served:
+        pipeline = get_active_pipeline().pipeline
+
+    # Extract components
+    champion_model = pipeline['champion_model']
+    knn_models = pipeline['knn_region_models']
+    clustering_models = pipeline['clustering_models']
+    tier_lookup = pipeline['tier_lookup']
+    city_stats = pipeline['city_price_stats']
+    features = pipeline['features']
+
+    cities = df['city'].astype(str).str.lower()
+    if 'region' in df.columns:
+        # Free-text names mapped onto the trained regions (one resolution per distinct city and name)
+        regions = pd.Series(get_region_canonicalizer(pipeline).canonicalize(cities.to_numpy(), df['region'].fillna('autres villes')),
+                            index=df.index)
+    else:
+        regions = pd.Series('autres villes', index=df.index)
+
+    size = df['size'].to_numpy()
+    room_count = df['room_count'].to_numpy()
+    bathroom_count = df['bathroom_count'].to_numpy()
+
+    imputed_region = regions.to_numpy(dtype=object).copy()
+    virtual_region = np.full(len(df), None, dtype=object)
+    tier = np.ones(len(df), dtype=np.int64)
+
+    # Stages 1-3 interleave per city: their durations are summed over the cities
+    clock = metrics.stage_clock()
+    stage_seconds = [0.0, 0.0, 0.0]
+    imputed = fallbacks = tier_misses = 0
+
+    for city, positions in cities.groupby(cities.to_numpy(), sort=False).indices.items():
+        city_median_ppm2 = city_stats['median'].get(city, 3000)
+        X_city = pd.DataFrame({
+            'size': size[positions],
+            'room_count': room_count[positions],
+            'bathroom_count': bathroom_count[positions],
+            'price_per_m2': city_median_ppm2,
         })
 
-        return stats_df
+        # 1. Region Imputation (KNN)
+        stage_start = clock()
+        unknown = imputed_region[positions] == 'autres villes'
+        if unknown.any() and city in knn_models:
+            models = knn_models[city]
+            X_scaled = models['scaler'].transform(X_city[unknown])
+            predicted_encoded = models['knn'].predict(X_scaled)
+            imputed_region[positions[unknown]] = models['label_encoder'].inverse_transform(predicted_encoded)
+            imputed += int(unknown.sum())
+        imputed_at = clock()
+        stage_seconds[0] += imputed_at - stage_start
+
+        # 2. Virtual Region (Cluster assignment)
+        city_virtual_regions = assign_virtual_regions(clustering_models, city, X_city)
+        if city_virtual_regions is not None:
+            virtual_region[positions] = city_virtual_regions
+            clustered_at = clock()
+            stage_seconds[1] += clustered_at - imputed_at
+
+            # 3. Tier lookup
+            city_tiers = pd.Series(city_virtual_regions).map(tier_lookup)
+            tier_misses += int(city_tiers.isna().sum())
+            tier[positions] = city_tiers.fillna(1).to_numpy()
+            stage_seconds[2] += clock() - clustered_at
+        else:
+            fallbacks += len(positions)
+            tier_misses += len(positions)
+    grouped_at = clock()
+
+    # 4. Feature Engineering
+    with np.errstate(divide='ignore', invalid='ignore'):
+        avg_room_size = np.where(room_count > 0, size / room_count, 0)
+        room_density = np.where(size > 0, room_count / (size / 100), 0)
+
+    input_df = pd.DataFrame({
+        'city': cities.to_numpy(),
+        'region': imputed_region,
+        'virtual_region': virtual_region,
+        'tier': tier,
+        'size': size,
+        'room_count': room_count,
+        'bathroom_count': bathroom_count,
+        'avg_room_size': avg_room_size,
+        'log_size': np.log1p(size),
+        'bathroom_ratio': bathroom_count / (room_count + 1),
+        'size_per_bathroom': size / (bathroom_count + 1),
+        'room_density': room_density,
+        'size_squared': size ** 2,
+    })
+    input_df = input_df.reindex(columns=features, fill_value=0)
+    featured_at = clock()
+
+    # 5. Predict (one call for the whole batch)
+    log_price = champion_model.predict(input_df)
+    estimated_price = np.expm1(log_price)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        price_per_m2 = np.where(size > 0, estimated_price / size, 0)
+
+    # 6. Prediction intervals (one residual table lookup per region source, city and tier)
+    from conformal import intervals
+    price_low, price_high = intervals(pipeline.get('conformal_intervals'), estimated_price, cities, tier,
+                                      imputed=regions.to_numpy() == 'autres villes')
+
+    if metrics.enabled:
+        metrics.record_prediction(
+            'batch', 'all', tuple(stage_seconds) + (featured_at - grouped_at, clock() - featured_at),
+            rows=len(df), imputed=imputed, fallbacks=fallbacks, tier_misses=tier_misses)
+
+    results = pd.DataFrame({
+        'city': cities.str.title().to_numpy(),
+        'size': size,
+        'room_count': room_count,
+        'bathroom_count': bathroom_count,
+        'original_region': df['region'].to_numpy() if 'region' in df.columns else regions.to_numpy(),
+        'canonical_region': regions.to_numpy(),
+        'imputed_region': imputed_region,
+        'estimated_price_tnd': np.round(estimated_price, 2),
+        'price_low_tnd': price_low,
+        'price_high_tnd': price_high,
+        'price_per_m2': np.round(price_per_m2, 2),
+        'avg_room_size': np.round(avg_room_size, 2)
+    }, index=df.index)
+    if served:
+        # Only the active pipeline's traffic feeds the input drift monitor (see drift.py)
+        observe_batch(results)
+    return results
+
+
+def assign_virtual_regions(clustering_models, city, X_city):
+    """
+    Stage 2 of predict_prices (cluster assignment) for the listings of one city.
+
+    Parameters:
+    -----------
+    clustering_models : dict - pipeline['clustering_models']
+    city : str - City of the listings (lowercase)
+    X_city : pd.DataFrame - size, room_count, bathroom_count and price_per_m2 (the city median)
+
+    Returns:
+    --------
+    np.ndarray of virtual_region names, or None when the city has no clustering models
+    """
+    import numpy as np
+
+    models = clustering_models.get(city)
+    if models is None:
+        return None
+    cluster_ids = models['kmeans'].predict(models['scaler'].transform(X_city))
+    return np.array([f"{city}_Cluster_{cluster_id}" for cluster_id in cluster_ids], dtype=object)
+
+
+def request_virtual_regions(pipeline, cities, size, room_count, bathroom_count):
+    """
+    virtual_region the request path assigns to each listing (stage 2 of predict_prices,
+    None for a city without clustering models), without pricing the listings.
+    """
+    import numpy as np
+    import pandas as pd
+
+    cities = np.asarray(cities, dtype=object)
+    features = np.column_stack([size, room_count, bathroom_count]).astype(float)
+    virtual_regions = np.full(len(cities), None, dtype=object)
+    for city in pd.unique(cities):
+        positions = np.flatnonzero(cities == city)
+        X_city = pd.DataFrame(features[positions], columns=['size', 'room_count', 'bathroom_count'])
+        X_city['price_per_m2'] = pipeline['city_price_stats']['median'].get(city, 3000)
+        city_virtual_regions = assign_virtual_regions(pipeline['clustering_models'], city, X_city)
+        if city_virtual_regions is not None:
+            virtual_regions[positions] = city_virtual_regions
+    return virtual_regions
+
+
+def request_tiers(pipeline, cities, size, room_count, bathroom_count):
+    """Tier the request path assigns to each listing (stage 3: tier of its virtual_region, 1 when unknown)"""
+    import numpy as np
+
+    tier_lookup = pipeline['tier_lookup']
+    return np.array([tier_lookup.get(virtual_region, 1) for virtual_region in
+                     request_virtual_regions(pipeline, cities, size, room_count, bathroom_count)], dtype=np.int64)
+
+
+def get_city_statistics():
+    """Get price statistics by city from the pipeline (shared DataFrame, copy before modifying)"""
+    try:
+        return get_pipeline_index().city_stats
     except Exception as e:
+        import pandas as pd
         # Fallback: return hardcoded statistics from metadata
         return pd.DataFrame({
             'City': ['Tunis', 'Ariana', 'Ben Arous', 'La Manouba'],
@@ -150,6 +613,8 @@ def get_city_statistics():
 
 def create_city_comparison_chart(stats_df):
     """Create a bar chart comparing median prices across cities"""
+    import plotly.express as px
+
     fig = px.bar(
         stats_df,
         x='City',
@@ -170,8 +635,44 @@ def create_city_comparison_chart(stats_df):
     return fig
 
 
-def create_prediction_gauge(predicted_price, city_median):
-    """Create a gauge chart showing prediction vs city median"""
+def create_price_curve_chart(curves_df, x, title, x_label):
+    """Create a line chart of predicted price against one feature, one line per city"""
+    import plotly.express as px
+
+    fig = px.line(
+        curves_df,
+        x=x,
+        y='estimated_price_tnd',
+        color='city',
+        markers=True,
+        category_orders={'city': CITIES},
+        hover_data=['price_per_m2'],
+        title=title,
+        labels={
+            x: x_label,
+            'estimated_price_tnd': f'Predicted Price ({CURRENCY})',
+            'price_per_m2': f'Price/m² ({CURRENCY})',
+            'city': 'City'
+        }
+    )
+
+    fig.update_layout(height=400)
+    return fig
+
+
+def create_prediction_gauge(predicted_price, city_median, low=None, high=None):
+    """Create a gauge chart showing prediction vs city median (and its prediction interval when given)"""
+    import plotly.graph_objects as go
+
+    steps = [
+        {'range': [0, city_median * 0.8], 'color': 'lightgray'},
+        {'range': [city_median * 0.8, city_median * 1.2], 'color': 'gray'}
+    ]
+    has_interval = low is not None and high is not None
+    if has_interval:
+        # Drawn over the median band; the thinner bar leaves it visible around the prediction
+        steps.append({'range': [low, high], 'color': 'rgba(44, 160, 44, 0.45)', 'thickness': 0.6})
+
     fig = go.Figure(go.Indicator(
         mode="gauge+number+delta",
         value=predicted_price,
@@ -179,12 +680,10 @@ def create_prediction_gauge(predicted_price, city_median):
         title={'text': f"Predicted Price ({CURRENCY})", 'font': {'size': 20}},
         delta={'reference': city_median, 'valueformat': '.0f'},
         gauge={
-            'axis': {'range': [None, max(predicted_price * 1.5, city_median * 1.5)], 'tickformat': '.0f'},
-            'bar': {'color': CHART_COLORS['primary']},
-            'steps': [
-                {'range': [0, city_median * 0.8], 'color': 'lightgray'},
-                {'range': [city_median * 0.8, city_median * 1.2], 'color': 'gray'}
-            ],
+            'axis': {'range': [None, max(predicted_price * 1.5, city_median * 1.5, high * 1.05 if has_interval else 0)],
+                     'tickformat': '.0f'},
+            'bar': {'color': CHART_COLORS['primary'], 'thickness': 0.3 if has_interval else 1},
+            'steps': steps,
             'threshold': {
                 'line': {'color': CHART_COLORS['danger'], 'width': 4},
                 'thickness': 0.75,
@@ -197,8 +696,45 @@ def create_prediction_gauge(predicted_price, city_median):
     return fig
 
 
+def create_attribution_chart(contributions, base_price):
+    """
+    Horizontal bar chart of the effect of each input on the price.
+
+    Parameters:
+    -----------
+    contributions : dict - Raw input -> log-price contribution (explain.Explanation.contributions)
+    base_price : float - Price of the model's average prediction, the reference of the effects
+    """
+    import numpy as np
+    import plotly.graph_objects as go
+
+    labels = {'city': 'City', 'region': 'Region', 'size': 'Size', 'room_count': 'Rooms',
+              'bathroom_count': 'Bathrooms'}
+    # Smallest effect first: plotly draws the first bar at the bottom
+    items = sorted(contributions.items(), key=lambda item: abs(item[1]))
+    effects = [float(np.expm1(value)) * 100 for _, value in items]
+
+    fig = go.Figure(go.Bar(
+        x=effects,
+        y=[labels.get(name, name) for name, _ in items],
+        orientation='h',
+        marker_color=[CHART_COLORS['success'] if effect >= 0 else CHART_COLORS['danger'] for effect in effects],
+        text=[f"{effect:+.1f}%" for effect in effects],
+        textposition='auto',
+    ))
+    fig.update_layout(
+        title=f"Effect on Price vs. an Average Listing ({base_price:,.2f} {CURRENCY})",
+        xaxis_title="Price effect (%)",
+        height=300,
+        margin={'l': 10, 'r': 10, 't': 50, 'b': 40},
+    )
+    return fig
+
+
 def create_history_chart(history_df):
-    """Create a scatter plot of prediction history"""
+    """Create a scatter plot of prediction history (WebGL above CHART_WEBGL_THRESHOLD points)"""
+    import plotly.express as px
+
     if history_df.empty:
         return None
 
@@ -209,6 +745,8 @@ def create_history_chart(history_df):
         color='city',
         size='room_count',
         hover_data=['bathroom_count', 'price_per_m2', 'imputed_region'],
+        category_orders={'city': CITIES},
+        render_mode='webgl' if len(history_df) > CHART_WEBGL_THRESHOLD else 'svg',
         title='Prediction History',
         labels={
             'size': 'Size (m²)',
@@ -229,46 +767,34 @@ def format_currency(amount):
 
 def get_model_info():
     """Get model metadata information"""
-    try:
-        import json
-        with open('model_export/pipeline_metadata.json', 'r') as f:
-            metadata = json.load(f)
-        return metadata
-    except:
-        return None
+    active = _active
+    if active is not None and active.version is not None:
+        # Metadata exported with the registry version being served
+        metadata = dict(active.version.metadata, version=active.version.name) if active.version.metadata else None
+    else:
+        try:
+            import json
+            with open('model_export/pipeline_metadata.json', 'r') as f:
+                metadata = json.load(f)
+        except:
+            return None
+    if metadata and active is not None and active.fingerprint.endswith('-student') and 'student_r2' in metadata:
+        # Serving the distilled student (held-out R² through the request path)
+        metadata = dict(metadata, champion_model_name=metadata['student_model_name'],
+                        champion_r2=metadata['student_r2'])
+    return metadata
 
 
 def get_available_regions(city=None):
     """Get list of available regions, optionally filtered by city"""
     try:
-        pipeline = load_pipeline()
-
-        # Get regions from KNN models (they have the label encoders with CLEANED regions)
-        all_regions = set()
-
-        if city and city.lower() in pipeline['knn_region_models']:
-            # Get regions for specific city (these are the CLEANED regions the model was trained on)
-            label_encoder = pipeline['knn_region_models'][city.lower()]['label_encoder']
-            regions = label_encoder.classes_.tolist()
-            all_regions.update(regions)
-        else:
-            # Get all unique regions from all cities
-            for city_name, models in pipeline['knn_region_models'].items():
-                label_encoder = models['label_encoder']
-                regions = label_encoder.classes_.tolist()
-                all_regions.update(regions)
-
-        # Sort alphabetically (excluding "autres villes")
-        regions_list = sorted([r for r in all_regions if r.lower() != 'autres villes'])
-
-        # Add "autres villes" at the top if it exists
-        if 'autres villes' in [r.lower() for r in all_regions]:
-            regions_list.insert(0, next(r for r in all_regions if r.lower() == 'autres villes'))
-        else:
-            regions_list.insert(0, 'autres villes')
+        index = get_pipeline_index()
 
-        # Capitalize first letter of each word for display
-        return [r.title() if r.lower() != 'autres villes' else 'Autres Villes' for r in regions_list]
+        if city and city.lower() in index.regions_by_city:
+            # Regions for a specific city (the CLEANED regions the model was trained on)
+            return index.regions_by_city[city.lower()]
+        # All unique regions from all cities
+        return index.all_regions
 
     except Exception as e:
         print(f"Error loading regions: {e}")
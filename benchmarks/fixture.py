@@ -0,0 +1,79 @@
+"""
+Synthetic pipeline fixture for the benchmarks.
+
+The real house_pricing_pipeline.joblib is not in the repository, so this
+trains a small pipeline of the same shape from data/processed/merged.csv
+through the app's own training stages (app/train.py): the shared cleaning
+and per-city IQR filtering, KNN region imputation, KMeans virtual regions
+and price tiers. Only the champion differs: a small stacking ensemble on
+the same features and preprocessing, so the fixture builds in seconds;
+latencies measured with it are a lower bound for the real model.
+
+    python fixture.py [output_path]
+"""
+import os
+import sys
+
+import joblib
+import numpy as np
+from sklearn.ensemble import GradientBoostingRegressor, RandomForestRegressor, StackingRegressor
+from sklearn.linear_model import Ridge
+from sklearn.pipeline import Pipeline
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "app"))
+
+from cleaning import input_profile
+from train import FEATURES, fit_region_imputers, fit_virtual_regions, load_training_data, make_preprocessor
+
+DATA_PATH = os.path.join(ROOT, "data", "processed", "merged.csv")
+FIXTURE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".fixture", "house_pricing_pipeline.joblib")
+
+
+def build_fixture_pipeline(output_path=FIXTURE_PATH, data_path=DATA_PATH, n_estimators=20):
+    """
+    Train the fixture pipeline and save it with joblib.
+
+    Returns:
+    --------
+    dict - The pipeline artifact (same keys as the exported v2 pipeline)
+    """
+    df = load_training_data(data_path)
+    profile = input_profile(df)
+
+    # 1. KNN region imputation and 2. virtual regions / price tiers, as in train.py
+    df, knn_region_models, best_k_per_city = fit_region_imputers(df)
+    df, clustering_models, tier_lookup = fit_virtual_regions(df)
+    df['avg_room_size'] = df['size'] / df['room_count']
+
+    # 3. Champion model on log prices
+    ensemble = StackingRegressor([
+        ('Ridge', Ridge()),
+        ('RandomForest', RandomForestRegressor(n_estimators=n_estimators, random_state=42)),
+        ('GradientBoosting', GradientBoostingRegressor(n_estimators=n_estimators * 2, random_state=42)),
+    ], final_estimator=Ridge(alpha=1.0), cv=5)
+    champion_model = Pipeline([('prep', make_preprocessor()), ('stacking', ensemble)])
+    champion_model.fit(df[FEATURES], np.log1p(df['price']))
+
+    pipeline = {
+        'champion_model': champion_model,
+        'champion_name': 'Stacking_Ensemble',
+        'knn_region_models': knn_region_models,
+        'best_k_per_city': best_k_per_city,
+        'clustering_models': clustering_models,
+        'tier_lookup': tier_lookup,
+        'city_price_stats': df.groupby('city')['price_per_m2'].agg(['median', 'mean', 'std']).to_dict(),
+        'features': FEATURES,
+        'input_profile': profile,
+    }
+    directory = os.path.dirname(output_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    joblib.dump(pipeline, output_path)
+    return pipeline
+
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else FIXTURE_PATH
+    build_fixture_pipeline(path)
+    print(f"Fixture pipeline saved to {path}")
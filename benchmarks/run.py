@@ -0,0 +1,244 @@
+"""
+Benchmarks for the inference and app hot paths.
+
+Runs against the fixture pipeline (fixture.py, built on first use) and
+writes flat, machine-readable results: one JSON file per run with metric
+name -> value, plus the commit and library versions it was measured on.
+
+    python run.py                                  # writes results/<commit>.json
+    python run.py --quick                          # fewer repetitions
+    python run.py --compare results/a.json results/b.json [--threshold 10]
+
+Metric names end with their unit; `_per_s` metrics are better when higher,
+all others (`_ms`, `_us`, `_s`, `_mb`) when lower.
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_DIR = os.path.join(ROOT, "app")
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+sys.path.insert(0, APP_DIR)
+
+import numpy as np
+import pandas as pd
+
+import utils
+from config import CITIES
+from fixture import DATA_PATH, FIXTURE_PATH, build_fixture_pipeline
+
+BATCH_SIZES = [1000, 10000]
+
+_COLD_LOAD = """
+import json, resource, sys, time
+sys.path.insert(0, {app_dir!r})
+start = time.perf_counter()
+import utils
+import_seconds = time.perf_counter() - start
+utils.PIPELINE_PATH = {path!r}
+start = time.perf_counter()
+utils.load_pipeline()
+load_seconds = time.perf_counter() - start
+print(json.dumps(dict(import_s=import_seconds, load_s=load_seconds,
+                      peak_rss_mb=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024)))
+"""
+
+
+def _max_rss_mb():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == 'darwin' else rss / 1024
+
+
+def _latency_stats(prefix, samples):
+    samples_ms = np.asarray(samples) * 1000
+    return {
+        f'{prefix}.p50_ms': float(np.percentile(samples_ms, 50)),
+        f'{prefix}.p95_ms': float(np.percentile(samples_ms, 95)),
+        f'{prefix}.p99_ms': float(np.percentile(samples_ms, 99)),
+        f'{prefix}.mean_ms': float(samples_ms.mean()),
+    }
+
+
+def _per_call_us(func, calls):
+    start = time.perf_counter()
+    for _ in range(calls):
+        func()
+    return (time.perf_counter() - start) / calls * 1e6
+
+
+def bench_load(path, cold_runs):
+    """Cold load in fresh interpreters (imports + unpickling), then reload and warm calls in-process"""
+    results = {}
+    cold = []
+    for _ in range(cold_runs):
+        output = subprocess.run([sys.executable, '-W', 'ignore', '-c', _COLD_LOAD.format(app_dir=APP_DIR, path=path)],
+                                capture_output=True, text=True, check=True).stdout
+        cold.append(json.loads(output.strip().splitlines()[-1]))
+    for key in cold[0]:
+        results[f'load_pipeline.cold.{key}'] = statistics.median(run[key] for run in cold)
+
+    # Reload: the process is warm (imports done, file in the page cache), only unpickling is timed
+    utils._active = None
+    start = time.perf_counter()
+    utils.load_pipeline()
+    results['load_pipeline.reload_s'] = time.perf_counter() - start
+    results['load_pipeline.warm_us'] = _per_call_us(utils.load_pipeline, 10000)
+    return results
+
+
+def bench_predict_price(calls, seed=42):
+    """Single-call latency per city, with a trained region and with 'autres villes' (KNN imputation)"""
+    results = {}
+    rng = np.random.default_rng(seed)
+    index = utils.get_pipeline_index()
+    for city in CITIES:
+        key = city.lower()
+        region = index.regions_by_city[key][1].lower()
+        for label, city_region in [('region', region), ('imputed', 'autres villes')]:
+            listings = [(city, int(rng.integers(40, 300)), int(rng.integers(1, 6)), int(rng.integers(1, 4)), city_region)
+                        for _ in range(calls)]
+            utils.predict_price(*listings[0])  # Warm-up
+            samples = []
+            for listing in listings:
+                start = time.perf_counter()
+                utils.predict_price(*listing)
+                samples.append(time.perf_counter() - start)
+            results.update(_latency_stats(f"predict_price.{key.replace(' ', '_')}.{label}", samples))
+    return results
+
+
+def bench_batch(sizes=BATCH_SIZES, repeats=3, seed=42):
+    """predict_prices throughput on listings sampled from merged.csv (half of them with imputed regions)"""
+    results = {}
+    data = pd.read_csv(DATA_PATH)
+    data = data[data['city'].str.lower().isin([c.lower() for c in CITIES])]
+    for size in sizes:
+        batch = data.sample(size, replace=True, random_state=seed)[['city', 'size', 'room_count', 'bathroom_count', 'region']]
+        batch = batch.reset_index(drop=True)
+        batch.loc[batch.index % 2 == 0, 'region'] = 'autres villes'
+        timings = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            utils.predict_prices(batch)
+            timings.append(time.perf_counter() - start)
+        best = min(timings)
+        results[f'predict_prices.batch_{size}.total_s'] = best
+        results[f'predict_prices.batch_{size}.rows_per_s'] = size / best
+    return results
+
+
+def bench_metadata(calls):
+    """Cost of the helpers the app calls on every rerun"""
+    return {
+        'get_available_regions.all_us': _per_call_us(utils.get_available_regions, calls),
+        'get_available_regions.city_us': _per_call_us(lambda: utils.get_available_regions('Tunis'), calls),
+        'get_city_statistics_us': _per_call_us(utils.get_city_statistics, calls),
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def run_benchmarks(quick=False, fixture_path=FIXTURE_PATH, rebuild=False):
+    """
+    Run every benchmark against the fixture pipeline.
+
+    Returns:
+    --------
+    dict with 'meta' (commit, versions, fixture fingerprint) and flat 'results'
+    """
+    import sklearn
+
+    if rebuild or not os.path.exists(fixture_path):
+        build_fixture_pipeline(fixture_path)
+    utils.PIPELINE_PATH = fixture_path
+
+    calls = 50 if quick else 300
+    results = {}
+    results.update(bench_load(fixture_path, cold_runs=1 if quick else 3))
+    results.update(bench_predict_price(calls))
+    results.update(bench_batch(repeats=1 if quick else 3))
+    results.update(bench_metadata(1000 if quick else 10000))
+    results['peak_rss_mb'] = _max_rss_mb()
+
+    return {
+        'meta': {
+            'commit': _git_commit(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'sklearn': sklearn.__version__,
+            'fixture_fingerprint': utils.get_pipeline_fingerprint(),
+            'quick': quick,
+        },
+        'results': results,
+    }
+
+
+def compare(base, head, threshold=10.0):
+    """
+    Relative change of every metric present in both runs.
+
+    Returns:
+    --------
+    list of (metric, base value, head value, % change, regressed)
+    """
+    rows = []
+    for metric in sorted(set(base['results']) & set(head['results'])):
+        before, after = base['results'][metric], head['results'][metric]
+        change = (after - before) / before * 100 if before else 0.0
+        worse = -change if metric.endswith('_per_s') else change
+        rows.append((metric, before, after, change, worse > threshold))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inference and app hot path benchmarks")
+    parser.add_argument('--quick', action='store_true', help="Fewer repetitions")
+    parser.add_argument('--rebuild-fixture', action='store_true', help="Retrain the fixture pipeline first")
+    parser.add_argument('--output', help="Results file (default: results/<commit>.json)")
+    parser.add_argument('--compare', nargs=2, metavar=('BASE', 'HEAD'), help="Compare two results files")
+    parser.add_argument('--threshold', type=float, default=10.0, help="Regression threshold in percent")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        with open(args.compare[0]) as f:
+            base = json.load(f)
+        with open(args.compare[1]) as f:
+            head = json.load(f)
+        rows = compare(base, head, args.threshold)
+        print(f"{base['meta']['commit']} -> {head['meta']['commit']}")
+        for metric, before, after, change, regressed in rows:
+            flag = '  REGRESSION' if regressed else ''
+            print(f"  {metric:<45} {before:>12.4g} -> {after:>12.4g} ({change:+6.1f}%){flag}")
+        return 1 if any(row[4] for row in rows) else 0
+
+    report = run_benchmarks(args.quick, rebuild=args.rebuild_fixture)
+    output = args.output or os.path.join(RESULTS_DIR, f"{report['meta']['commit']}.json")
+    directory = os.path.dirname(output)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    for metric, value in report['results'].items():
+        print(f"  {metric:<45} {value:>12.4g}")
+    print(f"Results written to {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
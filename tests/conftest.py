@@ -0,0 +1,49 @@
+"""
+Shared fixtures: the app modules are imported from app/, and every test runs
+against the benchmark fixture pipeline (benchmarks/fixture.py) with a
+conformal table calibrated on its held-out listings, so the suite needs only
+the CSVs under data/, not the exported artifact.
+"""
+import os
+import sys
+
+import joblib
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "app"))
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+import drift
+import utils
+from conformal import calibrate, holdout_rows
+from fixture import DATA_PATH, build_fixture_pipeline
+from train import load_training_data
+
+# Off unless a serving process enables it: tests that need a monitor start their own
+assert not drift.enabled
+
+
+@pytest.fixture(scope='session')
+def pipeline_path(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("pipeline") / "house_pricing_pipeline.joblib")
+    pipeline = build_fixture_pipeline(path, DATA_PATH, n_estimators=10)
+    pipeline['conformal_intervals'] = calibrate(pipeline, holdout_rows(load_training_data(DATA_PATH)))
+    joblib.dump(pipeline, path)
+    return path
+
+
+@pytest.fixture(scope='session', autouse=True)
+def served_pipeline(pipeline_path):
+    """The fixture pipeline as the loaded pipeline of utils"""
+    utils.PIPELINE_PATH = pipeline_path
+    utils._active = None
+    return utils.get_active_pipeline()
+
+
+@pytest.fixture
+def restore_active():
+    """Put back the served pipeline after a test that swaps it"""
+    active = utils._active
+    yield active
+    utils._active = active
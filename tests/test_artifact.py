@@ -0,0 +1,43 @@
+import shutil
+
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+
+from artifact import export_mmap_artifact, load_mmap_artifact
+from utils import file_fingerprint, predict_prices
+
+LISTINGS = pd.DataFrame({'city': ['tunis', 'ariana'], 'size': [100.0, 80.0], 'room_count': [3.0, 2.0],
+                         'bathroom_count': [1.0, 1.0], 'region': ['la marsa', 'autres villes']})
+
+
+@pytest.fixture
+def source_path(tmp_path, pipeline_path):
+    path = str(tmp_path / "house_pricing_pipeline.joblib")
+    shutil.copy(pipeline_path, path)
+    return path
+
+
+def test_mapped_pipeline_predicts_like_the_source(tmp_path, source_path):
+    mmap_path = str(tmp_path / "house_pricing_pipeline.mmap.joblib")
+    pipeline, fingerprint = load_mmap_artifact(mmap_path, source_path)  # exported on first use
+    assert fingerprint == file_fingerprint(source_path)
+    assert pipeline['source_fingerprint'] == fingerprint
+    assert any(isinstance(models['knn']._fit_X, np.memmap) for models in pipeline['knn_region_models'].values())
+
+    expected = predict_prices(LISTINGS, pipeline=joblib.load(source_path))
+    pd.testing.assert_frame_equal(predict_prices(LISTINGS, pipeline=pipeline), expected)
+
+
+def test_stale_export_is_replaced(tmp_path, source_path):
+    mmap_path = str(tmp_path / "house_pricing_pipeline.mmap.joblib")
+    export_mmap_artifact(source_path, mmap_path)
+
+    pipeline = joblib.load(source_path)
+    pipeline['champion_name'] = 'Retrained'
+    joblib.dump(pipeline, source_path)
+
+    loaded, fingerprint = load_mmap_artifact(mmap_path, source_path)
+    assert loaded['champion_name'] == 'Retrained'
+    assert loaded['source_fingerprint'] == fingerprint == file_fingerprint(source_path)
@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from batch_score import OUTPUT_COLUMNS, SCREENING_COLUMNS, score_chunk, score_file
+from utils import predict_prices
+
+LISTINGS = pd.DataFrame([
+    ('Tunis', 'La Marsa', 120, 3, 2),
+    ('ariana', 'autres villes', 90, 2, 1),
+    ('sfax', 'autres villes', 100, 3, 1),     # rejected: unsupported city
+    ('tunis', 'la marsa', -1, 1, 1),          # rejected: the sources' -1 for unknown
+    ('ben arous', None, 100000, 3, 1),        # flagged: size outside the training range
+    ('la manouba', 'denden', 75, 2, 1),
+], columns=['city', 'region', 'size', 'room_count', 'bathroom_count'])
+
+
+def test_score_chunk_screens_and_scores():
+    scored = score_chunk(LISTINGS)
+    assert list(scored.columns) == list(LISTINGS.columns) + OUTPUT_COLUMNS + SCREENING_COLUMNS
+    assert scored['input_status'].tolist() == ['ok', 'ok', 'rejected', 'rejected', 'flagged', 'ok']
+    assert scored['estimated_price_tnd'].notna().tolist() == [True, True, False, False, True, True]
+
+    valid = scored['input_status'] != 'rejected'
+    expected = predict_prices(LISTINGS[valid].assign(region=LISTINGS.loc[valid, 'region'].fillna('autres villes')))
+    np.testing.assert_array_equal(scored.loc[valid, 'estimated_price_tnd'].astype(float),
+                                  expected['estimated_price_tnd'])
+
+
+def test_score_chunk_reject_flagged():
+    scored = score_chunk(LISTINGS, reject_flagged=True)
+    assert scored['input_status'].iloc[4] == 'flagged'
+    assert np.isnan(scored['estimated_price_tnd'].iloc[4])
+
+
+@pytest.mark.parametrize('suffix', ['csv', 'parquet'])
+def test_score_file_streams_every_row_in_order(tmp_path, suffix):
+    listings = pd.concat([LISTINGS] * 5, ignore_index=True)
+    input_path = tmp_path / "listings.csv"
+    output_path = tmp_path / f"scored.{suffix}"
+    listings.to_csv(input_path, index=False)
+
+    summary = score_file(str(input_path), str(output_path), chunksize=4, workers=2)
+    assert summary['rows_read'] == 30
+    assert (summary['rows_scored'], summary['rows_flagged'], summary['rows_rejected']) == (20, 5, 10)
+
+    scored = pd.read_csv(output_path) if suffix == 'csv' else pd.read_parquet(output_path)
+    expected = score_chunk(listings)
+    assert scored['input_status'].tolist() == expected['input_status'].tolist()
+    np.testing.assert_allclose(scored['estimated_price_tnd'].astype(float), expected['estimated_price_tnd'].astype(float))
@@ -0,0 +1,67 @@
+import pytest
+
+import utils
+from cache import PredictionCache, normalize_inputs
+
+LISTING = ('tunis', 100, 3, 1, 'la marsa')
+
+
+def test_normalize_inputs():
+    assert normalize_inputs(' Tunis', 100, 3.0, 1, 'La Marsa ') == normalize_inputs(*LISTING)
+    assert normalize_inputs('tunis', 100, 3, 1, None)[-1] == 'autres villes'
+
+
+def test_rejects_unknown_policy():
+    with pytest.raises(ValueError):
+        PredictionCache(policy='random', disk_path=None)
+
+
+def test_hit_returns_the_prediction_with_the_region_as_typed():
+    cache = PredictionCache(disk_path=None)
+    first = cache.predict_price(*LISTING)
+    second = cache.predict_price('TUNIS', 100, 3, 1, 'LA MARSA')
+    assert cache.stats()['memory_hits'] == 1
+    assert second['original_region'] == 'LA MARSA'
+    assert second['canonical_region'] == first['canonical_region'] == 'la marsa'
+    assert second['estimated_price_tnd'] == first['estimated_price_tnd']
+
+
+@pytest.mark.parametrize('policy, kept', [('lru', 'a'), ('fifo', 'b')])
+def test_eviction_policy(policy, kept):
+    cache = PredictionCache(max_entries=2, policy=policy, disk_path=None)
+    cache.put('a', {'estimated_price_tnd': 1.0})
+    cache.put('b', {'estimated_price_tnd': 2.0})
+    cache.get('a')
+    cache.put('c', {'estimated_price_tnd': 3.0})
+    assert cache.get(kept) is not None
+    assert cache.stats()['evictions'] == 1
+
+
+def test_new_fingerprint_invalidates_both_tiers(tmp_path, restore_active):
+    cache = PredictionCache(disk_path=str(tmp_path / "predictions.sqlite"))
+    key = normalize_inputs(*LISTING)
+    cache.put(key, {'estimated_price_tnd': 1.0})
+    cache._memory.clear()
+    assert cache.get(key) == {'estimated_price_tnd': 1.0}
+    assert cache.stats()['disk_hits'] == 1
+
+    utils.activate_pipeline(restore_active.pipeline, restore_active.fingerprint + '-retrained')
+    assert cache.get(key) is None
+    stats = cache.stats()
+    assert stats['invalidations'] == 1
+    assert stats['memory_entries'] == 0 and stats['disk_entries'] == 0
+
+
+def test_swap_during_a_miss_does_not_store_the_old_price_under_the_new_fingerprint(monkeypatch, restore_active):
+    import cache as cache_module
+
+    def predict_then_swap(*args, active=None):
+        result = utils.predict_price(*args, active=active)
+        utils.activate_pipeline(restore_active.pipeline, restore_active.fingerprint + '-swapped')
+        return result
+    monkeypatch.setattr(cache_module, 'predict_price', predict_then_swap)
+
+    cache = PredictionCache(disk_path=None)
+    cache.predict_price(*LISTING)
+    key = normalize_inputs(*LISTING)
+    assert cache.get(key, restore_active.fingerprint + '-swapped') is None
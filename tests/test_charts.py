@@ -0,0 +1,99 @@
+import base64
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import charts
+import utils
+from charts import FigureCache, create_history_density_chart, hexbin, store_history_figure
+from history import HistoryStore, generate_history
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    """A history store and a fresh figure cache, with thresholds small enough for a quick test"""
+    monkeypatch.setattr(charts, '_cache', FigureCache())
+    monkeypatch.setattr(charts, 'CHART_MAX_POINTS', 500)
+    monkeypatch.setattr(utils, 'CHART_WEBGL_THRESHOLD', 100)
+    return HistoryStore(str(tmp_path / "history.sqlite"), max_rows=None, max_total_rows=None)
+
+
+def trace_types(figure):
+    return {trace.type for trace in figure.data}
+
+
+def values(array):
+    """Array of a cached figure (plotly stores numeric arrays as base64 typed arrays in its JSON)"""
+    if isinstance(array, dict):
+        data = np.frombuffer(base64.b64decode(array['bdata']), dtype=array['dtype'])
+        return data.reshape([int(n) for n in array['shape'].split(',')]) if 'shape' in array else data
+    return np.asarray(array)
+
+
+def points(figure):
+    return sum(len(values(trace.x)) for trace in figure.data)
+
+
+def binned(figure):
+    return sum(values(trace.customdata)[:, 0].sum() for trace in figure.data)
+
+
+def test_small_history_is_an_svg_scatter(store):
+    generate_history(store, 50, 'alice')
+    figure = store_history_figure(store, session_id='alice')
+    assert trace_types(figure) == {'scatter'}
+    assert points(figure) == 50
+
+
+def test_webgl_above_the_threshold(store):
+    generate_history(store, 300, 'alice')
+    figure = store_history_figure(store, session_id='alice')
+    assert trace_types(figure) == {'scattergl'}
+    assert points(figure) == 300
+    assert figure.data[0].marker.symbol != 'hexagon'
+
+
+def test_large_history_is_binned(store):
+    generate_history(store, 2000, 'alice')
+    generate_history(store, 10, 'bob')
+    figure = store_history_figure(store, session_id='alice')
+
+    assert trace_types(figure) == {'scattergl'}
+    assert {trace.marker.symbol for trace in figure.data} == {'hexagon'}
+    assert binned(figure) == 2000  # every row of alice, none of bob
+    assert '2,000 predictions, binned' in figure.layout.title.text
+
+
+def test_figure_is_cached_until_the_history_changes(store, monkeypatch):
+    generate_history(store, 2000, 'alice')
+    first = store_history_figure(store, session_id='alice', cities=['Ariana', 'Tunis'])
+
+    def no_read(*args, **kwargs):
+        raise AssertionError("the history was read again")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(store, 'columns', no_read)
+        assert store_history_figure(store, session_id='alice', cities=['Ariana', 'Tunis']) == first
+    assert {trace.marker.symbol for trace in first.data} == {'hexagon'}
+
+    store.add({'city': 'Tunis', 'size': 100.0, 'room_count': 3, 'estimated_price_tnd': 250.0}, 'alice')
+    updated = store_history_figure(store, session_id='alice', cities=['Ariana', 'Tunis'])
+    assert binned(updated) == binned(first) + 1
+
+
+def test_hexbin_assigns_the_nearest_centre():
+    rng = np.random.default_rng(0)
+    x, y = rng.uniform(0, 100, 1000), rng.uniform(0, 1000, 1000)
+    gridsize = 10
+    cells, centre_x, centre_y = hexbin(x, y, gridsize)
+    assert cells.shape == (1000,) and cells.max() < len(centre_x) == len(centre_y)
+    # Hexagon centres are nearest in grid units, where a row is sqrt(3) columns tall
+    sx, sy = np.ptp(x) / gridsize, np.ptp(y) / int(gridsize / np.sqrt(3))
+    centres = np.unique(cells)
+    distances = ((x[:, None] - centre_x[centres]) / sx) ** 2 + 3 * ((y[:, None] - centre_y[centres]) / sy) ** 2
+    assert (centres[distances.argmin(axis=1)] == cells).all()
+
+
+def test_density_chart_of_an_empty_history():
+    assert create_history_density_chart(pd.DataFrame(columns=charts.HISTORY_CHART_COLUMNS)) is None
@@ -0,0 +1,43 @@
+import filecmp
+import os
+
+import pandas as pd
+import pytest
+
+from cleaning import PROCESSED_DIR, apply_bounds, iqr_bounds, regenerate, screen_listings
+from utils import get_active_pipeline
+
+
+def test_regenerate_is_byte_exact(tmp_path):
+    counts = regenerate(str(tmp_path), chunksize=500)
+    assert len(counts) == 2
+    for path in counts:
+        reference = os.path.join(PROCESSED_DIR, os.path.relpath(path, tmp_path))
+        assert filecmp.cmp(path, reference, shallow=False), path
+
+
+@pytest.mark.parametrize('listing, status, issues', [
+    (('tunis', 100, 3, 1, 'la marsa'), 'ok', None),
+    (('sfax', 100, 3, 1, 'autres villes'), 'rejected', 'unsupported city'),
+    (('tunis', -1, 1, 1, 'la marsa'), 'rejected', 'missing or non-positive size'),
+    (('tunis', None, 3, 1, 'la marsa'), 'rejected', 'missing or non-positive size'),
+    (('tunis', 100, 3, -1, 'la marsa'), 'rejected', 'missing or negative bathroom count'),
+    (('tunis', 100, 3, 0, 'la marsa'), 'ok', None),
+    (('tunis', 20, 3, 1, 'la marsa'), 'rejected', 'too many rooms for the size'),
+    (('Tunis', 100000, 3, 1, 'la marsa'), 'flagged', 'size outside the training range'),
+    (('tunis', 100, 3, 1, 'nowhere land'), 'flagged', 'unknown region'),
+    (('tunis', 100, 3, 1, 'Marsa'), 'ok', None),
+])
+def test_screen_listings(listing, status, issues):
+    listings = pd.DataFrame([listing], columns=['city', 'size', 'room_count', 'bathroom_count', 'region'])
+    screened = screen_listings(listings, get_active_pipeline().pipeline)
+    assert screened['input_status'].iloc[0] == status
+    assert screened['input_issues'].iloc[0] == issues
+
+
+def test_iqr_filter_per_city():
+    df = pd.DataFrame({'city': ['a'] * 5 + ['b'] * 4 + ['c'],
+                       'price_per_m2': [1.0, 2.0, 3.0, 4.0, 100.0, 10.0, 11.0, 12.0, 13.0, 5.0]})
+    bounds = iqr_bounds(df.iloc[:9])  # city c has no fences
+    assert bounds.loc['a'].tolist() == [-1.0, 7.0]
+    assert apply_bounds(df, bounds)['price_per_m2'].tolist() == [1.0, 2.0, 3.0, 4.0, 10.0, 11.0, 12.0, 13.0]
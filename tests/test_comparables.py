@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+import comparables
+import utils
+from comparables import ComparablesIndex, build_comparables_index, get_comparables_index, load_listings
+from fixture import DATA_PATH
+
+
+@pytest.fixture(scope='module')
+def index(served_pipeline):
+    return build_comparables_index(served_pipeline, DATA_PATH)
+
+
+def test_nearest_listings_of_the_city(index):
+    results = index.query('Tunis', 120, 3, 2, k=5)
+    assert len(results) == 5
+    distances = [result['distance'] for result in results]
+    assert distances == sorted(distances)
+
+    listings = load_listings(DATA_PATH)
+    tunis = listings[listings['city'] == 'tunis']
+    scaled = (tunis[comparables.FEATURES].to_numpy(dtype=float) - index.cities['tunis']['mean']) \
+        / index.cities['tunis']['scale']
+    point = (np.array([120, 3, 2]) - index.cities['tunis']['mean']) / index.cities['tunis']['scale']
+    nearest = np.sort(np.linalg.norm(scaled - point, axis=1))[:5]
+    np.testing.assert_allclose(distances, nearest, atol=1e-4)
+
+
+def test_region_filter(index):
+    results = index.query('tunis', 120, 3, 2, region='La Marsa', k=3)
+    assert len(results) == 3
+    assert {result['region'] for result in results} == {'la marsa'}
+    # Too few listings in the region (or 'autres villes'): the whole city is searched
+    assert index.query('tunis', 120, 3, 2, region='autres villes', k=3) == index.query('tunis', 120, 3, 2, k=3)
+    assert index.query('tunis', 120, 3, 2, region='nowhere', k=3) == index.query('tunis', 120, 3, 2, k=3)
+
+
+def test_unknown_city(index):
+    assert index.query('paris', 120, 3, 2) == []
+
+
+def test_saved_index_is_reused_until_the_pipeline_changes(tmp_path, monkeypatch, served_pipeline, restore_active):
+    path = str(tmp_path / "comparables_index.joblib")
+    monkeypatch.setattr(comparables, '_index', None)
+    index = get_comparables_index(path, DATA_PATH)
+    assert index.fingerprint == served_pipeline.fingerprint
+    assert ComparablesIndex.load(path).query('tunis', 90, 2, 1) == index.query('tunis', 90, 2, 1)
+
+    monkeypatch.setattr(comparables, '_index', None)
+    monkeypatch.setattr(comparables, 'build_comparables_index', lambda *args: pytest.fail("index rebuilt"))
+    assert get_comparables_index(path, DATA_PATH).fingerprint == served_pipeline.fingerprint
+
+    monkeypatch.undo()
+    utils.activate_pipeline(served_pipeline.pipeline, 'retrained')
+    assert get_comparables_index(path, DATA_PATH).fingerprint == 'retrained'
+    assert ComparablesIndex.load(path).fingerprint == 'retrained'
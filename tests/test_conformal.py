@@ -0,0 +1,74 @@
+import math
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from config import PREDICTION_INTERVAL_LEVEL
+from compiled import _random_listings
+from conformal import conformal_offsets, coverage_report, cross_fitted_coverage, holdout_listings, interval, intervals
+from utils import predict_prices
+
+TABLE = {'levels': [0.8], 'min_stratum': 30, 'n_listings': 100, 'strata': {
+    ('given', 'tunis', 2): {'n': 40, 'offsets': {0.8: (-0.1, 0.2)}},
+    ('given', 'tunis', None): {'n': 60, 'offsets': {0.8: (-0.2, 0.3)}},
+    ('given', None, None): {'n': 100, 'offsets': {0.8: (-0.3, 0.4)}},
+    ('imputed', None, None): {'n': 100, 'offsets': {0.8: None}},
+}}
+
+
+def test_conformal_offsets():
+    residuals = np.arange(1, 25, dtype=float)  # 24 residuals: ranks floor(2.5) and ceil(22.5) cover 80%
+    assert conformal_offsets(residuals[::-1], 0.8) == (2.0, 23.0)
+    assert conformal_offsets(residuals[:5], 0.8) is None  # too few for the tails
+
+
+@pytest.mark.parametrize('city, tier, imputed, offsets', [
+    ('tunis', 2, False, (-0.1, 0.2)),   # city x tier stratum
+    ('tunis', 3, False, (-0.2, 0.3)),   # falls back to the city
+    ('ariana', 1, False, (-0.3, 0.4)),  # then to every city
+    ('tunis', 2, True, None),           # no offsets for this level
+])
+def test_interval_falls_back_to_wider_strata(city, tier, imputed, offsets):
+    low, high = interval(TABLE, 100.0, city, tier, imputed, level=0.8)
+    if offsets is None:
+        assert (low, high) == (None, None)
+    else:
+        assert (low, high) == (round(100 * math.exp(offsets[0]), 2), round(100 * math.exp(offsets[1]), 2))
+
+
+def test_intervals_match_interval():
+    cities = ['tunis', 'tunis', 'ariana', 'tunis']
+    tiers = [2, 3, 1, 2]
+    imputed = [False, False, False, True]
+    prices = [100.0, 250.0, 80.0, 120.0]
+    low, high = intervals(TABLE, prices, cities, tiers, imputed, level=0.8)
+    expected = [interval(TABLE, *row, level=0.8) for row in zip(prices, cities, tiers, imputed)]
+    np.testing.assert_array_equal(low, np.array([row[0] for row in expected], dtype=float))
+    np.testing.assert_array_equal(high, np.array([row[1] for row in expected], dtype=float))
+
+
+def test_no_table_no_interval():
+    assert interval(None, 100.0, 'tunis', 1, False) == (None, None)
+    low, high = intervals(None, [100.0], ['tunis'], [1], [False])
+    assert np.isnan(low).all() and np.isnan(high).all()
+
+
+def test_calibrated_coverage(served_pipeline):
+    report = coverage_report(served_pipeline.pipeline, holdout_listings())
+    assert report.loc['all', 'coverage'] == pytest.approx(PREDICTION_INTERVAL_LEVEL, abs=0.03)
+
+
+def test_cross_fitted_coverage(served_pipeline):
+    report = cross_fitted_coverage(served_pipeline.pipeline, holdout_listings(), folds=3)
+    assert report.loc['all', 'listings'] == len(holdout_listings().dropna())
+    assert report.loc['all', 'coverage'] == pytest.approx(PREDICTION_INTERVAL_LEVEL, abs=0.1)
+
+
+def test_intervals_bracket_the_estimate():
+    listings = pd.DataFrame(_random_listings(200, seed=7), columns=['city', 'size', 'room_count', 'bathroom_count',
+                                                                   'region'])
+    batch = predict_prices(listings)
+    assert batch['price_low_tnd'].notna().all()
+    assert (batch['price_low_tnd'] <= batch['estimated_price_tnd']).all()
+    assert (batch['estimated_price_tnd'] <= batch['price_high_tnd']).all()
@@ -0,0 +1,59 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import datasets
+from fixture import DATA_PATH
+
+
+@pytest.fixture
+def merged(tmp_path, monkeypatch):
+    """merged.csv copied to a temporary DATA_DIR, converted under a temporary PARQUET_CACHE_DIR"""
+    os.makedirs(tmp_path / "data" / "processed")
+    csv_path = tmp_path / "data" / "processed" / "merged.csv"
+    pd.read_csv(DATA_PATH).to_csv(csv_path, index=False)
+    monkeypatch.setattr(datasets, 'DATA_DIR', str(tmp_path / "data"))
+    monkeypatch.setattr(datasets, 'PARQUET_CACHE_DIR', str(tmp_path / "parquet"))
+    monkeypatch.setattr(datasets, '_verified', {})
+    return csv_path
+
+
+def test_load_matches_the_csv(merged):
+    expected = pd.read_csv(merged)
+    df = datasets.load_dataset('merged')
+    assert list(df.columns) == list(expected.columns)
+    assert isinstance(df['city'].dtype, pd.CategoricalDtype)
+    assert df['price'].dtype == np.float32
+    assert (df['city'].astype(str) == expected['city']).all()
+    np.testing.assert_allclose(df['price'], expected['price'], rtol=1e-6)
+
+
+def test_columns_and_filters_are_pushed_down(merged):
+    expected = pd.read_csv(merged)
+    expected = expected[(expected['city'] == 'Tunis') & (expected['size'] > 100)]
+    df = datasets.load_dataset('merged', columns=['size', 'price'], filters=[('city', '=', 'Tunis'), ('size', '>', 100)])
+    assert list(df.columns) == ['size', 'price']
+    assert len(df) == len(expected)
+    np.testing.assert_allclose(df['size'], expected['size'])
+
+
+def test_conversion_is_reused_until_the_csv_changes(merged):
+    path, converted = datasets.convert_dataset('merged')
+    assert converted
+    datasets._verified.clear()  # a new process: the Parquet file's source key is checked
+    assert datasets.convert_dataset('merged') == (path, False)
+
+    pd.read_csv(merged).head(10).to_csv(merged, index=False)
+    assert datasets.convert_dataset('merged') == (path, True)
+    assert len(datasets.load_dataset('merged')) == 10
+
+
+def test_unknown_dataset_and_column_are_rejected(merged, tmp_path):
+    with pytest.raises(ValueError):
+        datasets.load_dataset('houses')
+    with open(tmp_path / "other.csv", 'w', encoding='utf-8') as f:
+        f.write("city,floor\nTunis,2\n")
+    with pytest.raises(ValueError, match="floor"):
+        datasets.dataset_schema(str(tmp_path / "other.csv"))
@@ -0,0 +1,52 @@
+import logging
+
+import pytest
+
+import distill
+import utils
+from conformal import LISTING_COLUMNS, request_features
+from fixture import DATA_PATH
+from train import load_training_data
+
+# Held-out listings whose imputed region the fixture champion's encoder has not seen
+pytestmark = pytest.mark.filterwarnings('ignore:Found unknown categories')
+
+
+@pytest.fixture(autouse=True)
+def small_student(monkeypatch):
+    monkeypatch.setattr(distill, 'DISTILL_STUDENT_PARAMS', dict(distill.DISTILL_STUDENT_PARAMS, n_estimators=30))
+
+
+def test_student_follows_the_champion(served_pipeline):
+    student, report = distill.distill(served_pipeline.pipeline, DATA_PATH, n_synthetic=300, max_r2_drop=1,
+                                      max_mae_increase=10, verbose=False)
+    listings = load_training_data(DATA_PATH)
+    assert report['distill_listings'] == len(listings) - report['holdout_listings'] + 300
+    assert report['fidelity_r2'] > 0.8
+
+    X = request_features(served_pipeline.pipeline, listings[LISTING_COLUMNS].head(50))
+    teacher = served_pipeline.pipeline['champion_model'].predict(X)
+    assert abs(student.predict(X) - teacher).mean() < 0.2  # log prices
+
+
+def test_accuracy_guard():
+    with pytest.raises(ValueError, match="R²"):
+        distill.distill(utils.get_active_pipeline().pipeline, DATA_PATH, n_synthetic=0, max_r2_drop=-1,
+                        verbose=False)
+
+
+def test_student_is_served_with_its_own_table(monkeypatch, served_pipeline, caplog):
+    student = object()
+    pipeline = dict(served_pipeline.pipeline, student_model=student, student_name='Student',
+                    student_conformal_intervals={'strata': {}})
+    monkeypatch.setattr(utils, 'CHAMPION_MODEL', 'student')
+
+    served, fingerprint = utils.select_champion(pipeline, 'abc')
+    assert served['champion_model'] is student and served['champion_name'] == 'Student'
+    assert served['conformal_intervals'] == {'strata': {}}
+    assert fingerprint == 'abc-student'
+
+    with caplog.at_level(logging.WARNING, logger='utils'):
+        served, fingerprint = utils.select_champion(served_pipeline.pipeline, 'abc')
+    assert served is served_pipeline.pipeline and fingerprint == 'abc'
+    assert "no student_model" in caplog.text
@@ -0,0 +1,83 @@
+import numpy as np
+import pytest
+
+import batch_score
+import drift
+from conformal import LISTING_COLUMNS
+from drift import OTHER_CITY, DriftMonitor
+from fixture import DATA_PATH
+from train import load_training_data
+from utils import predict_prices
+
+
+@pytest.fixture(scope='module')
+def listings():
+    return load_training_data(DATA_PATH)[LISTING_COLUMNS].dropna().reset_index(drop=True)
+
+
+@pytest.fixture
+def monitor(served_pipeline):
+    monitor = DriftMonitor(served_pipeline.pipeline, served_pipeline.fingerprint, window=100000).start()
+    yield monitor
+    monitor.stop()
+
+
+def replay(monitor, listings, pipeline):
+    predictions = predict_prices(listings, pipeline=pipeline)
+    monitor.observe_batch(predictions['city'].to_numpy(), predictions['size'].to_numpy(),
+                          predictions['room_count'].to_numpy(), predictions['bathroom_count'].to_numpy(),
+                          predictions['canonical_region'].to_numpy() == 'autres villes',
+                          predictions['estimated_price_tnd'].to_numpy())
+    monitor.flush()
+
+
+def test_survives_a_prediction_it_cannot_sketch(monitor):
+    monitor.observe('tunis', float('nan'), 3, 1, False, 250.0)
+    monitor.flush()
+    assert monitor.dropped == 1
+    assert monitor._thread.is_alive()
+
+    monitor.observe('tunis', 100.0, 3, 1, False, 250.0)
+    monitor.observe('sfax', 100.0, 3, 1, True, 250.0)
+    monitor.flush()
+    live = monitor.live()
+    assert live['tunis'].rows == 1 and live[OTHER_CITY].rows == 1
+    assert monitor.scores()[1]['unknown_city_share'] == 0.5
+
+
+def test_training_listings_do_not_drift(monitor, listings, served_pipeline):
+    replay(monitor, listings, served_pipeline.pipeline)
+    rows, summary = monitor.scores()
+    assert summary['live_listings'] == len(listings)
+    assert summary['reference'] == 'training data'
+    assert max(row['drift'] for row in rows) < 0.05
+
+
+def test_larger_listings_drift(monitor, listings, served_pipeline):
+    replay(monitor, listings.assign(size=listings['size'] * 1.6), served_pipeline.pipeline)
+    rows, _ = monitor.scores()
+    scores = {row['city']: row['size'] for row in rows}
+    assert np.nanmin(list(scores.values())) > 0.3
+
+
+def test_full_queue_drops_and_counts(served_pipeline):
+    monitor = DriftMonitor(served_pipeline.pipeline, served_pipeline.fingerprint, queue_size=1)  # not started
+    monitor.observe('tunis', 100.0, 3, 1, False, 250.0)
+    monitor.observe('tunis', 100.0, 3, 1, False, 250.0)
+    monitor.observe_batch(np.array(['tunis', 'ariana']), np.array([90.0, 80.0]), np.array([3, 2]), np.array([1, 1]),
+                          np.array([False, True]), np.array([200.0, 180.0]))
+    assert monitor.dropped == 3
+    assert monitor.scores()[1]['dropped'] == 3
+
+
+def test_only_serving_processes_monitor(monkeypatch):
+    monkeypatch.setattr(drift, 'enabled', False)
+    monkeypatch.setattr(drift, 'DRIFT_MONITOR_ENABLED', False)
+    drift.enable()
+    assert not drift.enabled
+    monkeypatch.setattr(drift, 'DRIFT_MONITOR_ENABLED', True)
+    drift.enable()
+    assert drift.enabled
+
+    batch_score._init_worker()  # a worker forked from a monitoring process
+    assert not drift.enabled
@@ -0,0 +1,40 @@
+import numpy as np
+
+import utils
+from explain import RAW_INPUTS, explain_price, get_explainer, group_contributions, verify_additivity
+from utils import predict_price
+
+
+def test_explanations_are_additive():
+    report = verify_additivity(n=40, seed=3)
+    # Only the rounding of estimated_price_tnd to 0.01 K TND separates the two
+    assert report['max_log_price_gap'] < 1e-4
+    assert set(report['methods'].values()) <= {'tree_path', 'linear'}
+
+
+def test_explanation_matches_its_prediction():
+    result = predict_price('Tunis', 120, 3, 2, 'La Marsa', mode='standard')
+    explanation = explain_price(result, budget_ms=float('inf'))
+    assert explanation.complete
+    assert set(explanation.contributions) == set(RAW_INPUTS)
+    assert np.isclose(sum(explanation.contributions.values()), sum(explanation.feature_contributions.values()))
+    assert np.isclose(explanation.estimated_price, result['estimated_price_tnd'], atol=0.01)
+    assert explain_price(result) is explanation  # cached per fingerprint and listing
+
+
+def test_group_contributions_split_derived_features():
+    grouped = group_contributions({'size': 0.2, 'avg_room_size': 0.1, 'tier': 0.3})
+    assert np.isclose(grouped['size'], 0.2 + 0.05 + 0.1)
+    assert np.isclose(grouped['room_count'], 0.05 + 0.1)
+    assert np.isclose(grouped['bathroom_count'], 0.1)
+    assert np.isclose(sum(grouped.values()), 0.6)
+
+
+def test_explainer_follows_the_served_pipeline(served_pipeline, restore_active):
+    result = predict_price('Ariana', 90, 3, 1, mode='standard')
+    explainer = get_explainer()
+    explanation = explain_price(result)
+
+    utils.activate_pipeline(served_pipeline.pipeline, 'retrained')
+    assert get_explainer() is not explainer
+    assert explain_price(result) is not explanation  # the cache is keyed on the fingerprint
@@ -0,0 +1,120 @@
+import io
+import sqlite3
+import threading
+
+import pandas as pd
+import pytest
+
+from history import COLUMNS, HistoryStore
+
+
+def prediction(price, city='Tunis', minute=0):
+    return {'timestamp': f"2024-01-01 10:{minute:02d}:00", 'city': city, 'original_region': 'la marsa',
+            'imputed_region': 'la marsa', 'size': 100.0, 'room_count': 3, 'bathroom_count': 1,
+            'estimated_price_tnd': price, 'price_per_m2': price / 100, 'avg_room_size': 33.33}
+
+
+@pytest.fixture
+def store(tmp_path):
+    return HistoryStore(str(tmp_path / "history.sqlite"), max_rows=5, max_total_rows=None)
+
+
+def test_sessions_are_isolated(store):
+    store.add_many([prediction(100.0), prediction(300.0, 'Ariana')], 'alice')
+    store.add(prediction(200.0), 'bob')
+
+    assert store.summary('alice') == {'count': 2, 'mean': 200.0, 'min': 100.0, 'max': 300.0}
+    assert store.page('bob')['estimated_price_tnd'].tolist() == [200.0]
+    assert store.summary(None)['count'] == 3
+
+    store.clear('alice')
+    assert store.summary('alice')['count'] == 0
+    assert store.summary('bob')['count'] == 1
+
+
+def test_rows_are_pruned_per_session(store):
+    store.add_many([prediction(float(price), minute=price) for price in range(8)], 'alice')
+    store.add(prediction(50.0), 'bob')
+    assert store.columns(['estimated_price_tnd'], 'alice')['estimated_price_tnd'].tolist() == [3.0, 4.0, 5.0, 6.0, 7.0]
+    assert store.summary('bob')['count'] == 1
+
+
+def test_total_rows_are_bounded(tmp_path):
+    store = HistoryStore(str(tmp_path / "history.sqlite"), max_rows=None, max_total_rows=3)
+    for session in ['a', 'b', 'c', 'd']:
+        store.add(prediction(1.0), session)
+    assert len(store) == 3
+    assert store.summary('a')['count'] == 0
+
+
+def test_total_rows_are_bounded_across_id_gaps(tmp_path):
+    store = HistoryStore(str(tmp_path / "history.sqlite"), max_rows=None, max_total_rows=3)
+    store.add_many([prediction(float(price)) for price in range(4)], 'a')  # ids 1-4, id 1 pruned
+    store.add(prediction(10.0), 'b')  # id 5, id 2 pruned
+    store.clear('b')  # ids are never reused: the next one is 6
+    store.add(prediction(11.0), 'c')
+    assert store.columns(['estimated_price_tnd'])['estimated_price_tnd'].tolist() == [2.0, 3.0, 11.0]
+
+
+def test_no_row_limit_per_session_by_default(tmp_path):
+    store = HistoryStore(str(tmp_path / "history.sqlite"), max_total_rows=None)
+    store.add_many([prediction(1.0)] * 250, 'alice')
+    assert store.summary('alice')['count'] == 250
+
+
+def test_concurrent_adds_and_summaries(tmp_path):
+    store = HistoryStore(str(tmp_path / "history.sqlite"), max_rows=None, max_total_rows=None)
+    errors = []
+
+    def session(name):
+        try:
+            for i in range(50):
+                store.add(prediction(float(i)), name)
+                assert store.summary(name)['count'] == i + 1
+                store.page(name, page_size=5)
+        except Exception as error:  # noqa: BLE001 (reported by the main thread)
+            errors.append(error)
+
+    threads = [threading.Thread(target=session, args=(f"s{i}",)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert store.summary(None) == {'count': 200, 'mean': 24.5, 'min': 0.0, 'max': 49.0}
+
+
+def test_summary_memo_follows_adds_and_clears(store):
+    store.add_many([prediction(100.0), prediction(300.0, 'Ariana')], 'alice')
+    assert store.summary('alice', cities=['Tunis'])['count'] == 1
+    store.add(prediction(50.0), 'alice')  # brought up to date from the new rows only
+    assert store.summary('alice', cities=['Tunis']) == {'count': 2, 'mean': 75.0, 'min': 50.0, 'max': 100.0}
+    version = store.version('alice')
+    store.clear('alice')
+    assert store.version('alice') != version
+    assert store.summary('alice', cities=['Tunis'])['count'] == 0
+
+
+def test_export_filters_the_session(store):
+    store.add_many([prediction(100.0, minute=1), prediction(300.0, 'Ariana', minute=2)], 'alice')
+    store.add(prediction(200.0), 'bob')
+    output = io.BytesIO()
+    assert store.export(output, session_id='alice', min_price=150) == 1
+    exported = pd.read_csv(io.BytesIO(output.getvalue()))
+    assert list(exported.columns) == COLUMNS
+    assert exported['estimated_price_tnd'].tolist() == [300.0]
+
+
+def test_migrates_a_store_without_sessions(tmp_path):
+    path = str(tmp_path / "history.sqlite")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE predictions (id INTEGER PRIMARY KEY AUTOINCREMENT, timestamp TEXT NOT NULL, "
+                 "city TEXT NOT NULL, original_region TEXT, imputed_region TEXT, size REAL, room_count REAL, "
+                 "bathroom_count REAL, estimated_price_tnd REAL NOT NULL, price_per_m2 REAL, avg_room_size REAL)")
+    conn.execute("INSERT INTO predictions (timestamp, city, estimated_price_tnd) VALUES ('2024-01-01', 'Tunis', 1)")
+    conn.commit()
+    conn.close()
+
+    store = HistoryStore(path)
+    assert len(store) == 1
+    assert store.summary('alice')['count'] == 0
@@ -0,0 +1,68 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import incremental
+from conformal import LISTING_COLUMNS
+from drift import build_reference
+from fixture import DATA_PATH
+from incremental import bootstrap_stream_state, update_pipeline
+from train import load_training_data
+
+
+@pytest.fixture
+def base(served_pipeline):
+    listings = load_training_data(DATA_PATH)
+    pipeline = served_pipeline.pipeline
+    return dict(pipeline, stream_state=bootstrap_stream_state(pipeline, DATA_PATH),
+                drift_reference=build_reference(pipeline, listings[LISTING_COLUMNS]))
+
+
+@pytest.fixture
+def new_rows():
+    rows = pd.read_csv(DATA_PATH).sample(60, random_state=0).reset_index(drop=True)
+    rows['price'] = rows['price'] * 1.05
+    return rows
+
+
+def test_update_reads_only_the_new_rows(monkeypatch, base, new_rows):
+    def no_history(*args, **kwargs):
+        raise AssertionError("the training data was read")
+
+    monkeypatch.setattr(incremental, 'load_training_data', no_history)
+    monkeypatch.setattr('train.load_training_data', no_history)
+    pipeline = dict(base)
+    summary = update_pipeline(pipeline, new_rows)
+
+    assert 0 < summary['accepted'] <= summary['received'] == len(new_rows)
+    assert pipeline['stream_state']['rows'] == base['stream_state']['rows'] + summary['accepted']
+    reference_rows = sum(sketch.rows for sketch in pipeline['drift_reference'].values())
+    assert reference_rows == sum(sketch.rows for sketch in base['drift_reference'].values()) + summary['accepted']
+
+
+def test_per_listing_tables_are_marked_stale(base, new_rows):
+    pipeline = dict(base)
+    update_pipeline(pipeline, new_rows)
+    assert pipeline['conformal_intervals'] is base['conformal_intervals']
+    assert pipeline['stale_tables'] == ['conformal_intervals']
+
+    update_pipeline(pipeline, new_rows)  # still listed after a second update
+    assert pipeline['stale_tables'] == ['conformal_intervals']
+
+
+def test_base_pipeline_is_unchanged(base, new_rows):
+    centers = {city: models['kmeans'].cluster_centers_.copy() for city, models in base['clustering_models'].items()}
+    knn_sizes = {city: len(models['knn']._fit_X) for city, models in base['knn_region_models'].items()}
+    reference_rows = {city: sketch.rows for city, sketch in base['drift_reference'].items()}
+    state_rows = base['stream_state']['rows']
+
+    pipeline = dict(base)
+    summary = update_pipeline(pipeline, new_rows)
+
+    assert summary['knn_reference_rows'] > 0
+    for city, models in base['clustering_models'].items():
+        np.testing.assert_array_equal(models['kmeans'].cluster_centers_, centers[city])
+    assert {city: len(models['knn']._fit_X) for city, models in base['knn_region_models'].items()} == knn_sizes
+    assert {city: sketch.rows for city, sketch in base['drift_reference'].items()} == reference_rows
+    assert base['stream_state']['rows'] == state_rows
+    assert 'stale_tables' not in base
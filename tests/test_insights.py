@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+
+import insights
+import utils
+from config import CITIES, INSIGHTS_ROOMS_RANGE, INSIGHTS_SIZE_RANGE, INSIGHTS_STANDARD_PROPERTY
+from insights import compute_insights, get_insights
+from utils import predict_prices
+
+
+def test_surfaces_value_the_standard_property(served_pipeline):
+    result = compute_insights(served_pipeline)
+    assert result.fingerprint == served_pipeline.fingerprint
+
+    start, stop, step = INSIGHTS_SIZE_RANGE
+    assert len(result.size_curves) == len(CITIES) * len(range(start, stop + step, step))
+    assert len(result.room_curves) == len(CITIES) * (INSIGHTS_ROOMS_RANGE[1] - INSIGHTS_ROOMS_RANGE[0] + 1)
+
+    size, rooms, baths = INSIGHTS_STANDARD_PROPERTY
+    listings = pd.DataFrame({'city': CITIES, 'size': float(size), 'room_count': float(rooms),
+                             'bathroom_count': float(baths), 'region': 'autres villes'})
+    expected = predict_prices(listings, pipeline=served_pipeline.pipeline)['estimated_price_tnd']
+    np.testing.assert_allclose(result.standard_prices['estimated_price_tnd'], expected)
+
+    regions = result.region_valuations
+    assert regions['rank'].tolist() == list(range(1, len(regions) + 1))
+    assert regions['estimated_price_tnd'].is_monotonic_decreasing
+    assert not regions['region'].str.lower().eq('autres villes').any()
+    assert set(regions['city']) == set(CITIES)
+
+
+def test_a_hot_swap_during_the_computation_is_not_mixed_in(monkeypatch, served_pipeline, restore_active):
+    retrained = dict(served_pipeline.pipeline, champion_name='Retrained')
+
+    def swap_then_predict(listings, pipeline=None):
+        utils.activate_pipeline(retrained, 'retrained')
+        return predict_prices(listings, pipeline=pipeline)
+
+    monkeypatch.setattr(insights, 'predict_prices', swap_then_predict)
+    result = compute_insights()
+    assert result.fingerprint == served_pipeline.fingerprint
+    assert utils.get_active_pipeline().fingerprint == 'retrained'
+
+
+def test_insights_follow_the_served_pipeline(monkeypatch, served_pipeline, restore_active):
+    monkeypatch.setattr(insights, '_insights', None)
+    first = get_insights()
+    assert get_insights() is first
+
+    utils.activate_pipeline(served_pipeline.pipeline, 'retrained')
+    assert get_insights().fingerprint == 'retrained'
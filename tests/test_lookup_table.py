@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+import lookup_table
+from lookup_table import PriceLookupTable, build_lookup_table, get_lookup_table, validate_lookup_table
+from utils import predict_price
+
+SIZES = (50, 70)
+
+
+@pytest.fixture(scope='module')
+def table():
+    return build_lookup_table(size_step=10, size_range=SIZES, rooms_range=(1, 3), bathrooms_range=(1, 2),
+                              cities=['Ariana', 'La Manouba'])
+
+
+@pytest.fixture
+def table_path(tmp_path, table, monkeypatch):
+    path = str(tmp_path / "house_pricing_lookup.npz")
+    table.save(path)
+    monkeypatch.setattr(lookup_table, 'LOOKUP_TABLE_PATH', path)
+    return path
+
+
+@pytest.mark.parametrize('listing', [('ariana', 60, 2, 1, 'la soukra'), ('La Manouba', 70, 3, 2, 'autres villes'),
+                                     ('ariana', 50, 1, 1, 'Soukra')])
+def test_grid_points_match_predict_price(table, listing):
+    expected = predict_price(*listing, mode='standard', monitor=False)
+    assert table.lookup(*listing) == pytest.approx(expected)
+
+
+def test_sizes_between_grid_points_are_interpolated(table):
+    low, high = [table.lookup('ariana', size, 2, 1, 'la soukra')['estimated_price_tnd'] for size in (50, 60)]
+    assert table.lookup('ariana', 55, 2, 1, 'la soukra')['estimated_price_tnd'] == pytest.approx((low + high) / 2,
+                                                                                                 abs=0.01)
+
+
+@pytest.mark.parametrize('listing', [('ariana', 80, 2, 1), ('ariana', 60, 4, 1), ('ariana', 60, 2.5, 1),
+                                     ('tunis', 60, 2, 1)])
+def test_outside_the_domain(table, listing):
+    assert table.lookup(*listing) is None
+
+
+def test_saved_table_is_served_only_for_its_pipeline(table, table_path, restore_active):
+    import utils
+
+    loaded = get_lookup_table(table_path)
+    assert isinstance(loaded, PriceLookupTable)
+    np.testing.assert_array_equal(loaded.prices, table.prices)
+
+    utils.activate_pipeline(restore_active.pipeline, restore_active.fingerprint + '-retrained')
+    assert get_lookup_table(table_path) is None
+    with pytest.raises(ValueError):
+        validate_lookup_table(table, n=10, path=table_path)
+
+
+def test_lookup_predict_price_is_opt_in(table_path, monkeypatch):
+    def model(*listing):
+        return {'path': 'model'}
+
+    assert lookup_table.lookup_predict_price('ariana', 60, 2, 1, 'la soukra', fallback=model) == {'path': 'model'}
+    monkeypatch.setattr(lookup_table, 'LOOKUP_TABLE_ENABLED', True)
+    assert lookup_table.lookup_predict_price('ariana', 60, 2, 1, 'la soukra', fallback=model)['city'] == 'Ariana'
+    assert lookup_table.lookup_predict_price('ariana', 90, 2, 1, 'la soukra', fallback=model) == {'path': 'model'}
@@ -0,0 +1,68 @@
+import pandas as pd
+import pytest
+
+import metrics
+from metrics import PredictionMetrics, write_metrics_file
+from utils import predict_price, predict_prices
+
+
+@pytest.fixture
+def recording(monkeypatch):
+    """Metrics enabled on a fresh global registry"""
+    monkeypatch.setattr(metrics, 'registry', PredictionMetrics())
+    monkeypatch.setattr(metrics, 'enabled', True)
+    return metrics.registry
+
+
+def test_disabled_clock_is_a_no_op(monkeypatch):
+    monkeypatch.setattr(metrics, 'enabled', False)
+    assert metrics.stage_clock()() == 0.0
+
+
+def test_histogram_buckets_and_quantiles():
+    registry = PredictionMetrics()
+    for seconds in [0.0002] * 98 + [0.02, 3.0]:
+        registry.record_call('cache', 'tunis', seconds)
+    row, = registry.snapshot()[0]
+    assert (row['path'], row['stage'], row['calls']) == ('cache', 'total', 100)
+    assert row['p50_ms'] == pytest.approx(0.25)  # upper bound of the bucket holding the median
+    assert row['p99_ms'] == pytest.approx(25.0)
+    assert row['max_ms'] == pytest.approx(3000.0)
+
+
+def test_single_and_batch_predictions_are_recorded(recording):
+    predict_price('Tunis', 100, 3, 1, mode='standard', monitor=False)
+    predict_price('Tunis', 100, 3, 1, 'la marsa', mode='standard', monitor=False)
+    predict_prices(pd.DataFrame({'city': ['tunis', 'ariana'], 'size': [100, 80], 'room_count': [3, 2],
+                                 'bathroom_count': [1, 1]}))
+
+    stage_rows, city_rows = recording.snapshot()
+    single = {row['stage']: row['calls'] for row in stage_rows if row['path'] == 'single'}
+    assert single == dict.fromkeys(metrics.STAGES + ('total',), 2)
+    cities = {(row['path'], row['city']): row for row in city_rows}
+    assert cities[('single', 'tunis')]['predictions'] == 2
+    assert cities[('single', 'tunis')]['imputation_rate'] == 0.5
+    assert cities[('batch', 'all')]['predictions'] == 2
+
+
+def test_compiled_path_is_counted_once(recording):
+    predict_price('Ariana', 80, 2, 1, mode='compiled', monitor=False)
+    _, city_rows = recording.snapshot()
+    assert [(row['path'], row['city'], row['predictions']) for row in city_rows] == [('compiled', 'ariana', 1)]
+
+
+def test_prometheus_text(recording):
+    recording.record('single', 'tunis', (0.001,) * 5, imputed=1)
+    recording.record_call('lookup', 'ariana', 0.00005)
+    text = recording.render_prometheus()
+    assert 'house_price_stage_seconds_bucket{path="single",stage="predict",le="+Inf"} 1' in text
+    assert 'house_price_prediction_seconds_count{path="lookup"} 1' in text
+    assert 'house_price_region_imputations_total{path="single",city="tunis"} 1' in text
+    assert 'house_price_predictions_total{path="lookup",city="ariana"} 1' in text
+
+
+def test_metrics_file_is_replaced_atomically(tmp_path, recording):
+    path = tmp_path / "house_price.prom"
+    write_metrics_file(str(path))
+    assert path.read_text().startswith('# HELP house_price_stage_seconds')
+    assert not (tmp_path / "house_price.prom.tmp").exists()
@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+from cleaning import GROUPED_REGIONS
+from regions import RegionCanonicalizer
+from utils import predict_price
+
+
+@pytest.fixture
+def canonicalizer():
+    return RegionCanonicalizer({
+        'ariana': ['ariana ville', "jardins d'el menzah", 'el menzah 7', 'el menzah 9', 'la soukra', 'ennasr'],
+        'ben arous': ['mégrine', 'mgrine', 'radès', 'el mourouj'],
+    }, GROUPED_REGIONS)
+
+
+@pytest.mark.parametrize('city, region, expected', [
+    ('ariana', 'Ariana Ville ', ('ariana ville', 'exact')),
+    ('ariana', 'Jardins El Menzah', ("jardins d'el menzah", 'normalized')),  # GROUPED_REGIONS variant
+    ('ben arous', 'Rades', ('radès', 'normalized')),
+    ('ben arous', 'Mégrine', ('mégrine', 'exact')),  # trained spellings never change
+    ('ariana', 'Soukra', ('la soukra', 'skeleton')),
+    ('ariana', 'El Menzah7', ('el menzah 7', 'skeleton')),
+    ('ariana', 'Arianna Ville', ('ariana ville', 'typo')),
+    ('ariana', 'El Menzah 8', ('el menzah 8', 'unresolved')),  # numbers must match
+    ('ariana', '', ('autres villes', 'normalized')),
+    ('tunis', 'La Marsa', ('la marsa', 'other_city')),
+])
+def test_resolve(canonicalizer, city, region, expected):
+    assert canonicalizer.resolve(city, region) == expected
+
+
+def test_canonicalize_matches_canonical(canonicalizer):
+    cities = ['ariana', 'ariana', 'ben arous', 'ariana']
+    regions = ['Soukra', 'Soukra', 'Rades', 'nowhere']
+    expected = [canonicalizer.canonical(city, region) for city, region in zip(cities, regions)]
+    assert canonicalizer.canonicalize(cities, regions).tolist() == expected
+
+
+def test_known(canonicalizer):
+    known = canonicalizer.known(np.array(['ariana', 'ariana', 'tunis']), np.array(['soukra', 'zzz', 'la marsa']))
+    assert known.tolist() == [True, False, False]
+
+
+def test_regions_reported_as_given_and_canonical():
+    result = predict_price('Ariana', 80, 3, 1, 'Soukra', mode='standard')
+    assert result['original_region'] == 'Soukra'
+    assert result['canonical_region'] == 'la soukra'
+    assert result['imputed_region'] == 'la soukra'
+
+    result = predict_price('Ariana', 80, 3, 1, mode='standard')
+    assert result['canonical_region'] == 'autres villes'
+    assert result['imputed_region'] != 'autres villes'
@@ -0,0 +1,61 @@
+import os
+
+import joblib
+import pytest
+
+import utils
+from registry import ARTIFACT_NAME, ArtifactRegistry, RegistryWatcher
+
+
+def publish(registry, name, pipeline):
+    export_dir = os.path.join(registry.root, name, "model_export")
+    os.makedirs(export_dir, exist_ok=True)
+    joblib.dump(pipeline, os.path.join(export_dir, ARTIFACT_NAME))
+
+
+@pytest.fixture
+def registry(tmp_path, served_pipeline):
+    registry = ArtifactRegistry(str(tmp_path))
+    publish(registry, 'v1', served_pipeline.pipeline)
+    publish(registry, 'v2', dict(served_pipeline.pipeline, champion_name='Retrained'))
+    os.makedirs(tmp_path / "v3" / "model_export")  # not published yet
+    return registry
+
+
+def test_versions_and_resolve(registry):
+    assert [version.name for version in registry.versions()] == ['v1', 'v2']
+    assert registry.resolve().name == 'v2'
+    assert registry.next_version_dir().endswith(os.path.join('v4', 'model_export'))
+    with pytest.raises(ValueError):
+        registry.get('v3')
+
+
+def test_activate_and_rollback(registry):
+    registry.activate('v1')
+    assert registry.resolve().name == 'v1'
+    assert registry.rollback().name == 'v2'  # the version served before the pin
+    assert registry.rollback().name == 'v1'  # nothing remembered: the next older version
+    with pytest.raises(ValueError):
+        registry.rollback()
+
+
+def test_watcher_swaps_the_active_pipeline(registry, restore_active):
+    watcher = RegistryWatcher(registry, warm_up=False)
+    assert watcher.check()
+    assert utils.get_active_pipeline().version.name == 'v2'
+    assert utils.get_active_pipeline().pipeline['champion_name'] == 'Retrained'
+    assert not watcher.check()  # unchanged
+
+    registry.activate('v1')
+    assert watcher.check()
+    assert utils.get_active_pipeline().version.name == 'v1'
+    assert watcher.swaps == 2 and watcher.last_error is None
+
+
+def test_watcher_keeps_the_pipeline_when_a_load_fails(registry, restore_active):
+    watcher = RegistryWatcher(registry, warm_up=False)
+    with open(os.path.join(registry.root, 'v3', 'model_export', ARTIFACT_NAME), 'wb') as f:
+        f.write(b'not a pickle')
+    assert not watcher.check()
+    assert watcher.last_error
+    assert utils.get_active_pipeline() is restore_active
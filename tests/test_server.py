@@ -0,0 +1,89 @@
+import asyncio
+
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+
+import server
+from utils import predict_prices
+
+
+def request(handler, window_ms=20, max_batch_size=64):
+    """Run handler(client, app) against an in-process server whose pipeline has loaded"""
+    async def run():
+        app = server.create_app(window_ms, max_batch_size)
+        async with TestClient(TestServer(app)) as client:
+            await app['state']['loader']
+            return await handler(client, app)
+    return asyncio.run(run())
+
+
+def test_health_and_ready():
+    async def handler(client, app):
+        return (await client.get('/health')).status, (await client.get('/ready')).status
+    assert request(handler) == (200, 200)
+
+
+def test_not_ready_while_the_pipeline_fails_to_load(monkeypatch):
+    def fail():
+        raise Exception("artifact missing")
+    monkeypatch.setattr(server, 'load_pipeline', fail)
+
+    async def handler(client, app):
+        ready = await client.get('/ready')
+        predict = await client.post('/predict', json={'city': 'Tunis', 'size': 100, 'room_count': 3,
+                                                      'bathroom_count': 1})
+        return ready.status, (await ready.json())['error'], predict.status
+    assert request(handler) == (503, "artifact missing", 503)
+
+
+def test_concurrent_requests_are_scored_together():
+    listings = [{'city': city, 'size': size, 'room_count': 3, 'bathroom_count': 1, 'region': region}
+                for city, region in [('Tunis', 'La Marsa'), ('Ariana', None), ('Ben Arous', 'Rades')]
+                for size in (60, 90, 120, 150)]
+
+    async def handler(client, app):
+        responses = await asyncio.gather(*[client.post('/predict', json=listing) for listing in listings])
+        return [await response.json() for response in responses], app['batcher'].batches_scored
+
+    results, batches = request(handler)
+    assert batches < len(listings)
+    frame = predict_prices(server.pd.DataFrame([server.parse_listing(listing) for listing in listings]))
+    assert [result['estimated_price_tnd'] for result in results] == frame['estimated_price_tnd'].tolist()
+    assert results[0]['original_region'] == 'La Marsa'
+
+
+def test_list_payload():
+    async def handler(client, app):
+        response = await client.post('/predict', json=[
+            {'city': 'Tunis', 'size': 100, 'room_count': 3, 'bathroom_count': 0},
+            {'city': 'Ariana', 'size': 80, 'room_count': 2, 'bathroom_count': 1}])
+        return response.status, await response.json()
+
+    status, results = request(handler)
+    assert status == 200
+    assert [result['city'] for result in results] == ['Tunis', 'Ariana']
+
+
+@pytest.mark.parametrize('payload, error', [
+    ({'city': 'Tunis', 'size': 100, 'room_count': 3}, "Missing fields: bathroom_count"),
+    ({'city': 'Tunis', 'size': 'big', 'room_count': 3, 'bathroom_count': 1}, "'size' must be a number"),
+    ({'city': 'Tunis', 'size': 'nan', 'room_count': 3, 'bathroom_count': 1}, "'size' must be a finite number"),
+    ({'city': 'Sfax', 'size': 100, 'room_count': 3, 'bathroom_count': 1}, "Unsupported city"),
+    ({'city': 'Tunis', 'size': -1, 'room_count': 1, 'bathroom_count': 1}, "Missing or non-positive size"),
+    ({'city': 'Tunis', 'size': 100, 'room_count': 3, 'bathroom_count': -1}, "Missing or negative bathroom count"),
+    ([{'city': 'Tunis', 'size': 100, 'room_count': 3, 'bathroom_count': 1},
+      {'city': 'Tunis', 'size': 20, 'room_count': 3, 'bathroom_count': 1}], "Listing 1: too many rooms for the size"),
+    ("tunis", "Each listing must be a JSON object"),
+])
+def test_bad_input_is_rejected(payload, error):
+    async def handler(client, app):
+        response = await client.post('/predict', json=payload)
+        return response.status, (await response.json())['error']
+    assert request(handler) == (400, error)
+
+
+def test_invalid_json():
+    async def handler(client, app):
+        response = await client.post('/predict', data=b'{not json')
+        return response.status
+    assert request(handler) == 400
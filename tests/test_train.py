@@ -0,0 +1,89 @@
+import json
+
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.linear_model import Ridge
+
+from fixture import DATA_PATH
+from train import (FEATURES, N_TIERS, assign_tiers, build_stream_state, export_pipeline, fit_ensemble,
+                   fit_region_imputers, fit_virtual_regions, load_training_data)
+
+
+@pytest.fixture(scope='module')
+def listings():
+    return load_training_data(DATA_PATH)
+
+
+@pytest.fixture(scope='module')
+def stages(listings):
+    df, knn_region_models, best_k_per_city = fit_region_imputers(listings, n_jobs=1)
+    df, clustering_models, tier_lookup = fit_virtual_regions(df)
+    return df, knn_region_models, best_k_per_city, clustering_models, tier_lookup
+
+
+def test_training_data_is_cleaned_and_city_sorted(listings):
+    assert listings['city'].is_monotonic_increasing
+    assert listings.index.equals(pd.RangeIndex(len(listings)))
+    assert (listings['price_per_m2'] > 0).all()
+    assert not listings[['size', 'room_count', 'bathroom_count']].isna().any().any()
+
+
+def test_region_imputers_fill_unlisted_regions(listings, stages):
+    df, knn_region_models, best_k_per_city = stages[:3]
+    assert listings['region'].eq('autres villes').any()  # the input frame is left as listed
+    assert set(best_k_per_city) == set(knn_region_models)
+    for city, models in knn_region_models.items():
+        regions = df.loc[df['city'] == city, 'region']
+        assert not regions.eq('autres villes').any()
+        assert set(regions) <= set(models['label_encoder'].classes_)
+
+
+def test_virtual_regions_get_ordered_tiers(stages):
+    df, clustering_models, tier_lookup = stages[0], stages[3], stages[4]
+    assert set(df['virtual_region'].dropna().str.split('_Cluster_').str[0]) == set(clustering_models)
+    assert set(tier_lookup.values()) == set(range(N_TIERS))
+    medians = df.groupby('tier')['price_per_m2'].median()
+    assert medians.is_monotonic_increasing
+
+
+def test_tiers_are_kept_for_small_median_changes(stages):
+    df, tier_lookup = stages[0], stages[4]
+    medians = df.groupby('virtual_region')['price_per_m2'].median()
+    assert assign_tiers(medians * 1.01, previous_lookup=tier_lookup) == tier_lookup
+
+
+def test_stream_state_summarizes_every_city(stages):
+    df = stages[0]
+    state = build_stream_state(df)
+    assert state['rows'] == len(df)
+    for city, values in df.groupby('city')['price_per_m2']:
+        moments = state['city_price_per_m2'][city]['moments']
+        assert moments.count == len(values)
+        assert moments.mean == pytest.approx(values.mean())
+
+
+def test_ensemble_is_fitted_and_evaluated(stages):
+    df = stages[0].copy()
+    df['avg_room_size'] = df['size'] / df['room_count']
+    X, y = df[FEATURES], np.log1p(df['price'])
+    members = [('Ridge', Ridge()), ('Strong_Ridge', Ridge(alpha=10.0))]
+    model, results = fit_ensemble('voting', members, [0.5, 0.5], X, y, X, y, n_jobs=1)
+    assert len(model.predict(X)) == len(X)
+    assert 0 < results['R2_Test'] <= 1
+    assert results['Best_Params'] == {'estimators': ['Ridge', 'Strong_Ridge'], 'weights': [0.5, 0.5]}
+
+
+def test_export_writes_metadata_and_artifact(tmp_path, served_pipeline):
+    exports = dict(served_pipeline.pipeline,
+                   model_results={'Stacking_Ensemble': {'R2_Test': 0.8}, 'Ridge': {'R2_Test': 0.7}})
+    path = export_pipeline(exports, str(tmp_path / "model_export"))
+
+    assert joblib.load(path)['champion_name'] == 'Stacking_Ensemble'
+    assert not (tmp_path / "model_export" / "house_pricing_pipeline.joblib.tmp").exists()
+    with open(tmp_path / "model_export" / "pipeline_metadata.json", encoding='utf-8') as f:
+        metadata = json.load(f)
+    assert metadata['champion_r2'] == 0.8
+    assert metadata['cities_supported'] == list(exports['knn_region_models'])
+    assert metadata['features_required'] == FEATURES
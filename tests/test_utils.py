@@ -0,0 +1,32 @@
+import pandas as pd
+import pytest
+
+from compiled import _random_listings
+from utils import predict_price, predict_prices
+
+FIELDS = ['city', 'original_region', 'canonical_region', 'imputed_region', 'estimated_price_tnd',
+          'price_low_tnd', 'price_high_tnd', 'price_per_m2', 'avg_room_size']
+
+
+@pytest.fixture(scope='module')
+def listings():
+    rows = _random_listings(200, seed=7)
+    # Free-text spellings and blank regions take the canonicalization branches
+    rows += [('ariana', 15, 1, 1, 'Soukra'), ('tunis', 90, 3, 1, ' LA MARSA '), ('ben arous', 120, 4, 2, ''),
+             ('la manouba', 70, 2, 1, 'Autres Villes')]
+    return pd.DataFrame(rows, columns=['city', 'size', 'room_count', 'bathroom_count', 'region'])
+
+
+def test_batch_matches_single(listings):
+    batch = predict_prices(listings)
+    for position, row in enumerate(listings.itertuples(index=False)):
+        single = predict_price(row.city, row.size, row.room_count, row.bathroom_count, row.region, mode='standard')
+        for field in FIELDS:
+            assert batch[field].iloc[position] == single[field], (row, field)
+
+
+def test_batch_keeps_the_index_and_defaults_the_region(listings):
+    frame = listings.drop(columns='region').set_index(listings.index + 100)
+    batch = predict_prices(frame)
+    assert batch.index.equals(frame.index)
+    assert (batch['canonical_region'] == 'autres villes').all()